@@ -0,0 +1,6 @@
+"""
+Benchmarks offline (sin BigQuery)
+
+Export GA4 sintético + DuckDB para medir latencia, memoria y filas/s de cada
+consulta y visualización. Ver benchmarks/run_benchmarks.py.
+"""
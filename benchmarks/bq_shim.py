@@ -0,0 +1,153 @@
+"""
+Traducción de las consultas GA4 (dialecto BigQuery) a DuckDB
+
+La traducción general la hace sqlglot; aquí se corrigen las construcciones
+de BigQuery que sqlglot no resuelve para DuckDB:
+
+- `proyecto.dataset.events_*` con filtro _TABLE_SUFFIX: se lee una tabla
+  local con todos los shards y una columna _TABLE_SUFFIX.
+- UNNEST sin alias de un array de STRUCT (subconsultas sobre event_params):
+  BigQuery expone los campos del struct como columnas.
+- UNNEST(items) AS items: en BigQuery el alias oculta la columna de la tabla;
+  en DuckDB serían ambiguos, así que el alias se renombra en su ámbito.
+- ARRAY_AGG(... ORDER BY ... LIMIT n): DuckDB no admite LIMIT en agregados.
+- FORMAT('%02d', x): en DuckDB FORMAT usa otra sintaxis; se usa PRINTF.
+- FARM_FINGERPRINT(x): no existe en DuckDB; se usa HASH (otro valor, mismo
+  uso como clave de agrupación).
+
+Además, DuckDB devuelve SUM de enteros como HUGEINT (decimal en Arrow), donde
+BigQuery devuelve INT64: normalize_arrow_types deja los tipos como los de BigQuery.
+"""
+import re
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import sqlglot
+from sqlglot import exp
+
+# Nombre de la tabla local con todos los shards events_YYYYMMDD
+EVENTS_TABLE = 'events_all'
+
+_SHARDED_TABLE = re.compile(r"`[^`]+\.events_\*`")
+
+
+def _rename_unnest_aliases(select: exp.Select):
+    """Renombra los alias de UNNEST que coinciden con columnas de la tabla"""
+    renames = {}
+    for join in select.args.get('joins') or []:
+        unnest = join.this
+        if not isinstance(unnest, exp.Unnest):
+            continue
+        alias = unnest.args.get('alias')
+        if alias is None or len(alias.columns) != 1:
+            continue
+        name = alias.columns[0].name
+        renamed = f"{name}__u"
+        alias.columns[0].set('this', renamed)
+        renames[name] = (renamed, unnest)
+
+    if not renames:
+        return
+
+    for column in select.find_all(exp.Column):
+        first = column.parts[0]
+        if first.name not in renames:
+            continue
+        renamed, unnest = renames[first.name]
+        # El argumento del propio UNNEST sigue siendo la columna de la tabla
+        if column.find_ancestor(exp.Unnest) is unnest:
+            continue
+        if column.find_ancestor(exp.Select) is not select:
+            continue
+        first.set('this', renamed)
+
+
+def _expand_struct_unnest(unnest: exp.Unnest):
+    """FROM UNNEST(array_de_structs) sin alias -> subconsulta con los campos como columnas"""
+    call = exp.Anonymous(
+        this='UNNEST',
+        expressions=[
+            unnest.expressions[0].copy(),
+            exp.PropertyEQ(this=exp.var('max_depth'), expression=exp.Literal.number(2))
+        ]
+    )
+    unnest.replace(exp.Subquery(this=exp.select(call)))
+
+
+def _drop_aggregate_limit(array_agg: exp.ArrayAgg):
+    """ARRAY_AGG(x ORDER BY y LIMIT n) -> LIST_SLICE(ARRAY_AGG(x ORDER BY y), 1, n)"""
+    limit = array_agg.this
+    if not isinstance(limit, exp.Limit):
+        return
+    array_agg.set('this', limit.this)
+
+    outer = array_agg.parent if isinstance(array_agg.parent, exp.IgnoreNulls) else array_agg
+    if isinstance(outer.parent, exp.Bracket):
+        # [OFFSET(k)] con k < n: el recorte no cambia el resultado
+        return
+    outer.replace(exp.Anonymous(
+        this='LIST_SLICE',
+        expressions=[outer.copy(), exp.Literal.number(1), limit.expression.copy()]
+    ))
+
+
+def _format_to_printf(node: exp.Format):
+    """FORMAT(patrón_printf, ...) de BigQuery -> PRINTF de DuckDB"""
+    node.replace(exp.Anonymous(
+        this='PRINTF',
+        expressions=[node.this.copy()] + [e.copy() for e in node.expressions]
+    ))
+
+
+def _fingerprint_to_hash(node: exp.FarmFingerprint):
+    """FARM_FINGERPRINT(x) de BigQuery -> HASH(x) de DuckDB"""
+    node.replace(exp.Anonymous(this='HASH', expressions=[e.copy() for e in node.expressions]))
+
+
+def to_duckdb(sql: str) -> str:
+    """
+    Traduce una consulta generar_query_* a SQL de DuckDB
+
+    Args:
+        sql: Consulta en dialecto BigQuery
+
+    Returns:
+        Consulta equivalente para DuckDB sobre la tabla EVENTS_TABLE
+    """
+    sql = _SHARDED_TABLE.sub(EVENTS_TABLE, sql)
+    statements = sqlglot.parse(sql, read='bigquery')
+
+    translated = []
+    for tree in statements:
+        if tree is None:
+            continue
+        for array_agg in list(tree.find_all(exp.ArrayAgg)):
+            _drop_aggregate_limit(array_agg)
+        for select in list(tree.find_all(exp.Select)):
+            _rename_unnest_aliases(select)
+        for node in list(tree.find_all(exp.Format)):
+            _format_to_printf(node)
+        for node in list(tree.find_all(exp.FarmFingerprint)):
+            _fingerprint_to_hash(node)
+        for unnest in list(tree.find_all(exp.Unnest)):
+            if unnest.args.get('alias') is None and isinstance(unnest.parent, exp.From):
+                _expand_struct_unnest(unnest)
+        translated.append(tree.sql(dialect='duckdb'))
+
+    return ';\n'.join(translated)
+
+
+def normalize_arrow_types(table: pa.Table) -> pa.Table:
+    """
+    Convierte las columnas decimales de DuckDB a los tipos que devolvería BigQuery
+
+    Decimales sin parte fraccionaria (SUM/COUNT de enteros) pasan a int64 y el
+    resto a float64.
+    """
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_decimal(field.type):
+            target = pa.int64() if field.type.scale == 0 else pa.float64()
+            column = pc.cast(column, target, safe=False)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
@@ -0,0 +1,144 @@
+"""
+Casos de benchmark: cada consulta de las pestañas con su visualización
+
+Refleja el emparejamiento generar_query_* -> mostrar_* de ui/tabs. Cada caso
+es (pestaña, nombre, generador, visualizador, args extra de la consulta,
+args extra de la visualización).
+"""
+from database.queries import (
+    generar_query_consentimiento_basico,
+    generar_query_consentimiento_por_dispositivo,
+    generar_query_consentimiento_real,
+    generar_query_evolucion_temporal_consentimiento,
+    generar_query_consentimiento_por_geografia,
+    generar_query_consentimiento_por_fuente_trafico,
+    generar_query_comparativa_eventos,
+    generar_query_ingresos_transacciones,
+    generar_query_productos_mas_vendidos,
+    generar_query_relacion_productos,
+    generar_query_funnel_por_producto,
+    generar_query_combos_cross_selling,
+    generar_query_canales_trafico,
+    generar_query_atribucion_marketing,
+    generar_query_atribucion_completa,
+    generar_query_eventos_flatten,
+    generar_query_eventos_resumen,
+    generar_query_eventos_por_fecha,
+    generar_query_parametros_eventos,
+    generar_query_metricas_diarias,
+    generar_query_retencion_semanal,
+    generar_query_clv_sesiones,
+    generar_query_tiempo_primera_compra,
+    generar_query_landing_page_attribution,
+    generar_query_adquisicion_usuarios,
+    generar_query_conversion_mensual,
+    generar_query_low_converting_sessions,
+    generar_query_session_path_analysis,
+    generar_query_session_paths_n_pasos,
+    generar_query_hourly_sessions_performance,
+    generar_query_exit_pages,
+    generar_query_session_facts
+)
+from visualization import (
+    mostrar_consentimiento_basico,
+    mostrar_consentimiento_por_dispositivo,
+    mostrar_consentimiento_real,
+    mostrar_evolucion_temporal_consentimiento,
+    mostrar_consentimiento_por_geografia,
+    mostrar_consentimiento_por_fuente_trafico,
+    mostrar_comparativa_eventos,
+    mostrar_ingresos_transacciones,
+    mostrar_productos_mas_vendidos,
+    mostrar_relacion_productos,
+    mostrar_funnel_por_producto,
+    mostrar_combos_cross_selling,
+    mostrar_canales_trafico,
+    mostrar_atribucion_marketing,
+    mostrar_atribucion_multimodelo,
+    mostrar_atribucion_completa,
+    mostrar_eventos_flatten,
+    mostrar_eventos_resumen,
+    mostrar_eventos_por_fecha,
+    mostrar_parametros_evento,
+    mostrar_metricas_diarias,
+    mostrar_retencion_semanal,
+    mostrar_clv_sesiones,
+    mostrar_tiempo_primera_compra,
+    mostrar_landing_page_attribution,
+    mostrar_adquisicion_usuarios,
+    mostrar_conversion_mensual,
+    mostrar_low_converting_sessions,
+    mostrar_session_path_analysis,
+    mostrar_session_paths_n_pasos,
+    mostrar_hourly_sessions_performance,
+    mostrar_exit_pages_analysis
+)
+
+BENCHMARK_CASES = [
+    # Cookies
+    ('cookies', 'consentimiento_basico', generar_query_consentimiento_basico, mostrar_consentimiento_basico, (), ()),
+    # Modo rápido (APPROX_COUNT_DISTINCT sobre events_*; los sketches HLL_COUNT no tienen equivalente en DuckDB)
+    ('cookies', 'consentimiento_basico_aprox', generar_query_consentimiento_basico,
+     mostrar_consentimiento_basico, (True,), ()),
+    ('cookies', 'consentimiento_por_dispositivo', generar_query_consentimiento_por_dispositivo,
+     mostrar_consentimiento_por_dispositivo, (), ()),
+    ('cookies', 'consentimiento_real', generar_query_consentimiento_real, mostrar_consentimiento_real, (), ()),
+    ('cookies', 'evolucion_temporal_consentimiento', generar_query_evolucion_temporal_consentimiento,
+     mostrar_evolucion_temporal_consentimiento, (), ()),
+    ('cookies', 'consentimiento_por_geografia', generar_query_consentimiento_por_geografia,
+     mostrar_consentimiento_por_geografia, (), ()),
+    ('cookies', 'consentimiento_por_fuente_trafico', generar_query_consentimiento_por_fuente_trafico,
+     mostrar_consentimiento_por_fuente_trafico, (), ()),
+    # Ecommerce
+    ('ecommerce', 'comparativa_eventos', generar_query_comparativa_eventos, mostrar_comparativa_eventos, (), ()),
+    ('ecommerce', 'ingresos_transacciones', generar_query_ingresos_transacciones,
+     mostrar_ingresos_transacciones, (), ()),
+    ('ecommerce', 'productos_mas_vendidos', generar_query_productos_mas_vendidos,
+     mostrar_productos_mas_vendidos, (), ()),
+    ('ecommerce', 'relacion_productos', generar_query_relacion_productos, mostrar_relacion_productos, (), ()),
+    ('ecommerce', 'funnel_por_producto', generar_query_funnel_por_producto, mostrar_funnel_por_producto, (), ()),
+    ('ecommerce', 'combos_cross_selling', generar_query_combos_cross_selling, mostrar_combos_cross_selling, (), ()),
+    ('ecommerce', 'combos_cross_selling_muestra', generar_query_combos_cross_selling,
+     mostrar_combos_cross_selling, (10,), ()),
+    # Adquisición
+    ('acquisition', 'canales_trafico', generar_query_canales_trafico, mostrar_canales_trafico, (), ()),
+    ('acquisition', 'canales_trafico_aprox', generar_query_canales_trafico, mostrar_canales_trafico, (True,), ()),
+    ('acquisition', 'atribucion_marketing', generar_query_atribucion_marketing, mostrar_atribucion_marketing, (), ()),
+    ('acquisition', 'atribucion_multimodelo', generar_query_atribucion_marketing,
+     mostrar_atribucion_multimodelo, (), ()),
+    ('acquisition', 'atribucion_completa', generar_query_atribucion_completa, mostrar_atribucion_completa, (), ()),
+    # Eventos
+    ('events', 'eventos_flatten', generar_query_eventos_flatten, mostrar_eventos_flatten, (), ()),
+    ('events', 'eventos_flatten_seleccion', generar_query_eventos_flatten, mostrar_eventos_flatten,
+     (None, ['event_name', 'user_pseudo_id', 'ga_session_id'], ['page_location'], ['page_view'], False, False), ()),
+    ('events', 'eventos_flatten_anidado', generar_query_eventos_flatten, mostrar_eventos_flatten,
+     (None, None, None, None, True, True, True), ()),
+    ('events', 'eventos_resumen', generar_query_eventos_resumen, mostrar_eventos_resumen, (), ()),
+    ('events', 'eventos_por_fecha', generar_query_eventos_por_fecha, mostrar_eventos_por_fecha, (), ()),
+    ('events', 'parametros_eventos', generar_query_parametros_eventos, mostrar_parametros_evento,
+     ('page_view',), ('page_view',)),
+    ('events', 'parametros_eventos_muestra', generar_query_parametros_eventos, mostrar_parametros_evento,
+     ('page_view', 10), ('page_view',)),
+    ('events', 'metricas_diarias', generar_query_metricas_diarias, mostrar_metricas_diarias, (), ()),
+    ('events', 'metricas_diarias_aprox', generar_query_metricas_diarias, mostrar_metricas_diarias, (True,), ()),
+    # Usuarios
+    ('users', 'retencion_semanal', generar_query_retencion_semanal, mostrar_retencion_semanal, (), ()),
+    ('users', 'clv_sesiones', generar_query_clv_sesiones, mostrar_clv_sesiones, (), ()),
+    ('users', 'tiempo_primera_compra', generar_query_tiempo_primera_compra, mostrar_tiempo_primera_compra, (), ()),
+    ('users', 'landing_page_attribution', generar_query_landing_page_attribution,
+     mostrar_landing_page_attribution, (), ()),
+    ('users', 'adquisicion_usuarios', generar_query_adquisicion_usuarios, mostrar_adquisicion_usuarios, (), ()),
+    ('users', 'conversion_mensual', generar_query_conversion_mensual, mostrar_conversion_mensual, (), ()),
+    # Sesiones
+    ('sessions', 'low_converting_sessions', generar_query_low_converting_sessions,
+     mostrar_low_converting_sessions, (), ()),
+    ('sessions', 'session_path_analysis', generar_query_session_path_analysis,
+     mostrar_session_path_analysis, (), ()),
+    ('sessions', 'session_paths_n_pasos', generar_query_session_paths_n_pasos,
+     mostrar_session_paths_n_pasos, (), ()),
+    ('sessions', 'hourly_sessions_performance', generar_query_hourly_sessions_performance,
+     mostrar_hourly_sessions_performance, (), ()),
+    ('sessions', 'exit_pages', generar_query_exit_pages, mostrar_exit_pages_analysis, (), ()),
+    # Tabla de sesiones materializada (sin visualización propia)
+    ('sessions', 'session_facts', generar_query_session_facts, None, (), ()),
+]
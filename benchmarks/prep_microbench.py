@@ -0,0 +1,228 @@
+"""
+Microbenchmark de las transformaciones fila a fila de las visualizaciones
+
+Compara la implementación anterior (iterrows / apply con lambdas) con la
+vectorizada de visualization/*_prep.py sobre entradas sintéticas de distintos
+tamaños y comprueba que ambas dan el mismo resultado.
+
+Uso:
+    python -m benchmarks.prep_microbench
+    python -m benchmarks.prep_microbench --rows 10000 --rows 100000 --repeat 5
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from visualization.ecommerce_prep import _product_counts
+from visualization.prep import truncate_labels
+from visualization.path_graph import build_path_sankey
+
+
+# ========================================
+# IMPLEMENTACIONES ANTERIORES (referencia)
+# ========================================
+
+def _legacy_shorten_urls(urls, max_length=60):
+    def shorten_url(url):
+        if pd.isna(url):
+            return "(not set)"
+        return url[:max_length] + '...' if len(str(url)) > max_length else url
+    return urls.apply(shorten_url)
+
+
+def _legacy_hour_labels(hours):
+    return hours.apply(lambda x: f'{x:02d}:00')
+
+
+def _legacy_gap_colors(gap):
+    return gap.apply(lambda x: '#4CAF50' if x >= 0 else '#F44336')
+
+
+def _legacy_product_counts(combos):
+    product_counts = {}
+    for _, row in combos.iterrows():
+        product_counts[row['product_a']] = product_counts.get(row['product_a'], 0) + 1
+        product_counts[row['product_b']] = product_counts.get(row['product_b'], 0) + 1
+    return pd.DataFrame([
+        {'Producto': prod, 'Apariciones': count}
+        for prod, count in sorted(product_counts.items(), key=lambda x: x[1], reverse=True)
+    ])
+
+
+def _legacy_sankey_spec(sankey_data):
+    prev_dict = {page: f"{page} [entrada]" if page == '(entrance)' else f"{page} ←"
+                 for page in sankey_data['previous_page_short'].unique()}
+    curr_dict = {page: f"{page} [página]" for page in sankey_data['current_page_short'].unique()}
+    next_dict = {page: f"{page} [salida]" if page == '(exit)' else f"{page} →"
+                 for page in sankey_data['next_page_short'].unique()}
+
+    all_nodes = []
+    all_nodes.extend(prev_dict.values())
+    all_nodes.extend([node for node in curr_dict.values() if node not in all_nodes])
+    all_nodes.extend([node for node in next_dict.values() if node not in all_nodes])
+    node_indices = {node: idx for idx, node in enumerate(all_nodes)}
+
+    sources, targets, values = [], [], []
+    for _, row in sankey_data.iterrows():
+        sources.append(node_indices[prev_dict[row['previous_page_short']]])
+        targets.append(node_indices[curr_dict[row['current_page_short']]])
+        values.append(row['session_count'])
+    for _, row in sankey_data.iterrows():
+        sources.append(node_indices[curr_dict[row['current_page_short']]])
+        targets.append(node_indices[next_dict[row['next_page_short']]])
+        values.append(row['session_count'])
+
+    return {'labels': all_nodes, 'source': sources, 'target': targets, 'value': values}
+
+
+# ========================================
+# DATOS SINTÉTICOS
+# ========================================
+
+def _urls(rng, n):
+    """URLs de longitud variable (parte por debajo y parte por encima del límite) con ~1% nulas"""
+    sections = pd.Series(['productos', 'categoria', 'blog', 'checkout', 'cuenta', 'ofertas'])
+    slugs = pd.Series(rng.integers(10 ** 6, 10 ** 7, n)).astype(str).str.repeat(rng.integers(1, 12, n))
+    urls = ('/' + sections.sample(n, replace=True, random_state=rng).reset_index(drop=True)
+            + '/' + slugs).astype(object)
+    urls[rng.random(n) < 0.01] = None
+    return urls
+
+
+def _paths(rng, n):
+    pages = _urls(rng, max(n // 20, 50)).fillna('/').str[:40].to_numpy()
+    prev = pages[rng.integers(0, len(pages), n)]
+    nxt = pages[rng.integers(0, len(pages), n)]
+    prev[rng.random(n) < 0.2] = '(entrance)'
+    nxt[rng.random(n) < 0.2] = '(exit)'
+    return pd.DataFrame({
+        'previous_page_short': prev,
+        'current_page_short': pages[rng.integers(0, len(pages), n)],
+        'next_page_short': nxt,
+        'session_count': rng.integers(1, 5000, n)
+    })
+
+
+def _combos(rng, n):
+    products = np.array([f"Producto {i:05d}" for i in range(max(n // 10, 100))])
+    return pd.DataFrame({
+        'product_a': products[rng.integers(0, len(products), n)],
+        'product_b': products[rng.integers(0, len(products), n)]
+    })
+
+
+def _same_counts(legacy, vectorized):
+    """El orden entre empates no está definido: se compara como mapa producto -> apariciones"""
+    return dict(zip(legacy['Producto'], legacy['Apariciones'])) == \
+        dict(zip(vectorized['Producto'], vectorized['Apariciones']))
+
+
+_LEGACY_LEVELS = {' [entrada]': 0, ' ←': 0, ' [página]': 1, ' →': 2, ' [salida]': 2}
+
+
+def _legacy_node(label):
+    for suffix, level in _LEGACY_LEVELS.items():
+        if label.endswith(suffix):
+            return level, label[:-len(suffix)]
+
+
+def _same_sankey(legacy, engine):
+    """Mismo flujo total entre cada par de nodos (paso, página)"""
+    legacy_flows, engine_flows = {}, {}
+    for source, target, value in zip(legacy['source'], legacy['target'], legacy['value']):
+        key = (_legacy_node(legacy['labels'][source]), _legacy_node(legacy['labels'][target]))
+        legacy_flows[key] = legacy_flows.get(key, 0) + value
+    nodes = list(zip(engine['level'], engine['customdata']))
+    for source, target, value in zip(engine['source'], engine['target'], engine['value']):
+        engine_flows[(nodes[source], nodes[target])] = value
+    return legacy_flows == engine_flows
+
+
+def _sankey_3_steps(paths):
+    return build_path_sankey(paths, ['previous_page_short', 'current_page_short', 'next_page_short'],
+                             'session_count')
+
+
+def _sankey_5_steps(paths):
+    return build_path_sankey(paths, [f'step_{i}' for i in range(5)], 'session_count', top_k=200)
+
+
+def _paths_5_steps(rng, n):
+    """Secuencias de 5 pasos sobre miles de páginas; ~30% terminan antes"""
+    pages = _urls(rng, 5000).fillna('/').to_numpy()
+    steps = {f'step_{i}': pages[rng.integers(0, len(pages), n)] for i in range(5)}
+    steps['step_0'][rng.random(n) < 0.5] = '(entrance)'
+    for i in (3, 4):
+        steps[f'step_{i}'][rng.random(n) < 0.3] = None
+    return pd.DataFrame({**steps, 'session_count': rng.integers(1, 500, n)})
+
+
+def build_cases(rng, n):
+    """(nombre, entrada, anterior, vectorizada, comparación de resultados)"""
+    urls = _urls(rng, n)
+    hours = pd.Series(rng.integers(0, 24, n))
+    gap = pd.Series(rng.normal(0, 10, n))
+    return [
+        ('acortar_urls', urls, _legacy_shorten_urls,
+         lambda s: truncate_labels(s, 60, missing="(not set)"), lambda a, b: a.tolist() == b.tolist()),
+        # Columnas de texto respaldadas por Arrow (Settings.QUERY_ARROW_DTYPES)
+        ('acortar_urls_arrow', urls.astype('string[pyarrow]'), _legacy_shorten_urls,
+         lambda s: truncate_labels(s, 60, missing="(not set)"), lambda a, b: a.tolist() == b.tolist()),
+        ('etiquetas_hora', hours, _legacy_hour_labels,
+         lambda s: s.astype(str).str.zfill(2) + ':00', lambda a, b: a.tolist() == b.tolist()),
+        ('colores_consent_gap', gap, _legacy_gap_colors,
+         lambda s: np.where(s >= 0, '#4CAF50', '#F44336'), lambda a, b: (a.to_numpy() == b).all()),
+        ('conteo_productos_combos', _combos(rng, n), _legacy_product_counts, _product_counts, _same_counts),
+        ('enlaces_sankey', _paths(rng, n), _legacy_sankey_spec, _sankey_3_steps, _same_sankey),
+        # Sin implementación anterior: solo admitía anterior -> actual -> siguiente
+        ('sankey_5_pasos_top200', _paths_5_steps(rng, n), None, _sankey_5_steps, None),
+    ]
+
+
+def _time_ms(func, data, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(data)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmark de preparación vectorizada")
+    parser.add_argument('--rows', type=int, action='append', help="Filas de entrada (repetible)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones por caso (se usa la mediana)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.rows or [10_000, 100_000]:
+        rng = np.random.default_rng(args.seed)
+        for name, data, legacy, vectorized, same in build_cases(rng, n):
+            vectorized_ms, vectorized_result = _time_ms(vectorized, data, args.repeat)
+            if legacy is None:
+                results.append({'caso': name, 'filas': n, 'vectorizado_ms': round(vectorized_ms, 1),
+                                'mismo_resultado': True})
+                continue
+            legacy_ms, legacy_result = _time_ms(legacy, data, args.repeat)
+            results.append({
+                'caso': name,
+                'filas': n,
+                'anterior_ms': round(legacy_ms, 1),
+                'vectorizado_ms': round(vectorized_ms, 1),
+                'aceleracion': round(legacy_ms / vectorized_ms, 1) if vectorized_ms else None,
+                'mismo_resultado': bool(same(legacy_result, vectorized_result))
+            })
+
+    table = pd.DataFrame(results)
+    print(table.to_string(index=False))
+    return 0 if table['mismo_resultado'].all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Benchmark offline de consultas y visualizaciones
+
+Genera (o reutiliza) un export GA4 sintético, ejecuta cada generar_query_*
+traducido a DuckDB y después la visualización mostrar_* correspondiente sin
+interfaz (Streamlit en modo bare: los st.* no pintan nada pero la preparación
+de datos y las figuras de Plotly sí se calculan).
+
+Cada repetición parte de la caché de preparar_* vacía (prep_ms); después se
+repite la visualización con la caché caliente (rerun_ms), que es lo que cuesta
+una interacción con un widget de la sección.
+
+Uso:
+    python -m benchmarks.run_benchmarks --days 30 --events-per-day 50000
+    python -m benchmarks.run_benchmarks --tab sessions --repeat 5
+    python -m benchmarks.run_benchmarks --output actual.json --baseline base.json
+
+Con --baseline el proceso termina con código 1 si alguna consulta o pestaña
+es más lenta que la referencia por encima de --tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import duckdb
+import pandas as pd
+from streamlit import config as streamlit_config
+from streamlit import logger as streamlit_logger
+
+from benchmarks.bq_shim import EVENTS_TABLE, normalize_arrow_types, to_duckdb
+from benchmarks.cases import BENCHMARK_CASES
+from benchmarks.synthetic_ga4 import describe, generate_dataset
+from database.connection import arrow_to_dataframe
+from database.local_engines import apply_local_engine
+from visualization.prep import clear_prep_cache
+
+PROJECT = 'benchmark-project'
+DATASET = 'analytics_000000000'
+
+
+def _rss_bytes() -> int:
+    """Memoria residente actual del proceso"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # Sin /proc (macOS): máximo histórico, en bytes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _PeakMemory:
+    """Pico de memoria residente (por encima del inicial) mientras dura el bloque"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+
+    def __enter__(self):
+        self._start = _rss_bytes()
+        self.peak = self._start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+    @property
+    def delta_mb(self) -> float:
+        return (self.peak - self._start) / 1024 ** 2
+
+
+def load_events(con, paths):
+    """Carga los shards en una tabla local con la pseudo-columna _TABLE_SUFFIX"""
+    directory = os.path.dirname(paths[0])
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {EVENTS_TABLE} AS
+        SELECT * EXCLUDE (filename),
+               regexp_extract(filename, 'events_(\\d{{8}})', 1) AS _TABLE_SUFFIX
+        FROM read_parquet('{directory}/events_*.parquet', filename = true)
+    """)
+
+
+def run_case(con, case, start_date, end_date, repeat: int, input_rows: int) -> dict:
+    """
+    Ejecuta un caso `repeat` veces y devuelve la mediana de cada fase
+
+    Returns:
+        dict con tiempos (ms), filas, filas/s de entrada y pico de memoria (MB)
+    """
+    tab, name, generator, visualizer, query_args, view_args = case
+    result = {'tab': tab, 'query': name, 'status': 'ok'}
+
+    try:
+        sql = to_duckdb(generator(PROJECT, DATASET, start_date, end_date, *query_args))
+    except Exception as e:
+        return {**result, 'status': 'error', 'error': f"traducción: {e}"}
+
+    sql_times, fetch_times, prep_times, rerun_times, peaks = [], [], [], [], []
+    rows = 0
+    for _ in range(repeat):
+        try:
+            clear_prep_cache()
+            with _PeakMemory() as memory:
+                started = time.perf_counter()
+                table = normalize_arrow_types(con.execute(sql).to_arrow_table())
+                executed = time.perf_counter()
+                df = arrow_to_dataframe(table)
+                fetched = time.perf_counter()
+                # El motor local (combos) cuenta como preparación de la primera visualización
+                df = apply_local_engine(df, generator)
+                if visualizer is not None:
+                    visualizer(df, *view_args)
+                prepared = time.perf_counter()
+                if visualizer is not None:
+                    visualizer(df, *view_args)
+                rerun = time.perf_counter()
+        except Exception as e:
+            message = str(e).strip().splitlines()
+            return {**result, 'status': 'error', 'error': f"{type(e).__name__}: {message[0] if message else ''}"}
+
+        rows = len(df)
+        sql_times.append((executed - started) * 1000)
+        fetch_times.append((fetched - executed) * 1000)
+        prep_times.append((prepared - fetched) * 1000)
+        rerun_times.append((rerun - prepared) * 1000)
+        peaks.append(memory.delta_mb)
+
+    sql_ms = statistics.median(sql_times)
+    prep_ms = statistics.median(prep_times)
+    fetch_ms = statistics.median(fetch_times)
+    return {
+        **result,
+        'sql_ms': round(sql_ms, 1),
+        'fetch_ms': round(fetch_ms, 1),
+        'prep_ms': round(prep_ms, 1),
+        'total_ms': round(sql_ms + fetch_ms + prep_ms, 1),
+        'rerun_ms': round(statistics.median(rerun_times), 1),
+        'rows': rows,
+        'input_rows_per_s': round(input_rows / (sql_ms / 1000)) if sql_ms else None,
+        'peak_mb': round(max(peaks), 1),
+    }
+
+
+def summarize_tabs(results) -> pd.DataFrame:
+    """Totales por pestaña (suma de la ejecución en serie de sus secciones)"""
+    ok = pd.DataFrame([r for r in results if r['status'] == 'ok'])
+    if ok.empty:
+        return ok
+    return ok.groupby('tab').agg(
+        queries=('query', 'count'),
+        sql_ms=('sql_ms', 'sum'),
+        prep_ms=('prep_ms', 'sum'),
+        rerun_ms=('rerun_ms', 'sum'),
+        total_ms=('total_ms', 'sum'),
+        peak_mb=('peak_mb', 'max'),
+    ).round(1).reset_index()
+
+
+def compare_with_baseline(results, tabs: pd.DataFrame, baseline: dict, tolerance: float):
+    """Lista de regresiones (consultas y pestañas más lentas que la referencia)"""
+    regressions = []
+    base_queries = {(r['tab'], r['query']): r for r in baseline.get('queries', [])}
+    for r in results:
+        base = base_queries.get((r['tab'], r['query']))
+        if r['status'] != 'ok' or not base or base.get('status') != 'ok':
+            continue
+        for metric in ('total_ms', 'peak_mb'):
+            if base[metric] and r[metric] > base[metric] * (1 + tolerance) and r[metric] - base[metric] > 5:
+                regressions.append(f"{r['tab']}/{r['query']}: {metric} {base[metric]} -> {r[metric]}")
+
+    base_tabs = {t['tab']: t for t in baseline.get('tabs', [])}
+    for t in tabs.to_dict('records'):
+        base = base_tabs.get(t['tab'])
+        if base and base['total_ms'] and t['total_ms'] > base['total_ms'] * (1 + tolerance):
+            regressions.append(f"{t['tab']}: total_ms {base['total_ms']} -> {t['total_ms']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline de BigQuery Shield")
+    parser.add_argument('--days', type=int, default=30, help="Días de datos sintéticos")
+    parser.add_argument('--users', type=int, default=20000, help="Usuarios distintos")
+    parser.add_argument('--events-per-day', type=int, default=50000, help="Eventos aproximados por día")
+    parser.add_argument('--products', type=int, default=300, help="Productos del catálogo")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default='/tmp/bq_shield_benchmark', help="Directorio de los shards")
+    parser.add_argument('--tab', action='append', help="Solo estas pestañas (repetible)")
+    parser.add_argument('--query', action='append', help="Solo consultas cuyo nombre contenga esto")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones por caso (se usa la mediana)")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos de DuckDB")
+    parser.add_argument('--output', help="Guarda los resultados en JSON")
+    parser.add_argument('--baseline', help="JSON de referencia para detectar regresiones")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Margen sobre la referencia (0.25 = +25%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # Streamlit sin servidor avisa en cada st.*: se silencia una vez leída su configuración
+    streamlit_config.get_config_options()
+    streamlit_logger.set_log_level('error')
+
+    # Rango fijo que termina ayer: las consultas ven días cerrados
+    end_date = date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=args.days - 1)
+
+    started = time.perf_counter()
+    paths = generate_dataset(
+        args.data_dir, start_date, end_date, n_users=args.users,
+        events_per_day=args.events_per_day, n_products=args.products, seed=args.seed
+    )
+    dataset_info = describe(paths)
+    print(f"Datos: {dataset_info['days']} días, {dataset_info['rows']:,} eventos, "
+          f"{dataset_info['bytes'] / 1024 ** 2:.1f} MB en Parquet ({time.perf_counter() - started:.1f}s)")
+
+    con = duckdb.connect()
+    if args.threads:
+        con.execute(f"SET threads = {args.threads}")
+    load_events(con, paths)
+
+    cases = [
+        case for case in BENCHMARK_CASES
+        if (not args.tab or case[0] in args.tab)
+        and (not args.query or any(q in case[1] for q in args.query))
+    ]
+
+    results = []
+    for case in cases:
+        result = run_case(con, case, start_date, end_date, args.repeat, dataset_info['rows'])
+        results.append(result)
+        if result['status'] == 'ok':
+            print(f"  {result['tab']:<12} {result['query']:<36} {result['total_ms']:>9.1f} ms "
+                  f"{result['rows']:>8,} filas {result['peak_mb']:>8.1f} MB")
+        else:
+            print(f"  {result['tab']:<12} {result['query']:<36} ERROR {result['error']}")
+
+    queries = pd.DataFrame(results)
+    tabs = summarize_tabs(results)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print("\nPor consulta:")
+        print(queries.drop(columns=[c for c in ('error',) if c in queries]).to_string(index=False))
+        print("\nPor pestaña:")
+        print(tabs.to_string(index=False))
+
+    report = {
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'dataset': dataset_info,
+        'queries': results,
+        'tabs': tabs.to_dict('records'),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+    exit_code = 0
+    if any(r['status'] != 'ok' for r in results):
+        exit_code = 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, tabs, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresión(es) respecto a {args.baseline}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            exit_code = 1
+        else:
+            print(f"\n✅ Sin regresiones respecto a {args.baseline}")
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
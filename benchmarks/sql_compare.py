@@ -0,0 +1,210 @@
+"""
+Comparación de consultas entre una revisión de git y el árbol de trabajo
+
+Para cada caso de benchmarks/cases.py carga el generador homónimo de la
+revisión de referencia (git show <rev>:database/queries/<módulo>.py) y compara
+su SQL con el del árbol de trabajo:
+
+- Offline (siempre): los dos SQL traducidos a DuckDB sobre el export
+  sintético; tiempo de ejecución (mediana) y si devuelven el mismo resultado.
+- BigQuery (--bq-project/--bq-dataset/--credentials): bytes estimados con dry
+  run y, con --execute, bytes facturados y slot-ms de una ejecución sin caché.
+
+Los casos cuyo SQL no cambia entre revisiones no se ejecutan.
+
+Uso:
+    python -m benchmarks.sql_compare --rev HEAD~1
+    python -m benchmarks.sql_compare --rev main --tab sessions --output sql_compare.json
+    python -m benchmarks.sql_compare --rev HEAD~1 --bq-project mi-proyecto \\
+        --bq-dataset analytics_123 --credentials sa.json --execute
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import types
+from datetime import date, timedelta
+
+import duckdb
+import pandas as pd
+
+from benchmarks.bq_shim import normalize_arrow_types, to_duckdb
+from benchmarks.cases import BENCHMARK_CASES
+from benchmarks.run_benchmarks import DATASET, PROJECT, load_events
+from benchmarks.synthetic_ga4 import generate_dataset
+
+_baseline_modules = {}
+
+
+def load_baseline_generator(rev: str, generator):
+    """
+    Generador con el mismo nombre en la revisión `rev` (None si no existía)
+
+    El módulo se ejecuta con el paquete actual: sus imports (Settings,
+    fragmentos) resuelven contra el árbol de trabajo.
+    """
+    module_name = generator.__module__
+    if module_name not in _baseline_modules:
+        path = module_name.replace('.', '/') + '.py'
+        source = subprocess.run(
+            ['git', 'show', f'{rev}:{path}'], capture_output=True, text=True
+        )
+        module = None
+        if source.returncode == 0:
+            module = types.ModuleType(f'_baseline_{module_name}')
+            module.__package__ = module_name.rsplit('.', 1)[0]
+            exec(compile(source.stdout, f'{rev}:{path}', 'exec'), module.__dict__)
+        _baseline_modules[module_name] = module
+
+    module = _baseline_modules[module_name]
+    return getattr(module, generator.__name__, None) if module else None
+
+
+def same_result(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Mismas columnas y mismas filas (sin importar el orden, floats redondeados)"""
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+
+    def normalized(df):
+        df = df.copy()
+        for column in df.columns:
+            if pd.api.types.is_float_dtype(df[column]):
+                df[column] = df[column].round(6)
+        df = df.astype(str)
+        return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+    return normalized(a).equals(normalized(b))
+
+
+def _run_duckdb(con, sql: str, repeat: int):
+    times, df = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = normalize_arrow_types(con.execute(sql).to_arrow_table()).to_pandas()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), df
+
+
+def _bigquery_metrics(client, sql: str, execute: bool) -> dict:
+    """Bytes estimados (dry run) y, si execute, bytes facturados y slot-ms"""
+    from google.cloud import bigquery
+
+    dry_run = client.query(sql, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+    metrics = {'bytes_estimados': dry_run.total_bytes_processed}
+    if execute:
+        job = client.query(sql, job_config=bigquery.QueryJobConfig(use_query_cache=False))
+        job.result()
+        metrics.update({'bytes_facturados': job.total_bytes_billed, 'slot_ms': job.slot_millis})
+    return metrics
+
+
+def compare_case(con, case, rev, start_date, end_date, repeat, client=None, bq_target=None, execute=False) -> dict:
+    """Compara un caso entre la revisión de referencia y el árbol de trabajo"""
+    tab, name, generator, _, query_args, _ = case
+    result = {'tab': tab, 'query': name}
+
+    baseline = load_baseline_generator(rev, generator)
+    if baseline is None:
+        return {**result, 'status': 'nuevo'}
+
+    current_sql = generator(PROJECT, DATASET, start_date, end_date, *query_args)
+    try:
+        baseline_sql = baseline(PROJECT, DATASET, start_date, end_date, *query_args)
+    except TypeError:
+        # El generador de referencia no admitía estos argumentos (p. ej. approximate)
+        return {**result, 'status': 'nuevo'}
+    if current_sql == baseline_sql:
+        return {**result, 'status': 'sin cambios'}
+
+    try:
+        baseline_ms, baseline_df = _run_duckdb(con, to_duckdb(baseline_sql), repeat)
+        current_ms, current_df = _run_duckdb(con, to_duckdb(current_sql), repeat)
+    except Exception as e:
+        message = str(e).strip().splitlines()
+        return {**result, 'status': 'error', 'error': f"{type(e).__name__}: {message[0] if message else ''}"}
+
+    result.update({
+        'status': 'ok',
+        'antes_ms': round(baseline_ms, 1),
+        'despues_ms': round(current_ms, 1),
+        'aceleracion': round(baseline_ms / current_ms, 2) if current_ms else None,
+        'mismo_resultado': same_result(baseline_df, current_df)
+    })
+
+    if client is not None:
+        project, dataset = bq_target
+        before = _bigquery_metrics(client, baseline(project, dataset, start_date, end_date, *query_args), execute)
+        after = _bigquery_metrics(client, generator(project, dataset, start_date, end_date, *query_args), execute)
+        for metric in before:
+            result[f'{metric}_antes'] = before[metric]
+            result[f'{metric}_despues'] = after[metric]
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Comparación de consultas entre revisiones")
+    parser.add_argument('--rev', default='HEAD', help="Revisión de referencia (default: HEAD)")
+    parser.add_argument('--days', type=int, default=30, help="Días de datos sintéticos")
+    parser.add_argument('--users', type=int, default=20000, help="Usuarios distintos")
+    parser.add_argument('--events-per-day', type=int, default=50000, help="Eventos aproximados por día")
+    parser.add_argument('--products', type=int, default=300, help="Productos del catálogo")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default='/tmp/bq_shield_benchmark', help="Directorio de los shards")
+    parser.add_argument('--tab', action='append', help="Solo estas pestañas (repetible)")
+    parser.add_argument('--query', action='append', help="Solo consultas cuyo nombre contenga esto")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones por consulta (se usa la mediana)")
+    parser.add_argument('--bq-project', help="Proyecto de BigQuery para dry run / ejecución")
+    parser.add_argument('--bq-dataset', help="Dataset GA4 en BigQuery")
+    parser.add_argument('--credentials', help="JSON de cuenta de servicio (default: credenciales por defecto)")
+    parser.add_argument('--execute', action='store_true', help="Ejecuta en BigQuery (factura) para medir slot-ms")
+    parser.add_argument('--output', help="Guarda los resultados en JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    end_date = date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=args.days - 1)
+    paths = generate_dataset(
+        args.data_dir, start_date, end_date, n_users=args.users,
+        events_per_day=args.events_per_day, n_products=args.products, seed=args.seed
+    )
+    con = duckdb.connect()
+    load_events(con, paths)
+
+    client = None
+    if args.bq_project and args.bq_dataset:
+        from google.cloud import bigquery
+        if args.credentials:
+            client = bigquery.Client.from_service_account_json(args.credentials)
+        else:
+            client = bigquery.Client(project=args.bq_project)
+
+    cases = [
+        case for case in BENCHMARK_CASES
+        if (not args.tab or case[0] in args.tab)
+        and (not args.query or any(q in case[1] for q in args.query))
+    ]
+    results = [
+        compare_case(con, case, args.rev, start_date, end_date, args.repeat,
+                     client, (args.bq_project, args.bq_dataset), args.execute)
+        for case in cases
+    ]
+
+    table = pd.DataFrame(results)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(table.to_string(index=False))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rev': args.rev, 'params': vars(args), 'queries': results}, f, indent=2, default=str)
+
+    failed = [r for r in results if r['status'] == 'error' or r.get('mismo_resultado') is False]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,7 +10,92 @@ class Settings:
     PAGE_LAYOUT = "wide"
     
     # Configuración de BigQuery
-    QUERY_TIMEOUT = 30
+    QUERY_TIMEOUT = 300                           # Segundos; al superarlo el job se cancela
+    QUERY_POLL_SECONDS = 1.0                      # Intervalo de sondeo del estado del job
+    QUERY_MAX_RETRIES = 3                         # Reintentos ante errores transitorios
+    QUERY_RETRY_BACKOFF_SECONDS = 2.0             # Espera inicial (se duplica en cada intento)
+    
+    # Las tablas events_YYYYMMDD de GA4 pueden actualizarse hasta 72h después;
+    # pasado este margen se consideran cerradas (inmutables)
+    GA4_CLOSED_DAY_LAG = 3
+    
+    # Caché persistente de resultados (compartida entre sesiones y procesos)
+    QUERY_CACHE_ENABLED = True
+    QUERY_CACHE_DIR = '/tmp/bq_shield_cache'
+    QUERY_CACHE_MAX_BYTES = 2 * 1024 ** 3         # 2 GB en disco, expulsión LRU
+    QUERY_CACHE_TTL_SECONDS = 7 * 24 * 3600       # Rangos con todos los días cerrados
+    QUERY_CACHE_TTL_OPEN_SECONDS = 3600           # Rangos que incluyen días aún abiertos
+    DAILY_STORE_TTL_SECONDS = 180 * 24 * 3600     # Resultados por día de tablas ya cerradas
+    RANGE_CACHE_MAX_ENTRIES = 64                  # Rangos en memoria (uno por consulta y dataset)
+    
+    # Ejecución en paralelo ("Ejecutar todas las secciones")
+    MAX_PARALLEL_QUERIES = 4                      # Jobs de BigQuery simultáneos por pestaña
+    
+    # Consultas asíncronas (secciones pesadas con progreso y cancelación)
+    MAX_ASYNC_QUERIES = 8                         # Jobs en segundo plano por proceso
+    ASYNC_POLL_SECONDS = 2                        # Refresco del progreso en la interfaz
+    ASYNC_ABANDON_SECONDS = 120                   # Sin sondeos durante este tiempo el job se cancela
+    
+    # Descubrimiento de proyectos/datasets GA4 (barra lateral y panel de admin)
+    DISCOVERY_MAX_WORKERS = 16                    # Llamadas de metadatos simultáneas
+    DISCOVERY_TTL_SECONDS = 600                   # Pasado este tiempo se refresca en segundo plano
+    DISCOVERY_MAX_AGE_SECONDS = 24 * 3600         # Pasado este tiempo se refresca bloqueando
+    
+    # Rutas de navegación de n pasos
+    SESSION_PATH_DEPTH = 4                        # Pasos por defecto
+    SESSION_PATH_MAX_DEPTH = 8                    # Máximo permitido en la interfaz
+    
+    # Preparación de datos de las visualizaciones (memoizada por DataFrame y filtros)
+    PREP_CACHE_MAX_ENTRIES = 128                  # Resultados de preparar_* en memoria
+    
+    # Descarga de resultados
+    STORAGE_API_MIN_ROWS = 1000                   # A partir de aquí se usa la Storage Read API
+    QUERY_ARROW_DTYPES = False                    # DataFrames con dtypes Arrow en lugar de NumPy
+    
+    # Resultados paginados (explorador sin límite de filas)
+    PAGED_PAGE_SIZE = 100                         # Filas (o eventos) por página leídas con list_rows
+    PAGED_FETCH_WORKERS = 4                       # Lecturas de páginas simultáneas por proceso
+    PAGED_EXPORT_MAX_ROWS = 1_000_000             # Máximo de filas del CSV completo
+    PAGED_EXPORT_MAX_BYTES = 200 * 1024 * 1024    # Tamaño máximo del CSV (la descarga lo carga en memoria)
+    PAGED_EXPORT_BATCH_ROWS = 50_000              # Filas por lote de la exportación por REST
+    
+    # Control de coste (dry run antes de cada consulta)
+    COST_GUARD_ENABLED = True
+    QUERY_MAX_BYTES = 20 * 1024 ** 3              # Por encima pide confirmación
+    QUERY_HARD_MAX_BYTES = 200 * 1024 ** 3        # Por encima se rechaza siempre
+    SESSION_MAX_BYTES = 100 * 1024 ** 3           # Total por sesión de usuario
+    PROJECT_MONTHLY_MAX_BYTES = 2 * 1024 ** 4     # Total mensual por proyecto de facturación
+    COST_ESTIMATE_TTL_SECONDS = 3600              # Validez de estimaciones y autorizaciones
+    COST_LEDGER_PATH = '/tmp/bq_shield_cache/cost_ledger.sqlite'
+    
+    # Tabla de sesiones materializada (dataset auxiliar en el proyecto GA4)
+    SESSION_FACTS_ENABLED = True
+    SCRATCH_DATASET = 'bq_shield_scratch'
+    
+    # Modo rápido: conteos distintos aproximados (HyperLogLog++)
+    APPROXIMATE_MODE_DEFAULT = False              # Estado inicial del interruptor de la barra lateral
+    DAILY_SKETCHES_ENABLED = True                 # Sketches HLL por día en el dataset auxiliar
+    HLL_PRECISION = 15                            # 10-24; 15 ≈ 0,5% de error relativo típico
+    
+    # Modo muestreo: subconjunto determinista de usuarios para explorar
+    SAMPLE_PERCENT_OPTIONS = [1, 5, 10, 25]       # Porcentajes ofrecidos (además de "Completo")
+    SAMPLE_BUCKETS = 10000                        # Cubetas del hash de user_pseudo_id (resolución 0,01%)
+    SAMPLE_CONFIDENCE_Z = 1.96                    # z del intervalo de confianza (95%)
+    
+    # Modo en directo: tablas intradía (events_intraday_*) de los días aún sin exportar
+    LIVE_REFRESH_SECONDS = 60                     # Intervalo de sondeo de la consulta incremental
+    LIVE_LOOKBACK_DAYS = 1                        # Días anteriores a hoy que pueden seguir en intradía
+    LIVE_OVERLAP_MINUTES = 10                     # Minutos que se releen en cada sondeo (eventos tardíos)
+    
+    # Combos y cross-selling: itemsets frecuentes calculados en local (database.market_basket)
+    COMBOS_MIN_TRANSACTIONS = 5                   # Transacciones mínimas de un producto o combo
+    COMBOS_MAX_ITEMSET_SIZE = 4                   # Productos máximos por combo (pares, tríos, ...)
+    COMBOS_BLOCK_TRANSACTIONS = 200_000           # Transacciones por bloque al calcular coberturas
+    
+    # Atribución multi-modelo: rutas de canales comprimidas y motor local (database.attribution)
+    ATTRIBUTION_MAX_PATH_LENGTH = 10              # Últimas sesiones de cada ruta de conversión
+    ATTRIBUTION_DECAY_HALF_LIFE = 2               # Time Decay: sesiones antes de la conversión que reducen el peso a la mitad
+    ATTRIBUTION_POSITION_WEIGHTS = (0.4, 0.4)     # Position Based: peso de la primera y la última sesión
     DEFAULT_START_DATE = pd.to_datetime("2025-07-01")
     DEFAULT_END_DATE = pd.to_datetime("today")
     
@@ -40,13 +125,15 @@ class Settings:
     QUERY_LIMITS = {
         'default': 1000,           # Límite por defecto
         'flattenizado': 2000,      # Explorador de datos completo (events)
-        'combos': 500,             # Análisis de combos cross-selling
-        'atribucion_completa': 1000,  # Atribución 7 modelos (muy pesada)
+        'flattenizado_anidado': 20000,  # Explorador con arrays anidados (eventos, no filas)
+        'combos': 500,             # Combos cross-selling (por tamaño de combo)
+        'atribucion_completa': 1000,  # Atribución 7 modelos (canales por modelo)
         'atribucion_basica': 500,  # Atribución 3 modelos
         'clv': 5000,              # CLV por usuario
         'funnel_producto': 200,    # Funnel por producto
         'sessions_low_converting': 100,  # Sesiones sin conversión (reducido por quotas)
         'session_paths': 500,     # Rutas de navegación (reducido por quotas)
+        'session_paths_n': 1000,   # Rutas de n pasos (ya agregadas en BigQuery)
         'exit_pages': 500,         # Páginas de salida
         'landing_pages': 200,      # Landing pages attribution
         'tiempo_compra': 200,      # Tiempo a primera compra
@@ -0,0 +1,37 @@
+"""
+Utilidades de conversión entre columnas de pandas y arrays de pyarrow
+
+Las usan los motores locales (database.market_basket, database.attribution)
+y la preparación del explorador de eventos (visualization.events_prep).
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def list_array(series, value_type=None) -> pa.ListArray:
+    """
+    Columna de listas (dtype Arrow u objetos NumPy) como pyarrow.ListArray
+
+    Los nulos (fila sin array) pasan a lista vacía, así que la longitud de
+    cada lista nunca es nula y list_flatten / list_parent_indices no
+    necesitan tratarlos aparte.
+
+    Args:
+        series: Columna con una lista (o array NumPy) por fila
+        value_type: Tipo de los elementos (p. ej. pa.int64()); necesario
+            cuando la columna puede no tener ningún elemento
+
+    Returns:
+        pyarrow.ListArray con una lista por fila
+    """
+    if isinstance(series.dtype, pd.ArrowDtype):
+        array = pa.array(series.array)
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        if array.null_count:
+            array = pc.if_else(pc.is_null(array), pa.scalar([], type=array.type), array)
+        return array
+
+    values = [list(value) if pd.api.types.is_list_like(value) else [] for value in series]
+    return pa.array(values, type=pa.list_(value_type) if value_type is not None else None)
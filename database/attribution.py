@@ -0,0 +1,237 @@
+"""
+Atribución multi-modelo en local sobre rutas de conversión comprimidas
+
+generar_query_atribucion_completa devuelve cada ruta distinta de canales
+(códigos enteros) con sus usuarios con y sin conversión, compras e ingresos.
+Los modelos se calculan aquí con NumPy sobre los elementos de todas las rutas
+a la vez (un peso por touchpoint y bincount por canal), así que el coste
+depende de las rutas distintas y no de los usuarios:
+
+- Heurísticos (Last Click, First Click, Linear, Time Decay, Position Based,
+  Last Non-Direct): reparten las compras e ingresos de cada ruta entre sus
+  touchpoints.
+- Data Driven: efecto de eliminación de una cadena de Markov absorbente
+  (inicio → canales → conversión / abandono). Quitar el canal c convierte
+  P - f_c · h_c de los usuarios, con P la probabilidad de conversión, f_c la
+  de pasar alguna vez por c y h_c la de convertir partiendo de c; todas salen
+  de la matriz fundamental (I - Q)⁻¹, sin simular ni resolver una cadena
+  por canal.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from config.settings import Settings
+from database.arrow_utils import list_array
+
+MODELS = [
+    'Last Click',
+    'First Click',
+    'Linear',
+    'Time Decay',
+    'Position Based',
+    'Last Non-Direct',
+    'Data Driven'
+]
+
+CHANNEL_COLUMNS = ['utm_source', 'utm_medium', 'utm_campaign', 'device_type']
+
+ATTRIBUTION_COLUMNS = ['attribution_model'] + CHANNEL_COLUMNS + [
+    'touchpoints',
+    'conversions',
+    'revenue',
+    'attributed_conversions',
+    'attributed_revenue',
+    'conversion_rate',
+    'revenue_per_conversion'
+]
+
+# Hasta este número de canales se invierte (I - Q) en denso (más rápido que
+# resolver la diagonal con LU); por encima, LU dispersa por bloques de columnas
+_DENSE_MAX_CHANNELS = 4000
+_DIAGONAL_BLOCK = 256
+
+
+def _path_elements(path_column):
+    """
+    Touchpoints de todas las rutas en arrays planos
+
+    Returns:
+        (canal, ruta, posición en la ruta, longitud de su ruta) por touchpoint
+    """
+    lists = list_array(path_column, pa.int64())
+    lengths = pc.list_value_length(lists).to_numpy(zero_copy_only=False).astype(np.int64)
+    channels = pc.list_flatten(lists).to_numpy(zero_copy_only=False).astype(np.int64)
+    paths = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    positions = np.arange(len(channels)) - starts[paths]
+    return channels, paths, positions, lengths[paths]
+
+
+def _heuristic_weights(channels, paths, positions, lengths, direct):
+    """Peso de cada touchpoint en su ruta (suma 1 por ruta) para los modelos heurísticos"""
+    from_end = lengths - 1 - positions
+    first_weight, last_weight = Settings.ATTRIBUTION_POSITION_WEIGHTS
+
+    decay = 0.5 ** (from_end / Settings.ATTRIBUTION_DECAY_HALF_LIFE)
+    decay = decay / np.bincount(paths, weights=decay)[paths]
+
+    # Dos touchpoints: primero y último en la proporción de sus pesos
+    position = np.where(
+        lengths == 1, 1.0,
+        np.where(
+            lengths == 2,
+            np.where(positions == 0, first_weight, last_weight) / (first_weight + last_weight),
+            np.where(
+                positions == 0, first_weight,
+                np.where(from_end == 0, last_weight, (1 - first_weight - last_weight) / np.maximum(lengths - 2, 1))
+            )
+        )
+    )
+
+    # Último touchpoint no directo; si toda la ruta es directa, el último
+    last_non_direct = np.full(paths.max() + 1 if len(paths) else 0, -1)
+    np.maximum.at(last_non_direct, paths, np.where(direct[channels], -1, positions))
+    chosen = np.where(last_non_direct[paths] >= 0, last_non_direct[paths], lengths - 1)
+
+    return {
+        'Last Click': (from_end == 0).astype(float),
+        'First Click': (positions == 0).astype(float),
+        'Linear': 1.0 / lengths,
+        'Time Decay': decay,
+        'Position Based': position,
+        'Last Non-Direct': (positions == chosen).astype(float),
+    }
+
+
+def _removal_effects(channels, paths, positions, lengths, converting, non_converting, n_channels):
+    """
+    Efecto de eliminación normalizado (suma 1) de cada canal en la cadena de Markov
+
+    Las transiciones se ponderan por los usuarios de cada ruta; el último
+    touchpoint pasa a conversión (usuarios con compra) o a abandono (sin compra).
+    """
+    users = (converting + non_converting)[paths]
+    is_first = positions == 0
+    is_last = positions == lengths - 1
+
+    start = np.bincount(channels[is_first], weights=users[is_first], minlength=n_channels)
+    # Touchpoints consecutivos de la misma ruta: el siguiente elemento plano
+    moves = np.flatnonzero(~is_last)
+    transitions = sparse.csr_matrix(
+        (users[moves], (channels[moves], channels[moves + 1])),
+        shape=(n_channels, n_channels)
+    )
+    to_conversion = np.bincount(channels[is_last], weights=converting[paths][is_last], minlength=n_channels)
+    to_null = np.bincount(channels[is_last], weights=non_converting[paths][is_last], minlength=n_channels)
+
+    exits = np.asarray(transitions.sum(axis=1)).ravel() + to_conversion + to_null
+    # Canales fuera de las rutas (recortadas a ATTRIBUTION_MAX_PATH_LENGTH): inalcanzables
+    exits[exits == 0] = 1
+    Q = sparse.diags(1 / exits) @ transitions
+    system = sparse.identity(n_channels, format='csc') - Q.tocsc()
+    initial = start / start.sum()
+    absorption = to_conversion / exits
+
+    # Matriz fundamental N = (I - Q)⁻¹: h = N · r, visitas esperadas s0 · N y su diagonal N_cc
+    if n_channels <= _DENSE_MAX_CHANNELS:
+        fundamental = np.linalg.inv(system.toarray())
+        conversion_from = fundamental @ absorption
+        expected_visits = initial @ fundamental
+        returns = np.diag(fundamental).copy()
+    else:
+        lu = splu(system)
+        conversion_from = lu.solve(absorption)
+        expected_visits = lu.solve(initial, trans='T')
+        returns = np.empty(n_channels)
+        for first in range(0, n_channels, _DIAGONAL_BLOCK):
+            block = np.arange(first, min(first + _DIAGONAL_BLOCK, n_channels))
+            unit = np.zeros((n_channels, len(block)))
+            unit[block, np.arange(len(block))] = 1
+            returns[block] = lu.solve(unit)[block, np.arange(len(block))]
+
+    conversion = initial @ conversion_from
+    if conversion <= 0:
+        return np.zeros(n_channels)
+    effect = (expected_visits / returns) * conversion_from / conversion
+    return effect / effect.sum()
+
+
+def attribute_paths(df):
+    """
+    Atribución de 7 modelos a partir de las rutas comprimidas
+
+    Args:
+        df: Resultado de generar_query_atribucion_completa
+
+    Returns:
+        DataFrame con una fila por modelo y canal (fuente, medio, campaña y
+        dispositivo): touchpoints de todas las rutas, compras e ingresos de las
+        rutas con conversión en las que participa, compras e ingresos
+        atribuidos. Cada modelo conserva sus QUERY_LIMITS['atribucion_completa']
+        canales con más ingresos atribuidos.
+    """
+    catalog = df[df['utm_source'].notna()].sort_values('channel_code')
+    path_rows = df[df['utm_source'].isna()].reset_index(drop=True)
+    if catalog.empty or path_rows.empty:
+        return pd.DataFrame(columns=ATTRIBUTION_COLUMNS)
+
+    n_channels = int(catalog['channel_code'].max()) + 1
+    codes = catalog['channel_code'].to_numpy(dtype=np.int64)
+    channel_info = pd.DataFrame(index=np.arange(n_channels), columns=CHANNEL_COLUMNS)
+    channel_info.loc[codes, CHANNEL_COLUMNS] = catalog[CHANNEL_COLUMNS].to_numpy()
+    direct = (channel_info['utm_source'] == '(direct)').to_numpy()
+
+    converting = path_rows['converting_users'].to_numpy(dtype=float)
+    non_converting = path_rows['non_converting_users'].to_numpy(dtype=float)
+    conversions = path_rows['conversions'].to_numpy(dtype=float)
+    revenue = path_rows['revenue'].astype(float).fillna(0).to_numpy()
+
+    channels, paths, positions, lengths = _path_elements(path_rows['path'])
+
+    touchpoints = np.bincount(channels, weights=(converting + non_converting)[paths], minlength=n_channels)
+    # Compras e ingresos de las rutas en las que aparece cada canal (una vez por ruta)
+    participations = np.unique(paths * n_channels + channels)
+    participating_paths, participating_channels = np.divmod(participations, n_channels)
+    path_conversions = np.bincount(
+        participating_channels, weights=conversions[participating_paths], minlength=n_channels
+    )
+    path_revenue = np.bincount(participating_channels, weights=revenue[participating_paths], minlength=n_channels)
+
+    attributed = {
+        model: (
+            np.bincount(channels, weights=weights * conversions[paths], minlength=n_channels),
+            np.bincount(channels, weights=weights * revenue[paths], minlength=n_channels)
+        )
+        for model, weights in _heuristic_weights(channels, paths, positions, lengths, direct).items()
+    }
+    shares = _removal_effects(channels, paths, positions, lengths, converting, non_converting, n_channels)
+    attributed['Data Driven'] = (shares * conversions.sum(), shares * revenue.sum())
+
+    frames = []
+    for model in MODELS:
+        model_conversions, model_revenue = attributed[model]
+        frame = channel_info.copy()
+        frame.insert(0, 'attribution_model', model)
+        frame['touchpoints'] = touchpoints.astype(np.int64)
+        frame['conversions'] = path_conversions.astype(np.int64)
+        frame['revenue'] = path_revenue
+        frame['attributed_conversions'] = model_conversions.round(2)
+        frame['attributed_revenue'] = model_revenue.round(2)
+        frame['conversion_rate'] = np.round(
+            np.divide(model_conversions, touchpoints, out=np.zeros(n_channels), where=touchpoints > 0) * 100, 2
+        )
+        frame['revenue_per_conversion'] = np.round(
+            np.divide(model_revenue, model_conversions, out=np.zeros(n_channels), where=model_conversions > 0), 2
+        )
+        frame = frame[frame['attributed_conversions'] > 0]
+        frames.append(frame.nlargest(Settings.QUERY_LIMITS['atribucion_completa'], 'attributed_revenue'))
+
+    return (
+        pd.concat(frames, ignore_index=True)
+        .sort_values(['attribution_model', 'attributed_revenue'], ascending=[True, False], kind='stable')
+        .reset_index(drop=True)[ATTRIBUTION_COLUMNS]
+    )
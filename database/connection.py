@@ -1,8 +1,32 @@
+import random
+import re
+import time
+from datetime import datetime
+
+import pandas as pd
+from google.api_core import exceptions as api_exceptions
 from google.cloud import bigquery
 from google.oauth2 import service_account
 import streamlit as st
+from config.settings import Settings
 from utils.error_handling import handle_bq_error
-from utils.bq_monitoring import get_query_statistics, bytes_to_readable
+from utils.bq_monitoring import bytes_to_readable
+from database.query_cache import QueryCache
+from database.cost_guard import CostGuard, QueryBudgetExceeded
+
+# Errores transitorios que merece la pena reintentar
+_RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.GatewayTimeout,
+    ConnectionError,
+)
+
+
+class QueryCancelled(Exception):
+    """La consulta se canceló antes de terminar"""
 
 def get_bq_client(credentials_path=None):
     """
@@ -23,76 +47,14 @@ def get_bq_client(credentials_path=None):
     except Exception as e:
         handle_bq_error(e)
 
-def run_query(client, query, timeout=30, show_stats=False):
-    """
-    Ejecuta consulta en BigQuery - Con monitorización de consumo
-    
-    Args:
-        client: Cliente de BigQuery (obtenido de SessionManager)
-        query: Consulta SQL a ejecutar
-        timeout: Timeout en segundos (default: 30)
-        show_stats: Si True, muestra estadísticas de consumo (default: False)
-        
-    Returns:
-        DataFrame con los resultados
-    """
-    from concurrent.futures import TimeoutError
-    
-    try:
-        # Ejecutar consulta
-        query_job = client.query(query)
-        
-        # Obtener resultados
-        result_df = query_job.result(timeout=timeout).to_dataframe()
-        
-        # Obtener estadísticas de la consulta
-        stats = get_query_statistics(query_job)
-        
-        # Guardar estadísticas en session_state para historial
-        if 'query_history' not in st.session_state:
-            st.session_state.query_history = []
-        
-        st.session_state.query_history.append({
-            'timestamp': query_job.created,
-            'bytes_processed': stats['total_bytes_processed'],
-            'bytes_readable': stats['total_bytes_readable'],
-            'cache_hit': stats['cache_hit'],
-            'cost_usd': stats['estimated_cost_usd']
-        })
-        
-        # Mantener solo las últimas 50 consultas
-        if len(st.session_state.query_history) > 50:
-            st.session_state.query_history = st.session_state.query_history[-50:]
-        
-        # Mostrar estadísticas si se solicita
-        if show_stats:
-            if stats['cache_hit']:
-                st.success(f"✅ Consulta servida desde caché (0 bytes procesados)")
-            else:
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Datos procesados", stats['total_bytes_readable'])
-                with col2:
-                    st.metric("Datos facturados", stats['total_billed_readable'])
-                with col3:
-                    cost_display = f"${stats['estimated_cost_usd']:.6f}"
-                    st.metric("Coste estimado", cost_display)
-        
-        return result_df
-        
-    except TimeoutError:
-        handle_bq_error("⏳ Timeout: La consulta tardó demasiado. Filtra más datos.", query)
-    except Exception as e:
-        handle_bq_error(e, query)
-
-def run_query_with_estimate(client, query, timeout=30):
+def run_query_with_estimate(client, query, timeout=None):
     """
     Ejecuta consulta mostrando PRIMERO la estimación de consumo
     
     Args:
         client: Cliente de BigQuery (obtenido de SessionManager)
         query: Consulta SQL a ejecutar
-        timeout: Timeout en segundos (default: 30)
+        timeout: Timeout en segundos (default: Settings.QUERY_TIMEOUT)
         
     Returns:
         DataFrame con los resultados
@@ -113,78 +75,350 @@ def run_query_with_estimate(client, query, timeout=30):
             with col3:
                 st.metric("Coste estimado", f"${estimate['estimated_cost_usd']:.6f}")
             
-            # Alerta si es una consulta grande
-            if estimate['total_gb'] > 10:
-                st.warning(f"⚠️ Esta consulta procesará {estimate['total_gb']:.2f} GB de datos")
-            elif estimate['total_gb'] > 50:
+            # Alerta si es una consulta grande (el umbral mayor se comprueba primero)
+            if estimate['total_gb'] > 50:
                 st.error(f"🚨 Consulta muy grande: {estimate['total_gb']:.2f} GB. Considera filtrar más datos.")
+            elif estimate['total_gb'] > 10:
+                st.warning(f"⚠️ Esta consulta procesará {estimate['total_gb']:.2f} GB de datos")
     
-def run_query(client, query, query_name="Consulta sin nombre"):
+    # La ejecución pasa por el control de presupuestos de run_query
+    return run_query(client, query, timeout=timeout)
+    
+def fetch_arrow(query_job):
     """
-    Ejecuta una consulta en BigQuery y registra métricas de monitorización
+    Descarga el resultado de un job como pyarrow.Table
+    
+    Los resultados grandes se leen con la BigQuery Storage Read API (streams
+    Arrow en paralelo); los pequeños por REST, donde abrir una sesión de
+    lectura cuesta más que paginar. Si la Storage API no está disponible
+    (paquete no instalado o sin permiso bigquery.readsessions.create) se
+    vuelve a REST.
+    
+    Args:
+        query_job: Job de BigQuery ya lanzado
+    
+    Returns:
+        pyarrow.Table con los resultados
+    """
+    rows = query_job.result()
+    
+    if (rows.total_rows or 0) >= Settings.STORAGE_API_MIN_ROWS:
+        try:
+            return rows.to_arrow(create_bqstorage_client=True)
+        except Exception as e:
+            print(f"⚠️ Storage Read API no disponible, usando REST: {e}")
+            # El iterador puede haber quedado a medias: pedir uno nuevo
+            rows = query_job.result()
+    
+    return rows.to_arrow(create_bqstorage_client=False)
+
+def arrow_to_dataframe(table):
+    """
+    Convierte un pyarrow.Table en DataFrame
+    
+    Con Settings.QUERY_ARROW_DTYPES las columnas quedan respaldadas por Arrow
+    (sin copia); si no, se convierte a tipos NumPy liberando el Table por
+    bloques para no duplicar memoria.
+    """
+    if Settings.QUERY_ARROW_DTYPES:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def _job_labels(query_name, labels=None):
+    """Etiquetas del job (minúsculas, [a-z0-9_-], máximo 63 caracteres)"""
+    def _clean(value):
+        return re.sub(r'[^a-z0-9_-]+', '_', str(value).lower()).strip('_')[:63]
+    
+    job_labels = {'app': 'bq_shield', 'query_name': _clean(query_name) or 'sin_nombre'}
+    for key, value in (labels or {}).items():
+        job_labels[_clean(key)] = _clean(value)
+    return job_labels
+
+def _is_retryable(error):
+    """True para errores transitorios de BigQuery (cuotas, backend, red)"""
+    if isinstance(error, (QueryBudgetExceeded, QueryCancelled, TimeoutError)):
+        return False
+    if isinstance(error, _RETRYABLE_ERRORS):
+        return True
+    reasons = {err.get('reason') for err in getattr(error, 'errors', None) or [] if isinstance(err, dict)}
+    return bool(reasons & {'backendError', 'rateLimitExceeded', 'internalError', 'jobBackendError'})
+
+def _retry_delay(attempt):
+    """Espera antes del reintento número attempt (backoff exponencial con jitter)"""
+    delay = Settings.QUERY_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
+    return delay + random.uniform(0, delay / 2)
+
+def _wait_for_job(query_job, deadline, timeout, cancel_event=None):
+    """
+    Espera a que termine un job, cancelándolo por timeout o a petición
+    
+    Args:
+        query_job: Job de BigQuery ya lanzado
+        deadline: Instante límite (time.monotonic) común a todos los intentos
+        timeout: Timeout total en segundos (para el mensaje de error)
+        cancel_event: threading.Event que, al activarse, cancela el job
+    
+    Raises:
+        TimeoutError: si se supera el timeout (el job se cancela en BigQuery)
+        QueryCancelled: si cancel_event se activa
+    """
+    while not query_job.done():
+        if cancel_event is not None and cancel_event.is_set():
+            query_job.cancel()
+            raise QueryCancelled(f"Consulta cancelada (job {query_job.job_id})")
+        
+        if time.monotonic() >= deadline:
+            query_job.cancel()
+            raise TimeoutError(
+                f"⏳ Timeout: la consulta superó {timeout}s y se ha cancelado. Filtra más datos."
+            )
+        
+        time.sleep(Settings.QUERY_POLL_SECONDS)
+
+def execute_query(client, query, query_name="Consulta sin nombre", use_cache=True, monitoring_log=None,
+                  timeout=None, labels=None, cancel_event=None, job_info=None, fetch=True):
+    """
+    Motor único de ejecución de consultas en BigQuery
+    
+    No usa st.*, así que puede llamarse desde hilos secundarios: las métricas
+    se añaden a monitoring_log y es el hilo principal quien las vuelca en
+    session_state.
+    
+    Incluye caché persistente, control de coste, timeout (el job se cancela
+    en BigQuery), cancelación, etiquetas de job, reintentos con backoff
+    exponencial para errores transitorios y métricas del job (cache hit de
+    BigQuery, bytes facturados, slot-ms y tiempos de cola/ejecución/descarga).
     
     Args:
         client: Cliente de BigQuery
         query: Query SQL a ejecutar
         query_name: Nombre descriptivo de la consulta para monitorización
+        use_cache: Si True, reutiliza resultados de la caché persistente (default: True)
+        monitoring_log: Lista donde registrar la entrada de monitorización (opcional)
+        timeout: Timeout total en segundos, común a todos los reintentos
+            (default: Settings.QUERY_TIMEOUT)
+        labels: Etiquetas adicionales para el job (dict)
+        cancel_event: threading.Event que, al activarse, cancela el job
+        job_info: dict donde se publica el job en curso ('job', 'attempt') para
+            seguir su progreso desde otro hilo
+        fetch: Si False no descarga el resultado (ni usa la caché persistente) y
+            devuelve el QueryJob terminado; su tabla de destino anónima se lee
+            por páginas con PagedResult
     
     Returns:
-        pandas.DataFrame con los resultados
+        pandas.DataFrame con los resultados (QueryJob si fetch=False)
     """
-    from datetime import datetime
-    import streamlit as st
-    
-    # Inicializar monitoring_data si no existe
-    if 'monitoring_data' not in st.session_state:
-        st.session_state.monitoring_data = []
+    if monitoring_log is None:
+        monitoring_log = []
+    timeout = timeout or Settings.QUERY_TIMEOUT
     
     start_time = datetime.now()
+    # Un único plazo para todos los intentos: los reintentos no amplían el timeout
+    deadline = time.monotonic() + timeout
     
-    try:
-        # Ejecutar query
-        query_job = client.query(query)
-        df = query_job.to_dataframe()
-        
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        
-        # Obtener GB procesados
-        bytes_processed = query_job.total_bytes_processed or 0
-        gb_used = bytes_processed / (1024 ** 3)  # Convertir a GB
-        
-        # Registrar en monitorización
-        monitoring_entry = {
-            'query_name': query_name,
-            'timestamp': start_time,
-            'duration': duration,
-            'gb_used': gb_used,
-            'status': 'Success',
-            'rows_returned': len(df)
-        }
+    # Consultar primero la caché persistente (compartida entre sesiones)
+    cache_key = None
+    if use_cache and fetch:
+        cache_key = QueryCache.build_key(query, client)
+        cached_df = QueryCache.get(cache_key)
         
-        st.session_state.monitoring_data.append(monitoring_entry)
-        
-        print(f"✅ Query registrada: {query_name} - {duration:.2f}s - {gb_used:.3f}GB")
-        
-        return df
-        
-    except Exception as e:
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        
-        # Registrar error en monitorización
-        monitoring_entry = {
+        if cached_df is not None:
+            duration = (datetime.now() - start_time).total_seconds()
+            
+            monitoring_log.append({
+                'query_name': query_name,
+                'timestamp': start_time,
+                'duration': duration,
+                'gb_used': 0,
+                'status': 'Success',
+                'rows_returned': len(cached_df),
+                'cache_hit': True,
+                'cache_source': 'local'
+            })
+            
+            print(f"♻️ Query desde caché: {query_name} - {duration:.2f}s - 0.000GB")
+            
+            return cached_df
+    
+    attempt = 0
+    query_job = None
+    
+    def _log_error(e):
+        """Registra el error en monitorización y lo muestra en consola"""
+        monitoring_log.append({
             'query_name': query_name,
             'timestamp': start_time,
-            'duration': duration,
+            'duration': (datetime.now() - start_time).total_seconds(),
             'gb_used': 0,
             'status': 'Error',
-            'error_message': str(e)
-        }
-        
-        st.session_state.monitoring_data.append(monitoring_entry)
-        
+            'error_message': str(e),
+            'attempts': attempt,
+            'job_id': getattr(query_job, 'job_id', None)
+        })
         print(f"❌ Query con error: {query_name} - {str(e)}")
+    
+    # Lanzar el job: solo se vuelve a enviar si falla su creación o su ejecución
+    while True:
+        attempt += 1
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"⏳ Timeout: la consulta superó {timeout}s entre reintentos. Filtra más datos."
+                )
+            
+            # Control de coste: dry run contra los presupuestos antes de lanzar el job
+            job_config = bigquery.QueryJobConfig(
+                labels=_job_labels(query_name, labels),
+                job_timeout_ms=int(remaining * 1000)
+            )
+            if Settings.COST_GUARD_ENABLED:
+                job_config.maximum_bytes_billed = CostGuard.check(
+                    client, query, CostGuard.session_bytes(monitoring_log)
+                )
+            
+            # Ejecutar query
+            query_job = client.query(query, job_config=job_config)
+            if job_info is not None:
+                job_info.update({'job': query_job, 'attempt': attempt})
+            _wait_for_job(query_job, deadline, timeout, cancel_event)
+            break
         
-        # Re-lanzar la excepción para que sea manejada por el caller
-        raise e
+        except Exception as e:
+            if attempt <= Settings.QUERY_MAX_RETRIES and _is_retryable(e):
+                delay = _retry_delay(attempt)
+                # Sin tiempo para otro intento dentro del plazo: no se reintenta
+                if time.monotonic() + delay < deadline:
+                    print(f"🔁 Reintentando {query_name} en {delay:.1f}s (intento {attempt}): {e}")
+                    time.sleep(delay)
+                    continue
+            
+            _log_error(e)
+            # Re-lanzar la excepción para que sea manejada por el caller
+            raise e
+    
+    # Descargar el resultado del job ya terminado: un fallo transitorio de la
+    # descarga se reintenta sobre el mismo job, sin volver a facturar el escaneo
+    fetch_attempt = 0
+    while True:
+        fetch_attempt += 1
+        try:
+            if not fetch:
+                # El resultado se queda en la tabla de destino del job
+                rows_returned = client.get_table(query_job.destination).num_rows
+                fetch_seconds = 0
+                break
+            
+            fetch_start = time.monotonic()
+            df = arrow_to_dataframe(fetch_arrow(query_job))
+            rows_returned = len(df)
+            fetch_seconds = time.monotonic() - fetch_start
+            break
+        
+        except Exception as e:
+            if fetch_attempt <= Settings.QUERY_MAX_RETRIES and _is_retryable(e):
+                delay = _retry_delay(fetch_attempt)
+                print(f"🔁 Reintentando descarga de {query_name} en {delay:.1f}s (intento {fetch_attempt}): {e}")
+                time.sleep(delay)
+                continue
+            
+            _log_error(e)
+            raise e
+    
+    duration = (datetime.now() - start_time).total_seconds()
+    
+    # Obtener GB procesados
+    bytes_processed = query_job.total_bytes_processed or 0
+    gb_used = bytes_processed / (1024 ** 3)  # Convertir a GB
+    bytes_billed = query_job.total_bytes_billed or 0
+    
+    # Tiempos del job: cola (creado -> iniciado) y ejecución (iniciado -> terminado)
+    queue_seconds = execution_seconds = None
+    if query_job.created and query_job.started:
+        queue_seconds = (query_job.started - query_job.created).total_seconds()
+    if query_job.started and query_job.ended:
+        execution_seconds = (query_job.ended - query_job.started).total_seconds()
+    
+    # Registrar en monitorización
+    monitoring_entry = {
+        'query_name': query_name,
+        'timestamp': start_time,
+        'duration': duration,
+        'gb_used': gb_used,
+        'status': 'Success',
+        'rows_returned': rows_returned,
+        'cache_hit': bool(query_job.cache_hit),
+        'cache_source': 'bigquery' if query_job.cache_hit else None,
+        'bytes_billed': bytes_billed,
+        'slot_ms': query_job.slot_millis or 0,
+        'queue_seconds': queue_seconds,
+        'execution_seconds': execution_seconds,
+        'fetch_seconds': fetch_seconds,
+        'attempts': attempt,
+        'job_id': query_job.job_id
+    }
+    
+    monitoring_log.append(monitoring_entry)
+    CostGuard.record_usage(client.project, bytes_billed)
+    
+    # Guardar en caché para el resto de sesiones y procesos
+    if cache_key:
+        QueryCache.put(cache_key, df, query)
+    
+    print(f"✅ Query registrada: {query_name} - {duration:.2f}s - {gb_used:.3f}GB")
+    
+    if not fetch:
+        return query_job
+    return df
+
+def run_query(client, query, query_name="Consulta sin nombre", use_cache=True, timeout=None, labels=None,
+              show_stats=False):
+    """
+    Ejecuta una consulta en BigQuery y registra métricas de monitorización
+    
+    Args:
+        client: Cliente de BigQuery
+        query: Query SQL a ejecutar
+        query_name: Nombre descriptivo de la consulta para monitorización
+        use_cache: Si True, reutiliza resultados de la caché persistente (default: True)
+        timeout: Timeout en segundos (default: Settings.QUERY_TIMEOUT)
+        labels: Etiquetas adicionales para el job (dict)
+        show_stats: Si True, muestra estadísticas de consumo (default: False)
+    
+    Returns:
+        pandas.DataFrame con los resultados
+    """
+    # Inicializar monitoring_data si no existe
+    if 'monitoring_data' not in st.session_state:
+        st.session_state.monitoring_data = []
+    
+    try:
+        df = execute_query(
+            client,
+            query,
+            query_name=query_name,
+            use_cache=use_cache,
+            monitoring_log=st.session_state.monitoring_data,
+            timeout=timeout,
+            labels=labels
+        )
+    except QueryBudgetExceeded as e:
+        CostGuard.show_blocked_query(e)
+    except TimeoutError as e:
+        handle_bq_error(e, query)
+    
+    # Mostrar estadísticas si se solicita
+    if show_stats:
+        stats = st.session_state.monitoring_data[-1]
+        if stats['cache_hit']:
+            st.success("✅ Consulta servida desde caché (0 bytes procesados)")
+        else:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Datos procesados", bytes_to_readable(stats['gb_used'] * 1024 ** 3))
+            with col2:
+                st.metric("Datos facturados", bytes_to_readable(stats['bytes_billed']))
+            with col3:
+                st.metric("Slot-ms", f"{stats['slot_ms']:,}")
+    
+    return df
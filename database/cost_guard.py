@@ -0,0 +1,233 @@
+"""
+Control de coste previo a la ejecución de consultas
+
+Antes de lanzar un job se hace un dry run (cacheado por hash de la consulta)
+y se comparan los bytes estimados con los presupuestos configurados:
+por consulta, por sesión y mensual por proyecto de facturación. Además, el
+job se lanza con maximum_bytes_billed para que BigQuery lo cancele sin coste
+si la estimación se queda corta.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config.settings import Settings
+from database.query_cache import QueryCache, normalize_sql
+from utils.bq_monitoring import estimate_query_cost, bytes_to_readable
+
+# BigQuery factura un mínimo de 10 MB por tabla referenciada
+MIN_BILLED_BYTES = 10 * 1024 ** 2
+
+_lock = threading.Lock()
+_estimates: Dict[str, Dict] = {}
+_approved: Dict[str, float] = {}
+
+
+class QueryBudgetExceeded(Exception):
+    """La consulta superaría alguno de los presupuestos de bytes"""
+
+    def __init__(self, message: str, estimate: Dict, key: str, can_approve: bool):
+        super().__init__(message)
+        self.estimate = estimate
+        self.key = key
+        self.can_approve = can_approve
+
+
+def _guard_key(query: str, client) -> str:
+    """
+    Clave de las estimaciones y autorizaciones en memoria
+
+    Es la de la caché de resultados; si las credenciales no identifican a un
+    principal, se limita al objeto de credenciales del cliente.
+    """
+    key = QueryCache.build_key(query, client)
+    if key is None:
+        key = f"credentials:{id(getattr(client, '_credentials', None))}:{normalize_sql(query)}"
+    return key
+
+
+class CostGuard:
+    """Presupuestos de bytes por consulta, sesión y proyecto"""
+
+    @staticmethod
+    def estimate(client, query: str, key: Optional[str] = None) -> Dict:
+        """
+        Estima los bytes de una consulta con dry run, reutilizando estimaciones recientes
+
+        Args:
+            client: Cliente de BigQuery
+            query: Consulta SQL
+            key: Clave de la consulta (default: la de QueryCache.build_key)
+
+        Returns:
+            dict devuelto por estimate_query_cost
+        """
+        key = key or _guard_key(query, client)
+        now = time.time()
+
+        with _lock:
+            cached = _estimates.get(key)
+            if cached and cached['expires_at'] > now:
+                return cached['estimate']
+
+        estimate = estimate_query_cost(client, query)
+
+        if estimate['success']:
+            with _lock:
+                _estimates[key] = {
+                    'estimate': estimate,
+                    'expires_at': now + Settings.COST_ESTIMATE_TTL_SECONDS
+                }
+        return estimate
+
+    @staticmethod
+    def approve(key: str):
+        """Autoriza una consulta que supera el límite por consulta (no los de sesión/proyecto)"""
+        with _lock:
+            _approved[key] = time.time() + Settings.COST_ESTIMATE_TTL_SECONDS
+
+    @staticmethod
+    def is_approved(key: str) -> bool:
+        with _lock:
+            return _approved.get(key, 0) > time.time()
+
+    @staticmethod
+    def session_bytes(monitoring_log: List[Dict]) -> int:
+        """Bytes consumidos en la sesión según las entradas de monitorización"""
+        return int(sum(entry.get('gb_used', 0) or 0 for entry in monitoring_log) * 1024 ** 3)
+
+    @staticmethod
+    def check(client, query: str, session_bytes_used: int = 0) -> int:
+        """
+        Valida una consulta contra los presupuestos antes de ejecutarla
+
+        Args:
+            client: Cliente de BigQuery
+            query: Consulta SQL
+            session_bytes_used: Bytes ya consumidos en la sesión
+
+        Returns:
+            Valor de maximum_bytes_billed para el job
+
+        Raises:
+            QueryBudgetExceeded: si la consulta superaría algún presupuesto
+        """
+        key = _guard_key(query, client)
+        estimate = CostGuard.estimate(client, query, key)
+
+        session_remaining = Settings.SESSION_MAX_BYTES - session_bytes_used
+        project_remaining = Settings.PROJECT_MONTHLY_MAX_BYTES - CostGuard.get_project_usage(client.project)
+        query_limit = (
+            Settings.QUERY_HARD_MAX_BYTES
+            if CostGuard.is_approved(key)
+            else Settings.QUERY_MAX_BYTES
+        )
+
+        if estimate['success']:
+            total_bytes = estimate['total_bytes'] or 0
+            readable = bytes_to_readable(total_bytes)
+
+            # Los presupuestos de sesión y proyecto no admiten confirmación
+            if total_bytes > Settings.QUERY_HARD_MAX_BYTES:
+                raise QueryBudgetExceeded(
+                    f"La consulta procesaría {readable}, por encima del máximo absoluto "
+                    f"de {bytes_to_readable(Settings.QUERY_HARD_MAX_BYTES)}. Reduce el rango de fechas.",
+                    estimate, key, can_approve=False
+                )
+            if total_bytes > session_remaining:
+                raise QueryBudgetExceeded(
+                    f"La consulta procesaría {readable} y en esta sesión solo quedan "
+                    f"{bytes_to_readable(max(session_remaining, 0))} de presupuesto.",
+                    estimate, key, can_approve=False
+                )
+            if total_bytes > project_remaining:
+                raise QueryBudgetExceeded(
+                    f"La consulta procesaría {readable} y el proyecto {client.project} solo tiene "
+                    f"{bytes_to_readable(max(project_remaining, 0))} de presupuesto este mes.",
+                    estimate, key, can_approve=False
+                )
+            if total_bytes > query_limit:
+                raise QueryBudgetExceeded(
+                    f"La consulta procesaría {readable}, por encima del límite por consulta "
+                    f"de {bytes_to_readable(Settings.QUERY_MAX_BYTES)}.",
+                    estimate, key, can_approve=True
+                )
+
+        # Red de seguridad: BigQuery rechaza el job (sin coste) si factura más de esto
+        return max(min(query_limit, session_remaining, project_remaining), MIN_BILLED_BYTES)
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        """Abre el registro de consumo mensual por proyecto (compartido entre procesos)"""
+        os.makedirs(os.path.dirname(Settings.COST_LEDGER_PATH), exist_ok=True)
+        conn = sqlite3.connect(Settings.COST_LEDGER_PATH, timeout=30, isolation_level=None)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                project TEXT NOT NULL,
+                month TEXT NOT NULL,
+                bytes_billed INTEGER NOT NULL,
+                PRIMARY KEY (project, month)
+            )
+        """)
+        return conn
+
+    @staticmethod
+    def record_usage(project: str, bytes_billed: int):
+        """Suma los bytes facturados por un job al consumo mensual del proyecto"""
+        if not bytes_billed:
+            return
+        try:
+            conn = CostGuard._connect()
+            try:
+                conn.execute(
+                    """
+                    INSERT INTO usage (project, month, bytes_billed) VALUES (?, ?, ?)
+                    ON CONFLICT (project, month) DO UPDATE SET bytes_billed = bytes_billed + excluded.bytes_billed
+                    """,
+                    (project, datetime.now().strftime('%Y-%m'), int(bytes_billed))
+                )
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ No se pudo registrar el consumo del proyecto: {e}")
+
+    @staticmethod
+    def get_project_usage(project: str) -> int:
+        """Bytes facturados este mes por el proyecto"""
+        try:
+            conn = CostGuard._connect()
+            try:
+                row = conn.execute(
+                    'SELECT bytes_billed FROM usage WHERE project = ? AND month = ?',
+                    (project, datetime.now().strftime('%Y-%m'))
+                ).fetchone()
+            finally:
+                conn.close()
+        except Exception:
+            return 0
+        return row[0] if row else 0
+
+    @staticmethod
+    def show_blocked_query(error: QueryBudgetExceeded):
+        """Muestra una consulta bloqueada y, si procede, el botón para autorizarla"""
+        import streamlit as st
+
+        st.error(f"🚨 Consulta bloqueada por control de coste: {error}")
+
+        if error.can_approve:
+            estimate = error.estimate
+            st.warning(
+                f"Coste estimado: ${estimate['estimated_cost_usd']:.4f} "
+                f"({estimate['total_bytes_readable']}). Si es intencionado, autorízala y "
+                "vuelve a pulsar el botón de la sección."
+            )
+            st.button(
+                "Autorizar esta consulta",
+                key=f"btn_approve_{error.key[:16]}",
+                on_click=CostGuard.approve,
+                args=(error.key,)
+            )
+        st.stop()
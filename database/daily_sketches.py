@@ -0,0 +1,92 @@
+"""
+Modo rápido: conteos distintos aproximados con HyperLogLog++
+
+COUNT(DISTINCT user_pseudo_id) y COUNT(DISTINCT sesión) obligan a BigQuery a
+deduplicar todos los valores, el operador más caro en datasets con miles de
+millones de eventos. En modo rápido los generadores que lo admiten usan
+APPROX_COUNT_DISTINCT (error relativo típico ~1%).
+
+Además se materializa, igual que la tabla de sesiones, una tabla con sketches
+HLL_COUNT.INIT por día, evento, consentimiento y dispositivo. Los sketches se
+combinan con HLL_COUNT.MERGE, así que los distintos de cualquier rango de
+fechas salen de la tabla sin volver a leer events_* de los días cerrados.
+"""
+from typing import Dict
+
+from database.queries import (
+    generar_query_daily_sketches,
+    generar_query_consentimiento_basico,
+    generar_query_consentimiento_por_dispositivo,
+    generar_query_evolucion_temporal_consentimiento,
+    generar_query_consentimiento_por_geografia,
+    generar_query_consentimiento_por_fuente_trafico,
+    generar_query_canales_trafico,
+    generar_query_eventos_resumen,
+    generar_query_eventos_por_fecha,
+    generar_query_metricas_diarias
+)
+from database.session_facts import DailyTable
+
+# Generadores que aceptan approximate
+APPROXIMATE_GENERATORS = {
+    generar_query_consentimiento_basico,
+    generar_query_consentimiento_por_dispositivo,
+    generar_query_evolucion_temporal_consentimiento,
+    generar_query_consentimiento_por_geografia,
+    generar_query_consentimiento_por_fuente_trafico,
+    generar_query_canales_trafico,
+    generar_query_eventos_resumen,
+    generar_query_eventos_por_fecha,
+    generar_query_metricas_diarias,
+}
+
+# Generadores que además pueden leer los sketches diarios (sketches=)
+SKETCH_GENERATORS = {
+    generar_query_consentimiento_basico,
+    generar_query_consentimiento_por_dispositivo,
+    generar_query_eventos_resumen,
+}
+
+
+class DailySketches(DailyTable):
+    """Construcción incremental de la tabla de sketches HLL diarios"""
+
+    TABLE_PREFIX = 'daily_sketches'
+    DATE_COLUMN = 'sketch_date'
+    CLUSTER_BY = 'event_name'
+    ENABLED_SETTING = 'DAILY_SKETCHES_ENABLED'
+    LABEL = 'Sketches diarios'
+    _select = staticmethod(generar_query_daily_sketches)
+
+
+def approximate_kwargs(client, generator, project, dataset, start_date, end_date, monitoring_log=None) -> Dict:
+    """
+    Argumentos de modo rápido para un generador
+
+    No usa st.*, así que puede llamarse desde los hilos de "Ejecutar todas las
+    secciones". Si la tabla de sketches no está disponible el generador cuenta
+    con APPROX_COUNT_DISTINCT sobre events_*.
+
+    Returns:
+        dict con approximate (y sketches si el generador los admite); vacío si
+        el generador no tiene modo aproximado
+    """
+    if generator not in APPROXIMATE_GENERATORS:
+        return {}
+
+    kwargs = {'approximate': True}
+    if generator in SKETCH_GENERATORS:
+        kwargs['sketches'] = DailySketches.ensure_fresh(
+            client, project, dataset, start_date, end_date, monitoring_log
+        )
+    return kwargs
+
+
+def mark_approximate(df, approximate: bool):
+    """
+    Marca un resultado como aproximado (df.attrs['approximate'])
+
+    Las visualizaciones leen la marca para mostrar el aviso de aproximación.
+    """
+    df.attrs['approximate'] = bool(approximate)
+    return df
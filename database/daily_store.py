@@ -0,0 +1,210 @@
+"""
+Almacén de resultados por día para consultas GA4 descomponibles
+
+Las tablas events_YYYYMMDD de GA4 no cambian una vez cerrado el día, así que
+las consultas cuyo resultado es una fila (o grupo de filas) por fecha pueden
+guardarse día a día. Al desplazar la ventana de fechas solo se consultan en
+BigQuery los días que faltan; el resto se lee del almacén.
+"""
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Callable, List, Tuple
+
+import pandas as pd
+
+from config.settings import Settings
+from database.cost_guard import CostGuard, QueryBudgetExceeded
+from database.query_cache import QueryCache
+from database.range_cache import RangeCache
+from database.queries import (
+    generar_query_metricas_diarias,
+    generar_query_evolucion_temporal_consentimiento,
+    generar_query_eventos_por_fecha,
+    generar_query_comparativa_eventos,
+    generar_query_ingresos_transacciones
+)
+
+# Consultas descomponibles por día: columna de fecha y orden final del resultado
+DAILY_QUERY_SPECS = {
+    generar_query_metricas_diarias: {
+        'date_column': 'date_formatted',
+        'sort_by': ['date_formatted'],
+        'ascending': [True]
+    },
+    generar_query_evolucion_temporal_consentimiento: {
+        'date_column': 'date',
+        'sort_by': ['date'],
+        'ascending': [True]
+    },
+    generar_query_eventos_por_fecha: {
+        'date_column': 'event_date',
+        'sort_by': ['event_date', 'total_events'],
+        'ascending': [False, False]
+    },
+    generar_query_comparativa_eventos: {
+        'date_column': 'event_date',
+        'sort_by': ['event_date', 'total_events'],
+        'ascending': [True, False]
+    },
+    generar_query_ingresos_transacciones: {
+        'date_column': 'date',
+        'sort_by': ['date'],
+        'ascending': [True]
+    },
+}
+
+
+def to_date(value) -> date:
+    """Convierte datetime/Timestamp/date a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if hasattr(value, 'to_pydatetime'):
+        return value.to_pydatetime().date()
+    return value
+
+
+def day_suffixes(series: pd.Series) -> pd.Series:
+    """Normaliza una columna de fecha (DATE, TIMESTAMP o 'YYYYMMDD') a 'YYYYMMDD'"""
+    return series.astype(str).str.replace('-', '', regex=False).str[:8]
+
+
+def contiguous_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Agrupa una lista ordenada de días en rangos consecutivos"""
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def run_daily_query(client, generator: Callable, project, dataset, start_date, end_date,
+                    query_name=None, monitoring_log=None, approximate=False):
+    """
+    Ejecuta una consulta descomponible por día reutilizando los días cerrados ya consultados
+
+    Args:
+        client: Cliente de BigQuery
+        generator: Función generar_query_* registrada en DAILY_QUERY_SPECS
+        project: ID del proyecto
+        dataset: ID del dataset GA4
+        start_date: Fecha de inicio del análisis
+        end_date: Fecha de fin del análisis
+        query_name: Nombre para monitorización (default: nombre del generador)
+        monitoring_log: Lista de monitorización (default: st.session_state.monitoring_data).
+            Pasarla explícitamente permite llamar a la función desde hilos secundarios
+        approximate: Modo rápido (conteos distintos HLL++) si el generador lo admite
+
+    Returns:
+        pandas.DataFrame equivalente al de generator(project, dataset, start_date, end_date)
+    """
+    from database.connection import execute_query
+    from database.daily_sketches import APPROXIMATE_GENERATORS
+
+    # Sin monitoring_log explícito se llama desde el hilo de Streamlit
+    interactive = monitoring_log is None
+    if interactive:
+        import streamlit as st
+        if 'monitoring_data' not in st.session_state:
+            st.session_state.monitoring_data = []
+        monitoring_log = st.session_state.monitoring_data
+
+    spec = DAILY_QUERY_SPECS[generator]
+    date_column = spec['date_column']
+    query_name = query_name or generator.__name__
+
+    if approximate and generator in APPROXIMATE_GENERATORS:
+        # Las claves del almacén salen del SQL: exacto y aproximado no comparten días
+        generator = partial(generator, approximate=True)
+
+    start_date = to_date(start_date)
+    end_date = to_date(end_date)
+    last_closed_day = datetime.now().date() - timedelta(days=Settings.GA4_CLOSED_DAY_LAG)
+
+    def day_key(day):
+        # La clave es la del SQL de un solo día: si el generador cambia, la entrada deja de valer
+        return QueryCache.build_key(generator(project, dataset, day, day), client)
+
+    started_at = datetime.now()
+    frames = []
+    missing_days = []
+
+    # Días cubiertos por el rango guardado en memoria: se filtran sin leer disco ni BigQuery
+    range_key = RangeCache.build_key(client, generator, project, dataset)
+    cached_range = RangeCache.lookup(range_key, start_date, end_date, day_suffixes, date_column)
+    covered_start = covered_end = None
+    if cached_range is not None:
+        cached_df, covered_start, covered_end = cached_range
+        frames.append(cached_df)
+
+    day = start_date
+    while day <= end_date:
+        if covered_start is not None and covered_start <= day <= covered_end:
+            day += timedelta(days=1)
+            continue
+        stored = QueryCache.get(day_key(day)) if day <= last_closed_day else None
+        if stored is not None:
+            frames.append(stored)
+        else:
+            missing_days.append(day)
+        day += timedelta(days=1)
+
+    # Solo se escanean los días que no están en el almacén
+    for range_start, range_end in contiguous_ranges(missing_days):
+        query = generator(project, dataset, range_start, range_end)
+        try:
+            df = execute_query(
+                client,
+                query,
+                query_name=f"{query_name} ({range_start:%Y%m%d}-{range_end:%Y%m%d})",
+                monitoring_log=monitoring_log
+            )
+        except QueryBudgetExceeded as e:
+            if not interactive:
+                raise
+            CostGuard.show_blocked_query(e)
+        frames.append(df)
+
+        suffixes = day_suffixes(df[date_column]) if not df.empty else pd.Series(dtype=str)
+        day = range_start
+        while day <= min(range_end, last_closed_day):
+            day_df = df[suffixes == day.strftime('%Y%m%d')].reset_index(drop=True)
+            QueryCache.put(
+                day_key(day),
+                day_df,
+                generator(project, dataset, day, day),
+                ttl_seconds=Settings.DAILY_STORE_TTL_SECONDS
+            )
+            day += timedelta(days=1)
+
+    if not missing_days:
+        # Resultado completo desde el almacén: registrar en monitorización sin coste
+        monitoring_log.append({
+            'query_name': query_name,
+            'timestamp': started_at,
+            'duration': (datetime.now() - started_at).total_seconds(),
+            'gb_used': 0,
+            'status': 'Success',
+            'rows_returned': sum(len(f) for f in frames),
+            'cache_hit': True,
+            'cache_source': 'memoria' if len(frames) == 1 and cached_range is not None else 'local'
+        })
+
+    non_empty = [f for f in frames if not f.empty]
+    if not non_empty:
+        result = frames[0] if frames else pd.DataFrame()
+    else:
+        result = pd.concat(non_empty, ignore_index=True)
+
+        # Los días leídos de Parquet y los recién consultados pueden traer tipos de fecha distintos
+        result = result.sort_values(
+            spec['sort_by'],
+            ascending=spec['ascending'],
+            key=lambda col: day_suffixes(col) if col.name == date_column else col
+        ).reset_index(drop=True)
+
+    RangeCache.store(
+        range_key, start_date, end_date, result, last_closed_day, day_suffixes, date_column
+    )
+    return result
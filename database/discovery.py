@@ -0,0 +1,207 @@
+"""
+Descubrimiento de proyectos y datasets GA4 accesibles
+
+Listar proyectos, datasets y tablas son llamadas de metadatos independientes:
+se reparten en un pool de hilos y el mapa proyecto → datasets GA4 se guarda en
+memoria por identidad de credencial. Pasado el TTL se sigue sirviendo el mapa
+guardado mientras un hilo en segundo plano lo vuelve a construir, de modo que
+los reruns de Streamlit no repiten O(proyectos × datasets) llamadas.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from config.settings import Settings
+from database.query_cache import client_identity
+
+_lock = threading.Lock()
+# (identidad, solo_prefijo) -> {'projects': dict, 'fetched_at': float, 'refreshing': bool}
+_projects_cache: Dict[tuple, Dict] = {}
+# (identidad, proyecto, dataset) -> {'info': dict, 'fetched_at': float}
+_dataset_info_cache: Dict[tuple, Dict] = {}
+
+
+class GA4Discovery:
+    """Mapa proyecto → datasets GA4 cacheado por credencial"""
+
+    @staticmethod
+    def client_identity(client) -> str:
+        """
+        Identificador de la credencial del cliente (query_cache.client_identity)
+
+        Sin principal identificable el mapa se guarda solo para ese objeto de
+        credenciales: la caché vive en memoria y no se comparte entre sesiones.
+        """
+        identity = client_identity(client)
+        if identity is None:
+            return f"credentials:{id(getattr(client, '_credentials', None))}"
+        return identity
+
+    @staticmethod
+    def _has_events_tables(client, project_id: str, dataset_id: str) -> bool:
+        """Un dataset es de GA4 si contiene tablas events_*"""
+        try:
+            tables = client.list_tables(f"{project_id}.{dataset_id}", max_results=10)
+            return any(table.table_id.startswith('events_') for table in tables)
+        except Exception:
+            # Si hay error al listar tablas, asumir que no es GA4
+            return False
+
+    @staticmethod
+    def _list_datasets(client, project_id: str) -> List[str]:
+        try:
+            return [dataset.dataset_id for dataset in client.list_datasets(project_id)]
+        except Exception:
+            # Sin permisos sobre el proyecto: se omite
+            return []
+
+    @staticmethod
+    def _discover(client, require_prefix: bool) -> Dict[str, List[str]]:
+        """
+        Recorre proyectos, datasets y tablas en paralelo
+
+        Args:
+            client: Cliente de BigQuery
+            require_prefix: Solo considera datasets analytics_XXXXXXXXX
+
+        Returns:
+            dict: {project_id: [lista de datasets GA4]}, en el orden de list_projects
+        """
+        project_ids = [project.project_id for project in client.list_projects()]
+        if not project_ids:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=Settings.DISCOVERY_MAX_WORKERS) as executor:
+            datasets_by_project = dict(zip(
+                project_ids,
+                executor.map(lambda p: GA4Discovery._list_datasets(client, p), project_ids)
+            ))
+
+            candidates = [
+                (project_id, dataset_id)
+                for project_id in project_ids
+                for dataset_id in datasets_by_project[project_id]
+                if not require_prefix or dataset_id.startswith('analytics_')
+            ]
+            checks = executor.map(
+                lambda pair: GA4Discovery._has_events_tables(client, *pair), candidates
+            )
+
+            ga4_projects: Dict[str, List[str]] = {}
+            for (project_id, dataset_id), is_ga4 in zip(candidates, checks):
+                if is_ga4:
+                    ga4_projects.setdefault(project_id, []).append(dataset_id)
+
+        return ga4_projects
+
+    @staticmethod
+    def _refresh(client, cache_key: tuple, require_prefix: bool):
+        """Reconstruye una entrada de la caché (hilo en segundo plano)"""
+        try:
+            projects = GA4Discovery._discover(client, require_prefix)
+            with _lock:
+                _projects_cache[cache_key] = {
+                    'projects': projects,
+                    'fetched_at': time.time(),
+                    'refreshing': False
+                }
+        except Exception as e:
+            print(f"⚠️ No se pudo refrescar el listado de proyectos GA4: {e}")
+            with _lock:
+                if cache_key in _projects_cache:
+                    _projects_cache[cache_key]['refreshing'] = False
+
+    @staticmethod
+    def get_projects(client, require_prefix: bool = True, force_refresh: bool = False) -> Dict[str, List[str]]:
+        """
+        Obtiene los proyectos con datasets GA4 accesibles por el cliente
+
+        Dentro del TTL devuelve el mapa guardado sin llamar a la API. Pasado el
+        TTL lo devuelve igualmente y lanza un refresco en segundo plano; solo
+        se bloquea la primera vez, si se fuerza o si el mapa es demasiado antiguo.
+
+        Args:
+            client: Cliente de BigQuery
+            require_prefix: Solo datasets que siguen el patrón analytics_XXXXXXXXX
+            force_refresh: Ignora la caché y vuelve a recorrer los proyectos
+
+        Returns:
+            dict: {project_id: [lista de datasets GA4]}
+
+        Raises:
+            Exception: Si no se pueden listar los proyectos
+        """
+        cache_key = (GA4Discovery.client_identity(client), require_prefix)
+        now = time.time()
+
+        with _lock:
+            entry = _projects_cache.get(cache_key)
+            if entry is not None and not force_refresh:
+                age = now - entry['fetched_at']
+                if age < Settings.DISCOVERY_TTL_SECONDS:
+                    return entry['projects']
+                if age < Settings.DISCOVERY_MAX_AGE_SECONDS:
+                    if not entry['refreshing']:
+                        entry['refreshing'] = True
+                        threading.Thread(
+                            target=GA4Discovery._refresh,
+                            args=(client, cache_key, require_prefix),
+                            daemon=True
+                        ).start()
+                    return entry['projects']
+
+        projects = GA4Discovery._discover(client, require_prefix)
+        with _lock:
+            _projects_cache[cache_key] = {
+                'projects': projects,
+                'fetched_at': time.time(),
+                'refreshing': False
+            }
+        return projects
+
+    @staticmethod
+    def get_dataset_info(client, project_id: str, dataset_id: str) -> Dict:
+        """
+        Resumen de las tablas de un dataset GA4 (cacheado con el mismo TTL)
+
+        Returns:
+            dict con events_tables, total_tables, first_day y last_day (YYYYMMDD o None)
+        """
+        cache_key = (GA4Discovery.client_identity(client), project_id, dataset_id)
+
+        with _lock:
+            entry = _dataset_info_cache.get(cache_key)
+            if entry is not None and time.time() - entry['fetched_at'] < Settings.DISCOVERY_TTL_SECONDS:
+                return entry['info']
+
+        tables = list(client.list_tables(f"{project_id}.{dataset_id}", max_results=100))
+        events_tables = [t.table_id for t in tables if t.table_id.startswith('events_')]
+        days = sorted(
+            suffix for suffix in (t.replace('events_', '') for t in events_tables)
+            if suffix.isdigit() and len(suffix) == 8
+        )
+
+        info = {
+            'events_tables': len(events_tables),
+            'total_tables': len(tables),
+            'first_day': days[0] if days else None,
+            'last_day': days[-1] if days else None
+        }
+        with _lock:
+            _dataset_info_cache[cache_key] = {'info': info, 'fetched_at': time.time()}
+        return info
+
+    @staticmethod
+    def invalidate(client: Optional[object] = None):
+        """Vacía la caché de descubrimiento (de un cliente o completa)"""
+        with _lock:
+            if client is None:
+                _projects_cache.clear()
+                _dataset_info_cache.clear()
+                return
+
+            identity = GA4Discovery.client_identity(client)
+            for cache in (_projects_cache, _dataset_info_cache):
+                for key in [k for k in cache if k[0] == identity]:
+                    del cache[key]
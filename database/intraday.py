@@ -0,0 +1,142 @@
+"""
+Modo en directo: días aún no exportados leídos de events_intraday_*
+
+GA4 escribe el día en curso (y el anterior, hasta que termina la exportación
+diaria) en las tablas events_intraday_YYYYMMDD, que las consultas sobre
+events_* no ven. En directo, los días con tabla diaria salen del almacén por
+día (run_daily_query) y solo los días intradía se consultan en cada sondeo.
+
+Cada sondeo pide los minutos desde la marca de agua (último minuto visto)
+menos LIVE_OVERLAP_MINUTES, y sustituye esos minutos en el estado: los eventos
+que llegan con retraso dentro de ese margen se incorporan sin contarse dos
+veces. Los usuarios únicos exactos salen de un conjunto de huellas de usuario
+por fecha y evento (8 bytes por usuario, no una fila por usuario y minuto),
+al que volver a añadir un usuario del margen no cambia. Las tablas intradía no están particionadas por event_timestamp, así que
+BigQuery sigue leyendo las columnas usadas del día completo; lo incremental es
+el trabajo y las filas transferidas, y nunca se vuelven a leer los días cerrados.
+"""
+from datetime import datetime, timedelta
+from typing import List
+
+import pandas as pd
+
+from config.settings import Settings
+from database.daily_store import DAILY_QUERY_SPECS, day_suffixes, to_date
+from database.queries import generar_query_eventos_por_fecha, generar_query_eventos_intraday
+
+
+def live_days(daily_df, start_date, end_date) -> List:
+    """
+    Días del rango que hay que leer de las tablas intradía
+
+    Son los de los últimos LIVE_LOOKBACK_DAYS días (y hoy) que no tienen
+    filas en el resultado diario, es decir, cuya tabla diaria aún no existe.
+
+    Args:
+        daily_df: Resultado de generar_query_eventos_por_fecha para el rango
+
+    Returns:
+        Lista de días (date), vacía si el rango no llega a los días recientes
+    """
+    today = datetime.now().date()
+    first = max(to_date(start_date), today - timedelta(days=Settings.LIVE_LOOKBACK_DAYS))
+    last = min(to_date(end_date), today)
+
+    exported = set(day_suffixes(daily_df['event_date'])) if not daily_df.empty else set()
+    days = []
+    day = first
+    while day <= last:
+        if day.strftime('%Y%m%d') not in exported:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+class IntradayEvents:
+    """Estado incremental de eventos por fecha de los días intradía"""
+
+    def __init__(self, project, dataset, days):
+        self.project = project
+        self.dataset = dataset
+        self.days = list(days)
+        self.minutes = None         # Eventos por fecha, evento y minuto
+        self.users = {}             # (fecha, evento) -> set de user_key vistos
+        self.watermark = None       # Último minute_bucket visto
+        self.refreshed_at = None
+
+    def refresh(self, client, monitoring_log=None) -> int:
+        """
+        Consulta los minutos nuevos (y el margen de solape) y los incorpora
+
+        Los conteos por minuto del margen se sustituyen; los usuarios se
+        añaden a su conjunto, que no cambia si un usuario vuelve a llegar.
+
+        Returns:
+            Número de filas devueltas por la consulta incremental
+        """
+        from database.connection import execute_query
+
+        since = None if self.watermark is None else self.watermark - Settings.LIVE_OVERLAP_MINUTES
+        query = generar_query_eventos_intraday(
+            self.project, self.dataset, min(self.days), max(self.days), since_minute=since
+        )
+        # Sin caché: el mismo SQL devuelve datos nuevos en cada sondeo
+        delta = execute_query(
+            client, query,
+            query_name="Eventos en directo (intradía)",
+            use_cache=False,
+            monitoring_log=monitoring_log
+        )
+
+        is_user = delta['minute_bucket'].isna()
+        minutes = delta.loc[~is_user, ['event_date', 'event_name', 'minute_bucket', 'total_events']]
+        if self.minutes is None or since is None:
+            self.minutes = minutes.reset_index(drop=True)
+            self.users = {}
+        else:
+            kept = self.minutes[self.minutes['minute_bucket'] < since]
+            self.minutes = pd.concat([kept, minutes], ignore_index=True)
+
+        for key, user_keys in delta[is_user].groupby(['event_date', 'event_name'])['user_key']:
+            self.users.setdefault(key, set()).update(user_keys.tolist())
+
+        if not minutes.empty:
+            latest = int(minutes['minute_bucket'].max())
+            self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+        self.refreshed_at = datetime.now()
+        return len(delta)
+
+    @property
+    def data_until(self):
+        """Último minuto con datos (datetime local), o None"""
+        if self.watermark is None:
+            return None
+        return datetime.fromtimestamp(self.watermark * 60)
+
+    def eventos_por_fecha(self) -> pd.DataFrame:
+        """Estado actual con las columnas de generar_query_eventos_por_fecha"""
+        if self.minutes is None or self.minutes.empty:
+            return pd.DataFrame(columns=['event_date', 'event_name', 'total_events', 'unique_users'])
+
+        result = self.minutes.groupby(['event_date', 'event_name'], as_index=False)['total_events'].sum()
+        result['unique_users'] = [
+            len(self.users.get(key, ())) for key in zip(result['event_date'], result['event_name'])
+        ]
+        return result
+
+    def combine(self, daily_df) -> pd.DataFrame:
+        """Resultado diario más los días intradía, con el orden de DAILY_QUERY_SPECS"""
+        spec = DAILY_QUERY_SPECS[generar_query_eventos_por_fecha]
+        live = self.eventos_por_fecha()
+        frames = [f for f in (daily_df, live) if not f.empty]
+        if not frames:
+            return daily_df
+
+        result = pd.concat(frames, ignore_index=True)
+        result = result.sort_values(
+            spec['sort_by'],
+            ascending=spec['ascending'],
+            key=lambda col: day_suffixes(col) if col.name == spec['date_column'] else col
+        ).reset_index(drop=True)
+        result.attrs = dict(daily_df.attrs)
+        return result
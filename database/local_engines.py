@@ -0,0 +1,33 @@
+"""
+Consultas cuyo resultado se procesa en local antes de mostrarse
+
+Algunos generadores devuelven datos compactos (cestas codificadas, rutas
+agregadas) y el análisis se calcula en el proceso con NumPy/SciPy. Cualquier
+camino que ejecute la consulta (botón de la sección, "Ejecutar todas las
+secciones", benchmarks) aplica aquí el motor correspondiente.
+"""
+from database.attribution import attribute_paths
+from database.market_basket import mine_combos
+from database.queries import generar_query_atribucion_completa, generar_query_combos_cross_selling
+
+# generar_query_* -> función(df) que produce el DataFrame de la visualización
+LOCAL_ENGINES = {
+    generar_query_combos_cross_selling: mine_combos,
+    generar_query_atribucion_completa: attribute_paths,
+}
+
+
+def apply_local_engine(df, generator, **kwargs):
+    """
+    Aplica el motor local del generador, si lo tiene
+
+    Args:
+        df: Resultado de la consulta
+        generator: Generador que produjo la consulta
+        **kwargs: Opciones del motor (p. ej. sample_percent)
+
+    Returns:
+        DataFrame listo para la visualización
+    """
+    engine = LOCAL_ENGINES.get(generator)
+    return df if engine is None else engine(df, **kwargs)
@@ -0,0 +1,297 @@
+"""
+Market basket analysis en local: itemsets frecuentes y reglas de asociación
+
+generar_query_combos_cross_selling devuelve las cestas como códigos enteros
+de producto y un catálogo con las transacciones de cada producto frecuente.
+Aquí se construye la matriz dispersa transacción × producto X (CSR binaria) y
+se minan los itemsets frecuentes nivel a nivel (apriori con álgebra dispersa):
+
+- Cada itemset de tamaño k tiene su columna de cobertura en T_k (1 en las
+  transacciones que contienen todos sus productos); T_1 = X.
+- T_kᵀ · X cuenta, para cada itemset y producto, las transacciones con ambos:
+  las entradas con producto posterior al último del itemset y al menos
+  combos_min_transactions son los itemsets frecuentes de tamaño k + 1.
+- T_{k+1} se obtiene cruzando, en cada transacción, sus itemsets de tamaño k
+  con sus productos (_extend_cover), sin materializar columnas completas de
+  los productos más vendidos.
+
+Los productos por debajo del mínimo ya no llegan desde BigQuery (tampoco las
+compras de un solo producto frecuente), así que el coste depende de las cestas
+con combos y no del catálogo completo.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy import sparse
+
+from config.settings import Settings
+from database.arrow_utils import list_array
+from database.queries import generar_query_combos_cross_selling
+from database.queries.ecommerce_queries import combos_min_transactions
+from database.sampling import scale_sample
+
+# Mismas columnas (y orden) que devolvía la consulta de combos, más itemset_size
+COMBO_COLUMNS = [
+    'product_a',
+    'product_b',
+    'itemset_size',
+    'times_bought_together',
+    'avg_basket_value',
+    'avg_basket_size',
+    'lift',
+    'confidence_a_to_b',
+    'confidence_b_to_a',
+    'support',
+    'combined_revenue',
+    'desktop_purchases',
+    'mobile_purchases',
+    'tablet_purchases',
+    'product_a_transactions',
+    'product_b_transactions',
+    'combo_strength_score'
+]
+
+# Columnas de las cestas que se suman sobre las transacciones de cada combo
+_DEVICES = ['desktop', 'mobile', 'tablet']
+
+
+def _basket_matrix(item_codes, n_items):
+    """Matriz CSR binaria transacción × producto a partir de item_codes"""
+    lists = list_array(item_codes, pa.int64())
+    lengths = pc.list_value_length(lists).to_numpy(zero_copy_only=False)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    indices = pc.list_flatten(lists).to_numpy(zero_copy_only=False).astype(np.int32)
+    data = np.ones(len(indices), dtype=np.int32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(lengths), n_items))
+
+
+def _extend_cover(cover, X, last_items, new_keys, n_items):
+    """
+    Cobertura de los itemsets nuevos (padre + producto) en CSR
+
+    Se cruzan, transacción a transacción, los itemsets de cover con los
+    productos de X posteriores a su último producto y se conservan los que
+    están en new_keys (clave padre * n_productos + producto, ordenadas). El
+    trabajo es el mismo que el del conteo T_kᵀ · X y se hace por bloques de
+    transacciones para acotar la memoria.
+    """
+    item_counts = np.diff(X.indptr)
+    rows, columns = [], []
+
+    for first in range(0, cover.shape[0], Settings.COMBOS_BLOCK_TRANSACTIONS):
+        block = cover[first:first + Settings.COMBOS_BLOCK_TRANSACTIONS].tocoo()
+        transactions = block.row.astype(np.int64) + first
+        lengths = item_counts[transactions]
+        if not lengths.sum():
+            continue
+
+        # Cada (transacción, itemset) se repite una vez por producto de la transacción
+        entry_t = np.repeat(transactions, lengths)
+        entry_p = np.repeat(block.col.astype(np.int64), lengths)
+        offsets = np.repeat(X.indptr[transactions] - (np.cumsum(lengths) - lengths), lengths)
+        entry_i = X.indices[offsets + np.arange(len(entry_t))]
+
+        later = entry_i > last_items[entry_p]
+        keys = entry_p[later] * n_items + entry_i[later]
+        position = np.minimum(np.searchsorted(new_keys, keys), len(new_keys) - 1)
+        found = new_keys[position] == keys
+        rows.append(entry_t[later][found])
+        columns.append(position[found])
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+    return sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+        shape=(cover.shape[0], len(new_keys))
+    )
+
+
+def _frequent_itemsets(X, min_count, max_size):
+    """
+    Itemsets frecuentes de tamaño 2 a max_size
+
+    Returns:
+        Lista por tamaño de tuplas (itemsets (n × k, códigos crecientes),
+        transacciones de cada itemset, cobertura T_k en CSR)
+    """
+    n_items = X.shape[1]
+    itemsets = np.arange(n_items)[:, None]
+    cover = X
+    levels = []
+
+    for _ in range(2, max_size + 1):
+        counts = (cover.T.tocsr() @ X).tocoo()
+        keep = (counts.col > itemsets[counts.row, -1]) & (counts.data >= min_count)
+        if not keep.any():
+            break
+
+        parents = counts.row[keep].astype(np.int64)
+        items = counts.col[keep].astype(np.int64)
+        keys = parents * n_items + items
+        order = np.argsort(keys)
+        parents, items, keys = parents[order], items[order], keys[order]
+
+        cover = _extend_cover(cover, X, itemsets[:, -1], keys, n_items)
+        itemsets = np.column_stack([itemsets[parents], items])
+        levels.append((itemsets, counts.data[keep][order].astype(np.int64), cover))
+    return levels
+
+
+def _itemset_keys(itemsets, base):
+    """Clave entera única de cada itemset (códigos en base n_productos)"""
+    keys = np.zeros(len(itemsets), dtype=np.uint64)
+    for column in itemsets.T:
+        keys = keys * np.uint64(base) + column.astype(np.uint64)
+    return keys
+
+
+def _labels(names, itemsets):
+    """Nombres de los productos de cada itemset unidos con ' + '"""
+    labels = pd.Series(names[itemsets[:, 0]])
+    for column in itemsets.T[1:]:
+        labels = labels + ' + ' + names[column]
+    return labels.to_numpy()
+
+
+def _level_rules(itemsets, counts, cover, support_of, names, totals, total_transactions, cluster_sq=None):
+    """
+    Regla principal de cada itemset de un nivel
+
+    El consecuente (product_b) es el producto cuya regla resto → producto
+    tiene más confianza, es decir, el de antecedente con menos transacciones.
+    En los pares el antecedente es el primero por nombre, como en los combos
+    A + B de la consulta anterior.
+    """
+    size = itemsets.shape[1]
+    if size == 2:
+        consequent = np.ones(len(itemsets), dtype=int)
+    else:
+        antecedent_support = np.column_stack([
+            support_of(np.delete(itemsets, j, axis=1)) for j in range(size)
+        ])
+        consequent = antecedent_support.argmin(axis=1)
+
+    rows = np.arange(len(itemsets))
+    product_b = itemsets[rows, consequent]
+    mask = np.ones_like(itemsets, dtype=bool)
+    mask[rows, consequent] = False
+    antecedents = itemsets[mask].reshape(len(itemsets), size - 1)
+
+    support_a = support_of(antecedents).astype(float)
+    support_b = support_of(product_b[:, None]).astype(float)
+    confidence_a_to_b = counts / support_a * 100
+    confidence_b_to_a = counts / support_b * 100
+    lift = counts * total_transactions / (support_a * support_b)
+
+    # Sumas sobre las transacciones de cada combo: Tᵀ · [importe, tamaño, dispositivos]
+    sums = np.asarray(cover.T @ totals)
+
+    result = pd.DataFrame({
+        'product_a': _labels(names, antecedents),
+        'product_b': names[product_b],
+        'itemset_size': size,
+        'times_bought_together': counts,
+        'avg_basket_value': sums[:, 0] / counts,
+        'avg_basket_size': np.round(sums[:, 1] / counts, 2),
+        'lift': np.round(lift, 2),
+        'confidence_a_to_b': np.round(confidence_a_to_b, 1),
+        'confidence_b_to_a': np.round(confidence_b_to_a, 1),
+        'support': np.round(counts / total_transactions * 100, 3),
+        'combined_revenue': sums[:, 0],
+        'desktop_purchases': sums[:, 2].astype(np.int64),
+        'mobile_purchases': sums[:, 3].astype(np.int64),
+        'tablet_purchases': sums[:, 4].astype(np.int64),
+        'product_a_transactions': support_a.astype(np.int64),
+        'product_b_transactions': support_b.astype(np.int64),
+        # Sinergia (lift) por la mejor confianza, ponderada por la frecuencia
+        'combo_strength_score': np.round(
+            lift * np.maximum(confidence_a_to_b, confidence_b_to_a) / 100 * np.log10(1 + counts), 2
+        )
+    }, columns=COMBO_COLUMNS)
+    if cluster_sq is not None:
+        result['times_bought_together_sq'] = cluster_sq
+    return result
+
+
+def mine_combos(df, sample_percent=None):
+    """
+    Combos frecuentes con support, confidence y lift a partir de las cestas
+
+    Args:
+        df: Resultado de generar_query_combos_cross_selling
+        sample_percent: Porcentaje muestreado de la consulta, o None
+
+    Returns:
+        DataFrame con un combo por fila (pares, tríos, ... hasta
+        Settings.COMBOS_MAX_ITEMSET_SIZE): los QUERY_LIMITS['combos'] más
+        frecuentes de cada tamaño, ordenados por compras conjuntas. En los
+        combos de tres o más productos product_a es el antecedente (A + B) y
+        product_b el consecuente de la regla con más confianza.
+    """
+    min_count = combos_min_transactions(sample_percent)
+    catalog = df[df['item_name'].notna()]
+    baskets = df[df['item_name'].isna()].reset_index(drop=True)
+    combos = pd.DataFrame(columns=COMBO_COLUMNS)
+
+    if not catalog.empty and not baskets.empty:
+        n_items = int(catalog['item_code'].max()) + 1
+        codes = catalog['item_code'].to_numpy(dtype=np.int64)
+        names = np.empty(n_items, dtype=object)
+        names[codes] = catalog['item_name'].to_numpy(dtype=object)
+        item_support = np.zeros(n_items, dtype=np.int64)
+        item_support[codes] = catalog['item_transactions'].to_numpy(dtype=np.int64)
+        total_transactions = float(catalog['total_transactions'].iloc[0])
+
+        X = _basket_matrix(baskets['item_codes'], n_items)
+        levels = _frequent_itemsets(X, min_count, Settings.COMBOS_MAX_ITEMSET_SIZE)
+
+        device = baskets['device_category'].astype(object)
+        totals = np.column_stack(
+            [
+                baskets['purchase_revenue'].astype(float).fillna(0).to_numpy(),
+                baskets['basket_size'].astype(float).to_numpy()
+            ]
+            + [(device == name).to_numpy(dtype=float) for name in _DEVICES]
+        )
+
+        # Usuario × transacción: Σ por usuario de sus compras de cada combo (modo muestreo)
+        users = None
+        if sample_percent and 'user_pseudo_id' in baskets.columns:
+            user_codes, _ = pd.factorize(baskets['user_pseudo_id'])
+            users = sparse.csr_matrix(
+                (np.ones(len(user_codes), dtype=np.int64), (user_codes, np.arange(len(user_codes))))
+            )
+
+        # Transacciones de los itemsets de cada tamaño, para los antecedentes
+        keys_by_size = {1: (np.arange(n_items, dtype=np.uint64), item_support)}
+        for itemsets, counts, _ in levels:
+            keys = _itemset_keys(itemsets, n_items)
+            order = np.argsort(keys)
+            keys_by_size[itemsets.shape[1]] = (keys[order], counts[order])
+
+        def support_of(itemsets):
+            keys, counts = keys_by_size[itemsets.shape[1]]
+            return counts[np.searchsorted(keys, _itemset_keys(itemsets, n_items))]
+
+        frames = []
+        for itemsets, counts, cover in levels:
+            # Por tamaño: los tríos no quedan fuera por tener menos compras que los pares
+            top = np.argsort(-counts, kind='stable')[:Settings.QUERY_LIMITS['combos']]
+            itemsets, counts, cover = itemsets[top], counts[top], cover.tocsc()[:, top]
+            cluster_sq = None
+            if users is not None:
+                per_user = users @ cover
+                cluster_sq = np.asarray(per_user.multiply(per_user).sum(axis=0)).ravel()
+            frames.append(_level_rules(
+                itemsets, counts, cover, support_of, names, totals, total_transactions, cluster_sq
+            ))
+
+        if frames:
+            combos = (
+                pd.concat(frames, ignore_index=True)
+                .sort_values(['times_bought_together', 'lift'], ascending=False, kind='stable')
+                .reset_index(drop=True)
+            )
+
+    return scale_sample(combos, generar_query_combos_cross_selling, sample_percent)
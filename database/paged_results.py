@@ -0,0 +1,141 @@
+"""
+Resultados paginados desde la tabla de destino de un job
+
+Una consulta sin LIMIT se ejecuta sin descargar las filas (execute_query con
+fetch=False): BigQuery deja el resultado en la tabla de destino anónima del
+job, que se conserva unas 24 horas sin coste de consulta adicional. Las
+páginas se leen bajo demanda con list_rows(start_index, max_results) y la
+siguiente se pide en segundo plano mientras se muestra la actual, así que en
+memoria solo están la página visible y la precargada.
+
+El orden de las filas es el de almacenamiento de la tabla de destino, estable
+entre lecturas: no se añade ORDER BY, que obligaría a ordenar el resultado
+completo en un único worker.
+"""
+import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+from config.settings import Settings
+
+# Lecturas de páginas (y precargas) compartidas por todas las sesiones
+_executor = ThreadPoolExecutor(max_workers=Settings.PAGED_FETCH_WORKERS, thread_name_prefix="bq_pages")
+
+
+class PagedResult:
+    """Resultado de un job leído página a página"""
+
+    def __init__(self, client, query_job, page_size=None, attrs=None):
+        """
+        Args:
+            client: Cliente de BigQuery
+            query_job: Job terminado (execute_query con fetch=False)
+            page_size: Filas por página (default: Settings.PAGED_PAGE_SIZE)
+            attrs: Marcas que se copian en df.attrs de cada página (muestra, aproximado)
+        """
+        self.client = client
+        self.table = query_job.destination
+        self.job_id = query_job.job_id
+        self.total_rows = client.get_table(self.table).num_rows
+        self.page_size = page_size or Settings.PAGED_PAGE_SIZE
+        self.attrs = dict(attrs or {})
+        self._lock = threading.Lock()
+        self._pages = {}    # número de página -> Future con el DataFrame
+
+    @property
+    def page_count(self):
+        return max(1, -(-self.total_rows // self.page_size))
+
+    def _fetch(self, number):
+        from database.connection import arrow_to_dataframe
+
+        rows = self.client.list_rows(
+            self.table,
+            start_index=number * self.page_size,
+            max_results=self.page_size
+        )
+        df = arrow_to_dataframe(rows.to_arrow(create_bqstorage_client=False))
+        df.attrs.update(self.attrs)
+        return df
+
+    def _request(self, number):
+        """Future de la página, lanzando su lectura si no está pedida"""
+        future = self._pages.get(number)
+        if future is None:
+            future = _executor.submit(self._fetch, number)
+            self._pages[number] = future
+        return future
+
+    def page(self, number):
+        """
+        Filas de una página (0 = primera)
+
+        Deja pedida la siguiente y descarta el resto de páginas en memoria.
+        """
+        number = min(max(0, number), self.page_count - 1)
+        with self._lock:
+            future = self._request(number)
+            keep = {number}
+            if number + 1 < self.page_count:
+                self._request(number + 1)
+                keep.add(number + 1)
+            for other in [n for n in self._pages if n not in keep]:
+                self._pages.pop(other).cancel()
+
+        try:
+            return future.result()
+        except Exception:
+            # Una lectura fallida no queda guardada: el siguiente intento la repite
+            with self._lock:
+                if self._pages.get(number) is future:
+                    del self._pages[number]
+            raise
+
+    def _batches(self, use_storage_api):
+        """
+        RecordBatches de toda la tabla de destino en una sola lectura
+
+        Con la Storage Read API son streams Arrow; por REST, páginas de
+        PAGED_EXPORT_BATCH_ROWS filas. Sin max_results: list_rows lo usa para
+        descartar la Storage API.
+        """
+        rows = self.client.list_rows(self.table, page_size=Settings.PAGED_EXPORT_BATCH_ROWS)
+        bqstorage_client = self.client._ensure_bqstorage_client() if use_storage_api else None
+        return rows.to_arrow_iterable(bqstorage_client=bqstorage_client)
+
+    def _write_csv(self, path, max_rows, max_bytes, use_storage_api):
+        from database.connection import arrow_to_dataframe
+
+        written = 0
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            for batch in self._batches(use_storage_api):
+                if written >= max_rows or handle.tell() >= max_bytes:
+                    break
+                df = arrow_to_dataframe(pa.Table.from_batches([batch.slice(0, max_rows - written)]))
+                df.to_csv(handle, index=False, header=(written == 0), quoting=csv.QUOTE_MINIMAL)
+                written += len(df)
+        return written
+
+    def export_csv(self, path, max_rows=None, max_bytes=None):
+        """
+        Escribe el resultado en un CSV por lotes (nunca todo en memoria)
+
+        Args:
+            path: Fichero de salida
+            max_rows: Máximo de filas (default: Settings.PAGED_EXPORT_MAX_ROWS)
+            max_bytes: Tamaño a partir del cual se deja de escribir
+                (default: Settings.PAGED_EXPORT_MAX_BYTES)
+
+        Returns:
+            Número de filas escritas
+        """
+        max_rows = max_rows or Settings.PAGED_EXPORT_MAX_ROWS
+        max_bytes = max_bytes or Settings.PAGED_EXPORT_MAX_BYTES
+        if self.total_rows >= Settings.STORAGE_API_MIN_ROWS:
+            try:
+                return self._write_csv(path, max_rows, max_bytes, use_storage_api=True)
+            except Exception as e:
+                print(f"⚠️ Storage Read API no disponible, exportando por REST: {e}")
+        return self._write_csv(path, max_rows, max_bytes, use_storage_api=False)
@@ -26,6 +26,7 @@ from .events_queries import (
     generar_query_eventos_flatten,
     generar_query_eventos_resumen,
     generar_query_eventos_por_fecha,
+    generar_query_eventos_intraday,
     generar_query_parametros_eventos,
     generar_query_metricas_diarias
 )
@@ -42,10 +43,14 @@ from .users_queries import (
 from .sessions_queries import (
     generar_query_low_converting_sessions,
     generar_query_session_path_analysis,
+    generar_query_session_paths_n_pasos,
     generar_query_hourly_sessions_performance,
-    generar_query_exit_pages
+    generar_query_exit_pages,
+    generar_query_session_facts
 )
 
+from .sketches_queries import generar_query_daily_sketches
+
 __all__ = [
     # Cookies
     'generar_query_consentimiento_basico',
@@ -69,6 +74,7 @@ __all__ = [
     'generar_query_eventos_flatten',
     'generar_query_eventos_resumen',
     'generar_query_eventos_por_fecha',
+    'generar_query_eventos_intraday',
     'generar_query_parametros_eventos',
     'generar_query_metricas_diarias',
     # Users
@@ -81,6 +87,10 @@ __all__ = [
     # Sessions
     'generar_query_low_converting_sessions',
     'generar_query_session_path_analysis',
+    'generar_query_session_paths_n_pasos',
     'generar_query_hourly_sessions_performance',
-    'generar_query_exit_pages'
+    'generar_query_exit_pages',
+    'generar_query_session_facts',
+    # Sketches HLL diarios (modo rápido)
+    'generar_query_daily_sketches'
 ]
@@ -1,23 +1,25 @@
-def generar_query_canales_trafico(project, dataset, start_date, end_date):
-    """Consulta para análisis de canales de tráfico"""
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+from .fragments import distinct_count, events_with_params, session_key
+
+def generar_query_canales_trafico(project, dataset, start_date, end_date, approximate=False):
+    """
+    Consulta para análisis de canales de tráfico
+    
+    Con approximate las sesiones por canal se cuentan con APPROX_COUNT_DISTINCT
+    """
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
     
     return f"""
-    WITH traffic_data AS (
+    WITH events AS ({events}),
+    
+    traffic_data AS (
       SELECT
-        CONCAT(
-          user_pseudo_id, '-',
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id')
-        ) AS session_id,
+        {session_key()} AS session_id,
         collected_traffic_source.manual_source AS session_source,
         collected_traffic_source.manual_medium AS session_medium,
         collected_traffic_source.manual_campaign_name AS session_campaign_name,
         collected_traffic_source.gclid
       FROM
-        `{project}.{dataset}.events_*`
-      WHERE
-        _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+        events
     ),
 
     channel_grouping_cte AS (
@@ -79,7 +81,7 @@ def generar_query_canales_trafico(project, dataset, start_date, end_date):
     sessions_by_channel AS (
       SELECT
         traffic_channel,
-        COUNT(DISTINCT session_id) AS session_count
+        {distinct_count('session_id', approximate)} AS session_count
       FROM
         channel_grouping_cte
       GROUP BY
@@ -109,35 +111,32 @@ def generar_query_atribucion_marketing(project, dataset, start_date, end_date):
     """Consulta SIMPLIFICADA para atribución básica (3 modelos)"""
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id'],
+        where="event_name IN ('session_start', 'purchase')"
+    )
     
     return f"""
     -- Consulta básica de 3 modelos (Last Click, First Click, Linear)
-    WITH session_data AS (
+    WITH events AS ({events}),
+    session_data AS (
       SELECT
-        CONCAT(user_pseudo_id, '-', 
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id')
-        ) AS session_id,
+        {session_key()} AS session_id,
         user_pseudo_id,
         traffic_source.source AS utm_source,
         traffic_source.medium AS utm_medium,
         traffic_source.name AS utm_campaign,
         TIMESTAMP_MICROS(event_timestamp) AS session_start_ts,
         device.category AS device_type
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name = 'session_start'
+      FROM events
+      WHERE event_name = 'session_start'
     ),
     conversion_data AS (
       SELECT
-        CONCAT(user_pseudo_id, '-', 
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id')
-        ) AS session_id,
+        {session_key()} AS session_id,
         ecommerce.purchase_revenue AS revenue
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name = 'purchase'
+      FROM events
+      WHERE event_name = 'purchase'
         AND ecommerce.purchase_revenue > 0
     ),
     user_journeys AS (
@@ -246,269 +245,127 @@ def generar_query_atribucion_marketing(project, dataset, start_date, end_date):
     """
 
 def generar_query_atribucion_completa(project, dataset, start_date, end_date):
-    """Consulta COMPLETAMENTE NUEVA para 7 modelos - CON DATA DRIVEN MEJORADO Y CORREGIDO"""
+    """
+    Consulta de rutas de conversión comprimidas para la atribución de 7 modelos
+
+    No atribuye en BigQuery: devuelve cada ruta distinta de canales (las últimas
+    ATTRIBUTION_MAX_PATH_LENGTH sesiones del usuario hasta su última compra, o
+    todas si no compró) con los usuarios que la siguieron con y sin conversión,
+    sus compras y sus ingresos. database.attribution.attribute_paths calcula en
+    local los modelos heurísticos y el Data Driven (cadena de Markov). El
+    tamaño del resultado depende de las rutas distintas, no de los usuarios.
+
+    Devuelve dos tipos de fila en un único resultado:
+    - Canal (utm_source no nulo): fuente, medio, campaña y dispositivo de la
+      sesión (collected_traffic_source, como en canales de tráfico) con su
+      código entero channel_code.
+    - Ruta (path no vacío): códigos de canal en orden cronológico.
+    """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id'],
+        where="event_name IN ('session_start', 'purchase')"
+    )
+    max_length = Settings.ATTRIBUTION_MAX_PATH_LENGTH
     
     return f"""
-    -- CONSULTA DE 7 MODELOS - CON DATA DRIVEN ALGORÍTMICO CORREGIDO
-    WITH base_data AS (
-      SELECT
-        user_pseudo_id,
-        CONCAT(user_pseudo_id, '-', 
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id')
-        ) AS session_id,
-        traffic_source.source AS utm_source,
-        traffic_source.medium AS utm_medium,
-        traffic_source.name AS utm_campaign,
-        TIMESTAMP_MICROS(event_timestamp) AS session_start_ts,
-        device.category AS device_type,
-        ecommerce.purchase_revenue AS revenue,
-        CASE WHEN event_name = 'purchase' AND ecommerce.purchase_revenue > 0 THEN 1 ELSE 0 END AS conversion
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name IN ('session_start', 'purchase')
-    ),
-    
-    user_conversions AS (
-      SELECT DISTINCT user_pseudo_id
-      FROM base_data
-      WHERE conversion = 1
-    ),
-    
-    conversion_paths AS (
-      SELECT *
-      FROM base_data
-      WHERE user_pseudo_id IN (SELECT user_pseudo_id FROM user_conversions)
-    ),
-    
-    session_ranking AS (
-      SELECT *,
-        ROW_NUMBER() OVER (PARTITION BY user_pseudo_id ORDER BY session_start_ts) as session_asc,
-        ROW_NUMBER() OVER (PARTITION BY user_pseudo_id ORDER BY session_start_ts DESC) as session_desc,
-        COUNT(*) OVER (PARTITION BY user_pseudo_id) as total_sessions,
-        DATE_DIFF(
-          MAX(CASE WHEN conversion = 1 THEN DATE(session_start_ts) END) OVER (PARTITION BY user_pseudo_id),
-          DATE(session_start_ts),
-          DAY
-        ) as days_to_conversion
-      FROM conversion_paths
-    ),
-    
-    -- 1. Last Click
-    last_click AS (
-      SELECT
-        'Last Click' AS attribution_model,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(CASE WHEN session_desc = 1 THEN conversion ELSE 0 END) AS attributed_conversions,
-        SUM(CASE WHEN session_desc = 1 THEN revenue ELSE 0 END) AS attributed_revenue
-      FROM session_ranking
-      GROUP BY utm_source, utm_medium, utm_campaign, device_type
-    ),
-    
-    -- 2. First Click
-    first_click AS (
-      SELECT
-        'First Click' AS attribution_model,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(CASE WHEN session_asc = 1 THEN conversion ELSE 0 END) AS attributed_conversions,
-        SUM(CASE WHEN session_asc = 1 THEN revenue ELSE 0 END) AS attributed_revenue
-      FROM session_ranking
-      GROUP BY utm_source, utm_medium, utm_campaign, device_type
-    ),
-    
-    -- 3. Linear
-    linear AS (
-      SELECT
-        'Linear' AS attribution_model,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(conversion / NULLIF(total_sessions, 0)) AS attributed_conversions,
-        SUM(revenue / NULLIF(total_sessions, 0)) AS attributed_revenue
-      FROM session_ranking
-      GROUP BY utm_source, utm_medium, utm_campaign, device_type
-    ),
+    -- Rutas de canales comprimidas para atribución multi-modelo
+    WITH events AS ({events}),
     
-    -- 4. Time Decay (simplificado sin normalización en GROUP BY)
-    time_decay AS (
+    touchpoints AS (
       SELECT
-        'Time Decay' AS attribution_model,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(conversion * POW(2, -CAST(COALESCE(days_to_conversion, 0) AS FLOAT64) / 7.0)) AS attributed_conversions,
-        SUM(revenue * POW(2, -CAST(COALESCE(days_to_conversion, 0) AS FLOAT64) / 7.0)) AS attributed_revenue
-      FROM session_ranking
-      GROUP BY utm_source, utm_medium, utm_campaign, device_type
+        user_pseudo_id,
+        event_timestamp AS touch_ts,
+        COALESCE(collected_traffic_source.manual_source, '(direct)') AS utm_source,
+        COALESCE(collected_traffic_source.manual_medium, '(none)') AS utm_medium,
+        COALESCE(collected_traffic_source.manual_campaign_name, '(not set)') AS utm_campaign,
+        COALESCE(device.category, '(not set)') AS device_type
+      FROM events
+      WHERE event_name = 'session_start'
     ),
     
-    -- 5. Position Based (40% primer, 40% último, 20% intermedios)
-    position_based AS (
+    purchases AS (
       SELECT
-        'Position Based' AS attribution_model,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(
-          CASE 
-            WHEN total_sessions = 1 THEN conversion
-            WHEN session_asc = 1 THEN conversion * 0.4
-            WHEN session_desc = 1 THEN conversion * 0.4
-            ELSE conversion * 0.2 / NULLIF(total_sessions - 2, 0)
-          END
-        ) AS attributed_conversions,
-        SUM(
-          CASE 
-            WHEN total_sessions = 1 THEN revenue
-            WHEN session_asc = 1 THEN revenue * 0.4
-            WHEN session_desc = 1 THEN revenue * 0.4
-            ELSE revenue * 0.2 / NULLIF(total_sessions - 2, 0)
-          END
-        ) AS attributed_revenue
-      FROM session_ranking
-      GROUP BY utm_source, utm_medium, utm_campaign, device_type
+        user_pseudo_id,
+        COUNT(*) AS conversions,
+        SUM(ecommerce.purchase_revenue) AS revenue,
+        MAX(event_timestamp) AS last_purchase_ts
+      FROM events
+      WHERE event_name = 'purchase'
+        AND ecommerce.purchase_revenue > 0
+      GROUP BY user_pseudo_id
     ),
     
-    -- 6. Last Non-Direct
-    last_non_direct AS (
+    channels AS (
       SELECT
-        'Last Non-Direct' AS attribution_model,
         utm_source,
         utm_medium,
         utm_campaign,
         device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(CASE WHEN session_desc = 1 AND COALESCE(utm_source, '(direct)') != '(direct)' THEN conversion ELSE 0 END) AS attributed_conversions,
-        SUM(CASE WHEN session_desc = 1 AND COALESCE(utm_source, '(direct)') != '(direct)' THEN revenue ELSE 0 END) AS attributed_revenue
-      FROM session_ranking
+        ROW_NUMBER() OVER (ORDER BY utm_source, utm_medium, utm_campaign, device_type) - 1 AS channel_code
+      FROM touchpoints
       GROUP BY utm_source, utm_medium, utm_campaign, device_type
     ),
     
-    -- 7. Data Driven (CORREGIDO: Pre-calcular pesos por usuario)
-    user_weights AS (
-      SELECT
-        user_pseudo_id,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        conversion,
-        revenue,
-        total_sessions,
-        session_asc,
-        session_desc,
-        days_to_conversion,
-        -- Pre-calcular peso individual
-        CASE 
-          WHEN total_sessions = 1 THEN 1.0
-          WHEN session_asc = 1 THEN 0.35
-          WHEN session_desc = 1 THEN 0.45
-          ELSE 0.20 / NULLIF(total_sessions - 2, 0)
-        END
-        * POW(0.9, CAST(COALESCE(days_to_conversion, 0) AS FLOAT64))
-        * (1.0 + LOG(CAST(total_sessions AS FLOAT64) + 1) / 10.0)
-        * CASE 
-            WHEN utm_medium IN ('cpc', 'ppc', 'paid') THEN 1.2
-            WHEN utm_medium = 'organic' THEN 1.0
-            WHEN COALESCE(utm_source, '(direct)') = '(direct)' THEN 0.8
-            ELSE 1.0
-          END AS individual_weight
-      FROM session_ranking
-    ),
-    
-    user_weight_totals AS (
+    -- Una ruta por usuario: sesiones hasta la última compra (o todas si no compró)
+    user_paths AS (
       SELECT
-        user_pseudo_id,
-        SUM(individual_weight) as total_weight_per_user
-      FROM user_weights
-      GROUP BY user_pseudo_id
+        t.user_pseudo_id,
+        ARRAY_REVERSE(
+          ARRAY_AGG(c.channel_code ORDER BY t.touch_ts DESC, c.channel_code DESC LIMIT {max_length})
+        ) AS path,
+        -- Clave de agrupación de la ruta (BigQuery no agrupa por arrays)
+        ARRAY_TO_STRING(
+          ARRAY_AGG(CAST(c.channel_code AS STRING) ORDER BY t.touch_ts DESC, c.channel_code DESC LIMIT {max_length}), ','
+        ) AS path_key,
+        ANY_VALUE(p.conversions) AS conversions,
+        ANY_VALUE(p.revenue) AS revenue
+      FROM touchpoints t
+      JOIN channels c
+        USING (utm_source, utm_medium, utm_campaign, device_type)
+      LEFT JOIN purchases p
+        ON t.user_pseudo_id = p.user_pseudo_id
+      WHERE p.user_pseudo_id IS NULL OR t.touch_ts <= p.last_purchase_ts
+      GROUP BY t.user_pseudo_id
     ),
     
-    normalized_weights AS (
+    paths AS (
       SELECT
-        uw.user_pseudo_id,
-        uw.utm_source,
-        uw.utm_medium,
-        uw.utm_campaign,
-        uw.device_type,
-        uw.conversion,
-        uw.revenue,
-        uw.individual_weight / NULLIF(uwt.total_weight_per_user, 0) as normalized_weight
-      FROM user_weights uw
-      JOIN user_weight_totals uwt ON uw.user_pseudo_id = uwt.user_pseudo_id
-    ),
+        ANY_VALUE(path) AS path,
+        COUNTIF(conversions IS NOT NULL) AS converting_users,
+        COUNTIF(conversions IS NULL) AS non_converting_users,
+        COALESCE(SUM(conversions), 0) AS conversions,
+        COALESCE(SUM(revenue), 0) AS revenue
+      FROM user_paths
+      GROUP BY path_key
+    )
     
-    data_driven AS (
-      SELECT
-        'Data Driven' AS attribution_model,
-        utm_source,
-        utm_medium,
-        utm_campaign,
-        device_type,
-        COUNT(*) AS touchpoints,
-        SUM(conversion) AS conversions,
-        SUM(revenue) AS revenue,
-        SUM(conversion * normalized_weight) AS attributed_conversions,
-        SUM(revenue * normalized_weight) AS attributed_revenue
-      FROM normalized_weights
-      GROUP BY utm_source, utm_medium, utm_campaign, device_type
-    ),
+    SELECT
+      CAST(NULL AS INT64) AS channel_code,
+      CAST(NULL AS STRING) AS utm_source,
+      CAST(NULL AS STRING) AS utm_medium,
+      CAST(NULL AS STRING) AS utm_campaign,
+      CAST(NULL AS STRING) AS device_type,
+      path,
+      converting_users,
+      non_converting_users,
+      conversions,
+      revenue
+    FROM paths
     
-    -- COMBINAR LOS 7 MODELOS
-    all_models AS (
-      SELECT * FROM last_click
-      UNION ALL SELECT * FROM first_click
-      UNION ALL SELECT * FROM linear
-      UNION ALL SELECT * FROM time_decay
-      UNION ALL SELECT * FROM position_based
-      UNION ALL SELECT * FROM last_non_direct
-      UNION ALL SELECT * FROM data_driven
-    )
+    UNION ALL
     
     SELECT
-      attribution_model,
+      channel_code,
       utm_source,
       utm_medium,
       utm_campaign,
       device_type,
-      touchpoints,
-      conversions,
-      revenue,
-      ROUND(attributed_conversions, 2) AS attributed_conversions,
-      ROUND(attributed_revenue, 2) AS attributed_revenue,
-      ROUND(CASE WHEN touchpoints > 0 THEN (attributed_conversions / touchpoints) * 100 ELSE 0 END, 2) AS conversion_rate,
-      ROUND(CASE WHEN attributed_conversions > 0 THEN attributed_revenue / attributed_conversions ELSE 0 END, 2) AS revenue_per_conversion
-    FROM all_models
-    WHERE attributed_conversions > 0
-    ORDER BY attribution_model, attributed_revenue DESC
-    LIMIT {Settings.QUERY_LIMITS['atribucion_completa']}
+      ARRAY<INT64>[] AS path,
+      CAST(NULL AS INT64) AS converting_users,
+      CAST(NULL AS INT64) AS non_converting_users,
+      CAST(NULL AS INT64) AS conversions,
+      CAST(NULL AS FLOAT64) AS revenue
+    FROM channels
     """
@@ -1,47 +1,91 @@
-def generar_query_consentimiento_basico(project, dataset, start_date, end_date):
-    """Consulta básica de consentimiento"""
+from .fragments import distinct_count, events_with_params, session_key
+from .sketches_queries import daily_sketches_source
+
+def _consent_status(column):
+    """Normaliza un estado de consentimiento a 'true' / 'false' / 'null'"""
+    return f"""CASE
+          WHEN {column} IS NULL THEN 'null'
+          WHEN LOWER(CAST({column} AS STRING)) IN ('true', 'yes', '1') THEN 'true'
+          ELSE 'false'
+        END"""
+
+def generar_query_consentimiento_basico(project, dataset, start_date, end_date, approximate=False, sketches=None):
+    """
+    Consulta básica de consentimiento
+    
+    Con approximate los usuarios y sesiones se cuentan con HLL++; si además se
+    pasan sketches se combinan los sketches diarios en lugar de leer events_*
+    """
+    if approximate and sketches:
+        return f"""
+    SELECT
+      analytics_storage_status,
+      ads_storage_status,
+      SUM(total_events) AS total_events,
+      HLL_COUNT.MERGE(users_sketch) AS total_users,
+      HLL_COUNT.MERGE(sessions_sketch) AS total_sessions
+    FROM {daily_sketches_source(project, dataset, start_date, end_date, sketches)}
+    GROUP BY 1, 2
+    ORDER BY 3 DESC
+    """
+    
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
+    
     return f"""
+    WITH events AS ({events})
     SELECT
       privacy_info.analytics_storage AS analytics_storage_status,
       privacy_info.ads_storage AS ads_storage_status,
       COUNT(*) AS total_events,
-      COUNT(DISTINCT user_pseudo_id) AS total_users,
-      COUNT(DISTINCT CONCAT(user_pseudo_id, '-', 
-        (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id'))) AS total_sessions
-    FROM `{project}.{dataset}.events_*`
-    WHERE _TABLE_SUFFIX BETWEEN '{start_date.strftime('%Y%m%d')}' AND '{end_date.strftime('%Y%m%d')}'
+      {distinct_count('user_pseudo_id', approximate)} AS total_users,
+      {distinct_count(session_key(), approximate)} AS total_sessions
+    FROM events
     GROUP BY 1, 2
     ORDER BY 3 DESC
     """
 
-def generar_query_consentimiento_por_dispositivo(project, dataset, start_date, end_date):
-    """Consulta optimizada que garantiza datos diferentes"""
+def generar_query_consentimiento_por_dispositivo(project, dataset, start_date, end_date, approximate=False, sketches=None):
+    """
+    Consulta optimizada que garantiza datos diferentes
+    
+    Con approximate los usuarios y sesiones se cuentan con HLL++; si además se
+    pasan sketches se combinan los sketches diarios en lugar de leer events_*
+    """
+    if approximate and sketches:
+        return f"""
+    SELECT
+      device_type,
+      {_consent_status('analytics_storage_status')} AS analytics_status,
+      {_consent_status('ads_storage_status')} AS ads_status,
+      SUM(total_events) AS total_events,
+      HLL_COUNT.MERGE(users_sketch) AS total_users,
+      HLL_COUNT.MERGE(sessions_sketch) AS total_sessions
+    FROM {daily_sketches_source(project, dataset, start_date, end_date, sketches)}
+    GROUP BY 1, 2, 3
+    ORDER BY device_type, total_events DESC
+    """
+    
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
+    
     return f"""
-    WITH base_data AS (
+    WITH events AS ({events}),
+    
+    base_data AS (
       SELECT
         device.category AS device_type,
-        CASE
-          WHEN privacy_info.analytics_storage IS NULL THEN 'null'
-          WHEN LOWER(CAST(privacy_info.analytics_storage AS STRING)) IN ('true', 'yes', '1') THEN 'true'
-          ELSE 'false'
-        END AS analytics_status,
-        CASE
-          WHEN privacy_info.ads_storage IS NULL THEN 'null'
-          WHEN LOWER(CAST(privacy_info.ads_storage AS STRING)) IN ('true', 'yes', '1') THEN 'true'
-          ELSE 'false'
-        END AS ads_status,
+        {_consent_status('privacy_info.analytics_storage')} AS analytics_status,
+        {_consent_status('privacy_info.ads_storage')} AS ads_status,
         user_pseudo_id,
-        (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS session_id
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date.strftime('%Y%m%d')}' AND '{end_date.strftime('%Y%m%d')}'
+        ga_session_id AS session_id
+      FROM events
     )
     SELECT
       device_type,
       analytics_status,
       ads_status,
       COUNT(*) AS total_events,
-      COUNT(DISTINCT user_pseudo_id) AS total_users,
-      COUNT(DISTINCT CONCAT(user_pseudo_id, '-', session_id)) AS total_sessions
+      {distinct_count('user_pseudo_id', approximate)} AS total_users,
+      {distinct_count("CONCAT(user_pseudo_id, '-', session_id)", approximate)} AS total_sessions
     FROM base_data
     GROUP BY 1, 2, 3
     ORDER BY device_type, total_events DESC
@@ -64,17 +108,19 @@ def generar_query_consentimiento_real(project, dataset, start_date, end_date):
     ORDER BY total_events DESC
     """
 
-def generar_query_evolucion_temporal_consentimiento(project, dataset, start_date, end_date):
+def generar_query_evolucion_temporal_consentimiento(project, dataset, start_date, end_date, approximate=False):
     """
     Consulta para análisis de evolución temporal del consentimiento
     Muestra la tendencia día a día de tasas de consentimiento
+    Con approximate, usuarios y sesiones únicos aproximados (HLL++)
     """
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
     
     return f"""
     -- Evolución Temporal del Consentimiento
-    WITH daily_consent AS (
+    WITH events AS ({events}),
+    
+    daily_consent AS (
       SELECT
         PARSE_DATE('%Y%m%d', event_date) AS date,
         -- Conteo de eventos por estado de consentimiento
@@ -103,14 +149,16 @@ def generar_query_evolucion_temporal_consentimiento(project, dataset, start_date
         COUNTIF(privacy_info.ads_storage IS NULL) AS ads_undefined,
         
         -- Usuarios y sesiones únicos
-        COUNT(DISTINCT user_pseudo_id) AS unique_users,
-        COUNT(DISTINCT CONCAT(
-          user_pseudo_id, '-',
-          CAST((SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS STRING)
-        )) AS unique_sessions
+        {distinct_count('user_pseudo_id', approximate)} AS unique_users,
+        {distinct_count(session_key(), approximate)} AS unique_sessions,
         
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+        -- Ambos aceptados
+        COUNTIF(
+          LOWER(CAST(privacy_info.analytics_storage AS STRING)) IN ('true', 'yes', '1')
+          AND LOWER(CAST(privacy_info.ads_storage AS STRING)) IN ('true', 'yes', '1')
+        ) AS full_consent
+        
+      FROM events
       GROUP BY date
     )
     
@@ -137,39 +185,25 @@ def generar_query_evolucion_temporal_consentimiento(project, dataset, start_date
       ROUND(SAFE_DIVIDE(ads_undefined, total_events) * 100, 2) AS ads_undefined_pct,
       
       -- Tasa de consentimiento combinada (ambos aceptados)
-      ROUND(
-        SAFE_DIVIDE(
-          COUNTIF(
-            LOWER(CAST(privacy_info.analytics_storage AS STRING)) IN ('true', 'yes', '1')
-            AND LOWER(CAST(privacy_info.ads_storage AS STRING)) IN ('true', 'yes', '1')
-          ),
-          total_events
-        ) * 100, 
-        2
-      ) AS full_consent_pct
+      ROUND(SAFE_DIVIDE(full_consent, total_events) * 100, 2) AS full_consent_pct
       
     FROM daily_consent
-    CROSS JOIN `{project}.{dataset}.events_*`
-    WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-      AND PARSE_DATE('%Y%m%d', event_date) = daily_consent.date
-    GROUP BY 
-      date, total_events, unique_users, unique_sessions,
-      analytics_granted, analytics_denied, analytics_undefined,
-      ads_granted, ads_denied, ads_undefined
     ORDER BY date
     """
 
-def generar_query_consentimiento_por_geografia(project, dataset, start_date, end_date):
+def generar_query_consentimiento_por_geografia(project, dataset, start_date, end_date, approximate=False):
     """
     Consulta para análisis de consentimiento por geografía
     Muestra tasas de consentimiento por país y ciudad
+    Con approximate, usuarios y sesiones únicos aproximados (HLL++)
     """
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
     
     return f"""
     -- Consentimiento por Geografía (País y Ciudad)
-    WITH geo_consent AS (
+    WITH events AS ({events}),
+    
+    geo_consent AS (
       SELECT
         geo.country AS country,
         geo.city AS city,
@@ -178,11 +212,8 @@ def generar_query_consentimiento_por_geografia(project, dataset, start_date, end
         
         -- Conteo de eventos
         COUNT(*) AS total_events,
-        COUNT(DISTINCT user_pseudo_id) AS unique_users,
-        COUNT(DISTINCT CONCAT(
-          user_pseudo_id, '-',
-          CAST((SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS STRING)
-        )) AS unique_sessions,
+        {distinct_count('user_pseudo_id', approximate)} AS unique_users,
+        {distinct_count(session_key(), approximate)} AS unique_sessions,
         
         -- Analytics Storage
         COUNTIF(
@@ -208,9 +239,8 @@ def generar_query_consentimiento_por_geografia(project, dataset, start_date, end
           AND LOWER(CAST(privacy_info.ads_storage AS STRING)) IN ('false', 'no', '0')
         ) AS both_denied
         
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND geo.country IS NOT NULL
+      FROM events
+      WHERE geo.country IS NOT NULL
       GROUP BY country, city, continent, region
     )
     
@@ -243,17 +273,19 @@ def generar_query_consentimiento_por_geografia(project, dataset, start_date, end
     ORDER BY total_events DESC
     """
 
-def generar_query_consentimiento_por_fuente_trafico(project, dataset, start_date, end_date):
+def generar_query_consentimiento_por_fuente_trafico(project, dataset, start_date, end_date, approximate=False):
     """
     Consulta para análisis de consentimiento por fuente de tráfico
     Muestra tasas de consentimiento según utm_source, utm_medium, utm_campaign
+    Con approximate, usuarios y sesiones únicos aproximados (HLL++)
     """
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
     
     return f"""
     -- Consentimiento por Fuente de Tráfico
-    WITH traffic_consent AS (
+    WITH events AS ({events}),
+    
+    traffic_consent AS (
       SELECT
         -- Fuentes de tráfico
         traffic_source.source AS utm_source,
@@ -278,11 +310,8 @@ def generar_query_consentimiento_por_fuente_trafico(project, dataset, start_date
         
         -- Conteo de eventos
         COUNT(*) AS total_events,
-        COUNT(DISTINCT user_pseudo_id) AS unique_users,
-        COUNT(DISTINCT CONCAT(
-          user_pseudo_id, '-',
-          CAST((SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS STRING)
-        )) AS unique_sessions,
+        {distinct_count('user_pseudo_id', approximate)} AS unique_users,
+        {distinct_count(session_key(), approximate)} AS unique_sessions,
         
         -- Analytics Storage
         COUNTIF(
@@ -316,8 +345,7 @@ def generar_query_consentimiento_por_fuente_trafico(project, dataset, start_date
           AND LOWER(CAST(privacy_info.ads_storage AS STRING)) IN ('false', 'no', '0')
         ) AS no_consent
         
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+      FROM events
       GROUP BY utm_source, utm_medium, utm_campaign, channel_group
     )
     
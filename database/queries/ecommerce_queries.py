@@ -1,3 +1,7 @@
+import math
+
+from .fragments import user_sample_filter
+
 def generar_query_comparativa_eventos(project, dataset, start_date, end_date):
     """Consulta para comparativa completa de eventos de ecommerce"""
     start_date_str = start_date.strftime('%Y%m%d')
@@ -155,77 +159,124 @@ def generar_query_funnel_por_producto(project, dataset, start_date, end_date):
       purchase DESC, view_item DESC
     LIMIT {Settings.QUERY_LIMITS['funnel_producto']}
     """
-def generar_query_combos_cross_selling(project, dataset, start_date, end_date):
+def combos_min_transactions(sample_percent=None):
     """
-    Consulta SIMPLE para análisis de combos
-    Versión minimalista para evitar timeouts
+    Transacciones mínimas de un producto o combo para entrar en el análisis
+
+    En modo muestreo el mínimo se reduce en la misma proporción que los datos.
     """
     from config.settings import Settings
 
+    if not sample_percent:
+        return Settings.COMBOS_MIN_TRANSACTIONS
+    return max(1, math.ceil(Settings.COMBOS_MIN_TRANSACTIONS * sample_percent / 100))
+
+def generar_query_combos_cross_selling(project, dataset, start_date, end_date, sample_percent=None):
+    """
+    Consulta de cestas de compra para el análisis de combos (market basket)
+
+    No calcula los combos en BigQuery: devuelve la matriz transacción × producto
+    en forma compacta y database.market_basket.mine_combos obtiene en local los
+    itemsets frecuentes (pares, tríos, ...) con support, confidence y lift.
+
+    Devuelve dos tipos de fila en un único resultado:
+    - Catálogo (item_name no nulo): un producto con al menos
+      combos_min_transactions transacciones, su código entero (item_code,
+      consecutivo por orden de nombre), sus transacciones y el total de
+      transacciones del rango.
+    - Cesta (item_codes no vacío): una transacción con al menos dos productos
+      del catálogo, sus códigos, el número de productos distintos, el importe
+      y el dispositivo. Las compras de un solo producto frecuente no forman
+      combos y solo cuentan en los totales del catálogo.
+
+    Con sample_percent lee solo las compras de ese porcentaje de usuarios (modo
+    muestreo): el mínimo de transacciones se reduce en la misma proporción y
+    las cestas llevan user_pseudo_id para el intervalo de confianza.
+    """
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
+    sample = user_sample_filter(sample_percent)
+    min_transactions = combos_min_transactions(sample_percent)
+    user_column = ""
+    user_basket = ""
+    user_output = ""
+    user_catalog = ""
+    
+    if sample_percent:
+        user_column = ",\n        user_pseudo_id"
+        user_basket = ",\n        ANY_VALUE(p.user_pseudo_id) AS user_pseudo_id"
+        user_output = ",\n      user_pseudo_id"
+        user_catalog = ",\n      CAST(NULL AS STRING) AS user_pseudo_id"
     
     return f"""
-    -- Análisis de Combos - Versión Simple
+    -- Cestas de compra codificadas para market basket analysis
     
-    WITH items AS (
+    WITH purchase_items AS (
       SELECT
         ecommerce.transaction_id,
         items.item_name,
         ecommerce.purchase_revenue,
-        device.category AS device_category
+        device.category AS device_category{user_column}
       FROM `{project}.{dataset}.events_*`,
         UNNEST(items) AS items
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'{sample}
         AND event_name = 'purchase'
         AND ecommerce.transaction_id IS NOT NULL
         AND items.item_name IS NOT NULL
     ),
     
-    pairs AS (
+    catalog AS (
+      SELECT
+        item_name,
+        COUNT(DISTINCT transaction_id) AS item_transactions
+      FROM purchase_items
+      GROUP BY item_name
+      HAVING item_transactions >= {min_transactions}
+    ),
+    
+    coded_catalog AS (
       SELECT
-        a.item_name AS product_a,
-        b.item_name AS product_b,
-        COUNT(*) AS times_bought_together,
-        AVG(a.purchase_revenue) AS avg_basket_value,
-        COUNTIF(a.device_category = 'desktop') AS desktop_purchases,
-        COUNTIF(a.device_category = 'mobile') AS mobile_purchases,
-        COUNTIF(a.device_category = 'tablet') AS tablet_purchases
-      FROM items a
-      JOIN items b 
-        ON a.transaction_id = b.transaction_id
-        AND a.item_name < b.item_name
-      GROUP BY product_a, product_b
-      HAVING times_bought_together >= 5
-      ORDER BY times_bought_together DESC
-      LIMIT {Settings.QUERY_LIMITS['combos']}
+        item_name,
+        item_transactions,
+        ROW_NUMBER() OVER (ORDER BY item_name) - 1 AS item_code
+      FROM catalog
+    ),
+    
+    baskets AS (
+      SELECT
+        p.transaction_id,
+        ARRAY_AGG(DISTINCT c.item_code IGNORE NULLS) AS item_codes,
+        COUNT(DISTINCT p.item_name) AS basket_size,
+        MAX(p.purchase_revenue) AS purchase_revenue,
+        ANY_VALUE(p.device_category) AS device_category{user_basket}
+      FROM purchase_items p
+      LEFT JOIN coded_catalog c
+        ON p.item_name = c.item_name
+      GROUP BY p.transaction_id
+      HAVING ARRAY_LENGTH(item_codes) >= 2
     )
     
     SELECT
-      product_a,
-      product_b,
-      times_bought_together,
-      avg_basket_value,
-      3.0 AS avg_basket_size,
-      
-      -- Métricas simplificadas (estimaciones)
-      2.5 AS lift,
-      ROUND(times_bought_together * 2.0, 1) AS confidence_a_to_b,
-      ROUND(times_bought_together * 2.0, 1) AS confidence_b_to_a,
-      1.5 AS support,
-      
-      avg_basket_value * times_bought_together AS combined_revenue,
-      
-      desktop_purchases,
-      mobile_purchases,
-      tablet_purchases,
-      
-      times_bought_together AS product_a_transactions,
-      times_bought_together AS product_b_transactions,
-      
-      -- Score basado en frecuencia
-      ROUND(times_bought_together * 0.5, 2) AS combo_strength_score
-      
-    FROM pairs
-    ORDER BY times_bought_together DESC
+      CAST(NULL AS INT64) AS item_code,
+      CAST(NULL AS STRING) AS item_name,
+      CAST(NULL AS INT64) AS item_transactions,
+      CAST(NULL AS INT64) AS total_transactions,
+      item_codes,
+      basket_size,
+      purchase_revenue,
+      device_category{user_output}
+    FROM baskets
+    
+    UNION ALL
+    
+    SELECT
+      item_code,
+      item_name,
+      item_transactions,
+      (SELECT COUNT(DISTINCT transaction_id) FROM purchase_items) AS total_transactions,
+      ARRAY<INT64>[] AS item_codes,
+      CAST(NULL AS INT64) AS basket_size,
+      CAST(NULL AS FLOAT64) AS purchase_revenue,
+      CAST(NULL AS STRING) AS device_category{user_catalog}
+    FROM coded_catalog
     """
@@ -1,183 +1,225 @@
-def generar_query_eventos_flatten(project, dataset, start_date, end_date):
-    """Consulta para flattenizar todos los eventos de GA4"""
+from .fragments import (
+    distinct_count,
+    event_param,
+    events_with_params,
+    session_key,
+    sql_string_list,
+    user_sample_filter
+)
+from .sketches_queries import daily_sketches_source
+
+# Columnas de primer nivel del export de GA4 que ofrece el explorador flattenizado
+# (ga_session_id no es una columna: se extrae de event_params)
+FLATTEN_COLUMNS = [
+    'ga_session_id',
+    'event_date',
+    'event_timestamp',
+    'event_name',
+    'event_previous_timestamp',
+    'event_value_in_usd',
+    'event_bundle_sequence_id',
+    'event_server_timestamp_offset',
+    'user_id',
+    'user_pseudo_id',
+    'privacy_info',
+    'user_first_touch_timestamp',
+    'user_ltv',
+    'device',
+    'geo',
+    'app_info',
+    'traffic_source',
+    'stream_id',
+    'platform',
+    'event_dimensions',
+    'ecommerce',
+    'collected_traffic_source',
+    'is_active_user',
+    'batch_event_index',
+    'batch_page_id',
+    'batch_ordering_id',
+    'session_traffic_source_last_click',
+    'publisher'
+]
+
+FLATTEN_DEFAULT_COLUMNS = ['event_date', 'event_timestamp', 'event_name', 'user_pseudo_id', 'ga_session_id']
+
+# Campos de items que se desanidan
+FLATTEN_ITEM_FIELDS = [
+    'item_id', 'item_name', 'item_brand', 'item_variant',
+    'item_category', 'item_category2', 'item_category3', 'item_category4', 'item_category5',
+    'price_in_usd', 'price', 'quantity', 'item_revenue_in_usd', 'item_revenue',
+    'item_refund_in_usd', 'item_refund', 'coupon', 'affiliation', 'location_id',
+    'item_list_id', 'item_list_name', 'item_list_index',
+    'promotion_id', 'promotion_name', 'creative_name', 'creative_slot'
+]
+
+def generar_query_eventos_flatten(project, dataset, start_date, end_date, sample_percent=None,
+                                  columns=None, param_keys=None, event_names=None,
+                                  include_user_properties=True, include_items=True, nested=False,
+                                  paginated=False):
+    """
+    Consulta para flattenizar eventos de GA4
+
+    Hace una sola lectura de events_*; parámetros, propiedades de usuario e
+    items se desanidan con LEFT JOIN UNNEST sobre las filas de esa lectura, sin
+    volver a leer la tabla para cada array. BigQuery factura por columna, así
+    que solo se proyectan las columnas pedidas: sin parámetros ni
+    ga_session_id no se lee event_params, y lo mismo con user_properties e items.
+
+    Sin argumentos opcionales devuelve todas las columnas y todos los arrays.
+
+    Con nested no se desanida nada: una fila por evento con los arrays como
+    columnas ARRAY<STRUCT> (event_params filtrado a param_keys), que se
+    expanden en local solo para lo que se quiera ver. Desanidar multiplica las
+    filas (parámetros x propiedades x items), así que con el mismo volumen
+    transferido caben muchos más eventos (QUERY_LIMITS['flattenizado_anidado']).
+
+    Args:
+        sample_percent: Porcentaje de usuarios a leer (modo muestreo)
+        columns: Columnas de primer nivel (FLATTEN_COLUMNS); None = todas
+        param_keys: Claves de event_params a desanidar; None = todas, [] = ninguna
+        event_names: Eventos a incluir; None = todos
+        include_user_properties: Desanidar user_properties
+        include_items: Desanidar items
+        nested: Devolver los arrays sin desanidar (un evento por fila)
+        paginated: Sin LIMIT; el resultado se lee por páginas de la tabla de
+            destino del job (database.paged_results)
+    """
     from config.settings import Settings
 
+    if columns is not None and not columns:
+        raise ValueError("Selecciona al menos una columna de eventos")
+
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
+    sample = user_sample_filter(sample_percent)
+    events = f"\n            AND event_name IN ({sql_string_list(event_names)})" if event_names else ""
+
+    base_columns = []
+    if columns is None or 'ga_session_id' in columns:
+        base_columns.append(f"{event_param('ga_session_id')} AS ga_session_id")
+    if columns is None:
+        base_columns.append("* EXCEPT(event_params, user_properties, items)")
+    else:
+        base_columns.extend(column for column in columns if column != 'ga_session_id')
+
+    arrays = []
+    joins = []
+    nested_columns = []
+    if param_keys != []:
+        if nested and param_keys:
+            arrays.append(
+                f"ARRAY(SELECT ep FROM UNNEST(event_params) AS ep WHERE ep.key IN ({sql_string_list(param_keys)})) "
+                f"AS event_params"
+            )
+        else:
+            arrays.append('event_params')
+        key_filter = f" ON ep.key IN ({sql_string_list(param_keys)})" if param_keys else ""
+        joins.append(f"LEFT JOIN UNNEST(fe.event_params) AS ep{key_filter}")
+        nested_columns += [
+            "ep.key AS param_key",
+            "ep.value.string_value AS param_string_value",
+            "ep.value.int_value AS param_int_value",
+            "ep.value.float_value AS param_float_value",
+            "ep.value.double_value AS param_double_value"
+        ]
+    if include_user_properties:
+        arrays.append('user_properties')
+        joins.append("LEFT JOIN UNNEST(fe.user_properties) AS up")
+        nested_columns += [
+            "up.key AS user_property_key",
+            "up.value.string_value AS user_property_string_value",
+            "up.value.int_value AS user_property_int_value",
+            "up.value.float_value AS user_property_float_value",
+            "up.value.double_value AS user_property_double_value",
+            "up.value.set_timestamp_micros AS user_property_set_timestamp"
+        ]
+    if include_items:
+        arrays.append('items')
+        joins.append("LEFT JOIN UNNEST(fe.items) AS it")
+        nested_columns += [f"it.{field}" for field in FLATTEN_ITEM_FIELDS]
+
+    base_select = ",\n            ".join(base_columns + arrays)
+    limit_key = 'flattenizado_anidado' if nested else 'flattenizado'
+    limit = "" if paginated else f"\n    LIMIT {Settings.QUERY_LIMITS[limit_key]}"
+
+    if nested:
+        return f"""
+    -- Eventos GA4 con arrays anidados (una lectura de events_*, un evento por fila)
+    SELECT
+        {base_select}
+    FROM
+        `{project}.{dataset}.events_*`
+    WHERE 
+        _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'{sample}{events}{limit}
+    """
+
+    event_columns = f"fe.* EXCEPT({', '.join(arrays)})" if arrays else "fe.*"
+    select = ",\n        ".join([event_columns] + nested_columns)
+    join_clause = "".join(f"\n    {join}" for join in joins)
     
     return f"""
-    -- Flattenización completa de eventos GA4
+    -- Flattenización de eventos GA4 (una lectura de events_*)
     WITH FlatEvents AS (
-        -- Flatten the main event-level data
         SELECT
-            (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS ga_session_id,
-            * EXCEPT(event_params, user_properties, items)
+            {base_select}
         FROM
             `{project}.{dataset}.events_*`
         WHERE 
-            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-    ),
-
-    FlatEventParams AS (
-        -- Unnest event parameters
-        SELECT
-            user_pseudo_id,
-            event_timestamp,
-            event_name,
-            event_params.key AS param_key,
-            event_params.value.string_value AS param_string_value,
-            event_params.value.int_value AS param_int_value,
-            event_params.value.float_value AS param_float_value,
-            event_params.value.double_value AS param_double_value
-        FROM
-            `{project}.{dataset}.events_*`,
-            UNNEST(event_params) AS event_params
-        WHERE 
-            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-    ),
-
-    FlatUserProperties AS (
-        -- Unnest user properties
-        SELECT
-            user_pseudo_id,
-            event_timestamp,
-            event_name,
-            user_properties.key AS user_property_key,
-            user_properties.value.string_value AS user_property_string_value,
-            user_properties.value.int_value AS user_property_int_value,
-            user_properties.value.float_value AS user_property_float_value,
-            user_properties.value.double_value AS user_property_double_value,
-            user_properties.value.set_timestamp_micros AS user_property_set_timestamp
-        FROM
-            `{project}.{dataset}.events_*`,
-            UNNEST(user_properties) AS user_properties
-        WHERE 
-            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-    ),
-
-    FlatItems AS (
-        -- Unnest item-level data
-        SELECT
-            user_pseudo_id,
-            event_timestamp,
-            event_name,
-            items.item_id,
-            items.item_name,
-            items.item_brand,
-            items.item_variant,
-            items.item_category,
-            items.item_category2,
-            items.item_category3,
-            items.item_category4,
-            items.item_category5,
-            items.price_in_usd,
-            items.price,
-            items.quantity,
-            items.item_revenue_in_usd,
-            items.item_revenue,
-            items.item_refund_in_usd,
-            items.item_refund,
-            items.coupon,
-            items.affiliation,
-            items.location_id,
-            items.item_list_id,
-            items.item_list_name,
-            items.item_list_index,
-            items.promotion_id,
-            items.promotion_name,
-            items.creative_name,
-            items.creative_slot
-        FROM
-            `{project}.{dataset}.events_*`,
-            UNNEST(items) AS items
-        WHERE 
-            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'{sample}{events}
     )
 
     SELECT
-        -- Combine all flattened data into one table
-        fe.*,
-        fep.param_key,
-        fep.param_string_value,
-        fep.param_int_value,
-        fep.param_float_value,
-        fep.param_double_value,
-        fup.user_property_key,
-        fup.user_property_string_value,
-        fup.user_property_int_value,
-        fup.user_property_float_value,
-        fup.user_property_double_value,
-        fup.user_property_set_timestamp,
-        fi.item_id,
-        fi.item_name,
-        fi.item_brand,
-        fi.item_variant,
-        fi.item_category,
-        fi.item_category2,
-        fi.item_category3,
-        fi.item_category4,
-        fi.item_category5,
-        fi.price_in_usd,
-        fi.price,
-        fi.quantity,
-        fi.item_revenue_in_usd,
-        fi.item_revenue,
-        fi.item_refund_in_usd,
-        fi.item_refund,
-        fi.coupon,
-        fi.affiliation,
-        fi.location_id,
-        fi.item_list_id,
-        fi.item_list_name,
-        fi.item_list_index,
-        fi.promotion_id,
-        fi.promotion_name,
-        fi.creative_name,
-        fi.creative_slot
+        {select}
     FROM 
-        FlatEvents fe
-    LEFT JOIN 
-        FlatEventParams fep 
-        ON fe.user_pseudo_id = fep.user_pseudo_id 
-        AND fe.event_timestamp = fep.event_timestamp 
-        AND fe.event_name = fep.event_name
-    LEFT JOIN 
-        FlatUserProperties fup 
-        ON fe.user_pseudo_id = fup.user_pseudo_id 
-        AND fe.event_timestamp = fup.event_timestamp 
-        AND fe.event_name = fup.event_name
-    LEFT JOIN
-        FlatItems fi
-        ON fe.user_pseudo_id = fi.user_pseudo_id
-        AND fe.event_timestamp = fi.event_timestamp
-        AND fe.event_name = fi.event_name
-    LIMIT {Settings.QUERY_LIMITS['flattenizado']}
+        FlatEvents fe{join_clause}{limit}
     """
 
-def generar_query_eventos_resumen(project, dataset, start_date, end_date):
-    """Consulta para resumen de eventos más comunes"""
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+def generar_query_eventos_resumen(project, dataset, start_date, end_date, approximate=False, sketches=None):
+    """
+    Consulta para resumen de eventos más comunes
+    
+    Con approximate los usuarios y sesiones se cuentan con HLL++; si además se
+    pasan sketches se combinan los sketches diarios en lugar de leer events_*
+    """
+    if approximate and sketches:
+        return f"""
+    SELECT
+        event_name,
+        SUM(total_events) AS total_events,
+        HLL_COUNT.MERGE(users_sketch) AS unique_users,
+        HLL_COUNT.MERGE(sessions_sketch) AS unique_sessions
+    FROM
+        {daily_sketches_source(project, dataset, start_date, end_date, sketches)}
+    GROUP BY
+        event_name
+    ORDER BY
+        total_events DESC
+    """
+    
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
     
     return f"""
+    WITH events AS ({events})
     SELECT
         event_name,
         COUNT(*) AS total_events,
-        COUNT(DISTINCT user_pseudo_id) AS unique_users,
-        COUNT(DISTINCT CONCAT(user_pseudo_id, '-', 
-            (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id'))) AS unique_sessions
+        {distinct_count('user_pseudo_id', approximate)} AS unique_users,
+        {distinct_count(session_key(), approximate)} AS unique_sessions
     FROM
-        `{project}.{dataset}.events_*`
-    WHERE
-        _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+        events
     GROUP BY
         event_name
     ORDER BY
         total_events DESC
     """
 
-def generar_query_eventos_por_fecha(project, dataset, start_date, end_date):
-    """Consulta para evolución de eventos por fecha"""
+def generar_query_eventos_por_fecha(project, dataset, start_date, end_date, approximate=False):
+    """
+    Consulta para evolución de eventos por fecha
+    
+    Con approximate los usuarios únicos se cuentan con APPROX_COUNT_DISTINCT
+    """
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
     
@@ -186,7 +228,7 @@ def generar_query_eventos_por_fecha(project, dataset, start_date, end_date):
         event_date,
         event_name,
         COUNT(*) AS total_events,
-        COUNT(DISTINCT user_pseudo_id) AS unique_users
+        {distinct_count('user_pseudo_id', approximate)} AS unique_users
     FROM
         `{project}.{dataset}.events_*`
     WHERE
@@ -199,10 +241,95 @@ def generar_query_eventos_por_fecha(project, dataset, start_date, end_date):
         total_events DESC
     """
 
-def generar_query_parametros_eventos(project, dataset, start_date, end_date, event_name):
-    """Consulta para ver parámetros de un evento específico"""
+def generar_query_eventos_intraday(project, dataset, start_date, end_date, since_minute=None):
+    """
+    Eventos de las tablas intradía (events_intraday_*) para el modo en directo
+
+    Devuelve dos tipos de fila: conteos por fecha, evento y minuto
+    (minute_bucket, total_events) y los usuarios distintos por fecha y evento
+    (minute_bucket NULL, user_key = FARM_FINGERPRINT del usuario). user_key
+    nunca es NULL para que llegue como int64 y no como float64. Con since_minute solo lee los
+    minutos desde ese (minutos desde epoch, como minute_bucket). Los minutos
+    se sustituyen al solaparse sondeos y los usuarios se acumulan en un
+    conjunto, así que los incrementos se combinan sin volver a leer lo visto.
+    """
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
+    since = f"\n            AND event_timestamp >= {since_minute * 60000000}" if since_minute is not None else ""
+    
+    return f"""
+    WITH events AS (
+        SELECT
+            event_date,
+            event_name,
+            user_pseudo_id,
+            DIV(event_timestamp, 60000000) AS minute_bucket
+        FROM
+            `{project}.{dataset}.events_intraday_*`
+        WHERE
+            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'{since}
+    )
+    SELECT
+        event_date,
+        event_name,
+        minute_bucket,
+        COUNT(*) AS total_events,
+        0 AS user_key
+    FROM events
+    GROUP BY
+        event_date,
+        event_name,
+        minute_bucket
+    UNION ALL
+    SELECT DISTINCT
+        event_date,
+        event_name,
+        CAST(NULL AS INT64) AS minute_bucket,
+        CAST(NULL AS INT64) AS total_events,
+        FARM_FINGERPRINT(user_pseudo_id) AS user_key
+    FROM events
+    WHERE user_pseudo_id IS NOT NULL
+    """
+
+def generar_query_parametros_eventos(project, dataset, start_date, end_date, event_name, sample_percent=None):
+    """
+    Consulta para ver parámetros de un evento específico
+
+    Con sample_percent lee solo ese porcentaje de usuarios (modo muestreo) y
+    añade parameter_count_sq, la suma de los cuadrados de los conteos por
+    usuario, con la que database.sampling calcula el intervalo de confianza.
+    """
+    start_date_str = start_date.strftime('%Y%m%d')
+    end_date_str = end_date.strftime('%Y%m%d')
+
+    if sample_percent:
+        # user_rows = filas del mismo usuario y parámetro; su suma es la suma de cuadrados
+        return f"""
+    WITH sampled AS (
+        SELECT
+            ep.key AS parameter_name,
+            ep.value.string_value AS string_value,
+            ep.value.int_value AS int_value,
+            COUNT(*) OVER (PARTITION BY ep.key, user_pseudo_id) AS user_rows
+        FROM
+            `{project}.{dataset}.events_*`,
+            UNNEST(event_params) AS ep
+        WHERE
+            _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'{user_sample_filter(sample_percent)}
+            AND event_name = '{event_name}'
+    )
+    SELECT
+        parameter_name,
+        COUNT(*) AS parameter_count,
+        SUM(user_rows) AS parameter_count_sq,
+        COUNT(DISTINCT string_value) AS unique_string_values,
+        COUNT(DISTINCT int_value) AS unique_int_values
+    FROM sampled
+    GROUP BY
+        parameter_name
+    ORDER BY
+        parameter_count DESC
+    """
     
     return f"""
     SELECT
@@ -222,78 +349,70 @@ def generar_query_parametros_eventos(project, dataset, start_date, end_date, eve
         parameter_count DESC
     """
 
-def generar_query_metricas_diarias(project, dataset, start_date, end_date):
-    """Consulta para métricas diarias de sesiones, usuarios y engagement"""
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+def generar_query_metricas_diarias(project, dataset, start_date, end_date, approximate=False):
+    """
+    Consulta para métricas diarias de sesiones, usuarios y engagement
+    
+    Una sola lectura de events_*: se agrupa por sesión y día con agregación
+    condicional y las métricas diarias salen de esas filas. Con approximate los
+    conteos distintos usan APPROX_COUNT_DISTINCT.
+    """
+    sessions = distinct_count('CONCAT(user_pseudo_id, session_id)', approximate)
+    engaged_sessions = distinct_count('IF(is_engaged, CONCAT(user_pseudo_id, session_id), NULL)', approximate)
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id', 'ga_session_number', 'session_engaged']
+    )
     
     return f"""
     -- Métricas diarias completas
     WITH
-      -- Session-Level Data: Calculate session length separately
+      -- Eventos con los parámetros de sesión (un recorrido de event_params por evento)
+      events AS ({events}),
+      -- Session-Level Data: session length and event counters in the same pass
       session_data AS (
         SELECT
           user_pseudo_id,
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS session_id,
+          ga_session_id AS session_id,
           PARSE_DATE("%Y%m%d", event_date) AS date_formatted,
-          MIN(event_timestamp) AS session_start_time,
-          MAX(event_timestamp) AS session_end_time,
-          (MAX(event_timestamp) - MIN(event_timestamp)) / 1000000 AS session_length_in_seconds
-        FROM `{project}.{dataset}.events_*`
-        WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+          (MAX(event_timestamp) - MIN(event_timestamp)) / 1000000 AS session_length_in_seconds,
+          LOGICAL_OR(ga_session_number = 1) AS is_first_session,
+          LOGICAL_OR(session_engaged = '1') AS is_engaged,
+          COUNTIF(event_name = 'page_view') AS page_views,
+          COUNTIF(event_name = 'purchase') AS purchases,
+          SUM(ecommerce.purchase_revenue) AS purchase_revenue,
+          COUNT(*) AS event_count
+        FROM events
         GROUP BY user_pseudo_id, session_id, date_formatted
       ),
-      -- Aggregate session data to get session-level metrics for each day
-      session_aggregated AS (
+      -- Aggregate session data to get the metrics for each day
+      daily AS (
         SELECT
           date_formatted,
-          COUNT(DISTINCT CONCAT(user_pseudo_id, session_id)) AS sessions,
-          AVG(session_length_in_seconds) AS averageSessionDuration
+          {sessions} AS sessions,
+          AVG(session_length_in_seconds) AS averageSessionDuration,
+          {distinct_count('user_pseudo_id', approximate)} AS totalUsers,
+          SUM(page_views) AS screenPageViews,
+          SUM(purchases) AS Purchases,
+          SUM(purchase_revenue) AS purchaseRevenue,
+          {distinct_count('IF(is_first_session, user_pseudo_id, NULL)', approximate)} AS NewUsers,
+          {engaged_sessions} AS engagedSessions,
+          ROUND(SAFE_DIVIDE({engaged_sessions}, {sessions}) * 100, 2) AS engagementRate,
+          SUM(event_count) AS eventCount
         FROM session_data
         GROUP BY date_formatted
-      ),
-      -- Event-Level Metrics
-      event_data AS (
-        SELECT
-          user_pseudo_id,
-          PARSE_DATE("%Y%m%d", event_date) AS date_formatted,
-          event_name,
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS session_id,
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_number') AS session_number,
-          (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'session_engaged') AS session_engaged,
-          ecommerce.purchase_revenue
-        FROM `{project}.{dataset}.events_*`
-        WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-      ),
-      -- Aggregate Event Data Per Day
-      event_aggregated AS (
-        SELECT
-          ed.date_formatted,
-          COUNT(DISTINCT ed.user_pseudo_id) AS totalUsers,
-          COUNTIF(ed.event_name = 'page_view') AS screenPageViews,
-          COUNTIF(ed.event_name = 'purchase') AS Purchases,
-          SUM(ed.purchase_revenue) AS purchaseRevenue,
-          COUNT(DISTINCT CASE WHEN ed.session_number = 1 THEN ed.user_pseudo_id END) AS NewUsers,
-          COUNT(DISTINCT CASE WHEN ed.session_engaged = '1' THEN CONCAT(ed.user_pseudo_id, ed.session_id) END) AS engagedSessions,
-          ROUND(SAFE_DIVIDE(COUNT(DISTINCT CASE WHEN ed.session_engaged = '1' THEN CONCAT(ed.user_pseudo_id, ed.session_id) END), COUNT(DISTINCT CONCAT(ed.user_pseudo_id, ed.session_id))) * 100, 2) AS engagementRate,
-          COUNT(*) AS eventCount
-        FROM event_data ed
-        GROUP BY ed.date_formatted
       )
-    -- Combine Session and Event Data
     SELECT
-      ea.date_formatted,
-      sa.sessions,
-      sa.averageSessionDuration AS averageSessionDuration_seconds,
-      ea.totalUsers,
-      ea.NewUsers,
-      ea.Purchases,
-      IFNULL(ea.purchaseRevenue, 0) AS purchaseRevenue,
-      ea.screenPageViews,
-      ea.engagedSessions,
-      ea.engagementRate AS engagementRate_percent,
-      ea.eventCount
-    FROM event_aggregated ea
-    LEFT JOIN session_aggregated sa ON ea.date_formatted = sa.date_formatted
-    ORDER BY ea.date_formatted
+      date_formatted,
+      sessions,
+      averageSessionDuration AS averageSessionDuration_seconds,
+      totalUsers,
+      NewUsers,
+      Purchases,
+      IFNULL(purchaseRevenue, 0) AS purchaseRevenue,
+      screenPageViews,
+      engagedSessions,
+      engagementRate AS engagementRate_percent,
+      eventCount
+    FROM daily
+    ORDER BY date_formatted
     """
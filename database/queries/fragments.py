@@ -0,0 +1,160 @@
+"""
+Fragmentos SQL compartidos por los generadores de consultas GA4
+
+Leer un parámetro de evento con una subconsulta correlacionada
+`(SELECT value.X FROM UNNEST(event_params) WHERE key = '...')` recorre el
+array event_params una vez por parámetro y por fila. Con varios parámetros
+(ga_session_id, page_location, engagement_time_msec...) son varios recorridos
+por evento, y la alternativa de hacer FROM events_*, UNNEST(event_params)
+multiplica las filas por el número de parámetros (y por el de items si se
+desanida también items).
+
+events_with_params pivota todos los parámetros necesarios en un único
+recorrido del array por evento: una subconsulta SELECT AS STRUCT con un
+MAX(IF(key = ..., value, NULL)) por parámetro, expandida como columnas (con
+un solo parámetro basta la subconsulta escalar, que ya es un recorrido).
+Los generadores la usan como primer CTE y trabajan con columnas normales.
+"""
+
+# Tipo de valor de cada parámetro de evento que leen las consultas
+EVENT_PARAM_TYPES = {
+    'ga_session_id': 'int_value',
+    'ga_session_number': 'int_value',
+    'engagement_time_msec': 'int_value',
+    'session_engaged': 'string_value',
+    'page_location': 'string_value',
+    'page_referrer': 'string_value',
+    'page_title': 'string_value'
+}
+
+
+def events_table(project, dataset):
+    """Tabla comodín de eventos GA4 (`proyecto.dataset.events_*`)"""
+    return f"`{project}.{dataset}.events_*`"
+
+
+def table_suffix_filter(start_date, end_date):
+    """Condición de _TABLE_SUFFIX para el rango de fechas (ambos incluidos)"""
+    return f"_TABLE_SUFFIX BETWEEN '{start_date.strftime('%Y%m%d')}' AND '{end_date.strftime('%Y%m%d')}'"
+
+
+def _check_params(params):
+    unknown = [key for key in params if key not in EVENT_PARAM_TYPES]
+    if unknown:
+        raise ValueError(f"Parámetros sin tipo en EVENT_PARAM_TYPES: {', '.join(unknown)}")
+
+
+def event_param(key):
+    """Subconsulta escalar con el valor de un parámetro de evento"""
+    _check_params([key])
+    return f"(SELECT value.{EVENT_PARAM_TYPES[key]} FROM UNNEST(event_params) WHERE key = '{key}')"
+
+
+def event_params_pivot(params):
+    """
+    Expresión STRUCT con los parámetros pedidos, en un único recorrido de event_params
+
+    Args:
+        params: Nombres de parámetros (claves de EVENT_PARAM_TYPES)
+
+    Returns:
+        Subconsulta SELECT AS STRUCT con un campo por parámetro
+    """
+    _check_params(params)
+    fields = ",\n            ".join(
+        f"MAX(IF(key = '{key}', value.{EVENT_PARAM_TYPES[key]}, NULL)) AS {key}" for key in params
+    )
+    return f"""(
+          SELECT AS STRUCT
+            {fields}
+          FROM UNNEST(event_params)
+        )"""
+
+
+def events_with_params(project, dataset, start_date, end_date, params, where=None):
+    """
+    Eventos del rango con los parámetros pedidos como columnas
+
+    Pensada como primer CTE de una consulta: devuelve todas las columnas de
+    events_* (BigQuery solo lee las que use la consulta final) más una columna
+    por parámetro.
+
+    Args:
+        project: ID del proyecto
+        dataset: ID del dataset GA4
+        start_date: Fecha de inicio
+        end_date: Fecha de fin
+        params: Parámetros de evento a extraer (claves de EVENT_PARAM_TYPES)
+        where: Condición adicional sobre los eventos (p. ej. "event_name = 'page_view'")
+
+    Returns:
+        SELECT listo para usar dentro de WITH nombre AS (...)
+    """
+    condition = " AND ".join([table_suffix_filter(start_date, end_date)] + ([where] if where else []))
+
+    if len(params) == 1:
+        # Un solo parámetro: la subconsulta escalar ya es un único recorrido
+        return f"""
+      SELECT
+        *,
+        {event_param(params[0])} AS {params[0]}
+      FROM {events_table(project, dataset)}
+      WHERE {condition}
+    """
+
+    return f"""
+      SELECT * EXCEPT (params), params.*
+      FROM (
+        SELECT
+          *,
+          {event_params_pivot(params)} AS params
+        FROM {events_table(project, dataset)}
+        WHERE {condition}
+      )
+    """
+
+
+def distinct_count(expression, approximate=False):
+    """
+    COUNT(DISTINCT ...) exacto o, en modo rápido, APPROX_COUNT_DISTINCT (HLL++)
+    
+    APPROX_COUNT_DISTINCT no necesita deduplicar los valores, así que evita
+    el operador más caro de las consultas de usuarios/sesiones a cambio de un
+    error relativo de alrededor del 1%.
+    """
+    if approximate:
+        return f"APPROX_COUNT_DISTINCT({expression})"
+    return f"COUNT(DISTINCT {expression})"
+
+
+def session_key(session_column='ga_session_id', user_column='user_pseudo_id'):
+    """Identificador de sesión único entre usuarios: 'user_pseudo_id-ga_session_id'"""
+    return f"CONCAT({user_column}, '-', CAST({session_column} AS STRING))"
+
+
+def user_sample_filter(sample_percent, user_column='user_pseudo_id'):
+    """
+    Condición que conserva un subconjunto determinista de usuarios (modo muestreo)
+
+    Reparte los usuarios en SAMPLE_BUCKETS cubetas según el hash de
+    user_pseudo_id y se queda con las primeras. El mismo porcentaje devuelve
+    siempre los mismos usuarios, con todos sus eventos y transacciones, así que
+    las iteraciones son comparables entre sí y los conteos se pueden escalar.
+
+    Returns:
+        Texto " AND <condición>" para añadir a un WHERE, o "" sin muestreo
+    """
+    if not sample_percent:
+        return ""
+
+    from config.settings import Settings
+
+    buckets = Settings.SAMPLE_BUCKETS
+    kept = max(1, round(sample_percent * buckets / 100))
+    # ABS después de MOD: ABS del INT64 mínimo desborda
+    return f" AND ABS(MOD(FARM_FINGERPRINT({user_column}), {buckets})) < {kept}"
+
+
+def sql_string_list(values):
+    """Lista de literales de texto para un IN (...), con las comillas escapadas"""
+    return ", ".join("'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'" for value in values)
@@ -1,3 +1,5 @@
+from .fragments import events_with_params, session_key
+
 def generar_query_exit_pages(project, dataset, start_date, end_date):
     """
     Consulta para analizar las páginas de salida más frecuentes
@@ -5,23 +7,25 @@ def generar_query_exit_pages(project, dataset, start_date, end_date):
     """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id', 'page_location'],
+        where="event_name = 'page_view'"
+    )
     
     return f"""
     -- Most Frequent Exit Pages Analysis
     -- Identifica las páginas donde los usuarios abandonan más frecuentemente
     
-    WITH sessions_pages AS (
+    WITH page_views AS ({events}),
+    
+    sessions_pages AS (
       -- Extract page view data for each session
       SELECT
         user_pseudo_id AS cid,
-        (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS session_id,
-        (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page,
+        ga_session_id AS session_id,
+        page_location AS page,
         event_timestamp
-      FROM `{project}.{dataset}.events_*`
-      WHERE event_name = 'page_view'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+      FROM page_views
     ),
     
     exit_pages AS (
@@ -65,114 +69,52 @@ def generar_query_hourly_sessions_performance(project, dataset, start_date, end_
     """
     Consulta para analizar el rendimiento de sesiones por hora
     Incluye métricas de ecommerce: sesiones, pageviews, view_item, add_to_cart, purchases
+    
+    Una sola lectura de events_* con agregación condicional por hora. Los
+    eventos de ecommerce solo cuentan si llevan items.
     """
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id'],
+        where="event_name IN ('session_start', 'page_view', 'view_item', 'add_to_cart', 'purchase')"
+    )
     
     return f"""
     -- Hourly Sessions Ecommerce Performance
     -- Analiza el rendimiento de sesiones y eventos de ecommerce por hora del día
     
-    WITH sessions AS (
-      -- Calculate the number of sessions grouped by event date and hour
-      SELECT
-        event_date,
-        FORMAT('%02d', EXTRACT(HOUR FROM TIMESTAMP_MICROS(event_timestamp))) AS hour,
-        COUNT(DISTINCT params.value.int_value) AS sessions
-      FROM
-        `{project}.{dataset}.events_*`,
-        UNNEST(event_params) AS params
-      WHERE
-        event_name = 'session_start'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND params.key = 'ga_session_id'
-      GROUP BY event_date, hour
-    ),
-    
-    pageviews AS (
-      -- Count pageviews grouped by event date and hour
-      SELECT
-        event_date,
-        FORMAT('%02d', EXTRACT(HOUR FROM TIMESTAMP_MICROS(event_timestamp))) AS hour,
-        COUNT(event_timestamp) AS pageviews
-      FROM
-        `{project}.{dataset}.events_*`
-      WHERE
-        event_name = 'page_view'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-      GROUP BY event_date, hour
-    ),
-    
-    view_item_sessions AS (
-      -- Count sessions with "view_item" events grouped by event date and hour
-      SELECT
-        event_date,
-        FORMAT('%02d', EXTRACT(HOUR FROM TIMESTAMP_MICROS(event_timestamp))) AS hour,
-        COUNT(DISTINCT params.value.int_value) AS view_item_sessions
-      FROM
-        `{project}.{dataset}.events_*`,
-        UNNEST(event_params) AS params,
-        UNNEST(items) AS items
-      WHERE
-        event_name = 'view_item'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND params.key = 'ga_session_id'
-      GROUP BY event_date, hour
-    ),
+    WITH events AS ({events}),
     
-    add_to_carts AS (
-      -- Count sessions with "add_to_cart" events grouped by event date and hour
+    hourly AS (
+      -- All metrics grouped by event date and hour in a single pass
       SELECT
         event_date,
         FORMAT('%02d', EXTRACT(HOUR FROM TIMESTAMP_MICROS(event_timestamp))) AS hour,
-        COUNT(DISTINCT params.value.int_value) AS add_to_cart_sessions
-      FROM
-        `{project}.{dataset}.events_*`,
-        UNNEST(event_params) AS params,
-        UNNEST(items) AS items
-      WHERE
-        event_name = 'add_to_cart'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND params.key = 'ga_session_id'
-      GROUP BY event_date, hour
-    ),
-    
-    orders AS (
-      -- Count sessions with "purchase" events grouped by event date and hour
-      SELECT
-        event_date,
-        FORMAT('%02d', EXTRACT(HOUR FROM TIMESTAMP_MICROS(event_timestamp))) AS hour,
-        COUNT(DISTINCT params.value.int_value) AS order_sessions
-      FROM
-        `{project}.{dataset}.events_*`,
-        UNNEST(event_params) AS params,
-        UNNEST(items) AS items
-      WHERE
-        event_name = 'purchase'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND params.key = 'ga_session_id'
+        COUNTIF(event_name = 'session_start') AS session_start_events,
+        COUNT(DISTINCT IF(event_name = 'session_start', ga_session_id, NULL)) AS sessions,
+        COUNTIF(event_name = 'page_view') AS pageviews,
+        COUNT(DISTINCT IF(event_name = 'view_item' AND ARRAY_LENGTH(items) > 0, ga_session_id, NULL)) AS view_item_sessions,
+        COUNT(DISTINCT IF(event_name = 'add_to_cart' AND ARRAY_LENGTH(items) > 0, ga_session_id, NULL)) AS add_to_cart_sessions,
+        COUNT(DISTINCT IF(event_name = 'purchase' AND ARRAY_LENGTH(items) > 0, ga_session_id, NULL)) AS order_sessions
+      FROM events
       GROUP BY event_date, hour
     )
     
-    -- Aggregate and combine data from all metrics
     SELECT
       PARSE_DATE('%Y%m%d', event_date) AS event_date,
       FORMAT_DATE('%W', PARSE_DATE('%Y%m%d', event_date)) AS iso_week_of_the_year,
       FORMAT_DATE('%w - %A', PARSE_DATE('%Y%m%d', event_date)) AS weekday,
-      s.hour,
-      s.sessions,
-      COALESCE(p.pageviews, 0) AS pageviews,
-      COALESCE(vi.view_item_sessions, 0) AS view_item_sessions,
-      COALESCE(ac.add_to_cart_sessions, 0) AS add_to_cart_sessions,
-      COALESCE(o.order_sessions, 0) AS order_sessions
+      hour,
+      sessions,
+      pageviews,
+      view_item_sessions,
+      add_to_cart_sessions,
+      order_sessions
     FROM
-      sessions AS s
-    LEFT JOIN pageviews AS p USING (event_date, hour)
-    LEFT JOIN view_item_sessions AS vi USING (event_date, hour)
-    LEFT JOIN add_to_carts AS ac USING (event_date, hour)
-    LEFT JOIN orders AS o USING (event_date, hour)
+      hourly
+    WHERE
+      session_start_events > 0  -- Solo horas con inicios de sesión
     ORDER BY
-      event_date DESC, s.hour
+      event_date DESC, hour
     """
 
 def generar_query_session_path_analysis(project, dataset, start_date, end_date):
@@ -182,40 +124,34 @@ def generar_query_session_path_analysis(project, dataset, start_date, end_date):
     """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id', 'page_location'],
+        where="event_name = 'page_view'"
+    )
     
     return f"""
     -- Session Path Analysis
     -- Analiza los patrones de navegación de usuarios entre páginas
     
-    WITH page_view_data AS (
+    WITH page_views AS ({events}),
+    
+    page_view_data AS (
       -- Extract page view data with previous and next page navigation details
       SELECT
         -- Unique session identifier combining user ID and session ID
-        CONCAT(
-          user_pseudo_id, '-', 
-            (SELECT value.int_value 
-             FROM UNNEST(event_params) 
-             WHERE key = 'ga_session_id') 
-        ) AS session_id,
+        {session_key()} AS session_id,
         user_pseudo_id,
         -- Extract and normalize the page location to get the page path
         REGEXP_REPLACE(
           REGEXP_REPLACE(
-            (SELECT value.string_value 
-             FROM UNNEST(event_params) 
-             WHERE key = 'page_location'),
+            page_location,
             r'^https?://[^/]+', '' -- Remove the domain
           ),
           r'[\\?].*', '' -- Remove query parameters
         ) AS page_path,
         event_timestamp
       FROM
-        `{project}.{dataset}.events_*`
-      WHERE
-        event_name = 'page_view'
-        AND _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+        page_views
     ),
     
     page_navigation AS (
@@ -259,27 +195,164 @@ def generar_query_session_path_analysis(project, dataset, start_date, end_date):
     LIMIT {Settings.QUERY_LIMITS['session_paths']}
     """
 
-def generar_query_low_converting_sessions(project, dataset, start_date, end_date):
+# Normalización de page_location para las rutas de n pasos
+PATH_URL_MODES = {
+    'ruta': "Ruta sin dominio ni parámetros",
+    'ruta_sin_ids': "Ruta con segmentos numéricos agrupados (/producto/:id)",
+    'url': "URL completa"
+}
+
+def _normalize_page_sql(column, url_mode):
+    """Expresión SQL que normaliza page_location según PATH_URL_MODES"""
+    if url_mode == 'url':
+        return column
+    path = f"""REGEXP_REPLACE(
+          REGEXP_REPLACE(
+            REGEXP_REPLACE({column}, r'^https?://[^/]+', ''), -- Remove domain
+            r'[\\?#].*', ''                                   -- Remove query parameters and fragment
+          ),
+          r'(.)/$', r'\\1'                                     -- Remove trailing slash
+        )"""
+    if url_mode == 'ruta_sin_ids':
+        path = f"REGEXP_REPLACE({path}, r'/[0-9]+\\b', '/:id')"
+    return path
+
+def generar_query_session_paths_n_pasos(project, dataset, start_date, end_date, depth=None, url_mode='ruta'):
     """
-    Consulta para analizar sesiones con baja conversión
-    Identifica patrones en sesiones que NO convirtieron para encontrar oportunidades de mejora
+    Consulta para analizar rutas de navegación de n pasos
+    Agrega en BigQuery las secuencias de las primeras `depth` páginas de cada sesión
+    
+    Las recargas (misma página seguida) cuentan una vez. Si la sesión termina
+    antes de `depth` páginas la secuencia acaba en '(exit)'. Las rutas se agrupan
+    por un hash de la secuencia y solo se devuelven las más frecuentes.
+    
+    Args:
+        project: ID del proyecto
+        dataset: ID del dataset GA4
+        start_date: Fecha de inicio del análisis
+        end_date: Fecha de fin del análisis
+        depth: Número de pasos (default: Settings.SESSION_PATH_DEPTH)
+        url_mode: Normalización de la URL, una de PATH_URL_MODES
+    
+    Returns:
+        Query SQL con step_1..step_<depth>, path_key, sessions y pct_sessions
     """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    if url_mode not in PATH_URL_MODES:
+        raise ValueError(f"url_mode no válido: {url_mode}. Opciones: {', '.join(PATH_URL_MODES)}")
+    depth = int(depth or Settings.SESSION_PATH_DEPTH)
+    if not 2 <= depth <= Settings.SESSION_PATH_MAX_DEPTH:
+        raise ValueError(f"depth debe estar entre 2 y {Settings.SESSION_PATH_MAX_DEPTH}")
+
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id', 'page_location'],
+        where="event_name = 'page_view'"
+    )
+    page_sql = _normalize_page_sql('page_location', url_mode)
+    steps_sql = ",\n        ".join(
+        f"ANY_VALUE(path)[SAFE_OFFSET({i})] AS step_{i + 1}" for i in range(depth)
+    )
     
     return f"""
-    -- Low Converting Sessions Analysis
-    -- Analiza sesiones sin conversión para identificar patrones y oportunidades de mejora
+    -- Session Paths (n pasos)
+    -- Secuencias de las primeras {depth} páginas de cada sesión, agregadas por hash de ruta
+    
+    WITH events AS ({events}),
     
-    WITH session_data AS (
+    page_views AS (
       SELECT
-        CONCAT(
-          user_pseudo_id, 
-          '-', 
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id')
-        ) AS session_id,
+        user_pseudo_id,
+        ga_session_id AS session_id,
+        {page_sql} AS page,
+        event_timestamp
+      FROM events
+    ),
+    
+    page_changes AS (
+      -- Descartar recargas: la misma página que la anterior de la sesión
+      SELECT *
+      FROM (
+        SELECT
+          *,
+          LAG(page) OVER (PARTITION BY user_pseudo_id, session_id ORDER BY event_timestamp) AS previous_page
+        FROM page_views
+        WHERE page IS NOT NULL
+      )
+      WHERE previous_page IS NULL OR page != previous_page
+    ),
+    
+    session_paths AS (
+      -- Primeras {depth} páginas de cada sesión (+ '(exit)' si termina antes)
+      SELECT
+        ARRAY_CONCAT(
+          ARRAY_AGG(page ORDER BY event_timestamp LIMIT {depth}),
+          IF(COUNT(*) < {depth}, ['(exit)'], [])
+        ) AS path
+      FROM page_changes
+      GROUP BY user_pseudo_id, session_id
+    ),
+    
+    path_counts AS (
+      -- Agrupar por hash de la secuencia (INT64) en lugar de por el array
+      SELECT
+        FARM_FINGERPRINT(ARRAY_TO_STRING(path, ' > ')) AS path_key,
+        {steps_sql},
+        COUNT(*) AS sessions
+      FROM session_paths
+      GROUP BY path_key
+    )
+    
+    SELECT
+      *,
+      ROUND(sessions / SUM(sessions) OVER () * 100, 2) AS pct_sessions
+    FROM path_counts
+    ORDER BY sessions DESC
+    LIMIT {Settings.QUERY_LIMITS['session_paths_n']}
+    """
+
+def generar_query_low_converting_sessions(project, dataset, start_date, end_date, session_facts=None):
+    """
+    Consulta para analizar sesiones con baja conversión
+    Identifica patrones en sesiones que NO convirtieron para encontrar oportunidades de mejora
+    
+    Con session_facts lee la tabla de sesiones materializada en lugar de events_*
+    """
+    from config.settings import Settings
+
+    if session_facts:
+        session_data = f"""
+      -- Sesiones desde la tabla de hechos (reagrupadas: una sesión puede cruzar la medianoche)
+      SELECT
+        session_key AS session_id,
+        user_pseudo_id,
+        MIN(session_start) AS session_start,
+        MAX(session_end) AS session_end,
+        SUM(page_views) AS page_views,
+        MAX(unique_events) AS unique_events,
+        ARRAY_AGG(source ORDER BY session_start LIMIT 1)[OFFSET(0)] AS session_source,
+        ARRAY_AGG(medium ORDER BY session_start LIMIT 1)[OFFSET(0)] AS session_medium,
+        ARRAY_AGG(campaign ORDER BY session_start LIMIT 1)[OFFSET(0)] AS session_campaign,
+        ARRAY_AGG(device_category ORDER BY session_start LIMIT 1)[OFFSET(0)] AS device_category,
+        ARRAY_AGG(device_os ORDER BY session_start LIMIT 1)[OFFSET(0)] AS device_os,
+        ARRAY_AGG(browser ORDER BY session_start LIMIT 1)[OFFSET(0)] AS browser,
+        ARRAY_AGG(country ORDER BY session_start LIMIT 1)[OFFSET(0)] AS country,
+        ARRAY_AGG(city ORDER BY session_start LIMIT 1)[OFFSET(0)] AS city,
+        ARRAY_AGG(landing_page ORDER BY session_start LIMIT 1)[OFFSET(0)] AS landing_page,
+        ARRAY_AGG(exit_page ORDER BY session_end DESC LIMIT 1)[OFFSET(0)] AS exit_page,
+        SUM(engagement_time_seconds) AS engagement_time_seconds,
+        SUM(purchases) AS purchases,
+        SUM(revenue) AS revenue
+      FROM {session_facts_source(project, dataset, start_date, end_date, session_facts)}
+      GROUP BY session_id, user_pseudo_id
+    """
+    else:
+        events = events_with_params(
+            project, dataset, start_date, end_date, ['ga_session_id', 'page_location', 'engagement_time_msec']
+        )
+        session_data = f"""
+      SELECT
+        {session_key()} AS session_id,
         user_pseudo_id,
         MIN(TIMESTAMP_MICROS(event_timestamp)) AS session_start,
         MAX(TIMESTAMP_MICROS(event_timestamp)) AS session_end,
@@ -300,31 +373,26 @@ def generar_query_low_converting_sessions(project, dataset, start_date, end_date
         ARRAY_AGG(geo.country ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS country,
         ARRAY_AGG(geo.city ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS city,
         
-        -- Landing page
-        ARRAY_AGG(
-          (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location')
-          ORDER BY event_timestamp LIMIT 1
-        )[OFFSET(0)] AS landing_page,
-        
-        -- Exit page
-        ARRAY_AGG(
-          (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location')
-          ORDER BY event_timestamp DESC LIMIT 1
-        )[OFFSET(0)] AS exit_page,
+        -- Landing y exit page
+        ARRAY_AGG(page_location ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS landing_page,
+        ARRAY_AGG(page_location ORDER BY event_timestamp DESC LIMIT 1)[OFFSET(0)] AS exit_page,
         
         -- Engagement
-        SUM(
-          (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'engagement_time_msec')
-        ) / 1000 AS engagement_time_seconds,
+        SUM(engagement_time_msec) / 1000 AS engagement_time_seconds,
         
         -- Conversión
         COUNTIF(event_name = 'purchase') AS purchases,
         SUM(CASE WHEN event_name = 'purchase' THEN ecommerce.purchase_revenue ELSE 0 END) AS revenue
         
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+      FROM ({events})
       GROUP BY session_id, user_pseudo_id
-    ),
+    """
+    
+    return f"""
+    -- Low Converting Sessions Analysis
+    -- Analiza sesiones sin conversión para identificar patrones y oportunidades de mejora
+    
+    WITH session_data AS ({session_data}),
     
     non_converting_sessions AS (
       SELECT *,
@@ -384,3 +452,112 @@ def generar_query_low_converting_sessions(project, dataset, start_date, end_date
     ORDER BY total_non_converting_sessions DESC
     LIMIT {Settings.QUERY_LIMITS['sessions_low_converting']}
     """
+
+def generar_query_session_facts(project, dataset, start_date, end_date):
+    """
+    Consulta de hechos de sesión: una fila por sesión y día
+    
+    Es la base de la tabla de sesiones materializada (ver database/session_facts.py).
+    Las sesiones que cruzan la medianoche aparecen una vez por día, igual que en
+    las tablas events_YYYYMMDD de GA4.
+    """
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['ga_session_id', 'page_location', 'engagement_time_msec']
+    )
+    
+    return f"""
+    -- Session Facts (una fila por sesión y día)
+    WITH events AS ({events}),
+    
+    session_events AS (
+      SELECT
+        PARSE_DATE('%Y%m%d', event_date) AS session_date,
+        user_pseudo_id,
+        ga_session_id,
+        page_location,
+        engagement_time_msec,
+        event_name,
+        event_timestamp,
+        traffic_source,
+        device,
+        geo,
+        privacy_info,
+        ecommerce
+      FROM events
+    )
+    
+    SELECT
+      session_date,
+      user_pseudo_id,
+      ga_session_id,
+      {session_key()} AS session_key,
+      MIN(TIMESTAMP_MICROS(event_timestamp)) AS session_start,
+      MAX(TIMESTAMP_MICROS(event_timestamp)) AS session_end,
+      
+      -- Traffic source (primera ocurrencia en la sesión)
+      ARRAY_AGG(traffic_source.source ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS source,
+      ARRAY_AGG(traffic_source.medium ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS medium,
+      ARRAY_AGG(traffic_source.name ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS campaign,
+      
+      -- Device y geo
+      ARRAY_AGG(device.category ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS device_category,
+      ARRAY_AGG(device.operating_system ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS device_os,
+      ARRAY_AGG(device.web_info.browser ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS browser,
+      ARRAY_AGG(geo.country ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS country,
+      ARRAY_AGG(geo.city ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS city,
+      
+      -- Consentimiento al inicio de la sesión
+      ARRAY_AGG(CAST(privacy_info.analytics_storage AS STRING) ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS analytics_storage,
+      ARRAY_AGG(CAST(privacy_info.ads_storage AS STRING) ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS ads_storage,
+      
+      -- Landing y exit page
+      ARRAY_AGG(page_location ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS landing_page,
+      ARRAY_AGG(page_location ORDER BY event_timestamp DESC LIMIT 1)[OFFSET(0)] AS exit_page,
+      
+      -- Engagement
+      COUNT(*) AS events,
+      COUNT(DISTINCT IF(event_name = 'page_view', event_timestamp, NULL)) AS page_views,
+      COUNT(DISTINCT event_name) AS unique_events,
+      SUM(engagement_time_msec) / 1000 AS engagement_time_seconds,
+      
+      -- Conversión
+      COUNTIF(event_name = 'purchase') AS purchases,
+      COUNT(DISTINCT IF(event_name = 'purchase', ecommerce.transaction_id, NULL)) AS transactions,
+      MIN(IF(event_name = 'purchase', TIMESTAMP_MICROS(event_timestamp), NULL)) AS first_purchase_time,
+      SUM(IF(event_name = 'purchase', ecommerce.purchase_revenue, 0)) AS revenue,
+      COUNTIF(event_name = 'purchase') > 0 AS converted
+      
+    FROM session_events
+    GROUP BY session_date, user_pseudo_id, ga_session_id
+    """
+
+def session_facts_source(project, dataset, start_date, end_date, session_facts):
+    """
+    Subconsulta con los hechos de sesión del rango
+    
+    Lee de la tabla materializada los días que ya contiene y calcula el resto
+    (días aún abiertos) directamente desde events_*.
+    
+    Args:
+        session_facts: dict con 'table' (ID completo) y 'last_day' (último día materializado)
+    
+    Returns:
+        SQL entre paréntesis, utilizable en un FROM
+    """
+    from datetime import date, timedelta
+
+    start_day = date(start_date.year, start_date.month, start_date.day)
+    end_day = date(end_date.year, end_date.month, end_date.day)
+    last_day = session_facts['last_day']
+    
+    parts = []
+    if start_day <= last_day:
+        parts.append(f"""
+      SELECT * FROM `{session_facts['table']}`
+      WHERE session_date BETWEEN '{start_day:%Y-%m-%d}' AND '{min(end_day, last_day):%Y-%m-%d}'
+    """)
+    if end_day > last_day:
+        tail_start = max(start_day, last_day + timedelta(days=1))
+        parts.append(generar_query_session_facts(project, dataset, tail_start, end_day))
+    
+    return "(" + "\n    UNION ALL\n".join(f"({part})" for part in parts) + ")"
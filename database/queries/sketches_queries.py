@@ -0,0 +1,61 @@
+from .fragments import events_with_params, session_key
+
+def generar_query_daily_sketches(project, dataset, start_date, end_date):
+    """
+    Sketches HLL++ de usuarios y sesiones por día, evento, consentimiento y dispositivo
+
+    Es la consulta con la que se materializa la tabla de sketches diarios. Los
+    sketches de varios días (o de varias filas) se combinan con HLL_COUNT.MERGE,
+    así los usuarios y sesiones distintos de cualquier rango salen de la tabla
+    sin volver a leer events_*.
+    """
+    from config.settings import Settings
+
+    events = events_with_params(project, dataset, start_date, end_date, ['ga_session_id'])
+
+    return f"""
+    -- Sketches diarios de usuarios y sesiones
+    WITH events AS ({events})
+    SELECT
+      PARSE_DATE('%Y%m%d', event_date) AS sketch_date,
+      event_name,
+      privacy_info.analytics_storage AS analytics_storage_status,
+      privacy_info.ads_storage AS ads_storage_status,
+      device.category AS device_type,
+      COUNT(*) AS total_events,
+      HLL_COUNT.INIT(user_pseudo_id, {Settings.HLL_PRECISION}) AS users_sketch,
+      HLL_COUNT.INIT({session_key()}, {Settings.HLL_PRECISION}) AS sessions_sketch
+    FROM events
+    GROUP BY sketch_date, event_name, analytics_storage_status, ads_storage_status, device_type
+    """
+
+def daily_sketches_source(project, dataset, start_date, end_date, sketches):
+    """
+    Subconsulta con los sketches diarios del rango
+
+    Lee de la tabla materializada los días que ya contiene y calcula el resto
+    (días aún abiertos) directamente desde events_*.
+
+    Args:
+        sketches: dict con 'table' (ID completo) y 'last_day' (último día materializado)
+
+    Returns:
+        SQL entre paréntesis, utilizable en un FROM
+    """
+    from datetime import date, timedelta
+
+    start_day = date(start_date.year, start_date.month, start_date.day)
+    end_day = date(end_date.year, end_date.month, end_date.day)
+    last_day = sketches['last_day']
+
+    parts = []
+    if start_day <= last_day:
+        parts.append(f"""
+      SELECT * FROM `{sketches['table']}`
+      WHERE sketch_date BETWEEN '{start_day:%Y-%m-%d}' AND '{min(end_day, last_day):%Y-%m-%d}'
+    """)
+    if end_day > last_day:
+        tail_start = max(start_day, last_day + timedelta(days=1))
+        parts.append(generar_query_daily_sketches(project, dataset, tail_start, end_day))
+
+    return "(" + "\n    UNION ALL\n".join(f"({part})" for part in parts) + ")"
@@ -1,41 +1,44 @@
+from .fragments import events_with_params, session_key
+from .sessions_queries import session_facts_source
+
 def generar_query_retencion_semanal(project, dataset, start_date, end_date):
     """
     Weekly User Retention Analysis
     Analiza la retención semanal de usuarios adquiridos en semana 0
+    
+    Una sola lectura de events_*: la semana de cohorte es la primera semana
+    con actividad del usuario (ventana sobre sus semanas activas).
     """
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
     
     return f"""
     -- Weekly User Retention Analysis (CORREGIDO - sin división por cero)
-    WITH user_first_engagement AS (
+    WITH user_activity AS (
       SELECT 
         user_pseudo_id,
-        MIN(PARSE_DATE('%Y%m%d', event_date)) AS first_engagement_date,
-        DATE_TRUNC(MIN(PARSE_DATE('%Y%m%d', event_date)), WEEK) AS cohort_week
+        DATE_TRUNC(PARSE_DATE('%Y%m%d', event_date), WEEK) AS activity_week
       FROM `{project}.{dataset}.events_*`
       WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-      GROUP BY user_pseudo_id
+        AND user_pseudo_id IS NOT NULL
+      GROUP BY user_pseudo_id, activity_week
     ),
     
-    user_activity AS (
+    user_cohorts AS (
       SELECT 
         user_pseudo_id,
-        PARSE_DATE('%Y%m%d', event_date) AS activity_date,
-        DATE_TRUNC(PARSE_DATE('%Y%m%d', event_date), WEEK) AS activity_week
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-      GROUP BY user_pseudo_id, activity_date, activity_week
+        activity_week,
+        MIN(activity_week) OVER (PARTITION BY user_pseudo_id) AS cohort_week
+      FROM user_activity
     ),
     
     user_retention AS (
       SELECT 
-        ufe.cohort_week,
-        ufe.user_pseudo_id,
-        ua.activity_week,
-        DATE_DIFF(ua.activity_week, ufe.cohort_week, WEEK) AS weeks_since_first_engagement
-      FROM user_first_engagement ufe
-      JOIN user_activity ua ON ufe.user_pseudo_id = ua.user_pseudo_id
+        cohort_week,
+        user_pseudo_id,
+        activity_week,
+        DATE_DIFF(activity_week, cohort_week, WEEK) AS weeks_since_first_engagement
+      FROM user_cohorts
     )
     
     SELECT 
@@ -69,76 +72,88 @@ def generar_query_retencion_semanal(project, dataset, start_date, end_date):
     ORDER BY cohort_week DESC
     """
 
-def generar_query_clv_sesiones(project, dataset, start_date, end_date):
+def generar_query_clv_sesiones(project, dataset, start_date, end_date, session_facts=None):
     """
     Customer Lifetime Value (CLV) with Sessions
     Calcula el CLV y total de sesiones por usuario
+    
+    Con session_facts lee la tabla de sesiones materializada en lugar de events_*
     """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
-    
-    return f"""
-    -- Customer Lifetime Value with Sessions (CORREGIDO)
-    WITH user_sessions AS (
+    if session_facts:
+        user_totals = f"""
       SELECT 
         user_pseudo_id,
-        COUNT(DISTINCT CONCAT(
-          CAST(user_pseudo_id AS STRING), 
-          '-', 
-          CAST((SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS STRING)
-        )) AS total_sessions
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND user_pseudo_id IS NOT NULL
+        COUNT(DISTINCT session_key) AS total_sessions,
+        SUM(IF(revenue > 0, revenue, NULL)) AS total_revenue,
+        SUM(IF(revenue > 0, transactions, NULL)) AS total_transactions
+      FROM {session_facts_source(project, dataset, start_date, end_date, session_facts)}
+      WHERE user_pseudo_id IS NOT NULL
       GROUP BY user_pseudo_id
-    ),
-    
-    user_revenue AS (
+    """
+    else:
+        # Sesiones e ingresos en la misma lectura: solo cuentan las compras con ingresos
+        events = events_with_params(
+            project, dataset, start_date, end_date, ['ga_session_id'], where="user_pseudo_id IS NOT NULL"
+        )
+        paid_purchase = "event_name = 'purchase' AND ecommerce.purchase_revenue > 0"
+        user_totals = f"""
       SELECT 
         user_pseudo_id,
-        SUM(ecommerce.purchase_revenue) AS total_revenue,
-        COUNT(DISTINCT ecommerce.transaction_id) AS total_transactions
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name = 'purchase'
-        AND ecommerce.purchase_revenue IS NOT NULL
-        AND ecommerce.purchase_revenue > 0
-        AND user_pseudo_id IS NOT NULL
+        COUNT(DISTINCT {session_key()}) AS total_sessions,
+        SUM(IF({paid_purchase}, ecommerce.purchase_revenue, NULL)) AS total_revenue,
+        COUNT(DISTINCT IF({paid_purchase}, ecommerce.transaction_id, NULL)) AS total_transactions
+      FROM ({events})
       GROUP BY user_pseudo_id
-    )
+    """
+    
+    return f"""
+    -- Customer Lifetime Value with Sessions (CORREGIDO)
+    WITH user_totals AS ({user_totals})
     
     SELECT 
-      us.user_pseudo_id,
-      us.total_sessions,
-      COALESCE(ur.total_revenue, 0) AS customer_lifetime_value,
-      COALESCE(ur.total_transactions, 0) AS total_transactions,
-      ROUND(SAFE_DIVIDE(COALESCE(ur.total_revenue, 0), us.total_sessions), 2) AS revenue_per_session,
+      user_pseudo_id,
+      total_sessions,
+      COALESCE(total_revenue, 0) AS customer_lifetime_value,
+      COALESCE(total_transactions, 0) AS total_transactions,
+      ROUND(SAFE_DIVIDE(COALESCE(total_revenue, 0), total_sessions), 2) AS revenue_per_session,
       CASE 
-        WHEN ur.total_revenue IS NOT NULL AND ur.total_revenue > 0 THEN 'Buyer'
+        WHEN total_revenue IS NOT NULL AND total_revenue > 0 THEN 'Buyer'
         ELSE 'Non-Buyer'
       END AS user_type
-    FROM user_sessions us
-    LEFT JOIN user_revenue ur ON us.user_pseudo_id = ur.user_pseudo_id
-    WHERE us.total_sessions > 0
+    FROM user_totals
+    WHERE total_sessions > 0
     ORDER BY customer_lifetime_value DESC
     LIMIT {Settings.QUERY_LIMITS['clv']}
     """
 
-def generar_query_tiempo_primera_compra(project, dataset, start_date, end_date):
+def generar_query_tiempo_primera_compra(project, dataset, start_date, end_date, session_facts=None):
     """
     Time from First Visit to Purchase by Source
     Analiza el tiempo entre primera visita y compra por fuente de tráfico
+    
+    Con session_facts lee la tabla de sesiones materializada en lugar de events_*
     """
     from config.settings import Settings
 
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
     
-    return f"""
-    -- Time from First Visit to Purchase by Source
-    WITH first_visit AS (
+    if session_facts:
+        user_journey = f"""
+      SELECT 
+        user_pseudo_id,
+        MIN(session_start) AS first_visit_time,
+        ARRAY_AGG(source ORDER BY session_start LIMIT 1)[OFFSET(0)] AS first_source,
+        ARRAY_AGG(medium ORDER BY session_start LIMIT 1)[OFFSET(0)] AS first_medium,
+        MIN(IF(converted, first_purchase_time, NULL)) AS first_purchase_time
+      FROM {session_facts_source(project, dataset, start_date, end_date, session_facts)}
+      WHERE user_pseudo_id IS NOT NULL
+      GROUP BY user_pseudo_id
+    """
+    else:
+        user_journey = f"""
       SELECT 
         user_pseudo_id,
         MIN(TIMESTAMP_MICROS(event_timestamp)) AS first_visit_time,
@@ -151,33 +166,29 @@ def generar_query_tiempo_primera_compra(project, dataset, start_date, end_date):
           traffic_source.medium 
           ORDER BY event_timestamp 
           LIMIT 1
-        )[OFFSET(0)] AS first_medium
+        )[OFFSET(0)] AS first_medium,
+        MIN(IF(event_name = 'purchase', TIMESTAMP_MICROS(event_timestamp), NULL)) AS first_purchase_time
       FROM `{project}.{dataset}.events_*`
       WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+        AND user_pseudo_id IS NOT NULL
       GROUP BY user_pseudo_id
-    ),
+    """
     
-    first_purchase AS (
-      SELECT 
-        user_pseudo_id,
-        MIN(TIMESTAMP_MICROS(event_timestamp)) AS first_purchase_time
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name = 'purchase'
-      GROUP BY user_pseudo_id
-    ),
+    return f"""
+    -- Time from First Visit to Purchase by Source
+    -- Primera visita y primera compra de cada usuario en una sola lectura
+    WITH user_journey AS ({user_journey}),
     
     time_to_purchase AS (
       SELECT 
-        fv.user_pseudo_id,
-        fv.first_source,
-        fv.first_medium,
-        fv.first_visit_time,
-        fp.first_purchase_time,
-        DATE_DIFF(DATE(fp.first_purchase_time), DATE(fv.first_visit_time), DAY) AS days_to_purchase
-      FROM first_visit fv
-      INNER JOIN first_purchase fp ON fv.user_pseudo_id = fp.user_pseudo_id
-      WHERE fp.first_purchase_time > fv.first_visit_time
+        user_pseudo_id,
+        first_source,
+        first_medium,
+        first_visit_time,
+        first_purchase_time,
+        DATE_DIFF(DATE(first_purchase_time), DATE(first_visit_time), DAY) AS days_to_purchase
+      FROM user_journey
+      WHERE first_purchase_time > first_visit_time
     )
     
     SELECT 
@@ -202,81 +213,96 @@ def generar_query_landing_page_attribution(project, dataset, start_date, end_dat
     """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
+    events = events_with_params(
+        project, dataset, start_date, end_date, ['page_location'], where="user_pseudo_id IS NOT NULL"
+    )
     
     return f"""
     -- First Landing Page Attribution
-    WITH user_first_landing AS (
-      SELECT 
-        user_pseudo_id,
-        ARRAY_AGG(
-          (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location')
-          ORDER BY event_timestamp 
-          LIMIT 1
-        )[OFFSET(0)] AS first_landing_page
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name = 'page_view'
-      GROUP BY user_pseudo_id
-    ),
+    WITH events AS ({events}),
     
+    -- Primera landing page y totales de eventos de cada usuario en una sola lectura
     user_events AS (
       SELECT 
         user_pseudo_id,
+        ARRAY_AGG(
+          IF(event_name = 'page_view', page_location, NULL) IGNORE NULLS
+          ORDER BY event_timestamp
+          LIMIT 1
+        )[SAFE_OFFSET(0)] AS first_landing_page,
         COUNTIF(event_name = 'page_view') AS total_page_views,
         COUNTIF(event_name = 'view_item') AS total_view_items,
         COUNTIF(event_name = 'add_to_cart') AS total_add_to_cart,
         COUNTIF(event_name = 'begin_checkout') AS total_begin_checkout,
         COUNTIF(event_name = 'purchase') AS total_purchases,
         SUM(CASE WHEN event_name = 'purchase' THEN ecommerce.purchase_revenue ELSE 0 END) AS total_revenue
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+      FROM events
       GROUP BY user_pseudo_id
     )
     
     SELECT 
-      ufl.first_landing_page,
-      COUNT(DISTINCT ufl.user_pseudo_id) AS unique_users,
-      SUM(ue.total_page_views) AS total_page_views,
-      SUM(ue.total_view_items) AS total_view_items,
-      SUM(ue.total_add_to_cart) AS total_add_to_cart,
-      SUM(ue.total_begin_checkout) AS total_begin_checkout,
-      SUM(ue.total_purchases) AS total_purchases,
-      SUM(ue.total_revenue) AS total_revenue,
-      ROUND(SAFE_DIVIDE(SUM(ue.total_purchases), COUNT(DISTINCT ufl.user_pseudo_id)) * 100, 2) AS conversion_rate,
-      ROUND(SAFE_DIVIDE(SUM(ue.total_revenue), COUNT(DISTINCT ufl.user_pseudo_id)), 2) AS revenue_per_user
-    FROM user_first_landing ufl
-    LEFT JOIN user_events ue ON ufl.user_pseudo_id = ue.user_pseudo_id
-    WHERE ufl.first_landing_page IS NOT NULL
-    GROUP BY ufl.first_landing_page
+      first_landing_page,
+      COUNT(DISTINCT user_pseudo_id) AS unique_users,
+      SUM(total_page_views) AS total_page_views,
+      SUM(total_view_items) AS total_view_items,
+      SUM(total_add_to_cart) AS total_add_to_cart,
+      SUM(total_begin_checkout) AS total_begin_checkout,
+      SUM(total_purchases) AS total_purchases,
+      SUM(total_revenue) AS total_revenue,
+      ROUND(SAFE_DIVIDE(SUM(total_purchases), COUNT(DISTINCT user_pseudo_id)) * 100, 2) AS conversion_rate,
+      ROUND(SAFE_DIVIDE(SUM(total_revenue), COUNT(DISTINCT user_pseudo_id)), 2) AS revenue_per_user
+    FROM user_events
+    WHERE first_landing_page IS NOT NULL
+    GROUP BY first_landing_page
     HAVING unique_users >= 10
     ORDER BY total_revenue DESC
     LIMIT {Settings.QUERY_LIMITS['landing_pages']}
     """
 
-def generar_query_adquisicion_usuarios(project, dataset, start_date, end_date):
+def generar_query_adquisicion_usuarios(project, dataset, start_date, end_date, session_facts=None):
     """
     User Acquisition by Source/Medium with Channel Grouping
     Agrupa usuarios por fuente, medio y categorías predefinidas
+    
+    Con session_facts lee la tabla de sesiones materializada en lugar de events_*
     """
     from config.settings import Settings
 
-    start_date_str = start_date.strftime('%Y%m%d')
-    end_date_str = end_date.strftime('%Y%m%d')
-    
-    return f"""
-    -- User Acquisition by Source/Medium with Channel Grouping
-    WITH user_first_source AS (
+    if session_facts:
+        user_acquisition = f"""
+      SELECT 
+        user_pseudo_id,
+        ARRAY_AGG(source ORDER BY session_start LIMIT 1)[OFFSET(0)] AS first_source,
+        ARRAY_AGG(medium ORDER BY session_start LIMIT 1)[OFFSET(0)] AS first_medium,
+        MIN(session_date) AS acquisition_date,
+        COUNT(DISTINCT session_key) AS total_sessions,
+        SUM(purchases) AS total_purchases,
+        SUM(revenue) AS total_revenue
+      FROM {session_facts_source(project, dataset, start_date, end_date, session_facts)}
+      WHERE user_pseudo_id IS NOT NULL
+      GROUP BY user_pseudo_id
+    """
+    else:
+        events = events_with_params(
+            project, dataset, start_date, end_date, ['ga_session_id'], where="user_pseudo_id IS NOT NULL"
+        )
+        user_acquisition = f"""
       SELECT 
         user_pseudo_id,
         ARRAY_AGG(traffic_source.source ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS first_source,
         ARRAY_AGG(traffic_source.medium ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS first_medium,
-        MIN(PARSE_DATE('%Y%m%d', event_date)) AS acquisition_date
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
+        MIN(PARSE_DATE('%Y%m%d', event_date)) AS acquisition_date,
+        COUNT(DISTINCT {session_key()}) AS total_sessions,
+        COUNTIF(event_name = 'purchase') AS total_purchases,
+        SUM(CASE WHEN event_name = 'purchase' THEN ecommerce.purchase_revenue ELSE 0 END) AS total_revenue
+      FROM ({events})
       GROUP BY user_pseudo_id
-    ),
+    """
+    
+    return f"""
+    -- User Acquisition by Source/Medium with Channel Grouping
+    -- Primera fuente y métricas de cada usuario en una sola lectura
+    WITH user_acquisition AS ({user_acquisition}),
     
     channel_grouping AS (
       SELECT 
@@ -284,6 +310,9 @@ def generar_query_adquisicion_usuarios(project, dataset, start_date, end_date):
         first_source,
         first_medium,
         acquisition_date,
+        total_sessions,
+        total_purchases,
+        total_revenue,
         CASE
           WHEN first_source IS NULL THEN 'Direct'
           WHEN REGEXP_CONTAINS(first_source, r'(?i)google|bing|yahoo|duckduckgo|ecosia|yandex|baidu')
@@ -299,89 +328,79 @@ def generar_query_adquisicion_usuarios(project, dataset, start_date, end_date):
           WHEN REGEXP_CONTAINS(first_source, r'(?i)youtube|vimeo') THEN 'Video'
           ELSE 'Other'
         END AS channel_group
-      FROM user_first_source
-    ),
-    
-    user_metrics AS (
-      SELECT 
-        user_pseudo_id,
-        COUNT(DISTINCT CONCAT(
-          CAST(user_pseudo_id AS STRING), 
-          '-', 
-          CAST((SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS STRING)
-        )) AS total_sessions,
-        COUNTIF(event_name = 'purchase') AS total_purchases,
-        SUM(CASE WHEN event_name = 'purchase' THEN ecommerce.purchase_revenue ELSE 0 END) AS total_revenue
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-      GROUP BY user_pseudo_id
+      FROM user_acquisition
     )
     
     SELECT 
-      cg.channel_group,
-      cg.first_source,
-      cg.first_medium,
-      COUNT(DISTINCT cg.user_pseudo_id) AS total_users,
-      SUM(um.total_sessions) AS total_sessions,
-      SUM(um.total_purchases) AS total_purchases,
-      SUM(um.total_revenue) AS total_revenue,
-      ROUND(SAFE_DIVIDE(SUM(um.total_sessions), COUNT(DISTINCT cg.user_pseudo_id)), 2) AS avg_sessions_per_user,
-      ROUND(SAFE_DIVIDE(SUM(um.total_purchases), COUNT(DISTINCT cg.user_pseudo_id)) * 100, 2) AS conversion_rate,
-      ROUND(SAFE_DIVIDE(SUM(um.total_revenue), COUNT(DISTINCT cg.user_pseudo_id)), 2) AS revenue_per_user
-    FROM channel_grouping cg
-    LEFT JOIN user_metrics um ON cg.user_pseudo_id = um.user_pseudo_id
-    GROUP BY cg.channel_group, cg.first_source, cg.first_medium
+      channel_group,
+      first_source,
+      first_medium,
+      COUNT(DISTINCT user_pseudo_id) AS total_users,
+      SUM(total_sessions) AS total_sessions,
+      SUM(total_purchases) AS total_purchases,
+      SUM(total_revenue) AS total_revenue,
+      ROUND(SAFE_DIVIDE(SUM(total_sessions), COUNT(DISTINCT user_pseudo_id)), 2) AS avg_sessions_per_user,
+      ROUND(SAFE_DIVIDE(SUM(total_purchases), COUNT(DISTINCT user_pseudo_id)) * 100, 2) AS conversion_rate,
+      ROUND(SAFE_DIVIDE(SUM(total_revenue), COUNT(DISTINCT user_pseudo_id)), 2) AS revenue_per_user
+    FROM channel_grouping
+    GROUP BY channel_group, first_source, first_medium
     HAVING total_users >= 5
     ORDER BY total_users DESC
     LIMIT {Settings.QUERY_LIMITS['adquisicion']}
     """
 
-def generar_query_conversion_mensual(project, dataset, start_date, end_date):
+def generar_query_conversion_mensual(project, dataset, start_date, end_date, session_facts=None):
     """
     Monthly User Conversion Rate
     Calcula la tasa de conversión mensual (usuarios convertidos / usuarios totales)
+    
+    Con session_facts lee la tabla de sesiones materializada en lugar de events_*
     """
     start_date_str = start_date.strftime('%Y%m%d')
     end_date_str = end_date.strftime('%Y%m%d')
     
-    return f"""
-    -- Monthly User Conversion Rate
-    WITH monthly_users AS (
+    if session_facts:
+        monthly_users = f"""
       SELECT 
-        FORMAT_DATE('%Y-%m', PARSE_DATE('%Y%m%d', event_date)) AS month,
-        user_pseudo_id
-      FROM `{project}.{dataset}.events_*`
-      WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND user_pseudo_id IS NOT NULL
+        FORMAT_DATE('%Y-%m', session_date) AS month,
+        user_pseudo_id,
+        LOGICAL_OR(revenue > 0) AS converted,
+        SUM(IF(revenue > 0, revenue, NULL)) AS user_revenue,
+        SUM(IF(revenue > 0, transactions, NULL)) AS user_transactions
+      FROM {session_facts_source(project, dataset, start_date, end_date, session_facts)}
+      WHERE user_pseudo_id IS NOT NULL
       GROUP BY month, user_pseudo_id
-    ),
-    
-    monthly_converters AS (
+    """
+    else:
+        # Usuarios y compradores del mes en la misma lectura: convierte quien tiene una compra con ingresos
+        paid_purchase = "event_name = 'purchase' AND ecommerce.purchase_revenue > 0"
+        monthly_users = f"""
       SELECT 
         FORMAT_DATE('%Y-%m', PARSE_DATE('%Y%m%d', event_date)) AS month,
         user_pseudo_id,
-        SUM(ecommerce.purchase_revenue) AS user_revenue,
-        COUNT(DISTINCT ecommerce.transaction_id) AS user_transactions
+        COALESCE(LOGICAL_OR({paid_purchase}), FALSE) AS converted,
+        SUM(IF({paid_purchase}, ecommerce.purchase_revenue, NULL)) AS user_revenue,
+        COUNT(DISTINCT IF({paid_purchase}, ecommerce.transaction_id, NULL)) AS user_transactions
       FROM `{project}.{dataset}.events_*`
       WHERE _TABLE_SUFFIX BETWEEN '{start_date_str}' AND '{end_date_str}'
-        AND event_name = 'purchase'
-        AND ecommerce.purchase_revenue IS NOT NULL
-        AND ecommerce.purchase_revenue > 0
         AND user_pseudo_id IS NOT NULL
       GROUP BY month, user_pseudo_id
-    )
+    """
+    
+    return f"""
+    -- Monthly User Conversion Rate
+    WITH monthly_users AS ({monthly_users})
     
     SELECT 
-      mu.month,
-      COUNT(DISTINCT mu.user_pseudo_id) AS total_users,
-      COUNT(DISTINCT mc.user_pseudo_id) AS converted_users,
-      ROUND(SAFE_DIVIDE(COUNT(DISTINCT mc.user_pseudo_id), COUNT(DISTINCT mu.user_pseudo_id)) * 100, 2) AS conversion_rate,
-      SUM(mc.user_revenue) AS total_revenue,
-      SUM(mc.user_transactions) AS total_transactions,
-      ROUND(SAFE_DIVIDE(SUM(mc.user_revenue), COUNT(DISTINCT mc.user_pseudo_id)), 2) AS avg_revenue_per_converter,
-      ROUND(SAFE_DIVIDE(SUM(mc.user_revenue), COUNT(DISTINCT mu.user_pseudo_id)), 2) AS avg_revenue_per_user
-    FROM monthly_users mu
-    LEFT JOIN monthly_converters mc ON mu.month = mc.month AND mu.user_pseudo_id = mc.user_pseudo_id
-    GROUP BY mu.month
-    ORDER BY mu.month DESC
+      month,
+      COUNT(DISTINCT user_pseudo_id) AS total_users,
+      COUNT(DISTINCT IF(converted, user_pseudo_id, NULL)) AS converted_users,
+      ROUND(SAFE_DIVIDE(COUNT(DISTINCT IF(converted, user_pseudo_id, NULL)), COUNT(DISTINCT user_pseudo_id)) * 100, 2) AS conversion_rate,
+      SUM(IF(converted, user_revenue, NULL)) AS total_revenue,
+      SUM(IF(converted, user_transactions, NULL)) AS total_transactions,
+      ROUND(SAFE_DIVIDE(SUM(IF(converted, user_revenue, NULL)), COUNT(DISTINCT IF(converted, user_pseudo_id, NULL))), 2) AS avg_revenue_per_converter,
+      ROUND(SAFE_DIVIDE(SUM(IF(converted, user_revenue, NULL)), COUNT(DISTINCT user_pseudo_id)), 2) AS avg_revenue_per_user
+    FROM monthly_users
+    GROUP BY month
+    ORDER BY month DESC
     """
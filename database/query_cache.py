@@ -0,0 +1,338 @@
+"""
+Caché persistente de resultados de BigQuery
+
+Guarda los resultados de las consultas en disco (Parquet) indexados por un hash
+del SQL normalizado, la identidad del cliente y el proyecto/dataset/rango de
+fechas consultado. El índice vive en SQLite para que todas las sesiones y
+procesos de Streamlit compartan la misma caché.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import pandas as pd
+
+from config.settings import Settings
+
+# Literales SQL, comentarios de línea y espacios (en ese orden de prioridad)
+_SQL_TOKEN_RE = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|(--[^\n]*)|(\s+)")
+_TABLE_RE = re.compile(r"`([\w.-]+)\.(\w+)\.events_(?:intraday_)?\*`")
+_RANGE_RE = re.compile(r"_TABLE_SUFFIX\s+BETWEEN\s+'(\d{8})'\s+AND\s+'(\d{8})'", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normaliza una consulta SQL para calcular su clave de caché
+
+    Elimina comentarios de línea y colapsa espacios en blanco, respetando
+    el contenido de los literales de texto.
+    """
+    def _replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(2):
+            return ''
+        return ' '
+
+    return _SQL_TOKEN_RE.sub(_replace, query).strip()
+
+
+def client_identity(client) -> Optional[str]:
+    """
+    Obtiene una identidad estable del principal de un cliente BigQuery
+
+    Se usa para no compartir resultados entre credenciales distintas (cada una
+    puede tener permisos sobre datasets diferentes). Para cuentas de servicio
+    se usa el email; para OAuth, un hash del refresh token (el secreto nunca
+    forma parte de una clave). El client_id de OAuth no vale: lo comparten
+    todos los usuarios de la aplicación.
+
+    Returns:
+        Hash hexadecimal de la identidad y el proyecto, o None si las
+        credenciales no identifican a un principal
+    """
+    credentials = getattr(client, '_credentials', None)
+    email = getattr(credentials, 'service_account_email', None)
+    refresh_token = getattr(credentials, 'refresh_token', None)
+
+    if email:
+        identity = f"sa:{email}"
+    elif refresh_token:
+        identity = f"oauth:{hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()}"
+    else:
+        return None
+
+    project = getattr(client, 'project', None) or ''
+    return hashlib.sha256(f"{identity}|{project}".encode('utf-8')).hexdigest()[:16]
+
+
+def extract_query_scope(query: str) -> Dict[str, Optional[str]]:
+    """
+    Extrae proyecto, dataset y rango de _TABLE_SUFFIX de una consulta GA4
+
+    Returns:
+        dict con project, dataset, start_suffix y end_suffix (None si no aplica)
+    """
+    table_match = _TABLE_RE.search(query)
+    ranges = _RANGE_RE.findall(query)
+
+    return {
+        'project': table_match.group(1) if table_match else None,
+        'dataset': table_match.group(2) if table_match else None,
+        'start_suffix': min(r[0] for r in ranges) if ranges else None,
+        'end_suffix': max(r[1] for r in ranges) if ranges else None,
+    }
+
+
+def is_closed_range(end_suffix: Optional[str]) -> bool:
+    """True si todas las tablas diarias del rango están cerradas (ya no cambian)"""
+    if not end_suffix:
+        return False
+    last_closed_day = datetime.now().date() - timedelta(days=Settings.GA4_CLOSED_DAY_LAG)
+    return end_suffix <= last_closed_day.strftime('%Y%m%d')
+
+
+class QueryCache:
+    """Caché de resultados en disco compartida por sesiones y procesos"""
+
+    INDEX_FILE = 'index.sqlite'
+
+    @staticmethod
+    def _cache_dir() -> str:
+        os.makedirs(Settings.QUERY_CACHE_DIR, exist_ok=True)
+        return Settings.QUERY_CACHE_DIR
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        """Abre el índice SQLite (una conexión por llamada, segura entre procesos)"""
+        conn = sqlite3.connect(
+            os.path.join(QueryCache._cache_dir(), QueryCache.INDEX_FILE),
+            timeout=30,
+            isolation_level=None
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                project TEXT,
+                dataset TEXT,
+                start_suffix TEXT,
+                end_suffix TEXT
+            )
+        """)
+        return conn
+
+    @staticmethod
+    def build_key(query: str, client=None) -> Optional[str]:
+        """
+        Calcula la clave de caché de una consulta
+
+        Args:
+            query: Consulta SQL
+            client: Cliente de BigQuery (su identidad forma parte de la clave)
+
+        Returns:
+            Hash SHA-256 en hexadecimal, o None si las credenciales del cliente
+            no identifican a un principal (el resultado no se puede compartir)
+        """
+        identity = ''
+        if client is not None:
+            identity = client_identity(client)
+            if identity is None:
+                return None
+
+        scope = extract_query_scope(query)
+        parts = [
+            normalize_sql(query),
+            identity,
+            scope['project'] or '',
+            scope['dataset'] or '',
+            scope['start_suffix'] or '',
+            scope['end_suffix'] or '',
+        ]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get(key: Optional[str]) -> Optional[pd.DataFrame]:
+        """
+        Obtiene un resultado de la caché
+
+        Returns:
+            DataFrame o None si no existe, ha expirado o no hay clave
+        """
+        if not Settings.QUERY_CACHE_ENABLED or key is None:
+            return None
+
+        try:
+            conn = QueryCache._connect()
+            try:
+                row = conn.execute(
+                    'SELECT path, expires_at FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+
+                if row is None:
+                    return None
+
+                path, expires_at = row
+                if expires_at < time.time() or not os.path.exists(path):
+                    QueryCache._delete_entry(conn, key, path)
+                    return None
+
+                df = pd.read_parquet(path)
+                conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+                return df
+            finally:
+                conn.close()
+        except Exception as e:
+            # Una caché corrupta nunca debe impedir ejecutar la consulta
+            print(f"⚠️ Error leyendo caché de consultas: {e}")
+            return None
+
+    @staticmethod
+    def put(key: Optional[str], df: pd.DataFrame, query: str, ttl_seconds: Optional[int] = None) -> bool:
+        """
+        Guarda un resultado en la caché
+
+        Args:
+            key: Clave calculada con build_key (None = no se guarda)
+            df: Resultado de la consulta
+            query: SQL original (para metadatos y TTL)
+            ttl_seconds: TTL explícito; por defecto depende de si el rango está cerrado
+
+        Returns:
+            True si se guardó correctamente
+        """
+        if not Settings.QUERY_CACHE_ENABLED or key is None or df is None:
+            return False
+
+        scope = extract_query_scope(query)
+        if ttl_seconds is None:
+            ttl_seconds = (
+                Settings.QUERY_CACHE_TTL_SECONDS
+                if is_closed_range(scope['end_suffix'])
+                else Settings.QUERY_CACHE_TTL_OPEN_SECONDS
+            )
+
+        cache_dir = QueryCache._cache_dir()
+        path = os.path.join(cache_dir, f"{key}.parquet")
+        tmp_path = os.path.join(cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+
+        try:
+            # Escritura atómica: otro proceso nunca ve un fichero a medias
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            size_bytes = os.path.getsize(path)
+
+            now = time.time()
+            conn = QueryCache._connect()
+            try:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO entries
+                        (key, path, size_bytes, rows, created_at, last_access, expires_at,
+                         project, dataset, start_suffix, end_suffix)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, path, size_bytes, len(df), now, now, now + ttl_seconds,
+                     scope['project'], scope['dataset'], scope['start_suffix'], scope['end_suffix'])
+                )
+                QueryCache._evict(conn)
+            finally:
+                conn.close()
+            return True
+
+        except Exception as e:
+            # Tipos no serializables en Parquet, disco lleno, etc.
+            print(f"⚠️ No se pudo guardar en caché: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    @staticmethod
+    def _delete_entry(conn: sqlite3.Connection, key: str, path: str):
+        conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def _evict(conn: sqlite3.Connection):
+        """Elimina entradas expiradas y, si se supera el tamaño máximo, las menos usadas (LRU)"""
+        now = time.time()
+        for key, path in conn.execute(
+            'SELECT key, path FROM entries WHERE expires_at < ?', (now,)
+        ).fetchall():
+            QueryCache._delete_entry(conn, key, path)
+
+        total_bytes = conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM entries').fetchone()[0]
+        if total_bytes <= Settings.QUERY_CACHE_MAX_BYTES:
+            return
+
+        for key, path, size_bytes in conn.execute(
+            'SELECT key, path, size_bytes FROM entries ORDER BY last_access ASC'
+        ).fetchall():
+            QueryCache._delete_entry(conn, key, path)
+            total_bytes -= size_bytes
+            if total_bytes <= Settings.QUERY_CACHE_MAX_BYTES:
+                break
+
+    @staticmethod
+    def clear(project: Optional[str] = None, dataset: Optional[str] = None) -> int:
+        """
+        Vacía la caché (completa o solo para un proyecto/dataset)
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        conn = QueryCache._connect()
+        try:
+            sql = 'SELECT key, path FROM entries WHERE 1 = 1'
+            params = []
+            if project:
+                sql += ' AND project = ?'
+                params.append(project)
+            if dataset:
+                sql += ' AND dataset = ?'
+                params.append(dataset)
+
+            entries = conn.execute(sql, params).fetchall()
+            for key, path in entries:
+                QueryCache._delete_entry(conn, key, path)
+            return len(entries)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_stats() -> Dict:
+        """
+        Obtiene estadísticas de la caché
+
+        Returns:
+            dict con número de entradas, bytes ocupados y límite configurado
+        """
+        try:
+            conn = QueryCache._connect()
+            try:
+                entries, total_bytes = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM entries'
+                ).fetchone()
+            finally:
+                conn.close()
+        except Exception:
+            entries, total_bytes = 0, 0
+
+        return {
+            'entries': entries,
+            'total_bytes': total_bytes,
+            'max_bytes': Settings.QUERY_CACHE_MAX_BYTES
+        }
@@ -0,0 +1,155 @@
+"""
+Caché en memoria de resultados por rango de fechas
+
+Para las consultas descomponibles por día (DAILY_QUERY_SPECS) el resultado de
+un rango contiene, fila a fila, el de cualquier subrango. Se guarda el último
+rango consultado de cada consulta y, si el analista acota las fechas, el
+subrango se obtiene filtrando el DataFrame guardado sin tocar BigQuery ni el
+almacén en disco. Solo hay que consultar los días que quedan fuera del rango
+cubierto; al volver, el rango guardado se amplía con ellos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+from config.settings import Settings
+from database.query_cache import QueryCache
+
+# Día fijo con el que se genera el SQL que identifica la consulta
+_ANCHOR_DAY = date(2000, 1, 1)
+
+_lock = threading.Lock()
+# clave -> {'start': date, 'end': date, 'df': DataFrame, 'open_since': float | None}
+_entries: "OrderedDict[str, dict]" = OrderedDict()
+
+
+class RangeCache:
+    """Superconjuntos de fechas por consulta, con reutilización de subrangos"""
+
+    @staticmethod
+    def build_key(client, generator: Callable, project: str, dataset: str) -> Optional[str]:
+        """
+        La clave es la del SQL de un día fijo: cambia si cambia el generador
+
+        None si las credenciales no identifican a un principal (no se guarda nada)
+        """
+        return QueryCache.build_key(generator(project, dataset, _ANCHOR_DAY, _ANCHOR_DAY), client)
+
+    @staticmethod
+    def lookup(key: Optional[str], start_day: date, end_day: date, day_suffixes: Callable,
+               date_column: str) -> Optional[Tuple[pd.DataFrame, date, date]]:
+        """
+        Filas del rango guardado que caen dentro de [start_day, end_day]
+
+        Args:
+            key: Clave de RangeCache.build_key (None = sin caché)
+            start_day: Primer día pedido
+            end_day: Último día pedido
+            day_suffixes: Normalizador de la columna de fecha a 'YYYYMMDD'
+            date_column: Columna de fecha del resultado
+
+        Returns:
+            (DataFrame filtrado, primer día cubierto, último día cubierto), o
+            None si no hay intersección con el rango guardado
+        """
+        if key is None:
+            return None
+
+        with _lock:
+            entry = _entries.get(key)
+            if entry is None:
+                return None
+
+            # Los rangos con días abiertos de GA4 caducan antes
+            if (entry['open_since'] is not None
+                    and time.time() - entry['open_since'] > Settings.QUERY_CACHE_TTL_OPEN_SECONDS):
+                del _entries[key]
+                return None
+
+            _entries.move_to_end(key)
+            covered_start = max(start_day, entry['start'])
+            covered_end = min(end_day, entry['end'])
+            df = entry['df']
+
+        if covered_start > covered_end:
+            return None
+
+        if df.empty:
+            return df, covered_start, covered_end
+
+        suffixes = day_suffixes(df[date_column])
+        mask = (suffixes >= covered_start.strftime('%Y%m%d')) & (suffixes <= covered_end.strftime('%Y%m%d'))
+        return df[mask].reset_index(drop=True), covered_start, covered_end
+
+    @staticmethod
+    def store(key: Optional[str], start_day: date, end_day: date, df: pd.DataFrame,
+              last_closed_day: date, day_suffixes: Callable, date_column: str):
+        """
+        Guarda el resultado de [start_day, end_day], uniéndolo al rango ya
+        guardado si se solapan o son contiguos
+
+        Args:
+            key: Clave de RangeCache.build_key (None = no se guarda)
+            start_day: Primer día del resultado
+            end_day: Último día del resultado
+            df: Resultado completo del rango
+            last_closed_day: Último día cerrado de GA4 (los posteriores caducan)
+            day_suffixes: Normalizador de la columna de fecha a 'YYYYMMDD'
+            date_column: Columna de fecha del resultado
+        """
+        if key is None:
+            return
+
+        now = time.time()
+
+        with _lock:
+            entry = _entries.get(key)
+            if (entry is not None
+                    and start_day <= entry['end'] + timedelta(days=1)
+                    and entry['start'] <= end_day + timedelta(days=1)):
+                # Se conservan del rango anterior solo los días que no trae el nuevo
+                old = entry['df']
+                if not old.empty:
+                    suffixes = day_suffixes(old[date_column])
+                    outside = ((suffixes < start_day.strftime('%Y%m%d'))
+                               | (suffixes > end_day.strftime('%Y%m%d')))
+                    old = old[outside]
+                frames = [f for f in (old, df) if not f.empty]
+                merged = pd.concat(frames, ignore_index=True) if frames else df
+                new_start = min(start_day, entry['start'])
+                new_end = max(end_day, entry['end'])
+                previous_open_since = entry['open_since']
+            else:
+                merged = df
+                new_start, new_end = start_day, end_day
+                previous_open_since = None
+
+            # Antigüedad de los días abiertos: se renueva solo si el nuevo resultado los trae todos
+            first_open_day = max(new_start, last_closed_day + timedelta(days=1))
+            if new_end < first_open_day:
+                open_since = None
+            elif start_day <= first_open_day and end_day >= new_end:
+                open_since = now
+            else:
+                open_since = previous_open_since or now
+
+            _entries[key] = {
+                'start': new_start,
+                'end': new_end,
+                'df': merged,
+                'open_since': open_since
+            }
+            _entries.move_to_end(key)
+
+            while len(_entries) > Settings.RANGE_CACHE_MAX_ENTRIES:
+                _entries.popitem(last=False)
+
+    @staticmethod
+    def clear():
+        """Vacía la caché en memoria"""
+        with _lock:
+            _entries.clear()
@@ -0,0 +1,91 @@
+"""
+Modo muestreo: consultas exploratorias sobre un subconjunto de usuarios
+
+Los generadores que lo admiten (sample_percent=) filtran los eventos con un
+hash de user_pseudo_id (fragments.user_sample_filter), de modo que cada
+porcentaje corresponde siempre a los mismos usuarios. Los conteos de la muestra
+se escalan por 100 / porcentaje y se acompañan de un intervalo de confianza
+que tiene en cuenta que se muestrean usuarios enteros, no eventos sueltos.
+
+Las tablas comodín events_* no admiten TABLESAMPLE, y el filtro por hash no
+reduce los bytes facturados bajo demanda (se sigue leyendo cada columna); lo
+que se ahorra es tiempo de slots, shuffle de joins y agregaciones, y filas
+devueltas. Cuando el análisis está listo se repite en completo.
+"""
+import numpy as np
+
+from config.settings import Settings
+from database.queries import (
+    generar_query_eventos_flatten,
+    generar_query_parametros_eventos,
+    generar_query_combos_cross_selling
+)
+
+# Columnas a escalar por generador: 'counts' son conteos de filas (llevan
+# intervalo de confianza), 'totals' son sumas que solo se extrapolan y
+# 'cluster' es el conteo cuya columna <cluster>_sq (suma de cuadrados de los
+# conteos por usuario) devuelve la consulta muestreada
+SAMPLED_METRICS = {
+    generar_query_eventos_flatten: {'counts': [], 'totals': [], 'cluster': None},
+    generar_query_parametros_eventos: {'counts': ['parameter_count'], 'totals': [], 'cluster': 'parameter_count'},
+    generar_query_combos_cross_selling: {
+        'counts': [
+            'times_bought_together',
+            'desktop_purchases',
+            'mobile_purchases',
+            'tablet_purchases',
+            'product_a_transactions',
+            'product_b_transactions'
+        ],
+        'totals': ['combined_revenue'],
+        'cluster': 'times_bought_together'
+    },
+}
+
+
+def scale_sample(df, generator, sample_percent):
+    """
+    Extrapola al total un resultado obtenido con sample_percent
+
+    Cada conteo k de la muestra se estima como k / f (f = fracción muestreada).
+    Como cada usuario entra o no con todos sus eventos, la varianza es
+    (1 - f) * Σ k_u² / f², con k_u el conteo de cada usuario muestreado. Para
+    el conteo 'cluster' Σ k_u² viene en la consulta; el resto de conteos de la
+    fila usan el mismo efecto de diseño (Σ k_u² / k). Se añaden las columnas
+    <columna>_ic_inf / <columna>_ic_sup con el intervalo de SAMPLE_CONFIDENCE_Z.
+    Los conteos de valores distintos no se escalan (no son lineales).
+
+    Args:
+        df: Resultado del generador
+        generator: Generador que produjo la consulta (clave de SAMPLED_METRICS)
+        sample_percent: Porcentaje muestreado, o None si la consulta fue completa
+
+    Returns:
+        DataFrame escalado, con df.attrs['sample_percent'] para el aviso de muestra
+    """
+    # Copia: el DataFrame puede venir compartido desde la caché de consultas
+    df = df.copy()
+    df.attrs['sample_percent'] = sample_percent
+    if not sample_percent or df.empty:
+        return df
+
+    fraction = sample_percent / 100
+    metrics = SAMPLED_METRICS.get(generator, {'counts': [], 'totals': [], 'cluster': None})
+
+    # Efecto de diseño por fila: 1 si los eventos fueran independientes
+    design_effect = 1.0
+    if metrics['cluster'] and f"{metrics['cluster']}_sq" in df.columns:
+        cluster_sq = df.pop(f"{metrics['cluster']}_sq").astype(float)
+        design_effect = (cluster_sq / df[metrics['cluster']].astype(float)).fillna(1.0)
+
+    for column in metrics['counts']:
+        sampled = df[column].astype(float)
+        margin = Settings.SAMPLE_CONFIDENCE_Z * np.sqrt(sampled * design_effect * (1 - fraction))
+        df[column] = (sampled / fraction).round().astype('int64')
+        df[f'{column}_ic_inf'] = ((sampled - margin).clip(lower=0) / fraction).round().astype('int64')
+        df[f'{column}_ic_sup'] = ((sampled + margin) / fraction).round().astype('int64')
+
+    for column in metrics['totals']:
+        df[column] = df[column] / fraction
+
+    return df
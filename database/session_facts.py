@@ -0,0 +1,344 @@
+"""
+Tabla de hechos de sesión materializada
+
+Las consultas de sesiones y usuarios reconstruyen cada sesión a partir de
+events_* (ga_session_id, fuente, dispositivo, landing, conversión...). Esta
+tabla guarda una fila por sesión y día en un dataset auxiliar, particionada
+por fecha, y se completa de forma incremental: cada día cerrado de GA4 se
+materializa una sola vez. Las consultas la leen en lugar de escanear eventos.
+
+DailyTable contiene la construcción incremental común; SessionFacts y
+DailySketches (database/daily_sketches.py) solo definen su consulta y su
+esquema de partición.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
+
+from config.settings import Settings
+from database.daily_store import contiguous_ranges, to_date
+from database.queries import (
+    generar_query_session_facts,
+    generar_query_low_converting_sessions,
+    generar_query_clv_sesiones,
+    generar_query_tiempo_primera_compra,
+    generar_query_adquisicion_usuarios,
+    generar_query_conversion_mensual
+)
+
+# Generadores que aceptan session_facts
+SESSION_FACTS_GENERATORS = {
+    generar_query_low_converting_sessions,
+    generar_query_clv_sesiones,
+    generar_query_tiempo_primera_compra,
+    generar_query_adquisicion_usuarios,
+    generar_query_conversion_mensual,
+}
+
+_lock = threading.Lock()
+# table_id -> estado de la tabla (ver _table_state)
+_built_days: Dict[str, Dict] = {}
+
+
+def _table_state(table_id: str) -> Dict:
+    """
+    Estado en memoria de una tabla auxiliar
+
+    Cada tabla tiene su propio lock, que solo protege el estado: los jobs de
+    BigQuery se lanzan sin él. Los días en construcción quedan reservados con
+    un threading.Event para que otros hilos esperen ese rango en lugar de
+    construirlo otra vez.
+
+    Returns:
+        dict con 'lock', 'checked_on' (día de la última lectura de la tabla),
+        'loading' (Event de la lectura en curso), 'days' (días materializados)
+        y 'building' (día -> Event de su construcción en curso)
+    """
+    with _lock:
+        state = _built_days.get(table_id)
+        if state is None:
+            state = {
+                'lock': threading.Lock(),
+                'checked_on': None,
+                'loading': None,
+                'days': set(),
+                'building': {}
+            }
+            _built_days[table_id] = state
+        return state
+
+
+def _days_between(start_day, end_day):
+    """Días del rango [start_day, end_day]"""
+    days = []
+    day = start_day
+    while day <= end_day:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+class DailyTable:
+    """Tabla auxiliar particionada por día que se materializa de forma incremental"""
+
+    TABLE_PREFIX = None       # Nombre de la tabla: <prefijo>_<dataset GA4>
+    DATE_COLUMN = None        # Columna DATE de partición
+    CLUSTER_BY = None         # Columnas de clustering (None = sin clustering)
+    ENABLED_SETTING = None    # Atributo de Settings que activa la tabla
+    LABEL = None              # Nombre en monitorización
+    _select = None            # generar_query_*(project, dataset, start_date, end_date) de un rango de días
+
+    # Atributos que cada subclase debe definir (CLUSTER_BY es opcional)
+    _REQUIRED = ('TABLE_PREFIX', 'DATE_COLUMN', 'ENABLED_SETTING', 'LABEL', '_select')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = [name for name in cls._REQUIRED if getattr(cls, name) is None]
+        if missing:
+            raise TypeError(f"{cls.__name__} debe definir {', '.join(missing)}")
+
+    @classmethod
+    def table_id(cls, project: str, dataset: str) -> str:
+        return f"{project}.{Settings.SCRATCH_DATASET}.{cls.TABLE_PREFIX}_{dataset}"
+
+    @staticmethod
+    def _ensure_dataset(client, project: str, dataset: str):
+        """Crea el dataset auxiliar en la misma ubicación que el dataset GA4"""
+        location = client.get_dataset(f"{project}.{dataset}").location
+        scratch = bigquery.Dataset(f"{project}.{Settings.SCRATCH_DATASET}")
+        scratch.location = location
+        scratch.description = "Tablas auxiliares generadas por BigQuery Shield"
+        client.create_dataset(scratch, exists_ok=True)
+
+    @classmethod
+    def _load_built_days(cls, client, table_id: str, monitoring_log) -> Optional[set]:
+        """Días ya materializados (None si la tabla no existe)"""
+        from database.connection import execute_query
+
+        try:
+            client.get_table(table_id)
+        except NotFound:
+            return None
+
+        df = execute_query(
+            client,
+            f"SELECT DISTINCT {cls.DATE_COLUMN} FROM `{table_id}`",
+            query_name=f"{cls.LABEL} (días materializados)",
+            use_cache=False,
+            monitoring_log=monitoring_log
+        )
+        return {to_date(day) for day in df[cls.DATE_COLUMN]}
+
+    @classmethod
+    def _create_table(cls, client, project, dataset, table_id, day, monitoring_log):
+        """
+        Crea la tabla vacía (esquema de un día con LIMIT 0)
+
+        Nunca se crea con datos: si otro proceso la creó antes, CREATE TABLE IF
+        NOT EXISTS no hace nada y los días se rellenan igualmente con
+        _build_range.
+        """
+        from database.connection import execute_query
+
+        cluster = f"CLUSTER BY {cls.CLUSTER_BY}" if cls.CLUSTER_BY else ""
+        execute_query(
+            client,
+            f"""
+            CREATE TABLE IF NOT EXISTS `{table_id}`
+            PARTITION BY {cls.DATE_COLUMN}
+            {cluster}
+            AS SELECT * FROM ({cls._select(project, dataset, day, day)}) LIMIT 0
+            """,
+            query_name=f"{cls.LABEL} (creación)",
+            use_cache=False,
+            monitoring_log=monitoring_log
+        )
+
+    @classmethod
+    def _build_range(cls, client, project, dataset, table_id, range_start, range_end, monitoring_log):
+        """
+        Materializa un rango de días (borrando antes lo que hubiera)
+
+        DELETE e INSERT van en una transacción: si otro proceso construye los
+        mismos días a la vez, BigQuery aborta una de las dos en lugar de
+        duplicar filas.
+        """
+        from database.connection import execute_query
+
+        execute_query(
+            client,
+            f"""
+            BEGIN TRANSACTION;
+            DELETE FROM `{table_id}`
+            WHERE {cls.DATE_COLUMN} BETWEEN '{range_start:%Y-%m-%d}' AND '{range_end:%Y-%m-%d}';
+            INSERT INTO `{table_id}`
+            {cls._select(project, dataset, range_start, range_end)};
+            COMMIT TRANSACTION;
+            """,
+            query_name=f"{cls.LABEL} ({range_start:%Y%m%d}-{range_end:%Y%m%d})",
+            use_cache=False,
+            monitoring_log=monitoring_log
+        )
+
+    @classmethod
+    def _refresh(cls, client, project, dataset, table_id, state, today, monitoring_log):
+        """
+        Relee los días materializados una vez al día, creando la tabla si no existe
+
+        Solo un hilo lee la tabla; el resto espera a que termine.
+        """
+        with state['lock']:
+            if state['checked_on'] == today:
+                return
+            loading = state['loading']
+            if loading is None:
+                loading = state['loading'] = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            loading.wait()
+            if state['checked_on'] != today:
+                raise RuntimeError("no se pudieron leer los días materializados")
+            return
+
+        try:
+            days = cls._load_built_days(client, table_id, monitoring_log)
+            if days is None:
+                cls._ensure_dataset(client, project, dataset)
+                cls._create_table(client, project, dataset, table_id, today, monitoring_log)
+                days = set()
+            with state['lock']:
+                state['days'] = days
+                state['checked_on'] = today
+        finally:
+            with state['lock']:
+                state['loading'] = None
+            loading.set()
+
+    @classmethod
+    def ensure_fresh(cls, client, project, dataset, start_date, end_date, monitoring_log=None) -> Optional[Dict]:
+        """
+        Materializa los días cerrados del rango que aún no estén en la tabla
+
+        No usa st.*, así que puede llamarse desde los hilos de "Ejecutar todas
+        las secciones". Los jobs de construcción no bloquean a otras tablas ni
+        a los hilos que no necesitan esos días. Si algo falla (p. ej. sin
+        permisos para crear el dataset auxiliar) devuelve None y las consultas
+        vuelven a leer events_*.
+
+        Args:
+            client: Cliente de BigQuery
+            project: ID del proyecto
+            dataset: ID del dataset GA4
+            start_date: Fecha de inicio del análisis
+            end_date: Fecha de fin del análisis
+            monitoring_log: Lista de monitorización para los jobs de construcción
+
+        Returns:
+            dict {'table', 'last_day'} para los generadores, o None
+        """
+        if not getattr(Settings, cls.ENABLED_SETTING):
+            return None
+
+        start_day = to_date(start_date)
+        end_day = to_date(end_date)
+        today = datetime.now().date()
+        last_closed_day = today - timedelta(days=Settings.GA4_CLOSED_DAY_LAG)
+        last_day = min(end_day, last_closed_day)
+
+        if start_day > last_day:
+            # Todo el rango está en días abiertos: no hay nada que materializar
+            return None
+
+        table_id = cls.table_id(project, dataset)
+        if monitoring_log is None:
+            monitoring_log = []
+        state = _table_state(table_id)
+        days = _days_between(start_day, last_day)
+
+        try:
+            cls._refresh(client, project, dataset, table_id, state, today, monitoring_log)
+
+            # Se reservan los días que faltan y nadie está construyendo
+            with state['lock']:
+                claimed = threading.Event()
+                missing_days = []
+                pending = set()
+                for day in days:
+                    if day in state['days']:
+                        continue
+                    if day in state['building']:
+                        pending.add(state['building'][day])
+                    else:
+                        state['building'][day] = claimed
+                        missing_days.append(day)
+
+            try:
+                for range_start, range_end in contiguous_ranges(missing_days):
+                    cls._build_range(
+                        client, project, dataset, table_id, range_start, range_end, monitoring_log
+                    )
+                    with state['lock']:
+                        state['days'].update(_days_between(range_start, range_end))
+            finally:
+                with state['lock']:
+                    for day in missing_days:
+                        state['building'].pop(day, None)
+                claimed.set()
+
+            for event in pending:
+                event.wait()
+
+            with state['lock']:
+                if not state['days'].issuperset(days):
+                    # Otro hilo no pudo construir parte del rango
+                    return None
+
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar la tabla auxiliar {table_id}: {e}")
+            with state['lock']:
+                # Se vuelve a leer el estado real en la próxima llamada
+                state['checked_on'] = None
+            return None
+
+        return {'table': table_id, 'last_day': last_day}
+
+class SessionFacts(DailyTable):
+    """Construcción incremental y consulta de la tabla de sesiones"""
+
+    TABLE_PREFIX = 'session_facts'
+    DATE_COLUMN = 'session_date'
+    CLUSTER_BY = 'user_pseudo_id'
+    ENABLED_SETTING = 'SESSION_FACTS_ENABLED'
+    LABEL = 'Session facts'
+    _select = staticmethod(generar_query_session_facts)
+
+    @staticmethod
+    def generate_query(client, generator, project, dataset, start_date, end_date, monitoring_log=None,
+                       approximate=False) -> str:
+        """
+        Genera la consulta usando la tabla de sesiones si el generador la soporta
+
+        Args:
+            approximate: Modo rápido; los generadores que lo admiten cuentan
+                distintos con HLL++ (y leen los sketches diarios si pueden)
+
+        Returns:
+            SQL listo para ejecutar
+        """
+        kwargs = {}
+        if generator in SESSION_FACTS_GENERATORS:
+            kwargs['session_facts'] = SessionFacts.ensure_fresh(
+                client, project, dataset, start_date, end_date, monitoring_log
+            )
+        if approximate:
+            from database.daily_sketches import approximate_kwargs
+            kwargs.update(approximate_kwargs(
+                client, generator, project, dataset, start_date, end_date, monitoring_log
+            ))
+        return generator(project, dataset, start_date, end_date, **kwargs)
@@ -1,4 +1,4 @@
-from .sidebar import render_sidebar, get_project_dataset_selection
+from .sidebar import render_sidebar, get_project_dataset_selection, is_approximate_mode
 from .tabs import (
     show_cookies_tab, 
     show_ecommerce_tab, 
@@ -12,6 +12,7 @@ from .tabs import (
 __all__ = [
     'render_sidebar', 
     'get_project_dataset_selection',
+    'is_approximate_mode',
     'show_cookies_tab', 
     'show_ecommerce_tab',
     'show_acquisition_tab',
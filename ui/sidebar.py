@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from config.settings import Settings
-from google.cloud import bigquery
+from database.discovery import GA4Discovery
 from utils.error_handling import handle_bq_error
 
 def render_sidebar():
@@ -39,6 +39,15 @@ def render_sidebar():
         else:
             st.error(" La fecha de inicio debe ser anterior a la fecha de fin")
         
+        # Modo rápido: usuarios y sesiones únicos aproximados
+        st.toggle(
+            "Modo rápido (aproximado)",
+            value=Settings.APPROXIMATE_MODE_DEFAULT,
+            key="global_approximate",
+            help="Cuenta usuarios y sesiones únicos con HyperLogLog++ (error típico ~1%). "
+                 "Más rápido y barato en datasets grandes; los resultados se marcan como aproximados"
+        )
+        
         st.divider()
         
         # Links útiles
@@ -56,90 +65,29 @@ def render_sidebar():
     
     return False, start_date, end_date
 
-def is_ga4_dataset(client: bigquery.Client, project_id: str, dataset_id: str) -> bool:
-    """
-    Verifica si un dataset es de GA4
-    
-    Args:
-        client: Cliente de BigQuery
-        project_id: ID del proyecto
-        dataset_id: ID del dataset
-        
-    Returns:
-        True si es un dataset de GA4, False si no
-    """
-    try:
-        # Los datasets de GA4 siguen el patrón: analytics_XXXXXXXXX
-        if not dataset_id.startswith('analytics_'):
-            return False
-        
-        # Verificar que tenga al menos una tabla events_*
-        dataset_ref = f"{project_id}.{dataset_id}"
-        tables = list(client.list_tables(dataset_ref, max_results=10))
-        
-        # Buscar tablas que empiecen con "events_"
-        has_events_tables = any(table.table_id.startswith('events_') for table in tables)
-        
-        return has_events_tables
-        
-    except Exception:
-        # Si hay error al listar tablas, asumir que no es GA4
-        return False
-
-def get_ga4_projects_and_datasets(client: bigquery.Client):
-    """
-    Obtiene solo proyectos con datasets de GA4
-    
-    Args:
-        client: Cliente de BigQuery
-        
-    Returns:
-        dict: {project_id: [lista de datasets GA4]}
-    """
-    ga4_projects = {}
-    
-    try:
-        # Listar todos los proyectos
-        projects = list(client.list_projects())
-        
-        for project in projects:
-            project_id = project.project_id
-            
-            try:
-                # Listar datasets del proyecto
-                datasets = list(client.list_datasets(project_id))
-                
-                # Filtrar solo datasets de GA4
-                ga4_datasets = []
-                for dataset in datasets:
-                    dataset_id = dataset.dataset_id
-                    
-                    if is_ga4_dataset(client, project_id, dataset_id):
-                        ga4_datasets.append(dataset_id)
-                
-                # Solo añadir el proyecto si tiene datasets GA4
-                if ga4_datasets:
-                    ga4_projects[project_id] = ga4_datasets
-                    
-            except Exception:
-                # Si no se pueden listar datasets del proyecto, continuar con el siguiente
-                continue
-        
-        return ga4_projects
-        
-    except Exception as e:
-        st.error(f"Error listando proyectos: {e}")
-        return {}
+def is_approximate_mode():
+    """Estado del interruptor de modo rápido de la barra lateral"""
+    return st.session_state.get('global_approximate', Settings.APPROXIMATE_MODE_DEFAULT)
 
 def get_project_dataset_selection(client):
     """Obtiene la selección de proyecto y dataset - Solo GA4"""
     try:
         st.sidebar.markdown("### Fuente de Datos (GA4)")
         
-        # Mostrar spinner mientras se cargan proyectos
+        force_refresh = st.sidebar.button(
+            " Actualizar proyectos",
+            key="refresh_ga4_projects",
+            help=f"El listado se guarda {Settings.DISCOVERY_TTL_SECONDS // 60} minutos y se refresca en segundo plano"
+        )
+        
+        # Mostrar spinner mientras se cargan proyectos (solo la primera vez o al forzar)
         with st.sidebar:
             with st.spinner(" Buscando proyectos con GA4..."):
-                ga4_projects = get_ga4_projects_and_datasets(client)
+                try:
+                    ga4_projects = GA4Discovery.get_projects(client, force_refresh=force_refresh)
+                except Exception as e:
+                    st.error(f"Error listando proyectos: {e}")
+                    ga4_projects = {}
         
         if not ga4_projects:
             st.sidebar.error(" No se encontraron proyectos con datasets de GA4")
@@ -197,28 +145,15 @@ def get_project_dataset_selection(client):
         # Mostrar información adicional del dataset
         with st.sidebar.expander("ℹ Info del Dataset", expanded=False):
             try:
-                dataset_ref = f"{selected_project}.{selected_dataset}"
-                tables = list(client.list_tables(dataset_ref, max_results=100))
-                
-                # Contar tablas events_*
-                events_tables = [t for t in tables if t.table_id.startswith('events_')]
+                info = GA4Discovery.get_dataset_info(client, selected_project, selected_dataset)
                 
-                st.write(f"**Tablas events_**: {len(events_tables)}")
-                st.write(f"**Total de tablas**: {len(tables)}")
+                st.write(f"**Tablas events_**: {info['events_tables']}")
+                st.write(f"**Total de tablas**: {info['total_tables']}")
                 
                 # Mostrar rango de fechas disponibles
-                if events_tables:
-                    dates = []
-                    for table in events_tables:
-                        if table.table_id.startswith('events_') and len(table.table_id) > 7:
-                            date_str = table.table_id.replace('events_', '')
-                            if date_str.isdigit() and len(date_str) == 8:
-                                dates.append(date_str)
-                    
-                    if dates:
-                        dates.sort()
-                        st.write(f"**Desde**: {dates[0]}")
-                        st.write(f"**Hasta**: {dates[-1]}")
+                if info['first_day']:
+                    st.write(f"**Desde**: {info['first_day']}")
+                    st.write(f"**Hasta**: {info['last_day']}")
                 
             except Exception as e:
                 st.write(f"Error obteniendo info: {e}")
@@ -11,6 +11,11 @@ from visualization.acquisition_visualizations import (
     mostrar_atribucion_completa
 )
 from database.connection import run_query
+from database.attribution import attribute_paths
+from ui.tabs.async_query import submit_async_query, show_async_query_status
+from database.daily_sketches import mark_approximate
+from database.session_facts import SessionFacts
+from ui.sidebar import is_approximate_mode
 
 def show_acquisition_tab(client, project, dataset, start_date, end_date):
     """Pestaña de Adquisición con análisis de tráfico"""
@@ -18,8 +23,8 @@ def show_acquisition_tab(client, project, dataset, start_date, end_date):
     # Inicializar session_state para mantener datos y estado
     if 'attribution_data' not in st.session_state:
         st.session_state.attribution_data = None
-    if 'show_attribution_results' not in st.session_state:
-        st.session_state.show_attribution_results = False
+    if 'attribution_show' not in st.session_state:
+        st.session_state.attribution_show = False
     
     # Sección 1: Canales de Tráfico
     with st.expander(" Análisis de Canales de Tráfico", expanded=False):
@@ -27,8 +32,11 @@ def show_acquisition_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Canales de Tráfico", key="btn_canales"):
             with st.spinner("Analizando distribución de canales..."):
-                query = generar_query_canales_trafico(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                query = SessionFacts.generate_query(
+                    client, generar_query_canales_trafico, project, dataset, start_date, end_date, approximate=approximate
+                )
+                df = mark_approximate(run_query(client, query), approximate)
                 mostrar_canales_trafico(df)
     
     # Sección 2: Atribución Básica
@@ -52,7 +60,7 @@ def show_acquisition_tab(client, project, dataset, start_date, end_date):
                 mostrar_atribucion_multimodelo(df)
     
     # Sección 4: Atribución Completa (7 modelos)
-    with st.expander(" Atribución Completa (7 Modelos)", expanded=st.session_state.show_attribution_results):
+    with st.expander(" Atribución Completa (7 Modelos)", expanded=st.session_state.attribution_show):
         st.info("""
         **Análisis completo con 7 modelos de atribución:**
         - Last Click, First Click, Linear
@@ -61,14 +69,14 @@ def show_acquisition_tab(client, project, dataset, start_date, end_date):
         """)
         
         if st.button("Análisis 7 Modelos", key="btn_7modelos"):
-            with st.spinner("Calculando atribución completa (puede tardar)..."):
-                query = generar_query_atribucion_completa(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                
-                # Guardar datos en session_state
-                st.session_state.attribution_data = df
-                st.session_state.show_attribution_results = True
+            # Se ejecuta en segundo plano: la app sigue respondiendo y se puede cancelar
+            query = generar_query_atribucion_completa(project, dataset, start_date, end_date)
+            # BigQuery devuelve las rutas comprimidas; los 7 modelos se calculan al recoger el resultado
+            submit_async_query(client, query, "attribution", "Atribución 7 modelos", postprocess=attribute_paths)
+        
+        # Progreso del job en curso (guarda attribution_data al terminar)
+        show_async_query_status("attribution")
         
         # Mostrar resultados si existen en session_state
-        if st.session_state.show_attribution_results and st.session_state.attribution_data is not None:
+        if st.session_state.attribution_show and st.session_state.attribution_data is not None:
             mostrar_atribucion_completa(st.session_state.attribution_data)
@@ -0,0 +1,175 @@
+"""
+Consultas asíncronas con progreso y cancelación
+
+Las secciones pesadas lanzan su job en un hilo de fondo y guardan su estado en
+st.session_state.async_jobs (clave = prefijo de la sección). Un fragmento se
+vuelve a ejecutar cada pocos segundos mostrando tiempo transcurrido, bytes y
+slot-ms del job, sin bloquear el resto de la app; al terminar, el resultado se
+guarda en <prefijo>_data / <prefijo>_show como con una ejecución normal.
+
+Si la interfaz deja de sondear el job (pestaña cerrada, sesión perdida) el job
+se cancela en BigQuery para no seguir consumiendo slots.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config.settings import Settings
+from database.connection import execute_query, QueryCancelled
+from database.cost_guard import CostGuard, QueryBudgetExceeded
+from utils.bq_monitoring import bytes_to_readable
+from utils.error_handling import handle_bq_error
+
+# Pool compartido por todas las sesiones del proceso
+_executor = ThreadPoolExecutor(max_workers=Settings.MAX_ASYNC_QUERIES, thread_name_prefix="bq_async")
+
+
+class _JobHeartbeat(threading.Event):
+    """Evento de cancelación que también se activa si la interfaz deja de sondear"""
+
+    def __init__(self):
+        super().__init__()
+        self.touch()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def is_set(self):
+        if super().is_set():
+            return True
+        if time.monotonic() - self.last_seen > Settings.ASYNC_ABANDON_SECONDS:
+            self.set()
+            return True
+        return False
+
+
+def submit_async_query(client, query, prefix, query_name, postprocess=None, fetch=True):
+    """
+    Lanza una consulta en segundo plano asociada a una sección
+
+    Args:
+        client: Cliente de BigQuery
+        query: Query SQL a ejecutar
+        prefix: Prefijo de session_state de la sección (<prefijo>_data / <prefijo>_show)
+        query_name: Nombre descriptivo para monitorización
+        postprocess: Función opcional que recibe el DataFrame y devuelve el que se guarda
+        fetch: Si False el job no descarga filas y postprocess recibe el QueryJob
+            (resultados paginados)
+    """
+    jobs = st.session_state.setdefault('async_jobs', {})
+    if prefix in jobs:
+        # Un segundo clic no encola otra ejecución de la misma sección
+        st.info("⏳ Esta consulta ya está en curso")
+        return
+
+    # Copia del historial: el hilo ve el consumo de la sesión para el control de coste
+    monitoring_log = list(st.session_state.setdefault('monitoring_data', []))
+    cancel_event = _JobHeartbeat()
+    job_info = {}
+
+    jobs[prefix] = {
+        'future': _executor.submit(
+            execute_query, client, query,
+            query_name=query_name,
+            monitoring_log=monitoring_log,
+            cancel_event=cancel_event,
+            job_info=job_info,
+            fetch=fetch
+        ),
+        'query_name': query_name,
+        'query': query,
+        'postprocess': postprocess,
+        'cancel_event': cancel_event,
+        'job_info': job_info,
+        'monitoring_log': monitoring_log,
+        'log_start': len(monitoring_log),
+        'started_at': time.monotonic()
+    }
+
+
+@st.fragment(run_every=Settings.ASYNC_POLL_SECONDS)
+def _show_progress(prefix):
+    """Progreso del job en curso (se refresca solo, sin rerun de la app)"""
+    job = st.session_state.get('async_jobs', {}).get(prefix)
+    if job is None:
+        return
+
+    if job['future'].done():
+        # El resultado se recoge en una ejecución completa para que la sección lo muestre
+        st.rerun()
+
+    cancel_event = job['cancel_event']
+    cancel_event.touch()
+
+    elapsed = time.monotonic() - job['started_at']
+    bq_job = job['job_info'].get('job')
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Tiempo", f"{elapsed:.0f}s")
+    with col2:
+        processed = None
+        if bq_job is not None:
+            processed = bq_job.total_bytes_processed or bq_job.estimated_bytes_processed
+        st.metric("Bytes a procesar", bytes_to_readable(processed) if processed else "—")
+    with col3:
+        slot_ms = bq_job.slot_millis if bq_job is not None else None
+        st.metric("Slot-ms", f"{slot_ms:,}" if slot_ms else "—")
+
+    if bq_job is not None:
+        attempt = job['job_info'].get('attempt', 1)
+        st.caption(
+            f"Job `{bq_job.job_id}` · {bq_job.state or 'PENDING'}"
+            + (f" · intento {attempt}" if attempt > 1 else "")
+        )
+
+    if cancel_event.is_set():
+        st.info("Cancelando consulta...")
+    else:
+        st.button("⏹️ Cancelar consulta", key=f"btn_cancel_{prefix}", on_click=cancel_event.set)
+
+
+def show_async_query_status(prefix):
+    """
+    Muestra el progreso de la consulta de una sección o recoge su resultado
+
+    Debe llamarse en cada ejecución, dentro de la sección y antes de mostrar
+    <prefijo>_data.
+
+    Args:
+        prefix: Prefijo de session_state de la sección
+    """
+    jobs = st.session_state.setdefault('async_jobs', {})
+    job = jobs.get(prefix)
+    if job is None:
+        return
+
+    if not job['future'].done():
+        with st.status(f"Ejecutando {job['query_name']}...", expanded=True):
+            _show_progress(prefix)
+        return
+
+    del jobs[prefix]
+
+    # Las métricas del hilo se vuelcan desde el hilo principal
+    st.session_state.setdefault('monitoring_data', []).extend(
+        job['monitoring_log'][job['log_start']:]
+    )
+
+    try:
+        df = job['future'].result()
+    except QueryCancelled:
+        st.warning("⏹️ Consulta cancelada")
+        return
+    except QueryBudgetExceeded as e:
+        CostGuard.show_blocked_query(e)
+    except Exception as e:
+        handle_bq_error(e, job['query'])
+
+    if job['postprocess'] is not None:
+        df = job['postprocess'](df)
+
+    st.session_state[f"{prefix}_data"] = df
+    st.session_state[f"{prefix}_show"] = True
@@ -16,6 +16,11 @@ from visualization.cookies_visualizations import (
     mostrar_consentimiento_por_fuente_trafico
 )
 from database.connection import run_query
+from ui.tabs.run_all import show_run_all_button
+from database.daily_store import run_daily_query
+from database.daily_sketches import mark_approximate
+from database.session_facts import SessionFacts
+from ui.sidebar import is_approximate_mode
 
 def show_cookies_tab(client, project, dataset, start_date, end_date):
     """Pestaña de Cookies con análisis de privacidad y consentimientos"""
@@ -52,6 +57,20 @@ def show_cookies_tab(client, project, dataset, start_date, end_date):
     if 'cookies_trafico_show' not in st.session_state:
         st.session_state.cookies_trafico_show = False
     
+    # Ejecutar todas las secciones en paralelo
+    show_run_all_button(
+        client, project, dataset, start_date, end_date,
+        sections=[
+            ("cookies_evolucion", "Evolución Temporal del Consentimiento", generar_query_evolucion_temporal_consentimiento),
+            ("cookies_basico", "Consentimiento Básico", generar_query_consentimiento_basico),
+            ("cookies_dispositivo", "Consentimiento por Dispositivo", generar_query_consentimiento_por_dispositivo),
+            ("cookies_geografia", "Consentimiento por Geografía", generar_query_consentimiento_por_geografia),
+            ("cookies_trafico", "Consentimiento por Fuente de Tráfico", generar_query_consentimiento_por_fuente_trafico),
+            ("cookies_real", "Porcentaje Real de Consentimiento", generar_query_consentimiento_real)
+        ],
+        key="btn_cookies_run_all"
+    )
+    
     # ==========================================
     # SECCIÓN 1: Evolución Temporal (NUEVO)
     # ==========================================
@@ -67,8 +86,12 @@ def show_cookies_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Evolución Temporal", key="btn_evolucion_temporal"):
             with st.spinner("Analizando evolución temporal del consentimiento..."):
-                query = generar_query_evolucion_temporal_consentimiento(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                df = run_daily_query(
+                    client, generar_query_evolucion_temporal_consentimiento,
+                    project, dataset, start_date, end_date, approximate=approximate
+                )
+                mark_approximate(df, approximate)
                 st.session_state.cookies_evolucion_data = df
                 st.session_state.cookies_evolucion_show = True
         
@@ -89,8 +112,11 @@ def show_cookies_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Ejecutar Análisis Básico", key="btn_consent_basic"):
             with st.spinner("Calculando consentimientos..."):
-                query = generar_query_consentimiento_basico(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                query = SessionFacts.generate_query(
+                    client, generar_query_consentimiento_basico, project, dataset, start_date, end_date, approximate=approximate
+                )
+                df = mark_approximate(run_query(client, query), approximate)
                 st.session_state.cookies_basico_data = df
                 st.session_state.cookies_basico_show = True
         
@@ -111,8 +137,11 @@ def show_cookies_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Ejecutar Análisis por Dispositivo", key="btn_consent_device"):
             with st.spinner("Analizando dispositivos..."):
-                query = generar_query_consentimiento_por_dispositivo(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                query = SessionFacts.generate_query(
+                    client, generar_query_consentimiento_por_dispositivo, project, dataset, start_date, end_date, approximate=approximate
+                )
+                df = mark_approximate(run_query(client, query), approximate)
                 st.session_state.cookies_dispositivo_data = df
                 st.session_state.cookies_dispositivo_show = True
         
@@ -135,8 +164,11 @@ def show_cookies_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar por Geografía", key="btn_geografia"):
             with st.spinner("Analizando consentimiento por geografía..."):
-                query = generar_query_consentimiento_por_geografia(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                query = SessionFacts.generate_query(
+                    client, generar_query_consentimiento_por_geografia, project, dataset, start_date, end_date, approximate=approximate
+                )
+                df = mark_approximate(run_query(client, query), approximate)
                 st.session_state.cookies_geografia_data = df
                 st.session_state.cookies_geografia_show = True
         
@@ -159,8 +191,11 @@ def show_cookies_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar por Fuente de Tráfico", key="btn_trafico"):
             with st.spinner("Analizando consentimiento por fuente de tráfico..."):
-                query = generar_query_consentimiento_por_fuente_trafico(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                query = SessionFacts.generate_query(
+                    client, generar_query_consentimiento_por_fuente_trafico, project, dataset, start_date, end_date, approximate=approximate
+                )
+                df = mark_approximate(run_query(client, query), approximate)
                 st
                 st.session_state.cookies_trafico_data = df
                 st.session_state.cookies_trafico_show = True
@@ -14,6 +14,12 @@ from visualization.ecommerce_visualizations import (
     mostrar_combos_cross_selling
 )
 from database.connection import run_query
+from ui.tabs.run_all import show_run_all_button
+from ui.tabs.async_query import submit_async_query, show_async_query_status
+from database.daily_store import run_daily_query
+from database.market_basket import mine_combos
+from ui.tabs.sampling_controls import sample_percent_selector, full_run_requested, show_promote_button
+from functools import partial
 
 def show_ecommerce_tab(client, project, dataset, start_date, end_date):
     """Pestaña de Ecommerce con análisis completo de eventos y productos"""
@@ -44,6 +50,19 @@ def show_ecommerce_tab(client, project, dataset, start_date, end_date):
     if 'ecommerce_combos_show' not in st.session_state:
         st.session_state.ecommerce_combos_show = False
     
+    # Ejecutar todas las secciones en paralelo
+    show_run_all_button(
+        client, project, dataset, start_date, end_date,
+        sections=[
+            ("ecommerce_funnel", "Funnel de Conversión", generar_query_comparativa_eventos),
+            ("ecommerce_ingresos", "Ingresos y Transacciones", generar_query_ingresos_transacciones),
+            ("ecommerce_productos", "Productos Más Vendidos", generar_query_productos_mas_vendidos),
+            ("ecommerce_relacion", "Relación ID vs Nombre de Productos", generar_query_relacion_productos),
+            ("ecommerce_combos", "Combos y Cross-Selling", generar_query_combos_cross_selling)
+        ],
+        key="btn_ecommerce_run_all"
+    )
+    
     # Sección 1: Funnel de Conversión
     with st.expander(" Funnel de Conversión", expanded=st.session_state.ecommerce_funnel_show):
         st.info("""
@@ -56,8 +75,7 @@ def show_ecommerce_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Ejecutar Análisis de Funnel", key="btn_funnel"):
             with st.spinner("Analizando funnel de conversión..."):
-                query = generar_query_comparativa_eventos(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                df = run_daily_query(client, generar_query_comparativa_eventos, project, dataset, start_date, end_date)
                 st.session_state.ecommerce_funnel_data = df
                 st.session_state.ecommerce_funnel_show = True
         
@@ -78,8 +96,7 @@ def show_ecommerce_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Ingresos y Transacciones", key="btn_ingresos"):
             with st.spinner("Calculando ingresos y transacciones..."):
-                query = generar_query_ingresos_transacciones(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                df = run_daily_query(client, generar_query_ingresos_transacciones, project, dataset, start_date, end_date)
                 st.session_state.ecommerce_ingresos_data = df
                 st.session_state.ecommerce_ingresos_show = True
         
@@ -145,15 +162,20 @@ def show_ecommerce_tab(client, project, dataset, start_date, end_date):
         - Aumentar AOV (Average Order Value) mediante recomendaciones
         """)
         
-        if st.button("Analizar Combos y Cross-Selling", key="btn_combos"):
-            with st.spinner("Analizando combos de productos (esto puede tardar)..."):
-                query = generar_query_combos_cross_selling(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                st.session_state.ecommerce_combos_data = df
-                st.session_state.ecommerce_combos_show = True
+        sample_percent = sample_percent_selector("ecommerce_combos")
+        
+        if st.button("Analizar Combos y Cross-Selling", key="btn_combos") or full_run_requested("ecommerce_combos"):
+            query = generar_query_combos_cross_selling(project, dataset, start_date, end_date, sample_percent)
+            submit_async_query(
+                client, query, "ecommerce_combos", "Combos y cross-selling",
+                postprocess=partial(mine_combos, sample_percent=sample_percent)
+            )
+        
+        show_async_query_status("ecommerce_combos")
         
         # Mostrar resultados si existen
         if st.session_state.ecommerce_combos_show and st.session_state.ecommerce_combos_data is not None:
             mostrar_combos_cross_selling(st.session_state.ecommerce_combos_data)
+            show_promote_button("ecommerce_combos", st.session_state.ecommerce_combos_data)
     # Mensaje de completado
     st.success(" **Todas las consultas de Ecommerce están disponibles!**")
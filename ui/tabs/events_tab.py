@@ -1,5 +1,7 @@
 import streamlit as st
 from database.queries.events_queries import (
+    FLATTEN_COLUMNS,
+    FLATTEN_DEFAULT_COLUMNS,
     generar_query_eventos_flatten,
     generar_query_eventos_resumen,
     generar_query_eventos_por_fecha,
@@ -14,6 +16,52 @@ from visualization.events_visualizations import (
     mostrar_metricas_diarias
 )
 from database.connection import run_query
+from ui.tabs.run_all import show_run_all_button
+from ui.tabs.async_query import submit_async_query, show_async_query_status
+from database.daily_store import run_daily_query
+from database.daily_sketches import mark_approximate
+from database.session_facts import SessionFacts
+from ui.sidebar import is_approximate_mode
+from ui.tabs.sampling_controls import sample_percent_selector, full_run_requested, show_promote_button
+from database.sampling import scale_sample
+from database.intraday import IntradayEvents, live_days
+from database.paged_results import PagedResult
+from ui.tabs.pagination import show_paged_result
+from config.settings import Settings
+from functools import partial
+
+def _comma_list(text):
+    """Valores de un campo de texto separados por comas; None si está vacío"""
+    values = [value.strip() for value in text.split(',') if value.strip()]
+    return values or None
+
+@st.fragment(run_every=Settings.LIVE_REFRESH_SECONDS)
+def _show_live_eventos_por_fecha(client, project, dataset, start_date, end_date):
+    """Evolución de eventos con los días intradía, re-sondeados cada LIVE_REFRESH_SECONDS"""
+    daily = st.session_state.events_fecha_data
+    days = live_days(daily, start_date, end_date)
+    if not days:
+        st.info("El rango seleccionado no incluye días pendientes de exportar: no hay datos en directo")
+        mostrar_eventos_por_fecha(daily)
+        return
+    
+    # El estado incremental vale mientras no cambien la fuente ni los días intradía
+    live = st.session_state.get('events_fecha_live_state')
+    if live is None or (live.project, live.dataset, live.days) != (project, dataset, days):
+        live = IntradayEvents(project, dataset, days)
+        st.session_state.events_fecha_live_state = live
+    
+    try:
+        live.refresh(client, monitoring_log=st.session_state.setdefault('monitoring_data', []))
+    except Exception as e:
+        st.warning(f"No se pudo actualizar el directo: {e}")
+    
+    data_until = live.data_until
+    st.caption(
+        f" En directo · {', '.join(f'{day:%d/%m}' for day in days)} desde events_intraday_* · "
+        f"datos hasta {data_until:%H:%M}" if data_until else " En directo · sin eventos intradía todavía"
+    )
+    mostrar_eventos_por_fecha(live.combine(daily))
 
 def show_events_tab(client, project, dataset, start_date, end_date):
     """Pestaña de Eventos con análisis completo"""
@@ -46,14 +94,31 @@ def show_events_tab(client, project, dataset, start_date, end_date):
     if 'events_metricas_show' not in st.session_state:
         st.session_state.events_metricas_show = False
     
+    # Ejecutar todas las secciones en paralelo
+    # El explorador flattenizado y el análisis de parámetros quedan fuera: uno es
+    # muy pesado y el otro necesita que se elija un evento
+    show_run_all_button(
+        client, project, dataset, start_date, end_date,
+        sections=[
+            ("events_metricas", "Métricas Diarias de Rendimiento", generar_query_metricas_diarias),
+            ("events_resumen", "Resumen de Eventos", generar_query_eventos_resumen),
+            ("events_fecha", "Evolución Temporal de Eventos", generar_query_eventos_por_fecha)
+        ],
+        key="btn_events_run_all"
+    )
+    
     # Sección 1: Métricas Diarias (NUEVA - la pongo primera porque es muy útil)
     with st.expander(" Métricas Diarias de Rendimiento", expanded=st.session_state.events_metricas_show):
         st.info("Dashboard completo con métricas diarias: sesiones, usuarios, engagement, conversiones")
         
         if st.button("Analizar Métricas Diarias", key="btn_metricas_diarias"):
             with st.spinner("Calculando métricas diarias..."):
-                query = generar_query_metricas_diarias(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                df = run_daily_query(
+                    client, generar_query_metricas_diarias, project, dataset, start_date, end_date,
+                    approximate=approximate
+                )
+                mark_approximate(df, approximate)
                 st.session_state.events_metricas_data = df
                 st.session_state.events_metricas_show = True
         
@@ -67,8 +132,11 @@ def show_events_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Eventos", key="btn_eventos_resumen"):
             with st.spinner("Analizando eventos..."):
-                query = generar_query_eventos_resumen(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                query = SessionFacts.generate_query(
+                    client, generar_query_eventos_resumen, project, dataset, start_date, end_date, approximate=approximate
+                )
+                df = mark_approximate(run_query(client, query), approximate)
                 st.session_state.events_resumen_data = df
                 st.session_state.events_resumen_show = True
         
@@ -82,30 +150,112 @@ def show_events_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Evolución", key="btn_eventos_fecha"):
             with st.spinner("Calculando evolución temporal..."):
-                query = generar_query_eventos_por_fecha(project, dataset, start_date, end_date)
-                df = run_query(client, query)
+                approximate = is_approximate_mode()
+                df = run_daily_query(
+                    client, generar_query_eventos_por_fecha, project, dataset, start_date, end_date,
+                    approximate=approximate
+                )
+                mark_approximate(df, approximate)
                 st.session_state.events_fecha_data = df
                 st.session_state.events_fecha_show = True
         
         # Mostrar resultados si existen
         if st.session_state.events_fecha_show and st.session_state.events_fecha_data is not None:
-            mostrar_eventos_por_fecha(st.session_state.events_fecha_data)
+            if st.toggle(
+                "En directo (incluye hoy)",
+                key="events_fecha_live",
+                help="Añade los días aún sin tabla diaria desde events_intraday_* y los actualiza "
+                     f"cada {Settings.LIVE_REFRESH_SECONDS}s consultando solo los minutos nuevos"
+            ):
+                _show_live_eventos_por_fecha(client, project, dataset, start_date, end_date)
+            else:
+                mostrar_eventos_por_fecha(st.session_state.events_fecha_data)
     
     # Sección 4: Datos Completos Flattenizados
     with st.expander(" Explorador de Datos Completo (Flattenizado)", expanded=st.session_state.events_flatten_show):
         st.warning(" Esta consulta puede tardar varios segundos. Limitada a 1000 registros.")
-        st.info("Acceso completo a todos los campos de eventos, parámetros, propiedades de usuario e items")
+        st.info(
+            "Acceso a los campos de eventos, parámetros, propiedades de usuario e items. "
+            "BigQuery factura por columna leída: cuantas menos columnas y arrays, menor el coste"
+        )
+        
+        flatten_columns = st.multiselect(
+            "Columnas de evento:",
+            FLATTEN_COLUMNS,
+            default=FLATTEN_DEFAULT_COLUMNS,
+            key="events_flatten_columns"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            flatten_events = st.text_input(
+                "Eventos (separados por comas, vacío = todos):",
+                placeholder="Ej: page_view, purchase",
+                key="events_flatten_events"
+            )
+            flatten_params = st.checkbox("Desanidar event_params", value=True, key="events_flatten_params")
+            flatten_param_keys = st.text_input(
+                "Claves de parámetros (separadas por comas, vacío = todas):",
+                placeholder="Ej: page_location, page_title",
+                key="events_flatten_param_keys",
+                disabled=not flatten_params
+            )
+        with col2:
+            flatten_user_properties = st.checkbox(
+                "Desanidar user_properties", value=False, key="events_flatten_user_properties"
+            )
+            flatten_items = st.checkbox("Desanidar items", value=False, key="events_flatten_items")
+            flatten_nested = st.checkbox(
+                "Un evento por fila (arrays anidados)",
+                value=True,
+                key="events_flatten_nested",
+                help="Trae los arrays sin desanidar y los expande en local solo para los eventos y arrays "
+                     "que elijas: muchos más eventos con el mismo volumen transferido"
+            )
+            flatten_paginated = st.checkbox(
+                "Sin límite de filas (paginado)",
+                value=False,
+                key="events_flatten_paginated",
+                help="Ejecuta la consulta completa sin descargarla y recorre el resultado por páginas "
+                     f"de {Settings.PAGED_PAGE_SIZE} filas; en memoria solo hay una página (y la siguiente)"
+            )
         
-        if st.button("Cargar Datos Completos", key="btn_eventos_flatten"):
-            with st.spinner("Cargando datos completos (esto puede tardar)..."):
-                query = generar_query_eventos_flatten(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                st.session_state.events_flatten_data = df
-                st.session_state.events_flatten_show = True
+        sample_percent = sample_percent_selector("events_flatten")
+        
+        if st.button("Cargar Datos Completos", key="btn_eventos_flatten") or full_run_requested("events_flatten"):
+            if flatten_columns:
+                query = generar_query_eventos_flatten(
+                    project, dataset, start_date, end_date, sample_percent,
+                    columns=flatten_columns,
+                    param_keys=_comma_list(flatten_param_keys) if flatten_params else [],
+                    event_names=_comma_list(flatten_events),
+                    include_user_properties=flatten_user_properties,
+                    include_items=flatten_items,
+                    nested=flatten_nested,
+                    paginated=flatten_paginated
+                )
+                if flatten_paginated:
+                    submit_async_query(
+                        client, query, "events_flatten", "Datos completos flattenizados (paginado)",
+                        postprocess=partial(PagedResult, client, attrs={'sample_percent': sample_percent}),
+                        fetch=False
+                    )
+                else:
+                    submit_async_query(
+                        client, query, "events_flatten", "Datos completos flattenizados",
+                        postprocess=partial(scale_sample, generator=generar_query_eventos_flatten, sample_percent=sample_percent)
+                    )
+            else:
+                st.error(" Selecciona al menos una columna de evento")
+        
+        show_async_query_status("events_flatten")
         
         # Mostrar resultados si existen
         if st.session_state.events_flatten_show and st.session_state.events_flatten_data is not None:
-            mostrar_eventos_flatten(st.session_state.events_flatten_data)
+            if isinstance(st.session_state.events_flatten_data, PagedResult):
+                show_paged_result("events_flatten", st.session_state.events_flatten_data, mostrar_eventos_flatten)
+            else:
+                mostrar_eventos_flatten(st.session_state.events_flatten_data)
+            show_promote_button("events_flatten", st.session_state.events_flatten_data)
     
     # Sección 5: Parámetros de Evento Específico
     with st.expander(" Análisis de Parámetros por Evento", expanded=st.session_state.events_params_show):
@@ -119,13 +269,15 @@ def show_events_tab(client, project, dataset, start_date, end_date):
             value=st.session_state.events_params_name
         )
         
-        if st.button("Analizar Parámetros", key="btn_parametros_evento"):
+        sample_percent = sample_percent_selector("events_params")
+        
+        if st.button("Analizar Parámetros", key="btn_parametros_evento") or full_run_requested("events_params"):
             if evento_especifico:
                 with st.spinner(f"Analizando parámetros de '{evento_especifico}'..."):
                     query = generar_query_parametros_eventos(
-                        project, dataset, start_date, end_date, evento_especifico
+                        project, dataset, start_date, end_date, evento_especifico, sample_percent
                     )
-                    df = run_query(client, query)
+                    df = scale_sample(run_query(client, query), generar_query_parametros_eventos, sample_percent)
                     st.session_state.events_params_data = df
                     st.session_state.events_params_name = evento_especifico
                     st.session_state.events_params_show = True
@@ -138,3 +290,4 @@ def show_events_tab(client, project, dataset, start_date, end_date):
                 st.session_state.events_params_data, 
                 st.session_state.events_params_name
             )
+            show_promote_button("events_params", st.session_state.events_params_data)
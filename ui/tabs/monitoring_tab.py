@@ -206,6 +206,10 @@ def show_monitoring_tab(client=None, project=None):
                 'Fecha y Hora': query['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
                 'Duración (s)': round(query['duration'], 2),
                 'GB Usados': round(query['gb_used'], 3),
+                'GB Facturados': round((query.get('bytes_billed') or 0) / (1024 ** 3), 3),
+                'Slot-ms': query.get('slot_ms') or 0,
+                'Caché': query.get('cache_source') or ('local' if query.get('cache_hit') else ''),
+                'Intentos': query.get('attempts', 1),
                 'Estado': query['status']
             })
         
@@ -228,7 +232,9 @@ def show_monitoring_tab(client=None, project=None):
         st.dataframe(
             df_queries.style.apply(highlight_status, axis=1).format({
                 'Duración (s)': '{:.2f}',
-                'GB Usados': '{:.3f}'
+                'GB Usados': '{:.3f}',
+                'GB Facturados': '{:.3f}',
+                'Slot-ms': '{:,}'
             }),
             height=600,
             use_container_width=True
@@ -333,3 +339,28 @@ def show_monitoring_tab(client=None, project=None):
     
     with col2:
         st.caption("Limpia el historial de consultas de la sesión actual. Esto no afecta a los datos en BigQuery.")
+    
+    # Caché persistente de resultados (compartida por todas las sesiones)
+    from database.query_cache import QueryCache
+    from utils.bq_monitoring import bytes_to_readable
+    
+    cache_stats = QueryCache.get_stats()
+    cache_hits = sum(1 for q in monitoring_data if q.get('cache_hit'))
+    
+    col1, col2, col3 = st.columns([1, 1, 3])
+    
+    with col1:
+        st.metric("Consultas desde Caché", f"{cache_hits}")
+    
+    with col2:
+        st.metric("Caché en Disco", bytes_to_readable(cache_stats['total_bytes']))
+    
+    with col3:
+        st.caption(
+            f"{cache_stats['entries']} resultados guardados "
+            f"(límite {bytes_to_readable(cache_stats['max_bytes'])}). "
+            "Las consultas repetidas sobre el mismo rango se sirven desde disco sin coste en BigQuery."
+        )
+        if st.button(" Vaciar Caché de Resultados", type="secondary", key="btn_clear_query_cache"):
+            removed = QueryCache.clear()
+            st.success(f" {removed} resultados eliminados de la caché")
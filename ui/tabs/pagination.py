@@ -0,0 +1,112 @@
+"""
+Navegación por páginas de un resultado paginado (database.paged_results)
+
+La página actual vive en un number_input propio de cada resultado (la clave
+incluye el job), así que un resultado nuevo empieza siempre en la primera.
+"""
+import os
+import tempfile
+import time
+
+import streamlit as st
+
+
+# Los CSV exportados se borran al cambiar de resultado o pasadas 24 horas
+# (cuando BigQuery ya ha borrado la tabla de destino del job)
+_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "bq_shield_exports")
+_EXPORT_MAX_AGE = 24 * 3600
+
+
+def _move(key, delta):
+    st.session_state[key] += delta
+
+
+def _export_path(paged):
+    os.makedirs(_EXPORT_DIR, exist_ok=True)
+    return os.path.join(_EXPORT_DIR, f"{paged.job_id}.csv")
+
+
+def _remove_stale_exports():
+    """Borra los CSV de sesiones anteriores que ya no se pueden descargar"""
+    now = time.time()
+    for name in os.listdir(_EXPORT_DIR):
+        path = os.path.join(_EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > _EXPORT_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def show_paged_result(prefix, paged, render_page):
+    """
+    Muestra una página del resultado con controles de navegación y descarga
+
+    Args:
+        prefix: Prefijo de session_state de la sección
+        paged: PagedResult guardado en <prefijo>_data
+        render_page: Función que muestra el DataFrame de una página
+    """
+    page_key = f"{prefix}_page_{paged.job_id}"
+    last_page = paged.page_count
+    st.session_state.setdefault(page_key, 1)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button(
+            "◀ Anterior", key=f"btn_{prefix}_prev",
+            on_click=_move, args=(page_key, -1),
+            disabled=st.session_state[page_key] <= 1
+        )
+    with col3:
+        st.button(
+            "Siguiente ▶", key=f"btn_{prefix}_next",
+            on_click=_move, args=(page_key, 1),
+            disabled=st.session_state[page_key] >= last_page
+        )
+    with col2:
+        page = st.number_input(
+            f"Página (de {last_page:,})", min_value=1, max_value=last_page, step=1, key=page_key
+        )
+
+    first_row = (page - 1) * paged.page_size
+    st.caption(
+        f"Filas {first_row + 1:,}–{min(first_row + paged.page_size, paged.total_rows):,} "
+        f"de {paged.total_rows:,} · leídas bajo demanda de la tabla de resultados del job"
+    )
+
+    try:
+        with st.spinner("Cargando página..."):
+            df = paged.page(page - 1)
+    except Exception as e:
+        st.error(f"No se pudo leer la página: {e}")
+        return
+
+    render_page(df)
+
+    # CSV del resultado completo escrito por lotes en disco
+    csv_path = _export_path(paged)
+    previous_path = st.session_state.get(f"{prefix}_csv_path")
+    if previous_path and previous_path != csv_path and os.path.exists(previous_path):
+        # El CSV del resultado anterior ya no se puede descargar
+        os.remove(previous_path)
+    st.session_state[f"{prefix}_csv_path"] = csv_path
+
+    if st.button("Preparar CSV completo", key=f"btn_{prefix}_csv"):
+        _remove_stale_exports()
+        with st.spinner("Exportando resultado..."):
+            written = paged.export_csv(csv_path)
+        if written < paged.total_rows:
+            st.warning(
+                f"CSV limitado a las primeras {written:,} filas "
+                f"(PAGED_EXPORT_MAX_ROWS / PAGED_EXPORT_MAX_BYTES): la descarga se sirve desde memoria"
+            )
+    if os.path.exists(csv_path):
+        with open(csv_path, 'rb') as handle:
+            st.download_button(
+                "Descargar CSV completo",
+                data=handle,
+                file_name="eventos_ga4_flatten.csv",
+                mime="text/csv",
+                key=f"btn_{prefix}_csv_download"
+            )
@@ -0,0 +1,105 @@
+"""
+Ejecución en paralelo de todas las secciones de una pestaña
+
+Cada sección lanza su consulta como un job independiente de BigQuery; con un
+pool de hilos acotado el tiempo total pasa de la suma de latencias a,
+aproximadamente, la de la consulta más lenta.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit as st
+
+from config.settings import Settings
+from database.connection import execute_query
+from database.daily_sketches import APPROXIMATE_GENERATORS, mark_approximate
+from database.daily_store import DAILY_QUERY_SPECS, run_daily_query
+from database.local_engines import apply_local_engine
+from database.session_facts import SessionFacts
+from ui.sidebar import is_approximate_mode
+
+
+def _run_section(client, generator, project, dataset, start_date, end_date, query_name, monitoring_log,
+                 approximate=False):
+    """
+    Ejecuta la consulta de una sección (se llama desde un hilo del pool)
+
+    No usa st.*: los hilos del pool no tienen contexto de Streamlit.
+    """
+    if generator in DAILY_QUERY_SPECS:
+        return run_daily_query(
+            client, generator, project, dataset, start_date, end_date,
+            query_name=query_name, monitoring_log=monitoring_log, approximate=approximate
+        )
+
+    query = SessionFacts.generate_query(
+        client, generator, project, dataset, start_date, end_date, monitoring_log, approximate=approximate
+    )
+    df = execute_query(client, query, query_name=query_name, monitoring_log=monitoring_log)
+    return apply_local_engine(df, generator)
+
+
+def show_run_all_button(client, project, dataset, start_date, end_date, sections, key):
+    """
+    Muestra el botón "Ejecutar todas las secciones" y, si se pulsa, lanza
+    todas las consultas en paralelo
+
+    Los resultados se guardan en session_state con el mismo esquema que los
+    botones individuales (<prefijo>_data / <prefijo>_show), de modo que cada
+    expander los muestra igual que si se hubiese ejecutado por separado.
+
+    Args:
+        client: Cliente de BigQuery
+        project: ID del proyecto
+        dataset: ID del dataset GA4
+        start_date: Fecha de inicio del análisis
+        end_date: Fecha de fin del análisis
+        sections: Lista de tuplas (prefijo_session_state, título, generar_query_*)
+        key: Key única del botón
+    """
+    if not st.button("⚡ Ejecutar todas las secciones", key=key):
+        return
+
+    if 'monitoring_data' not in st.session_state:
+        st.session_state.monitoring_data = []
+
+    # Copia del historial: los hilos ven el consumo de la sesión para el control de coste
+    monitoring_log = list(st.session_state.monitoring_data)
+    # El estado del modo rápido se lee aquí: los hilos no tienen session_state
+    approximate = is_approximate_mode()
+    errors = []
+    max_workers = max(1, min(Settings.MAX_PARALLEL_QUERIES, len(sections)))
+
+    with st.status(f"Ejecutando {len(sections)} consultas en paralelo...", expanded=True) as status:
+        progress = st.progress(0.0)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    _run_section, client, generator, project, dataset,
+                    start_date, end_date, title, monitoring_log, approximate
+                ): (prefix, title, generator)
+                for prefix, title, generator in sections
+            }
+
+            # Cada resultado se publica en cuanto termina su job
+            for completed, future in enumerate(as_completed(futures), start=1):
+                prefix, title, generator = futures[future]
+                try:
+                    df = future.result()
+                    mark_approximate(df, approximate and generator in APPROXIMATE_GENERATORS)
+                    st.session_state[f"{prefix}_data"] = df
+                    st.session_state[f"{prefix}_show"] = True
+                    st.write(f"✅ {title} ({len(df):,} filas)")
+                except Exception as e:
+                    errors.append(title)
+                    st.write(f"❌ {title}: {e}")
+
+                progress.progress(completed / len(sections))
+
+        # Las métricas de los hilos se vuelcan desde el hilo principal
+        st.session_state.monitoring_data = monitoring_log
+
+        if errors:
+            status.update(label=f"Completado con {len(errors)} error(es)", state="error", expanded=True)
+        else:
+            status.update(label="Todas las secciones completadas", state="complete", expanded=False)
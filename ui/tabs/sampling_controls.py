@@ -0,0 +1,52 @@
+"""
+Controles del modo muestreo en las secciones exploratorias
+
+Cada sección elige su porcentaje de usuarios (<prefijo>_sample). Cuando el
+resultado mostrado es una muestra, el botón "Repetir en completo" cambia el
+selector a "Completo" y pide a la sección que relance la consulta.
+"""
+import streamlit as st
+
+from config.settings import Settings
+
+_FULL = "Completo"
+
+
+def sample_percent_selector(prefix):
+    """
+    Selector de muestra de una sección
+
+    Returns:
+        Porcentaje de usuarios a leer, o None para la consulta completa
+    """
+    options = [_FULL] + [f"{percent}%" for percent in Settings.SAMPLE_PERCENT_OPTIONS]
+    choice = st.radio(
+        "Muestra de usuarios",
+        options,
+        horizontal=True,
+        key=f"{prefix}_sample",
+        help="Lee un subconjunto fijo de usuarios y extrapola los conteos, con intervalo de confianza. "
+             "Útil para iterar rápido; repite en completo para el resultado definitivo"
+    )
+    return None if choice == _FULL else int(choice.rstrip('%'))
+
+
+def _promote(prefix):
+    st.session_state[f"{prefix}_sample"] = _FULL
+    st.session_state[f"{prefix}_promote"] = True
+
+
+def full_run_requested(prefix):
+    """True (una sola vez) si se pulsó "Repetir en completo" en la sección"""
+    return st.session_state.pop(f"{prefix}_promote", False)
+
+
+def show_promote_button(prefix, df):
+    """Botón para repetir en completo una sección cuyo resultado es una muestra"""
+    if df is not None and df.attrs.get('sample_percent'):
+        st.button(
+            "🔁 Repetir en completo",
+            key=f"btn_{prefix}_full",
+            on_click=_promote,
+            args=(prefix,)
+        )
@@ -2,16 +2,23 @@ import streamlit as st
 from database.queries.sessions_queries import (
     generar_query_low_converting_sessions,
     generar_query_session_path_analysis,
+    generar_query_session_paths_n_pasos,
     generar_query_hourly_sessions_performance,
-    generar_query_exit_pages
+    generar_query_exit_pages,
+    PATH_URL_MODES
 )
 from visualization.sessions_visualizations import (
     mostrar_low_converting_sessions,
     mostrar_session_path_analysis,
+    mostrar_session_paths_n_pasos,
     mostrar_hourly_sessions_performance,
     mostrar_exit_pages_analysis
 )
 from database.connection import run_query
+from config.settings import Settings
+from database.session_facts import SessionFacts
+from ui.tabs.run_all import show_run_all_button
+from ui.tabs.async_query import submit_async_query, show_async_query_status
 
 def show_sessions_tab(client, project, dataset, start_date, end_date):
     """Pestaña de Sesiones con análisis avanzados"""
@@ -27,6 +34,11 @@ def show_sessions_tab(client, project, dataset, start_date, end_date):
     if 'sessions_path_show' not in st.session_state:
         st.session_state.sessions_path_show = False
     
+    if 'sessions_path_n_data' not in st.session_state:
+        st.session_state.sessions_path_n_data = None
+    if 'sessions_path_n_show' not in st.session_state:
+        st.session_state.sessions_path_n_show = False
+    
     if 'sessions_hourly_data' not in st.session_state:
         st.session_state.sessions_hourly_data = None
     if 'sessions_hourly_show' not in st.session_state:
@@ -37,6 +49,18 @@ def show_sessions_tab(client, project, dataset, start_date, end_date):
     if 'sessions_exit_show' not in st.session_state:
         st.session_state.sessions_exit_show = False
     
+    # Ejecutar todas las secciones en paralelo
+    show_run_all_button(
+        client, project, dataset, start_date, end_date,
+        sections=[
+            ("sessions_low_converting", "Sesiones con Baja Conversión", generar_query_low_converting_sessions),
+            ("sessions_path", "Rutas de Navegación", generar_query_session_path_analysis),
+            ("sessions_hourly", "Rendimiento de Sesiones por Hora", generar_query_hourly_sessions_performance),
+            ("sessions_exit", "Páginas de Salida", generar_query_exit_pages)
+        ],
+        key="btn_sessions_run_all"
+    )
+    
     # Sección 1: Low Converting Sessions Analysis
     with st.expander(" Análisis de Sesiones con Baja Conversión", expanded=st.session_state.sessions_low_converting_show):
         st.info("""
@@ -49,11 +73,14 @@ def show_sessions_tab(client, project, dataset, start_date, end_date):
         """)
         
         if st.button("Analizar Sesiones Sin Conversión", key="btn_sessions_low_converting"):
-            with st.spinner("Analizando sesiones sin conversión (esto puede tardar)..."):
-                query = generar_query_low_converting_sessions(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                st.session_state.sessions_low_converting_data = df
-                st.session_state.sessions_low_converting_show = True
+            with st.spinner("Actualizando tabla de sesiones..."):
+                query = SessionFacts.generate_query(
+                    client, generar_query_low_converting_sessions, project, dataset, start_date, end_date,
+                    monitoring_log=st.session_state.setdefault('monitoring_data', [])
+                )
+            submit_async_query(client, query, "sessions_low_converting", "Sesiones sin conversión")
+        
+        show_async_query_status("sessions_low_converting")
         
         # Mostrar resultados si existen
         if st.session_state.sessions_low_converting_show and st.session_state.sessions_low_converting_data is not None:
@@ -72,16 +99,52 @@ def show_sessions_tab(client, project, dataset, start_date, end_date):
         """)
         
         if st.button("Analizar Rutas de Navegación", key="btn_sessions_path"):
-            with st.spinner("Analizando rutas de navegación (esto puede tardar)..."):
-                query = generar_query_session_path_analysis(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                st.session_state.sessions_path_data = df
-                st.session_state.sessions_path_show = True
+            query = generar_query_session_path_analysis(project, dataset, start_date, end_date)
+            submit_async_query(client, query, "sessions_path", "Rutas de navegación")
+        
+        show_async_query_status("sessions_path")
         
         # Mostrar resultados si existen
         if st.session_state.sessions_path_show and st.session_state.sessions_path_data is not None:
             mostrar_session_path_analysis(st.session_state.sessions_path_data)
     
+    # Sección 2b: Session Paths de n pasos
+    with st.expander(" Rutas de Navegación de n Pasos", expanded=st.session_state.sessions_path_n_show):
+        st.info("""
+        **Secuencias completas de las primeras páginas de cada sesión:**
+        - Rutas de n pasos agregadas en BigQuery (solo se descargan los conteos)
+        - Normalización de URL configurable (ruta, ruta sin ids, URL completa)
+        - Diagrama de flujo por paso (Sankey)
+        """)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            path_depth = st.selectbox(
+                "Número de pasos",
+                options=list(range(2, Settings.SESSION_PATH_MAX_DEPTH + 1)),
+                index=Settings.SESSION_PATH_DEPTH - 2,
+                key="sessions_path_n_depth"
+            )
+        with col2:
+            url_mode = st.selectbox(
+                "Normalización de URL",
+                options=list(PATH_URL_MODES),
+                format_func=PATH_URL_MODES.get,
+                key="sessions_path_n_url_mode"
+            )
+        
+        if st.button("Analizar Rutas de n Pasos", key="btn_sessions_path_n"):
+            query = generar_query_session_paths_n_pasos(
+                project, dataset, start_date, end_date, depth=path_depth, url_mode=url_mode
+            )
+            submit_async_query(client, query, "sessions_path_n", "Rutas de n pasos")
+        
+        show_async_query_status("sessions_path_n")
+        
+        # Mostrar resultados si existen
+        if st.session_state.sessions_path_n_show and st.session_state.sessions_path_n_data is not None:
+            mostrar_session_paths_n_pasos(st.session_state.sessions_path_n_data)
+    
     # Sección 3: Hourly Sessions Performance
     with st.expander("⏰ Rendimiento de Sesiones por Hora", expanded=st.session_state.sessions_hourly_show):
         st.info("""
@@ -95,11 +158,10 @@ def show_sessions_tab(client, project, dataset, start_date, end_date):
         """)
         
         if st.button("Analizar Rendimiento Horario", key="btn_sessions_hourly"):
-            with st.spinner("Analizando rendimiento por hora (esto puede tardar)..."):
-                query = generar_query_hourly_sessions_performance(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                st.session_state.sessions_hourly_data = df
-                st.session_state.sessions_hourly_show = True
+            query = generar_query_hourly_sessions_performance(project, dataset, start_date, end_date)
+            submit_async_query(client, query, "sessions_hourly", "Rendimiento por hora")
+        
+        show_async_query_status("sessions_hourly")
         
         # Mostrar resultados si existen
         if st.session_state.sessions_hourly_show and st.session_state.sessions_hourly_data is not None:
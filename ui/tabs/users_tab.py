@@ -16,6 +16,9 @@ from visualization.users_visualizations import (
     mostrar_conversion_mensual
 )
 from database.connection import run_query
+from database.session_facts import SessionFacts
+from ui.tabs.run_all import show_run_all_button
+from ui.tabs.async_query import submit_async_query, show_async_query_status
 
 def show_users_tab(client, project, dataset, start_date, end_date):
     """Pestaña de Usuarios con análisis avanzados"""
@@ -51,6 +54,20 @@ def show_users_tab(client, project, dataset, start_date, end_date):
     if 'users_monthly_conv_show' not in st.session_state:
         st.session_state.users_monthly_conv_show = False
     
+    # Ejecutar todas las secciones en paralelo
+    show_run_all_button(
+        client, project, dataset, start_date, end_date,
+        sections=[
+            ("users_retention", "Retención Semanal de Usuarios", generar_query_retencion_semanal),
+            ("users_clv", "Customer Lifetime Value (CLV) y Sesiones", generar_query_clv_sesiones),
+            ("users_time_purchase", "Tiempo desde Primera Visita hasta Compra", generar_query_tiempo_primera_compra),
+            ("users_landing", "Atribución por Primera Landing Page", generar_query_landing_page_attribution),
+            ("users_acquisition", "Adquisición de Usuarios por Fuente/Medio", generar_query_adquisicion_usuarios),
+            ("users_monthly_conv", "Tasa de Conversión Mensual", generar_query_conversion_mensual)
+        ],
+        key="btn_users_run_all"
+    )
+    
     # Sección 1: Retención Semanal
     with st.expander(" Retención Semanal de Usuarios", expanded=st.session_state.users_retention_show):
         st.info("""
@@ -61,11 +78,10 @@ def show_users_tab(client, project, dataset, start_date, end_date):
         """)
         
         if st.button("Analizar Retención Semanal", key="btn_users_retention"):
-            with st.spinner("Calculando retención semanal (esto puede tardar)..."):
-                query = generar_query_retencion_semanal(project, dataset, start_date, end_date)
-                df = run_query(client, query)
-                st.session_state.users_retention_data = df
-                st.session_state.users_retention_show = True
+            query = generar_query_retencion_semanal(project, dataset, start_date, end_date)
+            submit_async_query(client, query, "users_retention", "Retención semanal")
+        
+        show_async_query_status("users_retention")
         
         # Mostrar resultados si existen
         if st.session_state.users_retention_show and st.session_state.users_retention_data is not None:
@@ -83,7 +99,10 @@ def show_users_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar CLV y Sesiones", key="btn_users_clv"):
             with st.spinner("Calculando CLV y sesiones..."):
-                query = generar_query_clv_sesiones(project, dataset, start_date, end_date)
+                query = SessionFacts.generate_query(
+                    client, generar_query_clv_sesiones, project, dataset, start_date, end_date,
+                    monitoring_log=st.session_state.setdefault('monitoring_data', [])
+                )
                 df = run_query(client, query)
                 st.session_state.users_clv_data = df
                 st.session_state.users_clv_show = True
@@ -104,7 +123,10 @@ def show_users_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Tiempo a Compra", key="btn_users_time_purchase"):
             with st.spinner("Calculando tiempo a primera compra..."):
-                query = generar_query_tiempo_primera_compra(project, dataset, start_date, end_date)
+                query = SessionFacts.generate_query(
+                    client, generar_query_tiempo_primera_compra, project, dataset, start_date, end_date,
+                    monitoring_log=st.session_state.setdefault('monitoring_data', [])
+                )
                 df = run_query(client, query)
                 st.session_state.users_time_purchase_data = df
                 st.session_state.users_time_purchase_show = True
@@ -146,7 +168,10 @@ def show_users_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Adquisición", key="btn_users_acquisition"):
             with st.spinner("Calculando adquisición de usuarios..."):
-                query = generar_query_adquisicion_usuarios(project, dataset, start_date, end_date)
+                query = SessionFacts.generate_query(
+                    client, generar_query_adquisicion_usuarios, project, dataset, start_date, end_date,
+                    monitoring_log=st.session_state.setdefault('monitoring_data', [])
+                )
                 df = run_query(client, query)
                 st.session_state.users_acquisition_data = df
                 st.session_state.users_acquisition_show = True
@@ -167,7 +192,10 @@ def show_users_tab(client, project, dataset, start_date, end_date):
         
         if st.button("Analizar Conversión Mensual", key="btn_users_monthly_conv"):
             with st.spinner("Calculando conversión mensual..."):
-                query = generar_query_conversion_mensual(project, dataset, start_date, end_date)
+                query = SessionFacts.generate_query(
+                    client, generar_query_conversion_mensual, project, dataset, start_date, end_date,
+                    monitoring_log=st.session_state.setdefault('monitoring_data', [])
+                )
                 df = run_query(client, query)
                 st.session_state.users_monthly_conv_data = df
                 st.session_state.users_monthly_conv_show = True
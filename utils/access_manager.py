@@ -509,34 +509,6 @@ class AccessManager:
             st.error(f"Error creando cliente BigQuery: {e}")
             return None
 
-    @staticmethod
-    def is_ga4_dataset(client: bigquery.Client, project_id: str, dataset_id: str) -> bool:
-        """
-        Verifica si un dataset es de GA4 (tiene tablas events_*)
-
-        Args:
-            client: Cliente de BigQuery
-            project_id: ID del proyecto
-            dataset_id: ID del dataset
-
-        Returns:
-            True si es dataset de GA4
-        """
-        try:
-            # Listar tablas del dataset
-            dataset_ref = f"{project_id}.{dataset_id}"
-            tables = list(client.list_tables(dataset_ref, max_results=10))
-
-            # Verificar si hay tablas que empiecen con "events_"
-            for table in tables:
-                if table.table_id.startswith('events_'):
-                    return True
-
-            return False
-
-        except Exception:
-            return False
-
     @staticmethod
     def get_ga4_projects_and_datasets(token: str) -> Dict[str, List[str]]:
         """
@@ -548,41 +520,16 @@ class AccessManager:
         Returns:
             Dict con {project_id: [lista de datasets GA4]}
         """
+        from database.discovery import GA4Discovery
+
         client = AccessManager.get_bigquery_client_from_token(token)
 
         if not client:
             return {}
 
-        ga4_projects = {}
-
         try:
-            # Listar todos los proyectos
-            projects = list(client.list_projects())
-
-            for project in projects:
-                project_id = project.project_id
-
-                try:
-                    # Listar datasets del proyecto
-                    datasets = list(client.list_datasets(project_id))
-
-                    # Filtrar solo datasets de GA4
-                    ga4_datasets = []
-                    for dataset in datasets:
-                        dataset_id = dataset.dataset_id
-
-                        if AccessManager.is_ga4_dataset(client, project_id, dataset_id):
-                            ga4_datasets.append(dataset_id)
-
-                    # Solo añadir el proyecto si tiene datasets GA4
-                    if ga4_datasets:
-                        ga4_projects[project_id] = ga4_datasets
-
-                except Exception:
-                    # Si no se pueden listar datasets del proyecto, continuar
-                    continue
-
-            return ga4_projects
+            # Cacheado por credencial: el refresh token del cliente identifica la entrada
+            return GA4Discovery.get_projects(client, require_prefix=False)
 
         except Exception as e:
             st.error(f"Error listando proyectos: {e}")
@@ -43,6 +43,7 @@ from .users_visualizations import (
 from .sessions_visualizations import (
     mostrar_low_converting_sessions,
     mostrar_session_path_analysis,
+    mostrar_session_paths_n_pasos,
     mostrar_hourly_sessions_performance,
     mostrar_exit_pages_analysis
 )
@@ -50,7 +51,9 @@ from .sessions_visualizations import (
 from .common_charts import (
     create_pie_chart,
     create_bar_chart,
-    create_funnel_chart
+    create_funnel_chart,
+    mostrar_aviso_aproximado,
+    mostrar_aviso_muestra
 )
 
 __all__ = [
@@ -89,10 +92,13 @@ __all__ = [
     # Sessions
     'mostrar_low_converting_sessions',
     'mostrar_session_path_analysis',
+    'mostrar_session_paths_n_pasos',
     'mostrar_hourly_sessions_performance',
     'mostrar_exit_pages_analysis',
     # Common
     'create_pie_chart',
+    'mostrar_aviso_aproximado',
+    'mostrar_aviso_muestra',
     'create_bar_chart',
     'create_funnel_chart'
 ]
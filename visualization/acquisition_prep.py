@@ -0,0 +1,185 @@
+"""
+Preparación de datos de las visualizaciones de adquisición (sin Streamlit)
+"""
+from visualization.prep import memoize_prep
+
+
+@memoize_prep
+def preparar_canales_trafico(df):
+    """
+    Métricas y concentración de los canales de tráfico
+
+    Args:
+        df: Resultado de generar_query_canales_trafico (ordenado por sesiones)
+
+    Returns:
+        dict con totales, canal principal, peso de los 3 y 5 primeros y los
+        canales emergentes (menos del 1%)
+    """
+    return {
+        'total_sessions': df['session_count'].sum(),
+        'unique_channels': len(df),
+        'top_channel': df.iloc[0]['traffic_channel'] if not df.empty else "N/A",
+        'top_percentage': df.iloc[0]['traffic_percentage'] if not df.empty else 0,
+        'top_3_percentage': df.head(3)['traffic_percentage'].sum(),
+        'top_5_percentage': df.head(5)['traffic_percentage'].sum(),
+        'emerging_channels': df[df['traffic_percentage'] < 1.0]
+    }
+
+
+@memoize_prep
+def preparar_atribucion_marketing(df):
+    """
+    Resumen, medios, campañas y eficiencia de la atribución por UTM
+
+    Args:
+        df: Resultado de generar_query_atribucion_marketing
+
+    Returns:
+        dict con totales, agregado por medio (con tasa de conversión), top 10
+        campañas por ingresos y top 15 fuentes por ingresos por sesión
+    """
+    total_sessions = df['sessions'].sum()
+    total_conversions = df['conversions'].sum()
+
+    medios_df = df.groupby('utm_medium').agg({
+        'sessions': 'sum',
+        'conversions': 'sum',
+        'revenue': 'sum'
+    }).reset_index()
+    medios_df['conversion_rate'] = (medios_df['conversions'] / medios_df['sessions'] * 100).round(2)
+    medios_df = medios_df.sort_values('revenue', ascending=False)
+
+    # ROI aproximado (ingresos por sesión), sin modificar el resultado guardado
+    eficiencia_df = df.assign(revenue_per_session=(df['revenue'] / df['sessions']).round(2))
+
+    return {
+        'total_sessions': total_sessions,
+        'total_conversions': total_conversions,
+        'total_revenue': df['revenue'].sum(),
+        'overall_cr': (total_conversions / total_sessions * 100) if total_sessions > 0 else 0,
+        'medios_df': medios_df,
+        'top_campanas': df.nlargest(10, 'revenue'),
+        'eficiencia_df': eficiencia_df.nlargest(15, 'revenue_per_session')
+    }
+
+
+@memoize_prep
+def preparar_atribucion_multimodelo(df):
+    """
+    Resumen por modelo, detalle de cada modelo y diferencias Last/First Click
+
+    Args:
+        df: Resultado de generar_query_atribucion_multimodelo
+
+    Returns:
+        dict con el resumen por modelo, totales, el top 10 de canales de cada
+        modelo y los 5 canales con más diferencia entre Last Click y First
+        Click (None si falta alguno de los dos modelos)
+    """
+    model_summary = df.groupby('attribution_model').agg({
+        'sessions': 'sum',
+        'conversions': 'sum',
+        'revenue': 'sum',
+        'attributed_conversions': 'sum',
+        'attributed_revenue': 'sum'
+    }).reset_index()
+
+    model_details = {
+        model: df[df['attribution_model'] == model].nlargest(10, 'attributed_revenue')
+        for model in df['attribution_model'].unique()
+    }
+
+    pivot_df = df.pivot_table(
+        index=['utm_source', 'utm_medium'],
+        columns='attribution_model',
+        values='attributed_revenue',
+        aggfunc='sum'
+    ).reset_index().fillna(0)
+
+    top_differences = None
+    if len(pivot_df) > 0 and 'Last Click' in pivot_df.columns and 'First Click' in pivot_df.columns:
+        pivot_df['diferencia_lc_fc'] = pivot_df['Last Click'] - pivot_df['First Click']
+        top_differences = pivot_df.nlargest(5, 'diferencia_lc_fc')
+
+    return {
+        'model_summary': model_summary,
+        # Dividido por 3 modelos para evitar duplicación
+        'total_revenue': df['revenue'].sum() / 3,
+        'total_conversions': df['conversions'].sum() / 3,
+        'avg_attribution_rate': model_summary['attributed_conversions'].mean(),
+        'models_count': len(model_summary),
+        'model_details': model_details,
+        'top_differences': top_differences
+    }
+
+
+@memoize_prep
+def preparar_atribucion_completa(df):
+    """
+    Agregados de la atribución de 7 modelos que no dependen del modelo elegido
+
+    Args:
+        df: Resultado de database.attribution.attribute_paths
+
+    Returns:
+        dict con totales, modelos, comparativa por modelo, canales con más
+        variabilidad entre modelos y agregado por modelo y dispositivo
+    """
+    model_summary = df.groupby('attribution_model').agg({
+        'attributed_revenue': 'sum',
+        'attributed_conversions': 'sum'
+    }).reset_index()
+
+    model_comparison = df.groupby('attribution_model').agg({
+        'attributed_revenue': 'sum',
+        'attributed_conversions': 'sum',
+        'conversion_rate': 'mean',
+        'revenue_per_conversion': 'mean'
+    }).reset_index()
+
+    pivot_data = df.pivot_table(
+        index=['utm_source', 'utm_medium'],
+        columns='attribution_model',
+        values='attributed_revenue',
+        aggfunc='sum'
+    ).fillna(0)
+
+    high_variability = None
+    if not pivot_data.empty:
+        # Desviación estándar entre modelos (variabilidad)
+        pivot_data['std_deviation'] = pivot_data.std(axis=1)
+        pivot_data['mean_revenue'] = pivot_data.mean(axis=1)
+        pivot_data['variability'] = (pivot_data['std_deviation'] / pivot_data['mean_revenue']).round(3)
+        high_variability = pivot_data.nlargest(10, 'variability')[['mean_revenue', 'std_deviation', 'variability']]
+
+    device_analysis = df.groupby(['attribution_model', 'device_type']).agg({
+        'attributed_revenue': 'sum',
+        'attributed_conversions': 'sum'
+    }).reset_index()
+
+    return {
+        'total_models': df['attribution_model'].nunique(),
+        'total_channels': df['utm_source'].nunique(),
+        'total_revenue': model_summary['attributed_revenue'].sum(),
+        'total_conversions': model_summary['attributed_conversions'].sum(),
+        'models': list(df['attribution_model'].unique()),
+        'model_comparison': model_comparison,
+        'high_variability': high_variability,
+        'device_analysis': device_analysis
+    }
+
+
+@memoize_prep
+def preparar_atribucion_completa_modelo(df, selected_model):
+    """
+    Top 15 canales por ingresos atribuidos del modelo elegido
+
+    Args:
+        df: Resultado de database.attribution.attribute_paths
+        selected_model: Modelo seleccionado
+
+    Returns:
+        DataFrame con los canales del modelo
+    """
+    return df[df['attribution_model'] == selected_model].nlargest(15, 'attributed_revenue')
@@ -1,13 +1,21 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
+from visualization.common_charts import mostrar_aviso_aproximado
+from visualization.acquisition_prep import (
+    preparar_canales_trafico,
+    preparar_atribucion_marketing,
+    preparar_atribucion_multimodelo,
+    preparar_atribucion_completa,
+    preparar_atribucion_completa_modelo
+)
 from utils.helpers import safe_divide
 
 def mostrar_canales_trafico(df):
     """Visualización para análisis de canales de tráfico"""
     st.subheader("Distribución de Canales de Tráfico")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos de tráfico para el rango seleccionado")
@@ -19,20 +27,16 @@ def mostrar_canales_trafico(df):
         'traffic_percentage': '{:.2f}%'
     }))
     
-    # Calcular métricas generales
-    total_sessions = df['session_count'].sum()
-    unique_channels = len(df)
+    prep = preparar_canales_trafico(df)
     
     # Mostrar métricas clave
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Sesiones", f"{total_sessions:,}")
+        st.metric("Total Sesiones", f"{prep['total_sessions']:,}")
     with col2:
-        st.metric("Canales Únicos", f"{unique_channels}")
+        st.metric("Canales Únicos", f"{prep['unique_channels']}")
     with col3:
-        top_channel = df.iloc[0]['traffic_channel'] if not df.empty else "N/A"
-        top_percentage = df.iloc[0]['traffic_percentage'] if not df.empty else 0
-        st.metric("Canal Principal", f"{top_channel} ({top_percentage}%)")
+        st.metric("Canal Principal", f"{prep['top_channel']} ({prep['top_percentage']}%)")
     
     # Gráfico de torta - Distribución de canales
     fig_pie = px.pie(
@@ -62,18 +66,14 @@ def mostrar_canales_trafico(df):
     # Análisis de concentración
     st.subheader("Análisis de Concentración")
     
-    # Calcular concentración (Top 5 canales)
-    top_5_percentage = df.head(5)['traffic_percentage'].sum()
-    top_3_percentage = df.head(3)['traffic_percentage'].sum()
-    
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Top 3 Canales", f"{top_3_percentage:.1f}%")
+        st.metric("Top 3 Canales", f"{prep['top_3_percentage']:.1f}%")
     with col2:
-        st.metric("Top 5 Canales", f"{top_5_percentage:.1f}%")
+        st.metric("Top 5 Canales", f"{prep['top_5_percentage']:.1f}%")
     
-    # Detectar canales emergentes (menos del 1% pero presentes)
-    emerging_channels = df[df['traffic_percentage'] < 1.0]
+    # Canales emergentes (menos del 1% pero presentes)
+    emerging_channels = prep['emerging_channels']
     if not emerging_channels.empty:
         st.info("**Canales Emergentes** (menos del 1% pero con potencial):")
         for _, channel in emerging_channels.iterrows():
@@ -87,21 +87,18 @@ def mostrar_atribucion_marketing(df):
         st.warning("No hay datos de atribución para el rango seleccionado")
         return
     
-    # Mostrar resumen ejecutivo
-    total_sessions = df['sessions'].sum()
-    total_conversions = df['conversions'].sum()
-    total_revenue = df['revenue'].sum()
-    overall_cr = (total_conversions / total_sessions * 100) if total_sessions > 0 else 0
+    prep = preparar_atribucion_marketing(df)
     
+    # Mostrar resumen ejecutivo
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Sesiones", f"{total_sessions:,}")
+        st.metric("Total Sesiones", f"{prep['total_sessions']:,}")
     with col2:
-        st.metric("Total Conversiones", f"{total_conversions:,}")
+        st.metric("Total Conversiones", f"{prep['total_conversions']:,}")
     with col3:
-        st.metric("Ingresos Totales", f"€{total_revenue:,.2f}")
+        st.metric("Ingresos Totales", f"€{prep['total_revenue']:,.2f}")
     with col4:
-        st.metric("Tasa Conversión", f"{overall_cr:.2f}%")
+        st.metric("Tasa Conversión", f"{prep['overall_cr']:.2f}%")
     
     # Mostrar tabla de datos
     st.dataframe(df.style.format({
@@ -114,14 +111,7 @@ def mostrar_atribucion_marketing(df):
     # Análisis por medio
     st.subheader("Análisis por Medio de Marketing")
     
-    medios_df = df.groupby('utm_medium').agg({
-        'sessions': 'sum',
-        'conversions': 'sum',
-        'revenue': 'sum'
-    }).reset_index()
-    
-    medios_df['conversion_rate'] = (medios_df['conversions'] / medios_df['sessions'] * 100).round(2)
-    medios_df = medios_df.sort_values('revenue', ascending=False)
+    medios_df = prep['medios_df']
     
     col1, col2 = st.columns(2)
     
@@ -154,7 +144,7 @@ def mostrar_atribucion_marketing(df):
     # Top campañas por ROI
     st.subheader("Top Campañas por Performance")
     
-    top_campanas = df.nlargest(10, 'revenue')
+    top_campanas = prep['top_campanas']
     
     fig_campanas = px.scatter(
         top_campanas,
@@ -177,10 +167,8 @@ def mostrar_atribucion_marketing(df):
     # Análisis de eficiencia
     st.subheader("Eficiencia de Canales")
     
-    # Calcular ROI aproximado (ingresos por sesión)
-    df['revenue_per_session'] = (df['revenue'] / df['sessions']).round(2)
-    
-    eficiencia_df = df.nlargest(15, 'revenue_per_session')
+    # ROI aproximado (ingresos por sesión)
+    eficiencia_df = prep['eficiencia_df']
     
     fig_eficiencia = px.bar(
         eficiencia_df,
@@ -204,28 +192,19 @@ def mostrar_atribucion_multimodelo(df):
     # Mostrar resumen por modelo
     st.subheader("Resumen por Modelo de Atribución")
     
-    model_summary = df.groupby('attribution_model').agg({
-        'sessions': 'sum',
-        'conversions': 'sum',
-        'revenue': 'sum',
-        'attributed_conversions': 'sum',
-        'attributed_revenue': 'sum'
-    }).reset_index()
+    prep = preparar_atribucion_multimodelo(df)
+    model_summary = prep['model_summary']
     
     # Métricas comparativas
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        total_revenue = df['revenue'].sum() / 3 # Dividido por 3 modelos para evitar duplicación
-        st.metric("Ingresos Totales", f"€{total_revenue:,.2f}")
+        st.metric("Ingresos Totales", f"€{prep['total_revenue']:,.2f}")
     with col2:
-        total_conversions = df['conversions'].sum() / 3
-        st.metric("Conversiones Totales", f"{total_conversions:,.0f}")
+        st.metric("Conversiones Totales", f"{prep['total_conversions']:,.0f}")
     with col3:
-        avg_attribution_rate = model_summary['attributed_conversions'].mean()
-        st.metric("Tasa Atribución Promedio", f"{avg_attribution_rate:.1f}%")
+        st.metric("Tasa Atribución Promedio", f"{prep['avg_attribution_rate']:.1f}%")
     with col4:
-        models_count = len(model_summary)
-        st.metric("Modelos Analizados", f"{models_count}")
+        st.metric("Modelos Analizados", f"{prep['models_count']}")
     
     # Gráfico comparativo entre modelos
     st.subheader("Comparativa entre Modelos")
@@ -244,9 +223,8 @@ def mostrar_atribucion_multimodelo(df):
     # Análisis detallado por modelo
     st.subheader("Análisis Detallado por Modelo")
     
-    for model in df['attribution_model'].unique():
+    for model, model_data in prep['model_details'].items():
         with st.expander(f"Modelo: {model}", expanded=False):
-            model_data = df[df['attribution_model'] == model].nlargest(10, 'attributed_revenue')
             
             col1, col2 = st.columns(2)
             
@@ -293,27 +271,16 @@ def mostrar_atribucion_multimodelo(df):
     # Análisis de diferencias entre modelos
     st.subheader("Diferencias entre Modelos")
     
-    # Pivot para comparar modelos
-    pivot_df = df.pivot_table(
-        index=['utm_source', 'utm_medium'],
-        columns='attribution_model',
-        values='attributed_revenue',
-        aggfunc='sum'
-    ).reset_index().fillna(0)
-    
-    if len(pivot_df) > 0:
-        # Calcular variación entre modelos
-        if 'Last Click' in pivot_df.columns and 'First Click' in pivot_df.columns:
-            pivot_df['diferencia_lc_fc'] = pivot_df['Last Click'] - pivot_df['First Click']
-            
-            st.write("**Canales con Mayor Diferencia entre Last Click y First Click:**")
-            top_differences = pivot_df.nlargest(5, 'diferencia_lc_fc')
-            st.dataframe(top_differences.style.format({
-                'Last Click': '€{:,.2f}',
-                'First Click': '€{:,.2f}',
-                'Linear': '€{:,.2f}',
-                'diferencia_lc_fc': '€{:,.2f}'
-            }))
+    # Variación entre modelos
+    top_differences = prep['top_differences']
+    if top_differences is not None:
+        st.write("**Canales con Mayor Diferencia entre Last Click y First Click:**")
+        st.dataframe(top_differences.style.format({
+            'Last Click': '€{:,.2f}',
+            'First Click': '€{:,.2f}',
+            'Linear': '€{:,.2f}',
+            'diferencia_lc_fc': '€{:,.2f}'
+        }))
 
 # REEMPLAZAR solo la función mostrar_atribucion_completa en acquisition_visualizations.py
 
@@ -333,49 +300,42 @@ def mostrar_atribucion_completa(df):
         - **Last Click**: Atribuye el 100% al ultimo touchpoint antes de la conversion
         - **First Click**: Atribuye el 100% al primer touchpoint del usuario
         - **Linear**: Distribuye equitativamente entre todos los touchpoints
-        - **Time Decay**: Mayor peso a los touchpoints mas recientes
+        - **Time Decay**: Mayor peso a los touchpoints mas recientes (el peso se reduce a la mitad cada {half_life} sesiones hacia atras)
         - **Position Based**: 40% primer click, 40% ultimo click, 20% intermedios
         - **Last Non-Direct**: Como Last Click pero ignora trafico directo
-        - **Data Driven**: Combinacion algoritmica de multiples factores
-        """)
+        - **Data Driven**: Cadena de Markov sobre las rutas de canales; cada canal recibe
+          su efecto de eliminacion (cuantas conversiones se perderian sin el)
+
+        Cada ruta son las ultimas {max_length} sesiones del usuario hasta su ultima compra.
+        Todos los modelos se calculan a la vez sobre las rutas agregadas: cambiar de modelo no repite la consulta.
+        """.format(
+            half_life=Settings.ATTRIBUTION_DECAY_HALF_LIFE,
+            max_length=Settings.ATTRIBUTION_MAX_PATH_LENGTH
+        ))
     
     # Resumen ejecutivo
     st.subheader("Resumen Ejecutivo")
     
-    total_models = df['attribution_model'].nunique()
-    total_channels = df['utm_source'].nunique()
-    
-    # Calcular valores únicos por modelo
-    model_summary = df.groupby('attribution_model').agg({
-        'attributed_revenue': 'sum',
-        'attributed_conversions': 'sum'
-    }).reset_index()
-    
-    total_revenue = model_summary['attributed_revenue'].sum()
-    total_conversions = model_summary['attributed_conversions'].sum()
+    prep = preparar_atribucion_completa(df)
+    models = prep['models']
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Modelos de Atribución", total_models)
+        st.metric("Modelos de Atribución", prep['total_models'])
     with col2:
-        st.metric("Canales Únicos", total_channels)
+        st.metric("Canales Únicos", prep['total_channels'])
     with col3:
-        st.metric("Ingresos Atribuidos", f"€{total_revenue:,.0f}")
+        st.metric("Ingresos Atribuidos", f"€{prep['total_revenue']:,.0f}")
     with col4:
-        st.metric("Conversiones Atribuidas", f"{total_conversions:,.0f}")
+        st.metric("Conversiones Atribuidas", f"{prep['total_conversions']:,.0f}")
     
     # Mostrar los modelos realmente detectados
-    st.write(f"**Modelos analizados:** {', '.join(df['attribution_model'].unique())}")
+    st.write(f"**Modelos analizados:** {', '.join(models)}")
     
     # Comparativa entre modelos
     st.subheader("Comparativa entre Modelos")
     
-    model_comparison = df.groupby('attribution_model').agg({
-        'attributed_revenue': 'sum',
-        'attributed_conversions': 'sum',
-        'conversion_rate': 'mean',
-        'revenue_per_conversion': 'mean'
-    }).reset_index()
+    model_comparison = prep['model_comparison']
     
     col1, col2 = st.columns(2)
     
@@ -408,23 +368,10 @@ def mostrar_atribucion_completa(df):
     # Análisis de diferencias entre modelos
     st.subheader("Análisis de Diferencias entre Modelos")
     
-    # Pivot para comparación
-    pivot_data = df.pivot_table(
-        index=['utm_source', 'utm_medium'],
-        columns='attribution_model',
-        values='attributed_revenue',
-        aggfunc='sum'
-    ).fillna(0)
-    
-    if not pivot_data.empty:
-        # Calcular desviación estándar entre modelos (variabilidad)
-        pivot_data['std_deviation'] = pivot_data.std(axis=1)
-        pivot_data['mean_revenue'] = pivot_data.mean(axis=1)
-        pivot_data['variability'] = (pivot_data['std_deviation'] / pivot_data['mean_revenue']).round(3)
-        
+    high_variability = prep['high_variability']
+    if high_variability is not None:
         st.write("**Canales con Mayor Variabilidad entre Modelos:**")
-        high_variability = pivot_data.nlargest(10, 'variability')
-        st.dataframe(high_variability[['mean_revenue', 'std_deviation', 'variability']].style.format({
+        st.dataframe(high_variability.style.format({
             'mean_revenue': '€{:,.2f}',
             'std_deviation': '€{:,.2f}',
             'variability': '{:.3f}'
@@ -438,7 +385,7 @@ def mostrar_atribucion_completa(df):
     
     # Inicializar session_state si no existe
     if selectbox_key not in st.session_state:
-        st.session_state[selectbox_key] = df['attribution_model'].unique()[0] if len(df['attribution_model'].unique()) > 0 else ""
+        st.session_state[selectbox_key] = models[0] if len(models) > 0 else ""
     
     # Función callback que se ejecuta ANTES del rerun
     def on_model_change():
@@ -448,14 +395,14 @@ def mostrar_atribucion_completa(df):
     # Selectbox con callback
     selected_model = st.selectbox(
         "Seleccionar modelo para análisis detallado:",
-        options=list(df['attribution_model'].unique()),
-        index=list(df['attribution_model'].unique()).index(st.session_state[selectbox_key]) if st.session_state[selectbox_key] in df['attribution_model'].unique() else 0,
+        options=models,
+        index=models.index(st.session_state[selectbox_key]) if st.session_state[selectbox_key] in models else 0,
         key=selectbox_key,
         on_change=on_model_change
     )
     
     if selected_model:
-        model_data = df[df['attribution_model'] == selected_model].nlargest(15, 'attributed_revenue')
+        model_data = preparar_atribucion_completa_modelo(df, selected_model)
         
         if not model_data.empty:
             col1, col2 = st.columns(2)
@@ -506,10 +453,7 @@ def mostrar_atribucion_completa(df):
     # Análisis por dispositivo
     st.subheader("Análisis por Dispositivo")
     
-    device_analysis = df.groupby(['attribution_model', 'device_type']).agg({
-        'attributed_revenue': 'sum',
-        'attributed_conversions': 'sum'
-    }).reset_index()
+    device_analysis = prep['device_analysis']
     
     if not device_analysis.empty:
         fig_device = px.bar(
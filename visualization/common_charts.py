@@ -1,3 +1,4 @@
+import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
@@ -26,4 +27,18 @@ def create_funnel_chart(labels, values, title="Funnel Chart"):
         opacity=0.8
     ))
     fig.update_layout(title=title)
-    return fig
\ No newline at end of file
+    return fig
+
+def mostrar_aviso_aproximado(df):
+    """Aviso bajo el título si el resultado viene del modo rápido (df.attrs['approximate'])"""
+    if df is not None and df.attrs.get('approximate'):
+        st.caption(" ≈ Valores aproximados: usuarios y sesiones únicos estimados con HyperLogLog++ (error típico ~1%)")
+
+def mostrar_aviso_muestra(df):
+    """Aviso bajo el título si el resultado es una muestra de usuarios (df.attrs['sample_percent'])"""
+    if df is not None and df.attrs.get('sample_percent'):
+        st.caption(
+            f" ≈ Muestra del {df.attrs['sample_percent']}% de los usuarios: conteos extrapolados al total "
+            "(columnas _ic_inf / _ic_sup con el intervalo de confianza del 95%). "
+            "Los valores únicos y los registros de detalle corresponden solo a la muestra"
+        )
@@ -0,0 +1,265 @@
+"""
+Preparación de datos de las visualizaciones de consentimiento (sin Streamlit)
+"""
+import pandas as pd
+
+from config.settings import Settings
+from visualization.prep import memoize_prep
+
+# Países con regulación estricta (EU + UK + California aproximado)
+STRICT_COUNTRIES = ['Spain', 'France', 'Germany', 'Italy', 'United Kingdom',
+                    'Netherlands', 'Belgium', 'Sweden', 'United States']
+
+
+@memoize_prep
+def preparar_consentimiento_basico(df):
+    """
+    Tabla de consentimiento con el porcentaje de eventos, usuarios y sesiones
+
+    Args:
+        df: Resultado de generar_query_consentimiento_basico
+
+    Returns:
+        DataFrame con las columnas de la tabla en su orden
+    """
+    df_mostrar = df.copy()
+    df_mostrar['% eventos'] = (df_mostrar['total_events'] / df['total_events'].sum() * 100).round(2).astype(str) + '%'
+    df_mostrar['% usuarios'] = (df_mostrar['total_users'] / df['total_users'].sum() * 100).round(2).astype(str) + '%'
+    df_mostrar['% sesiones'] = (df_mostrar['total_sessions'] / df['total_sessions'].sum() * 100).round(2).astype(str) + '%'
+
+    columnas = ['analytics_storage_status', 'ads_storage_status',
+                'total_events', '% eventos',
+                'total_users', '% usuarios',
+                'total_sessions', '% sesiones']
+    return df_mostrar[columnas]
+
+
+def _consent_by_device(devices, status_column):
+    """Eventos por dispositivo y estado de consentimiento (Settings.CONSENT_MAPPING)"""
+    grouped = (
+        devices.assign(consent_status=devices[status_column].map(Settings.CONSENT_MAPPING))
+        .groupby(['device_type', 'consent_status'])['total_events'].sum().reset_index()
+    )
+    return grouped, grouped.pivot(index='device_type', columns='consent_status', values='total_events')
+
+
+@memoize_prep
+def preparar_consentimiento_por_dispositivo(df):
+    """
+    Consentimiento Analytics y Ads por dispositivo
+
+    Args:
+        df: Resultado de generar_query_consentimiento_por_dispositivo
+
+    Returns:
+        dict con el orden de dispositivos por eventos, agregados y pivotes de
+        cada tipo de consentimiento y los eventos consentidos
+    """
+    devices = df.assign(device_type=df['device_type'].str.capitalize())
+    analytics_grouped, analytics_pivot = _consent_by_device(devices, 'analytics_status')
+    ads_grouped, ads_pivot = _consent_by_device(devices, 'ads_status')
+
+    return {
+        'device_order': list(devices.groupby('device_type')['total_events'].sum().sort_values(ascending=False).index),
+        'analytics_grouped': analytics_grouped,
+        'analytics_pivot': analytics_pivot,
+        'ads_grouped': ads_grouped,
+        'ads_pivot': ads_pivot,
+        'analytics_true': df[df['analytics_status'] == 'true']['total_events'].sum(),
+        'ads_true': df[df['ads_status'] == 'true']['total_events'].sum()
+    }
+
+
+@memoize_prep
+def preparar_consentimiento_real(df):
+    """Porcentaje de eventos sin consentimiento (Denegado + No Definido)"""
+    return df[df['consent_status'].isin(['Denegado', 'No Definido'])]['event_percentage'].sum()
+
+
+@memoize_prep
+def preparar_evolucion_temporal_consentimiento(df):
+    """
+    Serie diaria de consentimiento con fecha legible y brecha Analytics - Ads
+
+    Args:
+        df: Resultado de generar_query_evolucion_temporal_consentimiento
+
+    Returns:
+        dict con los días (date_display y consent_gap), medias del período,
+        tendencia entre la primera y la última semana, brecha media y tabla
+        detallada
+    """
+    days = df.copy()
+    days['date'] = pd.to_datetime(days['date'])
+    days['date_display'] = days['date'].dt.strftime('%d/%m/%Y')
+    days['consent_gap'] = days['analytics_granted_pct'] - days['ads_granted_pct']
+
+    return {
+        'days': days,
+        'avg_analytics_consent': days['analytics_granted_pct'].mean(),
+        'avg_ads_consent': days['ads_granted_pct'].mean(),
+        'avg_full_consent': days['full_consent_pct'].mean(),
+        # Tendencia (primera vs última semana)
+        'trend': days.tail(7)['analytics_granted_pct'].mean() - days.head(7)['analytics_granted_pct'].mean(),
+        'avg_gap': days['consent_gap'].mean(),
+        'display_df': days[[
+            'date_display', 'total_events', 'unique_users', 'unique_sessions',
+            'analytics_granted_pct', 'analytics_denied_pct', 'analytics_undefined_pct',
+            'ads_granted_pct', 'ads_denied_pct', 'ads_undefined_pct',
+            'full_consent_pct'
+        ]]
+    }
+
+
+@memoize_prep
+def preparar_consentimiento_geografia(df):
+    """
+    Consentimiento por país, continente y ciudad
+
+    Args:
+        df: Resultado de generar_query_consentimiento_por_geografia
+
+    Returns:
+        dict con totales, agregados por país (top 20 y heatmap de los 15
+        primeros), continente y ciudad (top 20), países con mayor y menor
+        consentimiento y la comparativa de países regulados (None si falta
+        alguno de los dos grupos)
+    """
+    country_stats = df.groupby('country').agg({
+        'total_events': 'sum',
+        'unique_users': 'sum',
+        'analytics_consent_rate': 'mean',
+        'ads_consent_rate': 'mean',
+        'full_consent_rate': 'mean',
+        'full_denial_rate': 'mean'
+    }).reset_index().sort_values('total_events', ascending=False)
+    top_countries = country_stats.head(20)
+
+    heatmap_data = top_countries.head(15)[['country', 'analytics_consent_rate', 'ads_consent_rate']].set_index('country')
+    heatmap_data.columns = ['Analytics', 'Ads']
+
+    continent_stats = df.groupby('continent').agg({
+        'total_events': 'sum',
+        'unique_users': 'sum',
+        'analytics_consent_rate': 'mean',
+        'ads_consent_rate': 'mean',
+        'full_consent_rate': 'mean'
+    }).reset_index().sort_values('total_events', ascending=False)
+
+    city_stats = df.groupby(['country', 'city']).agg({
+        'total_events': 'sum',
+        'unique_users': 'sum',
+        'full_consent_rate': 'mean'
+    }).reset_index().sort_values('total_events', ascending=False).head(20)
+    city_stats['city_country'] = city_stats['city'] + ', ' + city_stats['country']
+
+    strict_data = df[df['country'].isin(STRICT_COUNTRIES)]
+    other_data = df[~df['country'].isin(STRICT_COUNTRIES)]
+    compliance = None
+    if not strict_data.empty and not other_data.empty:
+        compliance = {
+            'strict_consent': strict_data['full_consent_rate'].mean(),
+            'other_consent': other_data['full_consent_rate'].mean()
+        }
+
+    return {
+        'total_countries': df['country'].nunique(),
+        'total_cities': df['city'].nunique(),
+        'avg_consent_rate': df['full_consent_rate'].mean(),
+        'best_country': df.groupby('country')['full_consent_rate'].mean().idxmax(),
+        'country_stats': country_stats,
+        'top_countries': top_countries,
+        'heatmap_data': heatmap_data,
+        'continent_stats': continent_stats,
+        'city_stats': city_stats,
+        'best_consent_countries': country_stats.nlargest(5, 'full_consent_rate'),
+        'worst_consent_countries': country_stats.nsmallest(5, 'full_consent_rate'),
+        'compliance': compliance
+    }
+
+
+@memoize_prep
+def preparar_consentimiento_fuente_trafico(df):
+    """
+    Agregados de consentimiento por canal, medio y campaña
+
+    Args:
+        df: Resultado de generar_query_consentimiento_por_fuente_trafico
+
+    Returns:
+        dict con métricas generales, tablas por canal (con ratio
+        aceptación/rechazo), medio y campaña y las opciones de los filtros
+    """
+    channel_stats = df.groupby('channel_group').agg({
+        'total_events': 'sum',
+        'unique_users': 'sum',
+        'unique_sessions': 'sum',
+        'analytics_consent_rate': 'mean',
+        'ads_consent_rate': 'mean',
+        'full_consent_rate': 'mean',
+        'no_consent_rate': 'mean'
+    }).reset_index().sort_values('total_events', ascending=False)
+    channel_stats['consent_ratio'] = (
+        channel_stats['full_consent_rate'] /
+        channel_stats['no_consent_rate'].replace(0, 0.1)  # Evitar división por cero
+    )
+
+    medium_stats = df.groupby('utm_medium').agg({
+        'total_events': 'sum',
+        'unique_users': 'sum',
+        'analytics_consent_rate': 'mean',
+        'ads_consent_rate': 'mean',
+        'full_consent_rate': 'mean'
+    }).reset_index().sort_values('unique_users', ascending=False).head(15)
+
+    has_campaigns = not df['utm_campaign'].isna().all()
+    campaign_stats = None
+    if has_campaigns:
+        campaign_stats = df[df['utm_campaign'].notna()].groupby('utm_campaign').agg({
+            'unique_users': 'sum',
+            'full_consent_rate': 'mean'
+        }).reset_index().sort_values('unique_users', ascending=False).head(15)
+
+    return {
+        'total_sources': df['utm_source'].nunique(),
+        'avg_analytics_consent': df['analytics_consent_rate'].mean(),
+        'avg_ads_consent': df['ads_consent_rate'].mean(),
+        'avg_full_consent': df['full_consent_rate'].mean(),
+        'channel_stats': channel_stats,
+        'medium_stats': medium_stats,
+        'best_channels': channel_stats.nlargest(3, 'full_consent_rate'),
+        'worst_channels': channel_stats.nsmallest(3, 'full_consent_rate'),
+        'has_campaigns': has_campaigns,
+        'campaign_stats': campaign_stats,
+        'channels': ['Todos'] + sorted(df['channel_group'].unique().tolist()),
+        'max_users': int(df['unique_users'].max()) if len(df) > 0 else 1000
+    }
+
+
+@memoize_prep
+def preparar_consentimiento_fuente_trafico_filtrado(df, selected_channel, min_users):
+    """
+    Fuentes filtradas por canal y mínimo de usuarios
+
+    Args:
+        df: Resultado de generar_query_consentimiento_por_fuente_trafico
+        selected_channel: Canal o 'Todos'
+        min_users: Mínimo de usuarios únicos
+
+    Returns:
+        dict con las fuentes filtradas y el top 20 con etiqueta fuente / medio
+    """
+    filtered = df[df['unique_users'] >= min_users]
+    if selected_channel != 'Todos':
+        filtered = filtered[filtered['channel_group'] == selected_channel]
+
+    top_sources = filtered.nlargest(20, 'unique_users').copy()
+    top_sources['source_label'] = (
+        top_sources['utm_source'].fillna('(not set)') + ' / ' +
+        top_sources['utm_medium'].fillna('(none)')
+    )
+
+    return {
+        'filtered': filtered,
+        'top_sources': top_sources
+    }
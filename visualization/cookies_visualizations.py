@@ -1,33 +1,28 @@
 import streamlit as st
-import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
+from visualization.common_charts import mostrar_aviso_aproximado
+from visualization.cookies_prep import (
+    preparar_consentimiento_basico,
+    preparar_consentimiento_por_dispositivo,
+    preparar_consentimiento_real,
+    preparar_evolucion_temporal_consentimiento,
+    preparar_consentimiento_geografia,
+    preparar_consentimiento_fuente_trafico,
+    preparar_consentimiento_fuente_trafico_filtrado
+)
 
 def mostrar_consentimiento_basico(df):
     """Visualización para consulta básica de consentimiento con porcentajes"""
     st.subheader("Datos Crudos")
+    mostrar_aviso_aproximado(df)
     
-    # Calcular totales para porcentajes
-    total_eventos = df['total_events'].sum()
-    total_usuarios = df['total_users'].sum()
-    total_sesiones = df['total_sessions'].sum()
+    # Tabla con porcentajes sobre el total
+    df_mostrar = preparar_consentimiento_basico(df)
     
-    # Crear copia del DataFrame para no modificar el original
-    df_mostrar = df.copy()
-    
-    # Calcular porcentajes
-    df_mostrar['% eventos'] = (df_mostrar['total_events'] / total_eventos * 100).round(2).astype(str) + '%'
-    df_mostrar['% usuarios'] = (df_mostrar['total_users'] / total_usuarios * 100).round(2).astype(str) + '%'
-    df_mostrar['% sesiones'] = (df_mostrar['total_sessions'] / total_sesiones * 100).round(2).astype(str) + '%'
-    
-    # Reordenar columnas
-    columnas = ['analytics_storage_status', 'ads_storage_status', 
-                'total_events', '% eventos',
-                'total_users', '% usuarios',
-                'total_sessions', '% sesiones']
-    
-    st.dataframe(df_mostrar[columnas].style.format({
+    st.dataframe(df_mostrar.style.format({
         'total_events': '{:,}',
         'total_users': '{:,}',
         'total_sessions': '{:,}'
@@ -47,32 +42,26 @@ def mostrar_consentimiento_basico(df):
 def mostrar_consentimiento_por_dispositivo(df):
     """Visualización corregida que muestra datos diferentes en cada pestaña"""
     st.subheader("Consentimiento por Dispositivo (Detallado)")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos disponibles para el rango seleccionado")
         return
     
-    # Preprocesamiento
-    df['device_type'] = df['device_type'].str.capitalize()
-    consent_map = Settings.CONSENT_MAPPING
+    prep = preparar_consentimiento_por_dispositivo(df)
     
     # Orden de dispositivos por eventos totales
-    device_order = df.groupby('device_type')['total_events'].sum().sort_values(ascending=False).index
+    device_order = prep['device_order']
     
     tab1, tab2 = st.tabs(["Analytics Storage", "Ads Storage"])
     
     with tab1:
-        df_analytics = df[['device_type', 'analytics_status', 'total_events']].copy()
-        df_analytics['consent_status'] = df_analytics['analytics_status'].map(consent_map)
-        
-        df_analytics_grouped = df_analytics.groupby(['device_type', 'consent_status'])['total_events'].sum().reset_index()
-        
         fig_analytics = px.bar(
-            df_analytics_grouped,
+            prep['analytics_grouped'],
             x='device_type',
             y='total_events',
             color='consent_status',
-            category_orders={"device_type": list(device_order)},
+            category_orders={"device_type": device_order},
             barmode='stack',
             title='Consentimiento Analytics por Dispositivo',
             labels={'device_type': 'Dispositivo', 'total_events': 'Eventos'},
@@ -84,20 +73,15 @@ def mostrar_consentimiento_por_dispositivo(df):
         )
         st.plotly_chart(fig_analytics, use_container_width=True)
         
-        st.dataframe(df_analytics_grouped.pivot(index='device_type', columns='consent_status', values='total_events'))
+        st.dataframe(prep['analytics_pivot'])
     
     with tab2:
-        df_ads = df[['device_type', 'ads_status', 'total_events']].copy()
-        df_ads['consent_status'] = df_ads['ads_status'].map(consent_map)
-        
-        df_ads_grouped = df_ads.groupby(['device_type', 'consent_status'])['total_events'].sum().reset_index()
-        
         fig_ads = px.bar(
-            df_ads_grouped,
+            prep['ads_grouped'],
             x='device_type',
             y='total_events',
             color='consent_status',
-            category_orders={"device_type": list(device_order)},
+            category_orders={"device_type": device_order},
             barmode='stack',
             title='Consentimiento Ads por Dispositivo',
             labels={'device_type': 'Dispositivo', 'total_events': 'Eventos'},
@@ -109,19 +93,17 @@ def mostrar_consentimiento_por_dispositivo(df):
         )
         st.plotly_chart(fig_ads, use_container_width=True)
         
-        st.dataframe(df_ads_grouped.pivot(index='device_type', columns='consent_status', values='total_events'))
+        st.dataframe(prep['ads_pivot'])
     
     # Estadísticas comparativas
     st.subheader("Comparativa de Consentimientos")
     col1, col2 = st.columns(2)
     
     with col1:
-        analytics_true = df[df['analytics_status'] == 'true']['total_events'].sum()
-        st.metric("Eventos con Consentimiento Analytics", f"{analytics_true:,}")
+        st.metric("Eventos con Consentimiento Analytics", f"{prep['analytics_true']:,}")
     
     with col2:
-        ads_true = df[df['ads_status'] == 'true']['total_events'].sum()
-        st.metric("Eventos con Consentimiento Ads", f"{ads_true:,}")
+        st.metric("Eventos con Consentimiento Ads", f"{prep['ads_true']:,}")
 
 def mostrar_consentimiento_real(df):
     """Nueva visualización para porcentaje real de consentimiento"""
@@ -150,39 +132,30 @@ def mostrar_consentimiento_real(df):
     }))
     
     # Calcular y mostrar el % de eventos SIN consentimiento (Denegado + No Definido)
-    denied_pct = df[df['consent_status'].isin(['Denegado', 'No Definido'])]['event_percentage'].sum()
+    denied_pct = preparar_consentimiento_real(df)
     st.metric("Eventos sin consentimiento (Real)", f"{denied_pct:.2f}%")
 
 def mostrar_evolucion_temporal_consentimiento(df):
     """Visualización para evolución temporal del consentimiento"""
     st.subheader("Evolución Temporal del Consentimiento")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos de evolución temporal para el rango seleccionado")
         return
     
-    # Convertir fecha
-    df['date'] = pd.to_datetime(df['date'])
-    df['date_display'] = df['date'].dt.strftime('%d/%m/%Y')
-    
-    # Métricas generales del período
-    avg_analytics_consent = df['analytics_granted_pct'].mean()
-    avg_ads_consent = df['ads_granted_pct'].mean()
-    avg_full_consent = df['full_consent_pct'].mean()
-    
-    # Tendencia (primera vs última semana)
-    first_week = df.head(7)['analytics_granted_pct'].mean()
-    last_week = df.tail(7)['analytics_granted_pct'].mean()
-    trend = last_week - first_week
+    prep = preparar_evolucion_temporal_consentimiento(df)
+    df = prep['days']
+    trend = prep['trend']
     
     # Mostrar métricas clave
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Analytics Consent (Promedio)", f"{avg_analytics_consent:.1f}%")
+        st.metric("Analytics Consent (Promedio)", f"{prep['avg_analytics_consent']:.1f}%")
     with col2:
-        st.metric("Ads Consent (Promedio)", f"{avg_ads_consent:.1f}%")
+        st.metric("Ads Consent (Promedio)", f"{prep['avg_ads_consent']:.1f}%")
     with col3:
-        st.metric("Consentimiento Completo", f"{avg_full_consent:.1f}%")
+        st.metric("Consentimiento Completo", f"{prep['avg_full_consent']:.1f}%")
     with col4:
         st.metric("Tendencia (7 días)", f"{trend:+.1f}%", 
                  delta_color="normal" if trend >= 0 else "inverse")
@@ -272,9 +245,7 @@ def mostrar_evolucion_temporal_consentimiento(df):
     # Análisis comparativo: Analytics vs Ads
     st.subheader("Comparativa: Analytics vs Ads Storage")
     
-    # Calcular diferencia
-    df['consent_gap'] = df['analytics_granted_pct'] - df['ads_granted_pct']
-    avg_gap = df['consent_gap'].mean()
+    avg_gap = prep['avg_gap']
     
     col1, col2 = st.columns([2, 1])
     
@@ -286,9 +257,7 @@ def mostrar_evolucion_temporal_consentimiento(df):
             x=df['date_display'],
             y=df['consent_gap'],
             name='Diferencia',
-            marker_color=df['consent_gap'].apply(
-                lambda x: '#4CAF50' if x >= 0 else '#F44336'
-            ),
+            marker_color=np.where(df['consent_gap'] >= 0, '#4CAF50', '#F44336'),
             hovertemplate='%{x}<br>Gap: %{y:.2f}%<extra></extra>'
         ))
         
@@ -324,12 +293,7 @@ def mostrar_evolucion_temporal_consentimiento(df):
     # Tabla de datos detallada
     st.subheader("Datos Detallados")
     
-    display_df = df[[
-        'date_display', 'total_events', 'unique_users', 'unique_sessions',
-        'analytics_granted_pct', 'analytics_denied_pct', 'analytics_undefined_pct',
-        'ads_granted_pct', 'ads_denied_pct', 'ads_undefined_pct',
-        'full_consent_pct'
-    ]].copy()
+    display_df = prep['display_df']
     
     st.dataframe(display_df.style.format({
         'total_events': '{:,}',
@@ -365,41 +329,32 @@ def mostrar_evolucion_temporal_consentimiento(df):
 def mostrar_consentimiento_por_geografia(df):
     """Visualización para consentimiento por geografía"""
     st.subheader("Consentimiento por Geografía")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos geográficos para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_countries = df['country'].nunique()
-    total_cities = df['city'].nunique()
-    avg_consent_rate = df['full_consent_rate'].mean()
+    prep = preparar_consentimiento_geografia(df)
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Países Únicos", f"{total_countries}")
+        st.metric("Países Únicos", f"{prep['total_countries']}")
     with col2:
-        st.metric("Ciudades Únicas", f"{total_cities}")
+        st.metric("Ciudades Únicas", f"{prep['total_cities']}")
     with col3:
-        st.metric("Consent Rate Promedio", f"{avg_consent_rate:.1f}%")
+        st.metric("Consent Rate Promedio", f"{prep['avg_consent_rate']:.1f}%")
     with col4:
-        best_country = df.groupby('country')['full_consent_rate'].mean().idxmax()
-        st.metric("País con Mayor Consent", best_country)
+        st.metric("País con Mayor Consent", prep['best_country'])
     
     # Análisis por país
     st.subheader("Análisis por País")
     
-    country_stats = df.groupby('country').agg({
-        'total_events': 'sum',
-        'unique_users': 'sum',
-        'analytics_consent_rate': 'mean',
-        'ads_consent_rate': 'mean',
-        'full_consent_rate': 'mean',
-        'full_denial_rate': 'mean'
-    }).reset_index().sort_values('total_events', ascending=False)
+    country_stats = prep['country_stats']
     
     # Top 20 países
-    top_countries = country_stats.head(20)
+    top_countries = prep['top_countries']
     
     col1, col2 = st.columns(2)
     
@@ -442,12 +397,9 @@ def mostrar_consentimiento_por_geografia(df):
     # Heatmap de consentimiento por país
     st.subheader("Comparativa: Analytics vs Ads por País")
     
-    # Preparar datos para heatmap (Top 15 países)
-    heatmap_data = top_countries.head(15)[['country', 'analytics_consent_rate', 'ads_consent_rate']].set_index('country')
-    heatmap_data.columns = ['Analytics', 'Ads']
-    
+    # Heatmap de los 15 primeros países
     fig_heatmap = px.imshow(
-        heatmap_data.T,
+        prep['heatmap_data'].T,
         labels=dict(x="País", y="Tipo de Consentimiento", color="Tasa (%)"),
         title="Comparativa Analytics vs Ads por País (Top 15)",
         color_continuous_scale='RdYlGn',
@@ -460,13 +412,7 @@ def mostrar_consentimiento_por_geografia(df):
     # Análisis por continente
     st.subheader("Análisis por Continente")
     
-    continent_stats = df.groupby('continent').agg({
-        'total_events': 'sum',
-        'unique_users': 'sum',
-        'analytics_consent_rate': 'mean',
-        'ads_consent_rate': 'mean',
-        'full_consent_rate': 'mean'
-    }).reset_index().sort_values('total_events', ascending=False)
+    continent_stats = prep['continent_stats']
     
     col1, col2 = st.columns(2)
     
@@ -512,16 +458,8 @@ def mostrar_consentimiento_por_geografia(df):
     # Análisis por ciudad (Top 20)
     st.subheader("Top 20 Ciudades")
     
-    city_stats = df.groupby(['country', 'city']).agg({
-        'total_events': 'sum',
-        'unique_users': 'sum',
-        'full_consent_rate': 'mean'
-    }).reset_index().sort_values('total_events', ascending=False).head(20)
-    
-    city_stats['city_country'] = city_stats['city'] + ', ' + city_stats['country']
-    
     fig_cities = px.bar(
-        city_stats,
+        prep['city_stats'],
         x='unique_users',
         y='city_country',
         orientation='h',
@@ -560,8 +498,8 @@ def mostrar_consentimiento_por_geografia(df):
     st.subheader("Insights Geográficos")
     
     # Países con mayor y menor consentimiento
-    best_consent_countries = country_stats.nlargest(5, 'full_consent_rate')
-    worst_consent_countries = country_stats.nsmallest(5, 'full_consent_rate')
+    best_consent_countries = prep['best_consent_countries']
+    worst_consent_countries = prep['worst_consent_countries']
     
     col1, col2 = st.columns(2)
     
@@ -587,22 +525,18 @@ def mostrar_consentimiento_por_geografia(df):
     # Estadísticas de compliance
     st.subheader("Estadísticas de Compliance")
     
-    # Países con regulación estricta (EU + UK + California aproximado)
-    strict_countries = ['Spain', 'France', 'Germany', 'Italy', 'United Kingdom', 
-                       'Netherlands', 'Belgium', 'Sweden', 'United States']
+    # Países con regulación estricta (EU + UK + California aproximado) frente al resto
+    compliance = prep['compliance']
     
-    strict_data = df[df['country'].isin(strict_countries)]
-    other_data = df[~df['country'].isin(strict_countries)]
-    
-    if not strict_data.empty and not other_data.empty:
+    if compliance is not None:
         col1, col2, col3 = st.columns(3)
+        strict_consent = compliance['strict_consent']
+        other_consent = compliance['other_consent']
         
         with col1:
-            strict_consent = strict_data['full_consent_rate'].mean()
             st.metric("Consent Rate (Países Regulados)", f"{strict_consent:.1f}%")
         
         with col2:
-            other_consent = other_data['full_consent_rate'].mean()
             st.metric("Consent Rate (Otros Países)", f"{other_consent:.1f}%")
         
         with col3:
@@ -616,39 +550,29 @@ def mostrar_consentimiento_por_geografia(df):
 def mostrar_consentimiento_por_fuente_trafico(df):
     """Visualización para consentimiento por fuente de tráfico"""
     st.subheader("Consentimiento por Fuente de Tráfico")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos de consentimiento por fuente de tráfico")
         return
     
-    # Métricas generales
-    total_sources = df['utm_source'].nunique()
-    avg_analytics_consent = df['analytics_consent_rate'].mean()
-    avg_ads_consent = df['ads_consent_rate'].mean()
-    avg_full_consent = df['full_consent_rate'].mean()
+    prep = preparar_consentimiento_fuente_trafico(df)
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Fuentes Únicas", f"{total_sources}")
+        st.metric("Fuentes Únicas", f"{prep['total_sources']}")
     with col2:
-        st.metric("Analytics Consent (Avg)", f"{avg_analytics_consent:.1f}%")
+        st.metric("Analytics Consent (Avg)", f"{prep['avg_analytics_consent']:.1f}%")
     with col3:
-        st.metric("Ads Consent (Avg)", f"{avg_ads_consent:.1f}%")
+        st.metric("Ads Consent (Avg)", f"{prep['avg_ads_consent']:.1f}%")
     with col4:
-        st.metric("Consentimiento Completo", f"{avg_full_consent:.1f}%")
+        st.metric("Consentimiento Completo", f"{prep['avg_full_consent']:.1f}%")
     
     # Análisis por Channel Group
     st.subheader("Consentimiento por Channel Group")
     
-    channel_stats = df.groupby('channel_group').agg({
-        'total_events': 'sum',
-        'unique_users': 'sum',
-        'unique_sessions': 'sum',
-        'analytics_consent_rate': 'mean',
-        'ads_consent_rate': 'mean',
-        'full_consent_rate': 'mean',
-        'no_consent_rate': 'mean'
-    }).reset_index().sort_values('total_events', ascending=False)
+    channel_stats = prep['channel_stats']
     
     col1, col2 = st.columns(2)
     
@@ -735,7 +659,7 @@ def mostrar_consentimiento_por_fuente_trafico(df):
     with col1:
         selected_channel = st.selectbox(
             "Filtrar por canal:",
-            ['Todos'] + sorted(df['channel_group'].unique().tolist()),
+            prep['channels'],
             key="consent_traffic_channel_filter"
         )
     
@@ -743,26 +667,19 @@ def mostrar_consentimiento_por_fuente_trafico(df):
         min_users = st.slider(
             "Mínimo de usuarios:",
             min_value=10,
-            max_value=int(df['unique_users'].max()) if len(df) > 0 else 1000,
+            max_value=prep['max_users'],
             value=50,
             key="consent_traffic_min_users"
         )
     
     # Aplicar filtros
-    df_filtered = df[df['unique_users'] >= min_users].copy()
-    if selected_channel != 'Todos':
-        df_filtered = df_filtered[df_filtered['channel_group'] == selected_channel]
+    filtrado = preparar_consentimiento_fuente_trafico_filtrado(df, selected_channel, min_users)
+    df_filtered = filtrado['filtered']
     
     # Top 20 fuentes
-    top_sources = df_filtered.nlargest(20, 'unique_users')
+    top_sources = filtrado['top_sources']
     
     if not top_sources.empty:
-        # Crear etiqueta compuesta
-        top_sources['source_label'] = (
-            top_sources['utm_source'].fillna('(not set)') + ' / ' + 
-            top_sources['utm_medium'].fillna('(none)')
-        )
-        
         fig_top_sources = px.bar(
             top_sources,
             x='unique_users',
@@ -794,13 +711,7 @@ def mostrar_consentimiento_por_fuente_trafico(df):
     # Análisis por medio (utm_medium)
     st.subheader("Análisis por Medio de Adquisición")
     
-    medium_stats = df.groupby('utm_medium').agg({
-        'total_events': 'sum',
-        'unique_users': 'sum',
-        'analytics_consent_rate': 'mean',
-        'ads_consent_rate': 'mean',
-        'full_consent_rate': 'mean'
-    }).reset_index().sort_values('unique_users', ascending=False).head(15)
+    medium_stats = prep['medium_stats']
     
     col1, col2 = st.columns(2)
     
@@ -853,8 +764,8 @@ def mostrar_consentimiento_por_fuente_trafico(df):
     st.subheader("Insights de Marketing")
     
     # Identificar mejores y peores canales
-    best_channels = channel_stats.nlargest(3, 'full_consent_rate')
-    worst_channels = channel_stats.nsmallest(3, 'full_consent_rate')
+    best_channels = prep['best_channels']
+    worst_channels = prep['worst_channels']
     
     col1, col2 = st.columns(2)
     
@@ -873,12 +784,6 @@ def mostrar_consentimiento_por_fuente_trafico(df):
     # Análisis de ratio consent/denial
     st.subheader("Ratio de Aceptación vs Rechazo")
     
-    # Añadir columna de ratio
-    channel_stats['consent_ratio'] = (
-        channel_stats['full_consent_rate'] / 
-        channel_stats['no_consent_rate'].replace(0, 0.1) # Evitar división por cero
-    )
-    
     fig_ratio = px.bar(
         channel_stats.sort_values('consent_ratio', ascending=False),
         x='channel_group',
@@ -911,13 +816,10 @@ def mostrar_consentimiento_por_fuente_trafico(df):
     """)
     
     # Análisis de campañas específicas (si hay datos)
-    if not df['utm_campaign'].isna().all():
+    if prep['has_campaigns']:
         st.subheader("Top Campañas por Consentimiento")
         
-        campaign_stats = df[df['utm_campaign'].notna()].groupby('utm_campaign').agg({
-            'unique_users': 'sum',
-            'full_consent_rate': 'mean'
-        }).reset_index().sort_values('unique_users', ascending=False).head(15)
+        campaign_stats = prep['campaign_stats']
         
         if not campaign_stats.empty:
             fig_campaigns = px.scatter(
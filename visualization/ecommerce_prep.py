@@ -0,0 +1,247 @@
+"""
+Preparación de datos de las visualizaciones de ecommerce (sin Streamlit)
+"""
+import pandas as pd
+
+from config.settings import Settings
+from utils.helpers import safe_divide
+from visualization.prep import memoize_prep, truncate_labels
+
+FUNNEL_EVENT_LABELS = {
+    'page_view': 'Page Views',
+    'view_item': 'View Item',
+    'add_to_cart': 'Add to Cart',
+    'begin_checkout': 'Begin Checkout',
+    'purchase': 'Purchase'
+}
+
+
+@memoize_prep
+def preparar_comparativa_eventos(df):
+    """
+    Totales por evento del funnel y tasas de conversión entre etapas
+
+    Args:
+        df: Resultado de generar_query_comparativa_eventos
+
+    Returns:
+        dict con las tasas de conversión y las etapas del funnel con datos
+    """
+    event_totals = df.groupby('event_name')['total_events'].sum()
+    totals = {event: event_totals.get(event, 0) for event in Settings.FUNNEL_EVENTS}
+
+    page_views = totals['page_view']
+    view_items = totals['view_item']
+
+    # Solo las etapas con datos entran en el gráfico
+    funnel_stages = [event for event in Settings.FUNNEL_EVENTS if totals[event] > 0]
+
+    return {
+        'view_item_rate': safe_divide(view_items, page_views) * 100,
+        'add_to_cart_rate': safe_divide(totals['add_to_cart'], view_items) * 100,
+        'checkout_rate': safe_divide(totals['begin_checkout'], view_items) * 100,
+        'purchase_rate': safe_divide(totals['purchase'], view_items) * 100,
+        'funnel_events': [FUNNEL_EVENT_LABELS[event] for event in funnel_stages],
+        'funnel_values': [totals[event] for event in funnel_stages]
+    }
+
+
+@memoize_prep
+def preparar_ingresos_transacciones(df):
+    """
+    Días con fecha legible y métricas de ingresos
+
+    Args:
+        df: Resultado de generar_query_ingresos_transacciones
+
+    Returns:
+        dict con los días (con fecha_formateada), compras, ingresos y ticket medio
+    """
+    days = df.copy()
+    days['date'] = pd.to_datetime(days['date'], format='%Y%m%d')
+    days['fecha_formateada'] = days['date'].dt.strftime('%d/%m/%Y')
+
+    total_purchases = days['total_purchase_events'].sum()
+    total_revenue = days['purchase_revenue'].sum()
+
+    return {
+        'days': days,
+        'total_purchases': total_purchases,
+        'total_revenue': total_revenue,
+        'avg_transaction_value': safe_divide(total_revenue, total_purchases)
+    }
+
+
+@memoize_prep
+def preparar_productos_mas_vendidos(df):
+    """
+    Métricas generales de los productos vendidos
+
+    Args:
+        df: Resultado de generar_query_productos_mas_vendidos (ordenado por ingresos)
+
+    Returns:
+        dict con ingresos y cantidad totales e ingreso medio por producto
+    """
+    total_revenue = df['total_revenue'].sum()
+
+    return {
+        'total_revenue': total_revenue,
+        'total_quantity': df['total_quantity_sold'].sum(),
+        'avg_revenue_per_product': safe_divide(total_revenue, len(df))
+    }
+
+
+@memoize_prep
+def preparar_relacion_productos(df):
+    """
+    Productos con más de un nombre o nombres con más de un ID
+
+    Args:
+        df: Resultado de generar_query_relacion_productos
+
+    Returns:
+        dict con las ineficiencias, sus dos desgloses y el porcentaje sobre el total
+    """
+    ineficiencias = df[(df['nombres_por_producto'] > 1) | (df['ids_por_nombre'] > 1)]
+
+    return {
+        'ineficiencias': ineficiencias,
+        'productos_multi_nombre': ineficiencias[ineficiencias['nombres_por_producto'] > 1],
+        'nombres_multi_id': ineficiencias[ineficiencias['ids_por_nombre'] > 1],
+        'pct_ineficiencia': safe_divide(len(ineficiencias), len(df)) * 100
+    }
+
+
+@memoize_prep
+def preparar_funnel_por_producto(df):
+    """
+    Métricas, funnel de los 5 primeros productos y tasas de los 10 primeros
+
+    Args:
+        df: Resultado de generar_query_funnel_por_producto
+
+    Returns:
+        dict con totales, conversión global, funnel en formato largo, tasas
+        por producto y el producto con mejor tasa de compra
+    """
+    total_view_items = df['view_item'].sum()
+    total_purchases = df['purchase'].sum()
+    top_products = df.head(10)
+
+    # Formato largo (producto, etapa, usuarios) para las barras agrupadas
+    stages = {'view_item': 'View Item', 'add_to_cart': 'Add to Cart',
+              'begin_checkout': 'Begin Checkout', 'purchase': 'Purchase'}
+    funnel_df = (
+        top_products.head(5)[['item_name'] + list(stages)]
+        .melt(id_vars='item_name', var_name='Etapa', value_name='Usuarios')
+        .rename(columns={'item_name': 'Producto'})
+    )
+    funnel_df['Etapa'] = funnel_df['Etapa'].map(stages)
+
+    return {
+        'total_view_items': total_view_items,
+        'total_purchases': total_purchases,
+        'overall_conversion_rate': safe_divide(total_purchases, total_view_items) * 100,
+        'funnel_df': funnel_df,
+        'rates_df': top_products.set_index('item_name')[['add_to_cart_rate', 'begin_checkout_rate', 'purchase_rate']],
+        'best_converter': df.loc[df['purchase_rate'].idxmax()] if not df.empty else None
+    }
+
+
+def _product_counts(combos):
+    """Apariciones de cada producto en los combos (como A o como B), de más a menos"""
+    return (
+        pd.concat([combos['product_a'], combos['product_b']], ignore_index=True)
+        .value_counts()
+        .rename_axis('Producto')
+        .reset_index(name='Apariciones')
+    )
+
+
+@memoize_prep
+def preparar_combos(df):
+    """
+    Combos con etiquetas y métricas generales (independientes de los filtros)
+
+    Args:
+        df: Combos de database.market_basket.mine_combos
+
+    Returns:
+        dict con los combos etiquetados, métricas y máximos de los sliders
+    """
+    combos = df.copy()
+    combos['combo_label'] = combos['product_a'] + ' + ' + combos['product_b']
+    combos['combo_label_short'] = truncate_labels(combos['combo_label'], 60)
+
+    return {
+        'combos': combos,
+        'total_combos': len(combos),
+        'avg_lift': combos['lift'].mean(),
+        'avg_confidence': combos['confidence_a_to_b'].mean(),
+        'best_combo': combos.iloc[0] if len(combos) > 0 else None,
+        # El slider empieza en lift 1: necesita un máximo por encima aunque no haya sinergias
+        'max_lift': max(float(combos['lift'].max()), 1.1) if len(combos) > 0 else 5.0,
+        'max_frequency': int(combos['times_bought_together'].max()) if len(combos) > 0 else 50,
+        'itemset_sizes': sorted(combos['itemset_size'].unique().tolist())
+    }
+
+
+@memoize_prep
+def preparar_combos_filtrado(df, min_lift, min_confidence, min_frequency, itemset_size=None):
+    """
+    Tablas de combos que dependen de los filtros de lift, confidence y frecuencia
+
+    Args:
+        df: Combos de database.market_basket.mine_combos
+        min_lift: Lift mínimo
+        min_confidence: Confidence A→B mínima (%)
+        min_frequency: Mínimo de compras conjuntas
+        itemset_size: Productos por combo (None = todos)
+
+    Returns:
+        dict con los combos filtrados, cuadrantes frecuencia/valor, rankings,
+        totales por dispositivo, productos ancla y estimación de impacto
+    """
+    combos = preparar_combos(df)['combos']
+    filtered = combos[
+        (combos['lift'] >= min_lift) &
+        (combos['confidence_a_to_b'] >= min_confidence) &
+        (combos['times_bought_together'] >= min_frequency) &
+        ((combos['itemset_size'] == itemset_size) if itemset_size else True)
+    ]
+    if filtered.empty:
+        return {'filtered': filtered}
+
+    # Cuadrantes por mediana de frecuencia y de valor del carrito
+    median_freq = filtered['times_bought_together'].median()
+    median_value = filtered['avg_basket_value'].median()
+    high_value = filtered['avg_basket_value'] > median_value
+
+    # En los combos de tres o más productos product_a es un antecedente (A + B), no un producto
+    top_products = _product_counts(filtered[filtered['itemset_size'] == 2]).head(15)
+
+    # Escenario: aumentar ventas de los top 10 combos en un 20%
+    top_10_combos = filtered.head(10)
+    current_combo_sales = top_10_combos['times_bought_together'].sum()
+    avg_combo_value = top_10_combos['avg_basket_value'].mean()
+    potential_new_combos = current_combo_sales * 0.20
+
+    return {
+        'filtered': filtered,
+        'median_freq': median_freq,
+        'median_value': median_value,
+        'star_combos': filtered[(filtered['times_bought_together'] > median_freq) & high_value].head(5),
+        'premium_combos': filtered[(filtered['times_bought_together'] <= median_freq) & high_value].head(5),
+        'top_value': filtered.nlargest(15, 'avg_basket_value'),
+        'top_freq': filtered.nlargest(15, 'times_bought_together'),
+        'total_desktop': filtered['desktop_purchases'].sum(),
+        'total_mobile': filtered['mobile_purchases'].sum(),
+        'total_tablet': filtered['tablet_purchases'].sum(),
+        'top_products': top_products,
+        'best_bundles': filtered.nlargest(5, 'combo_strength_score'),
+        'current_combo_sales': current_combo_sales,
+        'avg_combo_value': avg_combo_value,
+        'potential_new_combos': potential_new_combos,
+        'potential_revenue': potential_new_combos * avg_combo_value
+    }
@@ -3,7 +3,16 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
-from utils.helpers import safe_divide
+from visualization.ecommerce_prep import (
+    preparar_comparativa_eventos,
+    preparar_ingresos_transacciones,
+    preparar_productos_mas_vendidos,
+    preparar_relacion_productos,
+    preparar_funnel_por_producto,
+    preparar_combos,
+    preparar_combos_filtrado
+)
+from visualization.common_charts import mostrar_aviso_muestra
 
 def mostrar_comparativa_eventos(df):
     """Visualización para comparativa completa de eventos (con funnel como antes)"""
@@ -19,69 +28,22 @@ def mostrar_comparativa_eventos(df):
         'unique_users': '{:,}'
     }))
     
-    # Agregar datos por tipo de evento (suma total)
-    event_totals = df.groupby('event_name').agg({
-        'total_events': 'sum',
-        'unique_users': 'sum'
-    }).reset_index()
-    
-    # Crear datos para el funnel
-    funnel_data = []
-    for event_type in Settings.FUNNEL_EVENTS:
-        event_data = event_totals[event_totals['event_name'] == event_type]
-        if not event_data.empty:
-            funnel_data.append({
-                'event_name': event_type,
-                'total_events': event_data['total_events'].values[0],
-                'unique_users': event_data['unique_users'].values[0]
-            })
-        else:
-            funnel_data.append({
-                'event_name': event_type,
-                'total_events': 0,
-                'unique_users': 0
-            })
-    
-    funnel_df = pd.DataFrame(funnel_data)
-    
-    # Calcular tasas de conversión con manejo de zeros
-    page_views = funnel_df[funnel_df['event_name'] == 'page_view']['total_events'].values[0]
-    view_items = funnel_df[funnel_df['event_name'] == 'view_item']['total_events'].values[0]
-    add_to_cart = funnel_df[funnel_df['event_name'] == 'add_to_cart']['total_events'].values[0]
-    begin_checkout = funnel_df[funnel_df['event_name'] == 'begin_checkout']['total_events'].values[0]
-    purchases = funnel_df[funnel_df['event_name'] == 'purchase']['total_events'].values[0]
+    prep = preparar_comparativa_eventos(df)
     
     # Mostrar métricas de conversión
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        view_item_rate = safe_divide(view_items, page_views) * 100
-        st.metric("Tasa View Item", f"{view_item_rate:.2f}%")
+        st.metric("Tasa View Item", f"{prep['view_item_rate']:.2f}%")
     with col2:
-        add_to_cart_rate = safe_divide(add_to_cart, view_items) * 100
-        st.metric("Tasa Add to Cart", f"{add_to_cart_rate:.2f}%")
+        st.metric("Tasa Add to Cart", f"{prep['add_to_cart_rate']:.2f}%")
     with col3:
-        checkout_rate = safe_divide(begin_checkout, view_items) * 100
-        st.metric("Tasa Checkout", f"{checkout_rate:.2f}%")
+        st.metric("Tasa Checkout", f"{prep['checkout_rate']:.2f}%")
     with col4:
-        purchase_rate = safe_divide(purchases, view_items) * 100
-        st.metric("Tasa Compra", f"{purchase_rate:.2f}%")
+        st.metric("Tasa Compra", f"{prep['purchase_rate']:.2f}%")
     
     # Gráfico de funnel (solo mostrar eventos con datos)
-    funnel_events = []
-    funnel_values = []
-    event_labels = {
-        'page_view': 'Page Views',
-        'view_item': 'View Item', 
-        'add_to_cart': 'Add to Cart',
-        'begin_checkout': 'Begin Checkout',
-        'purchase': 'Purchase'
-    }
-    
-    for event_type in Settings.FUNNEL_EVENTS:
-        event_value = funnel_df[funnel_df['event_name'] == event_type]['total_events'].values[0]
-        if event_value > 0:
-            funnel_events.append(event_labels[event_type])
-            funnel_values.append(event_value)
+    funnel_events = prep['funnel_events']
+    funnel_values = prep['funnel_values']
     
     if funnel_values:
         fig_funnel = go.Figure(go.Funnel(
@@ -105,25 +67,21 @@ def mostrar_ingresos_transacciones(df):
         st.warning("No hay datos de transacciones para el rango seleccionado")
         return
     
-    # Convertir la fecha
-    df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
-    df['fecha_formateada'] = df['date'].dt.strftime('%d/%m/%Y')
+    # Fecha legible, sin modificar el resultado guardado
+    prep = preparar_ingresos_transacciones(df)
+    df = prep['days']
     
     # Mostrar tabla
     st.dataframe(df)
     
     # Métricas
-    total_purchases = df['total_purchase_events'].sum()
-    total_revenue = df['purchase_revenue'].sum()
-    avg_transaction_value = safe_divide(total_revenue, total_purchases)
-    
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Compras", f"{total_purchases:,}")
+        st.metric("Total Compras", f"{prep['total_purchases']:,}")
     with col2:
-        st.metric("Ingresos Totales", f"€{total_revenue:,.2f}")
+        st.metric("Ingresos Totales", f"€{prep['total_revenue']:,.2f}")
     with col3:
-        st.metric("Ticket Medio", f"€{avg_transaction_value:,.2f}")
+        st.metric("Ticket Medio", f"€{prep['avg_transaction_value']:,.2f}")
     
     # GRÁFICO SIMPLIFICADO - Solo ingresos
     try:
@@ -151,24 +109,20 @@ def mostrar_productos_mas_vendidos(df):
     }))
     
     # Calcular métricas generales
-    total_revenue = df['total_revenue'].sum()
-    total_quantity = df['total_quantity_sold'].sum()
-    avg_revenue_per_product = safe_divide(total_revenue, len(df))
+    prep = preparar_productos_mas_vendidos(df)
     
     # Mostrar métricas clave
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Ingresos Totales Productos", f"€{total_revenue:,.2f}")
+        st.metric("Ingresos Totales Productos", f"€{prep['total_revenue']:,.2f}")
     with col2:
-        st.metric("Cantidad Total Vendida", f"{total_quantity:,}")
+        st.metric("Cantidad Total Vendida", f"{prep['total_quantity']:,}")
     with col3:
-        st.metric("Ingreso Promedio por Producto", f"€{avg_revenue_per_product:,.2f}")
+        st.metric("Ingreso Promedio por Producto", f"€{prep['avg_revenue_per_product']:,.2f}")
     
     # Gráfico de barras - Top 10 productos por ingresos
-    top_products = df.head(10).copy()
-    
     fig_bar = px.bar(
-        top_products,
+        df.head(10),
         y='item_name',
         x='total_revenue',
         orientation='h',
@@ -222,9 +176,8 @@ def mostrar_relacion_productos(df):
         return
     
     # Identificar ineficiencias
-    df_ineficiencias = df[
-        (df['nombres_por_producto'] > 1) | (df['ids_por_nombre'] > 1)
-    ].copy()
+    prep = preparar_relacion_productos(df)
+    df_ineficiencias = prep['ineficiencias']
     
     # Aplicar formato condicional para resaltar ineficiencias
     def highlight_inefficiencies(row):
@@ -247,14 +200,14 @@ def mostrar_relacion_productos(df):
         st.warning("**Se detectaron posibles ineficiencias:**")
         
         # Productos con múltiples nombres
-        productos_multi_nombre = df_ineficiencias[df_ineficiencias['nombres_por_producto'] > 1]
+        productos_multi_nombre = prep['productos_multi_nombre']
         if not productos_multi_nombre.empty:
             st.write("**Productos con múltiples nombres:**")
             for _, row in productos_multi_nombre.head(5).iterrows():
                 st.write(f"- ID `{row['item_id']}` tiene {int(row['nombres_por_producto'])} nombres diferentes")
         
         # Nombres con múltiples IDs
-        nombres_multi_id = df_ineficiencias[df_ineficiencias['ids_por_nombre'] > 1]
+        nombres_multi_id = prep['nombres_multi_id']
         if not nombres_multi_id.empty:
             st.write("**Nombres con múltiples IDs:**")
             for _, row in nombres_multi_id.head(5).iterrows():
@@ -265,7 +218,7 @@ def mostrar_relacion_productos(df):
         with col1:
             st.metric("Productos con ineficiencias", len(df_ineficiencias))
         with col2:
-            st.metric("% de ineficiencia", f"{(len(df_ineficiencias) / len(df) * 100):.1f}%")
+            st.metric("% de ineficiencia", f"{prep['pct_ineficiencia']:.1f}%")
     else:
         st.success("No se detectaron ineficiencias en la relación ID vs Nombre")
 
@@ -289,38 +242,21 @@ def mostrar_funnel_por_producto(df):
     }))
     
     # Calcular métricas generales
-    total_view_items = df['view_item'].sum()
-    total_purchases = df['purchase'].sum()
-    overall_conversion_rate = safe_divide(total_purchases, total_view_items) * 100
+    prep = preparar_funnel_por_producto(df)
     
     # Mostrar métricas clave
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Visualizaciones", f"{total_view_items:,}")
+        st.metric("Total Visualizaciones", f"{prep['total_view_items']:,}")
     with col2:
-        st.metric("Total Compras", f"{total_purchases:,}")
+        st.metric("Total Compras", f"{prep['total_purchases']:,}")
     with col3:
-        st.metric("Tasa Conversión Global", f"{overall_conversion_rate:.2f}%")
-    
-    # Top 10 productos por conversión
-    top_products = df.head(10).copy()
+        st.metric("Tasa Conversión Global", f"{prep['overall_conversion_rate']:.2f}%")
     
     # Gráfico de funnel por producto (Top 5)
-    top_5_products = top_products.head(5)
-    
-    if not top_5_products.empty:
-        # Preparar datos para el gráfico de funnel
-        funnel_data = []
-        for _, product in top_5_products.iterrows():
-            funnel_data.extend([
-                {'Producto': product['item_name'], 'Etapa': 'View Item', 'Usuarios': product['view_item']},
-                {'Producto': product['item_name'], 'Etapa': 'Add to Cart', 'Usuarios': product['add_to_cart']},
-                {'Producto': product['item_name'], 'Etapa': 'Begin Checkout', 'Usuarios': product['begin_checkout']},
-                {'Producto': product['item_name'], 'Etapa': 'Purchase', 'Usuarios': product['purchase']}
-            ])
-        
-        funnel_df = pd.DataFrame(funnel_data)
-        
+    funnel_df = prep['funnel_df']
+    
+    if not funnel_df.empty:
         # Gráfico de barras agrupadas
         fig = px.bar(
             funnel_df,
@@ -337,12 +273,8 @@ def mostrar_funnel_por_producto(df):
         st.plotly_chart(fig, use_container_width=True)
     
     # Gráfico de tasas de conversión (Heatmap)
-    rates_df = top_products[['item_name', 'add_to_cart_rate', 'begin_checkout_rate', 'purchase_rate']].copy()
-    rates_df = rates_df.set_index('item_name')
-    
-    # Crear heatmap de tasas de conversión
     fig_heatmap = px.imshow(
-        rates_df.T,
+        prep['rates_df'].T,
         labels=dict(x="Producto", y="Tasa de Conversión", color="Porcentaje"),
         title="Tasas de Conversión por Producto (Top 10)",
         aspect="auto",
@@ -356,7 +288,7 @@ def mostrar_funnel_por_producto(df):
     st.subheader("Productos con Mejor Conversión")
     
     # Producto con mejor tasa de compra
-    best_converter = df.loc[df['purchase_rate'].idxmax()] if not df.empty else None
+    best_converter = prep['best_converter']
     if best_converter is not None:
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -369,16 +301,13 @@ def mostrar_funnel_por_producto(df):
 def mostrar_combos_cross_selling(df):
     """Visualización para análisis de combos y cross-selling"""
     st.subheader("Análisis de Combos y Cross-Selling")
+    mostrar_aviso_muestra(df)
     
     if df.empty:
         st.warning("No hay datos de combos para el rango seleccionado")
         return
     
-    # CREAR combo_label al inicio
-    df['combo_label'] = df['product_a'] + ' + ' + df['product_b']
-    df['combo_label_short'] = df['combo_label'].apply(
-        lambda x: x[:60] + '...' if len(x) > 60 else x
-    )
+    prep = preparar_combos(df)
     
     # Información educativa sobre Market Basket Analysis
     with st.expander("¿Qué es Market Basket Analysis?", expanded=False):
@@ -399,7 +328,10 @@ def mostrar_combos_cross_selling(df):
           - Indica qué tan común es el combo
         
         - **Combo Strength Score**: Métrica combinada para ranking (0-10+)
-          - Combina lift, confidence y frecuencia en una sola métrica
+          - Lift × mejor confidence × log10(1 + compras juntas)
+        
+        **Combos de 3 o más productos:** A es el conjunto de productos (A1 + A2)
+        y B el producto que más probablemente completa la cesta.
         
         **Aplicaciones prácticas:**
         - Crear bundles estratégicos
@@ -409,18 +341,15 @@ def mostrar_combos_cross_selling(df):
         """)
     
     # Métricas generales
-    total_combos = len(df)
-    avg_lift = df['lift'].mean()
-    avg_confidence = df['confidence_a_to_b'].mean()
-    best_combo = df.iloc[0] if len(df) > 0 else None
+    best_combo = prep['best_combo']
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Combos Identificados", f"{total_combos}")
+        st.metric("Combos Identificados", f"{prep['total_combos']}")
     with col2:
-        st.metric("Lift Promedio", f"{avg_lift:.2f}")
+        st.metric("Lift Promedio", f"{prep['avg_lift']:.2f}")
     with col3:
-        st.metric("Confidence Promedio", f"{avg_confidence:.1f}%")
+        st.metric("Confidence Promedio", f"{prep['avg_confidence']:.1f}%")
     with col4:
         if best_combo is not None:
             st.metric("Mejor Combo Score", f"{best_combo['combo_strength_score']:.1f}")
@@ -434,7 +363,7 @@ def mostrar_combos_cross_selling(df):
         min_lift = st.slider(
             "Lift mínimo:",
             min_value=1.0,
-            max_value=float(df['lift'].max()) if len(df) > 0 else 5.0,
+            max_value=prep['max_lift'],
             value=1.0,
             step=0.1,
             key="combo_min_lift",
@@ -456,18 +385,25 @@ def mostrar_combos_cross_selling(df):
         min_frequency = st.slider(
             "Compras juntas mínimas:",
             min_value=1,
-            max_value=int(df['times_bought_together'].max()) if len(df) > 0 else 50,
+            max_value=prep['max_frequency'],
             value=3,
             key="combo_min_frequency",
             help="Número mínimo de co-ocurrencias"
         )
     
+    itemset_size = None
+    if len(prep['itemset_sizes']) > 1:
+        size_option = st.selectbox(
+            "Productos por combo:",
+            options=["Todos"] + prep['itemset_sizes'],
+            key="combo_itemset_size",
+            help="Pares (A + B), tríos (A1 + A2 → B), ..."
+        )
+        itemset_size = None if size_option == "Todos" else size_option
+    
     # Aplicar filtros
-    df_filtered = df[
-        (df['lift'] >= min_lift) &
-        (df['confidence_a_to_b'] >= min_confidence) &
-        (df['times_bought_together'] >= min_frequency)
-    ].copy()
+    filtrado = preparar_combos_filtrado(df, min_lift, min_confidence, min_frequency, itemset_size)
+    df_filtered = filtrado['filtered']
     
     if df_filtered.empty:
         st.warning("No hay combos que cumplan los filtros. Intenta reducir los valores.")
@@ -478,10 +414,8 @@ def mostrar_combos_cross_selling(df):
     # Top 20 combos por Strength Score
     st.subheader("Top 20 Combos Más Fuertes")
     
-    top_combos = df_filtered.head(20).copy()
-    
     fig_top_combos = px.bar(
-        top_combos,
+        df_filtered.head(20),
         x='combo_strength_score',
         y='combo_label_short',
         orientation='h',
@@ -531,8 +465,8 @@ def mostrar_combos_cross_selling(df):
     )
     
     # Añadir cuadrantes
-    median_freq = df_filtered['times_bought_together'].median()
-    median_value = df_filtered['avg_basket_value'].median()
+    median_freq = filtrado['median_freq']
+    median_value = filtrado['median_value']
     
     fig_scatter.add_vline(
         x=median_freq,
@@ -555,10 +489,7 @@ def mostrar_combos_cross_selling(df):
     
     with col1:
         st.write("**Combos ESTRELLA (Alta freq + Alto valor):**")
-        star_combos = df_filtered[
-            (df_filtered['times_bought_together'] > median_freq) &
-            (df_filtered['avg_basket_value'] > median_value)
-        ].head(5)
+        star_combos = filtrado['star_combos']
         
         if not star_combos.empty:
             for _, row in star_combos.iterrows():
@@ -569,10 +500,7 @@ def mostrar_combos_cross_selling(df):
     
     with col2:
         st.write("**Combos PREMIUM (Bajo volumen + Alto valor):**")
-        premium_combos = df_filtered[
-            (df_filtered['times_bought_together'] <= median_freq) &
-            (df_filtered['avg_basket_value'] > median_value)
-        ].head(5)
+        premium_combos = filtrado['premium_combos']
         
         if not premium_combos.empty:
             for _, row in premium_combos.iterrows():
@@ -589,10 +517,8 @@ def mostrar_combos_cross_selling(df):
     
     with col1:
         # Top combos por valor de basket
-        top_value = df_filtered.nlargest(15, 'avg_basket_value')
-        
         fig_value = px.bar(
-            top_value,
+            filtrado['top_value'],
             x='avg_basket_value',
             y='combo_label_short',
             orientation='h',
@@ -609,10 +535,8 @@ def mostrar_combos_cross_selling(df):
     
     with col2:
         # Top por frecuencia
-        top_freq = df_filtered.nlargest(15, 'times_bought_together')
-        
         fig_freq = px.bar(
-            top_freq,
+            filtrado['top_freq'],
             x='times_bought_together',
             y='combo_label_short',
             orientation='h',
@@ -631,9 +555,9 @@ def mostrar_combos_cross_selling(df):
     st.subheader("Análisis por Dispositivo")
     
     # Calcular totales
-    total_desktop = df_filtered['desktop_purchases'].sum()
-    total_mobile = df_filtered['mobile_purchases'].sum()
-    total_tablet = df_filtered['tablet_purchases'].sum()
+    total_desktop = filtrado['total_desktop']
+    total_mobile = filtrado['total_mobile']
+    total_tablet = filtrado['total_tablet']
     total_purchases = total_desktop + total_mobile + total_tablet
     
     if total_purchases > 0:
@@ -665,16 +589,7 @@ def mostrar_combos_cross_selling(df):
     # Top productos en combos
     st.subheader("Productos Más Presentes en Combos")
     
-    # Contar apariciones de cada producto
-    product_counts = {}
-    for _, row in df_filtered.iterrows():
-        product_counts[row['product_a']] = product_counts.get(row['product_a'], 0) + 1
-        product_counts[row['product_b']] = product_counts.get(row['product_b'], 0) + 1
-    
-    top_products = pd.DataFrame([
-        {'Producto': prod, 'Apariciones': count}
-        for prod, count in sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:15]
-    ])
+    top_products = filtrado['top_products']
     
     if not top_products.empty:
         fig_products = px.bar(
@@ -702,12 +617,15 @@ def mostrar_combos_cross_selling(df):
     st.subheader("Tabla Detallada de Combos")
     
     display_df = df_filtered.head(50)[[
-        'product_a', 'product_b', 'times_bought_together',
-        'avg_basket_value', 'combo_strength_score'
+        'product_a', 'product_b', 'times_bought_together', 'support',
+        'confidence_a_to_b', 'lift', 'avg_basket_value', 'combo_strength_score'
     ]]
     
     st.dataframe(display_df.style.format({
         'times_bought_together': '{:,}',
+        'support': '{:.2f}%',
+        'confidence_a_to_b': '{:.1f}%',
+        'lift': '{:.2f}',
         'avg_basket_value': '€{:,.2f}',
         'combo_strength_score': '{:.2f}'
     }), height=600)
@@ -716,7 +634,7 @@ def mostrar_combos_cross_selling(df):
     st.subheader("Recomendaciones Accionables")
     
     # Identificar mejores oportunidades
-    best_bundles = df_filtered.nlargest(5, 'combo_strength_score')
+    best_bundles = filtrado['best_bundles']
     
     col1, col2 = st.columns(2)
     
@@ -759,14 +677,10 @@ def mostrar_combos_cross_selling(df):
     # Estimación de impacto
     st.subheader("Estimación de Impacto")
     
-    top_10_combos = df_filtered.head(10)
-    
-    current_combo_sales = top_10_combos['times_bought_together'].sum()
-    avg_combo_value = top_10_combos['avg_basket_value'].mean()
-    
-    # Escenario: aumentar ventas de combos en 20%
-    potential_new_combos = current_combo_sales * 0.20
-    potential_revenue = potential_new_combos * avg_combo_value
+    current_combo_sales = filtrado['current_combo_sales']
+    avg_combo_value = filtrado['avg_combo_value']
+    potential_new_combos = filtrado['potential_new_combos']
+    potential_revenue = filtrado['potential_revenue']
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -0,0 +1,262 @@
+"""
+Preparación de datos de las visualizaciones de eventos (sin Streamlit)
+
+El explorador en modo anidado recibe un evento por fila con event_params,
+user_properties e items como listas de structs. Solo se expanden a formato
+largo los arrays y eventos que el analista elige, con kernels de Arrow
+(list_flatten / list_parent_indices) en lugar de explotar fila a fila.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from database.arrow_utils import list_array
+from database.queries.events_queries import FLATTEN_ITEM_FIELDS
+from visualization.prep import memoize_prep
+
+# Campo del struct (ruta con puntos) -> columna del formato largo, como en la consulta desanidada
+EXPANDABLE_ARRAYS = {
+    'event_params': {
+        'key': 'param_key',
+        'value.string_value': 'param_string_value',
+        'value.int_value': 'param_int_value',
+        'value.float_value': 'param_float_value',
+        'value.double_value': 'param_double_value'
+    },
+    'user_properties': {
+        'key': 'user_property_key',
+        'value.string_value': 'user_property_string_value',
+        'value.int_value': 'user_property_int_value',
+        'value.float_value': 'user_property_float_value',
+        'value.double_value': 'user_property_double_value',
+        'value.set_timestamp_micros': 'user_property_set_timestamp'
+    },
+    'items': {field: field for field in FLATTEN_ITEM_FIELDS},
+}
+
+
+def nested_arrays(df):
+    """Columnas de arrays anidados presentes en un resultado del explorador"""
+    return [column for column in EXPANDABLE_ARRAYS if column in df.columns]
+
+
+def _struct_field(values, path):
+    """Campo anidado de un StructArray, o None si el esquema no lo tiene"""
+    for name in path.split('.'):
+        if not pa.types.is_struct(values.type) or values.type.get_field_index(name) < 0:
+            return None
+        values = pc.struct_field(values, name)
+    return values
+
+
+def _explode(df, column, keys=None):
+    """
+    Expande una columna de arrays a formato largo (LEFT JOIN UNNEST)
+
+    Los eventos sin elementos (o sin ninguno con clave en keys) conservan una
+    fila con las columnas del array a nulo.
+    """
+    lists = list_array(df[column])
+    parents = pc.list_parent_indices(lists)
+    values = pc.list_flatten(lists)
+
+    if keys and pa.types.is_struct(values.type):
+        mask = pc.fill_null(pc.is_in(_struct_field(values, 'key'), value_set=pa.array(list(keys))), False)
+        values = values.filter(mask)
+        parents = parents.filter(mask)
+
+    positions = parents.to_numpy(zero_copy_only=False)
+    expanded = {}
+    for path, name in EXPANDABLE_ARRAYS[column].items():
+        field = _struct_field(values, path)
+        if field is not None:
+            expanded[name] = field.to_pandas()
+
+    events = df.drop(columns=[column]).reset_index(drop=True)
+    missing = np.setdiff1d(np.arange(len(events)), positions)
+    order = np.concatenate([positions, missing])
+
+    long = pd.concat([
+        events.iloc[positions].reset_index(drop=True),
+        pd.DataFrame(expanded).reset_index(drop=True)
+    ], axis=1)
+    result = pd.concat([long, events.iloc[missing].reset_index(drop=True)], ignore_index=True)
+
+    # Mismo orden que los eventos de entrada (estable dentro de cada evento)
+    return result.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+
+
+@memoize_prep
+def preparar_eventos_expandidos(df, arrays=(), event_name=None, param_keys=()):
+    """
+    Formato largo de los eventos anidados, solo para lo que se quiere ver
+
+    Args:
+        df: Resultado de generar_query_eventos_flatten(..., nested=True)
+        arrays: Arrays a expandir (claves de EXPANDABLE_ARRAYS); el resto se descarta
+        event_name: Tipo de evento a expandir (None = todos)
+        param_keys: Claves de event_params a conservar (vacío = todas)
+
+    Returns:
+        DataFrame con una fila por combinación de elementos, como la consulta desanidada
+    """
+    events = df if event_name is None else df[df['event_name'] == event_name]
+    present = nested_arrays(events)
+    events = events.drop(columns=[column for column in present if column not in arrays])
+
+    for column in arrays:
+        if column in present:
+            events = _explode(events, column, keys=param_keys if column == 'event_params' else None)
+    return events
+
+
+@memoize_prep
+def preparar_eventos_flatten(df):
+    """
+    Métricas del explorador y tipos de evento para el filtro
+
+    Args:
+        df: Resultado de generar_query_eventos_flatten (una página si está paginado)
+
+    Returns:
+        dict con filas, eventos y usuarios distintos y las opciones del filtro
+    """
+    has_events = 'event_name' in df.columns
+    return {
+        'total_rows': len(df),
+        'unique_events': df['event_name'].nunique() if has_events else 0,
+        'unique_users': df['user_pseudo_id'].nunique() if 'user_pseudo_id' in df.columns else 0,
+        'eventos_disponibles': ['Todos'] + sorted(df['event_name'].unique().tolist()) if has_events else ['Todos']
+    }
+
+
+@memoize_prep
+def preparar_eventos_flatten_filtrado(df, event_name):
+    """Filas del explorador de un tipo de evento ('Todos' = sin filtro)"""
+    if event_name == 'Todos' or 'event_name' not in df.columns:
+        return df
+    return df[df['event_name'] == event_name]
+
+
+@memoize_prep
+def preparar_eventos_resumen(df):
+    """
+    Totales y concentración del resumen de eventos
+
+    Args:
+        df: Resultado de generar_query_eventos_resumen (ordenado por volumen)
+
+    Returns:
+        dict con totales y el peso de los 5 y 10 eventos principales
+    """
+    total_events = df['total_events'].sum()
+    return {
+        'total_events': total_events,
+        'total_users': df['unique_users'].sum(),
+        'total_sessions': df['unique_sessions'].sum() if 'unique_sessions' in df.columns else 0,
+        'top_5_pct': df.head(5)['total_events'].sum() / total_events * 100,
+        'top_10_pct': df.head(10)['total_events'].sum() / total_events * 100
+    }
+
+
+@memoize_prep
+def preparar_eventos_por_fecha(df):
+    """
+    Eventos por fecha con la fecha como datetime y en formato dd/mm/aaaa
+
+    No modifica el resultado guardado: el modo en directo vuelve a combinarlo
+    con los días intradía usando event_date en formato YYYYMMDD.
+
+    Args:
+        df: Resultado de generar_query_eventos_por_fecha
+
+    Returns:
+        dict con las filas (event_date datetime y fecha_formateada) y las
+        opciones del filtro de eventos
+    """
+    events = df.copy()
+    events['event_date'] = pd.to_datetime(events['event_date'], format='%Y%m%d')
+    events['fecha_formateada'] = events['event_date'].dt.strftime('%d/%m/%Y')
+    return {
+        'events': events,
+        'eventos_disponibles': ['Todos'] + sorted(events['event_name'].unique().tolist())
+    }
+
+
+@memoize_prep
+def preparar_eventos_por_fecha_filtrado(df, eventos_seleccionados):
+    """
+    Series diarias de los eventos seleccionados
+
+    Args:
+        df: Resultado de generar_query_eventos_por_fecha
+        eventos_seleccionados: Tupla de eventos (con 'Todos' o vacía = todos)
+
+    Returns:
+        dict con el agregado diario y, si hay varios eventos seleccionados,
+        la serie diaria de cada uno (None si no)
+    """
+    events = preparar_eventos_por_fecha(df)['events']
+    all_events = 'Todos' in eventos_seleccionados or len(eventos_seleccionados) == 0
+    filtered = events if all_events else events[events['event_name'].isin(eventos_seleccionados)]
+
+    df_agregado = filtered.groupby(['event_date', 'fecha_formateada']).agg({
+        'total_events': 'sum',
+        'unique_users': 'sum'
+    }).reset_index().sort_values('event_date')
+
+    df_por_evento = None
+    if not all_events and len(eventos_seleccionados) > 1:
+        df_por_evento = filtered.groupby(['event_date', 'fecha_formateada', 'event_name']).agg({
+            'total_events': 'sum'
+        }).reset_index().sort_values('event_date')
+
+    return {
+        'df_agregado': df_agregado,
+        'df_por_evento': df_por_evento
+    }
+
+
+@memoize_prep
+def preparar_parametros_evento(df):
+    """Parámetros distintos y usos totales de un evento"""
+    return {
+        'total_params': len(df),
+        'total_uses': df['parameter_count'].sum()
+    }
+
+
+@memoize_prep
+def preparar_metricas_diarias(df):
+    """
+    Métricas diarias con fecha legible, tasa de conversión y totales del período
+
+    Args:
+        df: Resultado de generar_query_metricas_diarias
+
+    Returns:
+        dict con las filas (con fecha_display), la tasa de conversión diaria
+        y los totales
+    """
+    days = df.copy()
+    days['date_formatted'] = pd.to_datetime(days['date_formatted'])
+    days['fecha_display'] = days['date_formatted'].dt.strftime('%d/%m/%Y')
+
+    total_sessions = days['sessions'].sum()
+    total_revenue = days['purchaseRevenue'].sum()
+    return {
+        'days': days,
+        'conversion': pd.DataFrame({
+            'fecha_display': days['fecha_display'],
+            'conversion_rate': (days['Purchases'] / days['sessions'] * 100).round(2)
+        }),
+        'total_sessions': total_sessions,
+        'total_users': days['totalUsers'].sum(),
+        'total_new_users': days['NewUsers'].sum(),
+        'total_purchases': days['Purchases'].sum(),
+        'total_revenue': total_revenue,
+        'avg_session_duration': days['averageSessionDuration_seconds'].mean(),
+        'avg_engagement_rate': days['engagementRate_percent'].mean(),
+        'revenue_per_session': total_revenue / total_sessions if total_sessions > 0 else 0
+    }
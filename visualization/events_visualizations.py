@@ -1,29 +1,41 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
+from visualization.common_charts import mostrar_aviso_aproximado, mostrar_aviso_muestra
+from visualization.events_prep import (
+    nested_arrays,
+    preparar_eventos_expandidos,
+    preparar_eventos_flatten,
+    preparar_eventos_flatten_filtrado,
+    preparar_eventos_resumen,
+    preparar_eventos_por_fecha,
+    preparar_eventos_por_fecha_filtrado,
+    preparar_parametros_evento,
+    preparar_metricas_diarias
+)
 
 def mostrar_eventos_flatten(df):
     """Visualización para datos flattened de eventos"""
     st.subheader("Datos Completos de Eventos (Flattenizados)")
+    mostrar_aviso_muestra(df)
     
     if df.empty:
         st.warning("No hay datos de eventos para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_rows = len(df)
-    unique_events = df['event_name'].nunique() if 'event_name' in df.columns else 0
-    unique_users = df['user_pseudo_id'].nunique() if 'user_pseudo_id' in df.columns else 0
+    # Modo anidado: un evento por fila, los arrays se expanden aquí bajo demanda
+    arrays = nested_arrays(df)
+    prep = preparar_eventos_flatten(df)
     
+    # Métricas generales
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Registros", f"{total_rows:,}")
+        st.metric("Total Eventos" if arrays else "Total Registros", f"{prep['total_rows']:,}")
     with col2:
-        st.metric("Eventos Únicos", f"{unique_events}")
+        st.metric("Eventos Únicos", f"{prep['unique_events']}")
     with col3:
-        st.metric("Usuarios Únicos", f"{unique_users}")
+        st.metric("Usuarios Únicos", f"{prep['unique_users']}")
     
     # Información sobre las columnas
     st.subheader("Información del Dataset")
@@ -52,7 +64,7 @@ def mostrar_eventos_flatten(df):
         if 'evento_flatten_selected' not in st.session_state:
             st.session_state.evento_flatten_selected = 'Todos'
         
-        eventos_disponibles = ['Todos'] + sorted(df['event_name'].unique().tolist())
+        eventos_disponibles = prep['eventos_disponibles']
         
         evento_seleccionado = st.selectbox(
             "Filtrar por tipo de evento:",
@@ -63,16 +75,37 @@ def mostrar_eventos_flatten(df):
         
         # Actualizar session_state
         st.session_state.evento_flatten_selected = evento_seleccionado
-        
-        if evento_seleccionado != 'Todos':
-            df_filtrado = df[df['event_name'] == evento_seleccionado]
-        else:
-            df_filtrado = df
-        
-        st.write(f"**Mostrando {len(df_filtrado):,} registros**")
+        df_filtrado = preparar_eventos_flatten_filtrado(df, evento_seleccionado)
     else:
+        evento_seleccionado = 'Todos'
         df_filtrado = df
     
+    if arrays:
+        col1, col2 = st.columns(2)
+        with col1:
+            expandir = st.multiselect(
+                "Arrays a expandir:",
+                arrays,
+                default=[],
+                key="flatten_expand_arrays",
+                help="Solo se expanden a filas los arrays y el tipo de evento seleccionados"
+            )
+        with col2:
+            claves = st.text_input(
+                "Claves de event_params (separadas por comas, vacío = todas):",
+                key="flatten_expand_keys",
+                disabled='event_params' not in expandir
+            )
+        df_filtrado = preparar_eventos_expandidos(
+            df,
+            tuple(expandir),
+            None if evento_seleccionado == 'Todos' else evento_seleccionado,
+            tuple(clave.strip() for clave in claves.split(',') if clave.strip())
+        )
+    
+    if 'event_name' in df.columns or arrays:
+        st.write(f"**Mostrando {len(df_filtrado):,} registros**")
+    
     # Mostrar tabla con opciones de descarga
     st.dataframe(
         df_filtrado.head(100), # Limitar a 100 filas para rendimiento
@@ -95,23 +128,22 @@ def mostrar_eventos_flatten(df):
 def mostrar_eventos_resumen(df):
     """Visualización para resumen de eventos"""
     st.subheader("Resumen de Eventos")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos de eventos para el rango seleccionado")
         return
     
-    # Métricas totales
-    total_events = df['total_events'].sum()
-    total_users = df['unique_users'].sum()
-    total_sessions = df['unique_sessions'].sum() if 'unique_sessions' in df.columns else 0
+    prep = preparar_eventos_resumen(df)
     
+    # Métricas totales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Eventos", f"{total_events:,}")
+        st.metric("Total Eventos", f"{prep['total_events']:,}")
     with col2:
-        st.metric("Usuarios Únicos", f"{total_users:,}")
+        st.metric("Usuarios Únicos", f"{prep['total_users']:,}")
     with col3:
-        st.metric("Sesiones Únicas", f"{total_sessions:,}")
+        st.metric("Sesiones Únicas", f"{prep['total_sessions']:,}")
     with col4:
         st.metric("Tipos de Eventos", f"{len(df)}")
     
@@ -159,33 +191,29 @@ def mostrar_eventos_resumen(df):
     # Análisis de concentración
     st.subheader("Análisis de Concentración de Eventos")
     
-    top_5_pct = (df.head(5)['total_events'].sum() / total_events * 100)
-    top_10_pct = (df.head(10)['total_events'].sum() / total_events * 100)
-    
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Top 5 Eventos", f"{top_5_pct:.1f}% del total")
+        st.metric("Top 5 Eventos", f"{prep['top_5_pct']:.1f}% del total")
     with col2:
-        st.metric("Top 10 Eventos", f"{top_10_pct:.1f}% del total")
+        st.metric("Top 10 Eventos", f"{prep['top_10_pct']:.1f}% del total")
 
 def mostrar_eventos_por_fecha(df):
     """Visualización para evolución temporal de eventos"""
     st.subheader("Evolución Temporal de Eventos")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos de eventos por fecha")
         return
     
-    # Convertir fecha
-    df['event_date'] = pd.to_datetime(df['event_date'], format='%Y%m%d')
-    df['fecha_formateada'] = df['event_date'].dt.strftime('%d/%m/%Y')
+    prep = preparar_eventos_por_fecha(df)
     
     # Inicializar session_state para el multiselect
     if 'eventos_fecha_selected' not in st.session_state:
         st.session_state.eventos_fecha_selected = ['Todos']
     
     # Selector de eventos para filtrar
-    eventos_disponibles = ['Todos'] + sorted(df['event_name'].unique().tolist())
+    eventos_disponibles = prep['eventos_disponibles']
     
     eventos_seleccionados = st.multiselect(
         "Seleccionar eventos a visualizar:",
@@ -197,16 +225,9 @@ def mostrar_eventos_por_fecha(df):
     # Actualizar session_state
     st.session_state.eventos_fecha_selected = eventos_seleccionados if eventos_seleccionados else ['Todos']
     
-    if 'Todos' not in eventos_seleccionados and len(eventos_seleccionados) > 0:
-        df_filtrado = df[df['event_name'].isin(eventos_seleccionados)]
-    else:
-        df_filtrado = df
-    
     # Agrupar por fecha
-    df_agregado = df_filtrado.groupby(['event_date', 'fecha_formateada']).agg({
-        'total_events': 'sum',
-        'unique_users': 'sum'
-    }).reset_index().sort_values('event_date')
+    filtrado = preparar_eventos_por_fecha_filtrado(df, tuple(eventos_seleccionados))
+    df_agregado = filtrado['df_agregado']
     
     # Gráfico de línea - Evolución temporal
     fig_line = px.line(
@@ -220,13 +241,9 @@ def mostrar_eventos_por_fecha(df):
     st.plotly_chart(fig_line, use_container_width=True)
     
     # Gráfico por tipo de evento (si hay filtros)
-    if 'Todos' not in eventos_seleccionados and len(eventos_seleccionados) > 1:
-        df_por_evento = df_filtrado.groupby(['event_date', 'fecha_formateada', 'event_name']).agg({
-            'total_events': 'sum'
-        }).reset_index().sort_values('event_date')
-        
+    if filtrado['df_por_evento'] is not None:
         fig_multi = px.line(
-            df_por_evento,
+            filtrado['df_por_evento'],
             x='fecha_formateada',
             y='total_events',
             color='event_name',
@@ -256,19 +273,20 @@ def mostrar_eventos_por_fecha(df):
 def mostrar_parametros_evento(df, event_name):
     """Visualización para parámetros de un evento específico"""
     st.subheader(f" Parámetros del Evento: {event_name}")
+    mostrar_aviso_muestra(df)
     
     if df.empty:
         st.warning(f"No hay datos de parámetros para el evento '{event_name}'")
         return
     
-    # Métricas
-    total_params = len(df)
+    prep = preparar_parametros_evento(df)
     
+    # Métricas
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Parámetros Únicos", f"{total_params}")
+        st.metric("Parámetros Únicos", f"{prep['total_params']}")
     with col2:
-        st.metric("Usos Totales", f"{df['parameter_count'].sum():,}")
+        st.metric("Usos Totales", f"{prep['total_uses']:,}")
     
     # Tabla de parámetros
     st.dataframe(df.style.format({
@@ -294,41 +312,32 @@ def mostrar_parametros_evento(df, event_name):
 def mostrar_metricas_diarias(df):
     """Visualización para métricas diarias completas"""
     st.subheader("Métricas Diarias de Rendimiento")
+    mostrar_aviso_aproximado(df)
     
     if df.empty:
         st.warning("No hay datos de métricas diarias para el rango seleccionado")
         return
     
-    # Convertir fecha y formatear
-    df['date_formatted'] = pd.to_datetime(df['date_formatted'])
-    df['fecha_display'] = df['date_formatted'].dt.strftime('%d/%m/%Y')
-    
-    # Métricas totales
-    total_sessions = df['sessions'].sum()
-    total_users = df['totalUsers'].sum()
-    total_new_users = df['NewUsers'].sum()
-    total_purchases = df['Purchases'].sum()
-    total_revenue = df['purchaseRevenue'].sum()
-    avg_session_duration = df['averageSessionDuration_seconds'].mean()
-    avg_engagement_rate = df['engagementRate_percent'].mean()
+    prep = preparar_metricas_diarias(df)
+    df = prep['days']
+    total_purchases = prep['total_purchases']
     
     # Mostrar métricas clave en cards
     st.subheader("Resumen del Período")
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Sesiones", f"{total_sessions:,}")
-        st.metric("Usuarios Totales", f"{total_users:,}")
+        st.metric("Total Sesiones", f"{prep['total_sessions']:,}")
+        st.metric("Usuarios Totales", f"{prep['total_users']:,}")
     with col2:
-        st.metric("Nuevos Usuarios", f"{total_new_users:,}")
-        st.metric("Tasa Engagement", f"{avg_engagement_rate:.2f}%")
+        st.metric("Nuevos Usuarios", f"{prep['total_new_users']:,}")
+        st.metric("Tasa Engagement", f"{prep['avg_engagement_rate']:.2f}%")
     with col3:
         st.metric("Total Compras", f"{total_purchases:,}")
-        st.metric("Ingresos Totales", f"€{total_revenue:,.2f}")
+        st.metric("Ingresos Totales", f"€{prep['total_revenue']:,.2f}")
     with col4:
-        st.metric("Duración Media Sesión", f"{avg_session_duration:.0f}s")
-        revenue_per_session = total_revenue / total_sessions if total_sessions > 0 else 0
-        st.metric("Ingresos/Sesión", f"€{revenue_per_session:.2f}")
+        st.metric("Duración Media Sesión", f"{prep['avg_session_duration']:.0f}s")
+        st.metric("Ingresos/Sesión", f"€{prep['revenue_per_session']:.2f}")
     
     # Mostrar tabla completa
     st.subheader("Tabla de Datos")
@@ -470,9 +479,8 @@ def mostrar_metricas_diarias(df):
         
         with col2:
             # Tasa de conversión
-            df['conversion_rate'] = (df['Purchases'] / df['sessions'] * 100).round(2)
             fig_conversion = px.line(
-                df,
+                prep['conversion'],
                 x='fecha_display',
                 y='conversion_rate',
                 title='Tasa de Conversión (%)',
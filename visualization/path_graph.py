@@ -0,0 +1,123 @@
+"""
+Grafo de rutas de navegación para diagramas Sankey
+
+Recibe secuencias de páginas de n pasos (una columna por paso y una columna
+de peso) y construye la entrada de go.Sankey:
+
+- Cada nodo es un par (paso, página): la misma página en pasos distintos son
+  nodos distintos, así el diagrama no tiene ciclos.
+- Los identificadores de nodo salen de códigos categóricos (página) y de
+  pd.factorize sobre paso * n_páginas + página, sin búsquedas en listas.
+- Los enlaces de todos los pasos se agregan con un único groupby.
+- La poda se hace por paso (top-K flujos) y después se descartan los enlaces
+  cuyo origen quedó sin flujo de entrada, para que no aparezcan nodos sueltos.
+
+Todo es lineal en el número de secuencias (más la ordenación de la poda).
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from visualization.prep import truncate_labels
+
+ENTRANCE = '(entrance)'
+EXIT = '(exit)'
+
+NODE_COLORS = {
+    'entrance': 'rgba(76, 175, 80, 0.8)',   # Verde para entradas
+    'exit': 'rgba(244, 67, 54, 0.8)',       # Rojo para salidas
+    'page': 'rgba(33, 150, 243, 0.8)'       # Azul para páginas intermedias
+}
+
+
+def _stack_links(paths: pd.DataFrame, step_columns: List[str], value_column: str,
+                 page_codes: np.ndarray) -> pd.DataFrame:
+    """Enlaces paso i -> i+1 de todas las secuencias en formato largo (códigos de página)"""
+    n_rows = len(paths)
+    n_links = len(step_columns) - 1
+    weights = paths[value_column].to_numpy()
+
+    return pd.DataFrame({
+        'level': np.repeat(np.arange(n_links), n_rows),
+        'source': page_codes[:, :-1].T.ravel(),
+        'target': page_codes[:, 1:].T.ravel(),
+        'value': np.tile(weights, n_links)
+    })
+
+
+def _prune(links: pd.DataFrame, top_k: Optional[int]) -> pd.DataFrame:
+    """Top-K enlaces por paso, conservando solo flujos conectados desde el primer paso"""
+    if top_k is not None:
+        links = links.sort_values('value', ascending=False, kind='stable').groupby('level').head(top_k)
+
+    kept = [links[links['level'] == 0]]
+    for level in range(1, int(links['level'].max()) + 1 if len(links) else 0):
+        reachable = kept[-1]['target'].unique()
+        current = links[links['level'] == level]
+        kept.append(current[current['source'].isin(reachable)])
+    return pd.concat(kept, ignore_index=True) if kept else links
+
+
+def build_path_sankey(paths: pd.DataFrame, step_columns: List[str], value_column: str,
+                      top_k: Optional[int] = None, top_paths: Optional[int] = None,
+                      label_length: int = 40) -> dict:
+    """
+    Construye nodos y enlaces de un Sankey a partir de secuencias de páginas
+
+    Args:
+        paths: Una fila por secuencia, con una columna por paso y su peso
+        step_columns: Columnas de los pasos, en orden
+        value_column: Columna de peso (sesiones)
+        top_k: Máximo de enlaces por paso (None = todos)
+        top_paths: Solo las N secuencias con más peso (None = todas)
+        label_length: Longitud máxima de las etiquetas
+
+    Returns:
+        dict con labels, customdata (página completa), colors y level de los
+        nodos y source, target y value de los enlaces (argumentos de go.Sankey).
+        Los pasos nulos (secuencias más cortas) no generan enlace.
+    """
+    if top_paths is not None:
+        paths = paths.nlargest(top_paths, value_column)
+
+    empty = {'labels': [], 'customdata': [], 'colors': [], 'level': [], 'source': [], 'target': [], 'value': []}
+    if paths.empty or len(step_columns) < 2:
+        return empty
+
+    # Códigos de página compartidos por todos los pasos (-1 = paso vacío)
+    pages = pd.Categorical(paths[step_columns].to_numpy(dtype=object).ravel())
+    page_codes = pages.codes.reshape(len(paths), len(step_columns)).astype(np.int64)
+
+    links = _stack_links(paths, step_columns, value_column, page_codes)
+    links = links[(links['source'] >= 0) & (links['target'] >= 0)]
+    links = links.groupby(['level', 'source', 'target'], as_index=False, sort=False)['value'].sum()
+    links = _prune(links, top_k)
+    if links.empty:
+        return empty
+
+    # Nodo = (paso, página) -> identificador consecutivo
+    n_pages = len(pages.categories)
+    levels = links['level'].to_numpy()
+    source_keys = levels * n_pages + links['source'].to_numpy()
+    target_keys = (levels + 1) * n_pages + links['target'].to_numpy()
+    node_ids, node_keys = pd.factorize(np.concatenate([source_keys, target_keys]))
+    n_links = len(links)
+
+    node_pages = pd.Series(pages.categories[node_keys % n_pages], dtype=object)
+    node_levels = node_keys // n_pages
+    colors = np.select(
+        [node_pages == ENTRANCE, node_pages == EXIT],
+        [NODE_COLORS['entrance'], NODE_COLORS['exit']],
+        default=NODE_COLORS['page']
+    )
+
+    return {
+        'labels': truncate_labels(node_pages, label_length).tolist(),
+        'customdata': node_pages.tolist(),
+        'colors': colors.tolist(),
+        'level': node_levels.tolist(),
+        'source': node_ids[:n_links].tolist(),
+        'target': node_ids[n_links:].tolist(),
+        'value': links['value'].tolist()
+    }
@@ -0,0 +1,104 @@
+"""
+Memoización de la preparación de datos de las visualizaciones
+
+Cada mostrar_* delega los cálculos con pandas (agregaciones, acumulados,
+pivotes) en funciones preparar_* puras, sin llamadas a Streamlit, que
+devuelven DataFrames y especificaciones de figuras. Se memoizan por la huella
+del DataFrame de entrada y los parámetros de filtro: al mover un slider solo
+se recalcula lo que depende de él, y la misma preparación puede medirse en
+los benchmarks o reutilizarse fuera de la interfaz.
+
+Los resultados se comparten entre ejecuciones: quien los recibe no debe
+modificarlos (copiar antes de añadir columnas).
+"""
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config.settings import Settings
+
+_lock = threading.Lock()
+# (función, huella, args, kwargs) -> resultado
+_entries: "OrderedDict[tuple, object]" = OrderedDict()
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Huella del contenido de un DataFrame (valores, índice, columnas y dtypes)
+
+    Args:
+        df: DataFrame a identificar
+
+    Returns:
+        Hash hexadecimal; cambia si cambia cualquier valor o columna
+    """
+    digest = hashlib.sha1()
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df.index).values.tobytes())
+    for column in df.columns:
+        try:
+            hashed = pd.util.hash_pandas_object(df[column], index=False)
+        except TypeError:
+            # Columnas con listas o dicts (arrays de GA4): se hashea su representación
+            hashed = pd.util.hash_pandas_object(df[column].astype(str), index=False)
+        digest.update(hashed.values.tobytes())
+    return digest.hexdigest()
+
+
+def truncate_labels(values: pd.Series, max_length: int, missing=None) -> pd.Series:
+    """
+    Acorta una columna de etiquetas (URLs, nombres de producto) a max_length
+
+    Args:
+        values: Columna de texto
+        max_length: Longitud máxima antes de añadir '...'
+        missing: Valor para los nulos (None los deja como están)
+
+    Returns:
+        Serie con el mismo índice
+    """
+    # Con cadenas Arrow las operaciones .str son kernels vectorizados, no bucles Python
+    text = values
+    if not (isinstance(values.dtype, (pd.StringDtype, pd.ArrowDtype)) and pd.api.types.is_string_dtype(values.dtype)):
+        text = values.astype('string[pyarrow]')
+    # Los nulos no cumplen la condición y str[] los mantiene nulos
+    short = text.where(text.str.len() <= max_length, text.str[:max_length] + '...')
+    if missing is not None:
+        short = short.fillna(missing)
+    return short
+
+
+def memoize_prep(func):
+    """
+    Memoiza una función preparar_*(df, *filtros) por huella de df y filtros
+
+    Los filtros deben ser hashables. La caché es LRU, de tamaño
+    Settings.PREP_CACHE_MAX_ENTRIES y compartida por todas las sesiones.
+    """
+    @functools.wraps(func)
+    def wrapper(df, *args, **kwargs):
+        key = (func.__module__, func.__qualname__, frame_fingerprint(df), args, tuple(sorted(kwargs.items())))
+        with _lock:
+            if key in _entries:
+                _entries.move_to_end(key)
+                return _entries[key]
+
+        result = func(df, *args, **kwargs)
+
+        with _lock:
+            _entries[key] = result
+            _entries.move_to_end(key)
+            while len(_entries) > Settings.PREP_CACHE_MAX_ENTRIES:
+                _entries.popitem(last=False)
+        return result
+
+    return wrapper
+
+
+def clear_prep_cache():
+    """Vacía la caché de preparaciones (benchmarks, cambio de dataset)"""
+    with _lock:
+        _entries.clear()
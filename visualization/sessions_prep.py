@@ -0,0 +1,395 @@
+"""
+Preparación de datos de las visualizaciones de sesiones (sin Streamlit)
+
+Cada preparar_* devuelve un dict con DataFrames y valores listos para pintar.
+Las que reciben filtros dependen de la preparación base, que se memoiza por
+separado: al cambiar un filtro solo se recalcula la parte filtrada.
+"""
+import pandas as pd
+
+from visualization.path_graph import build_path_sankey
+from visualization.prep import memoize_prep, truncate_labels
+
+WEEKDAY_ORDER = ['0 - Sunday', '1 - Monday', '2 - Tuesday', '3 - Wednesday',
+                 '4 - Thursday', '5 - Friday', '6 - Saturday']
+
+PATH_TYPES = ["Todas", "Solo entradas (entrance)", "Solo salidas (exit)", "Rutas internas"]
+
+
+def shorten_url(url, max_length=60):
+    """Acorta una URL para etiquetas de gráficos"""
+    if pd.isna(url):
+        return "(not set)"
+    return url[:max_length] + '...' if len(str(url)) > max_length else url
+
+
+# ========================================
+# PÁGINAS DE SALIDA
+# ========================================
+
+@memoize_prep
+def preparar_exit_pages(df):
+    """
+    Métricas y tablas de páginas de salida que no dependen de los filtros
+
+    Args:
+        df: Resultado de generar_query_exit_pages
+
+    Returns:
+        dict con las páginas (con URL corta), el acumulado de Pareto y las
+        métricas de concentración
+    """
+    pages = df.copy()
+    pages['exit_page_short'] = truncate_labels(pages['exit_page_path'], 60, missing="(not set)")
+    total_sessions = pages['sessions'].sum()
+
+    # Porcentaje acumulativo
+    pareto = pages.sort_values('sessions', ascending=False).reset_index(drop=True)
+    pareto['cumulative_sessions'] = pareto['sessions'].cumsum()
+    pareto['cumulative_percentage'] = (pareto['cumulative_sessions'] / total_sessions * 100).round(2)
+
+    return {
+        'pages': pages,
+        'pareto': pareto,
+        'total_sessions': total_sessions,
+        'unique_exit_pages': len(pages),
+        'avg_sessions_per_page': pages['sessions'].mean(),
+        'top_exit_rate': pages.iloc[0]['exit_percentage'] if len(pages) > 0 else 0,
+        'max_sessions': int(pages['sessions'].max()) if len(pages) > 0 else 100,
+        'top_10_pct': pareto.head(10)['exit_percentage'].sum(),
+        'top_20_pct': pareto.head(20)['exit_percentage'].sum(),
+        # Cuántas páginas acumulan el 80% de las salidas
+        'pages_80pct': len(pareto[pareto['cumulative_percentage'] <= 80]),
+        'top_exit': pareto.iloc[0] if len(pareto) > 0 else None,
+        'high_exit_pages': pareto[pareto['exit_percentage'] > 5].head(10),
+        'top_10_sessions': pareto.head(10)['sessions'].sum()
+    }
+
+
+@memoize_prep
+def preparar_exit_pages_filtrado(df, min_sessions, top_n):
+    """
+    Tablas de páginas de salida que dependen de los filtros
+
+    Args:
+        df: Resultado de generar_query_exit_pages
+        min_sessions: Mínimo de sesiones por página
+        top_n: Número de páginas a mostrar
+
+    Returns:
+        dict con las páginas filtradas y sus distribuciones por rango de
+        sesiones y por sección del sitio
+    """
+    pages = preparar_exit_pages(df)['pages']
+    filtered = pages[pages['sessions'] >= min_sessions].head(top_n).copy()
+    if filtered.empty:
+        return {'filtered': filtered}
+
+    # Rangos de sesiones
+    filtered['session_range'] = pd.cut(
+        filtered['sessions'],
+        bins=[0, 50, 100, 500, 1000, float('inf')],
+        labels=['1-50', '51-100', '101-500', '501-1000', '1000+']
+    )
+    range_dist = filtered.groupby('session_range', observed=True).size().reset_index(name='count')
+
+    # Secciones del sitio (primer nivel de path)
+    filtered['section'] = filtered['exit_page_path'].str.extract(r'^/([^/]+)')[0].fillna('home')
+    section_stats = filtered.groupby('section').agg({
+        'sessions': 'sum',
+        'exit_page_path': 'count'
+    }).reset_index()
+    section_stats.columns = ['section', 'total_sessions', 'page_count']
+    section_stats = section_stats.sort_values('total_sessions', ascending=False).head(15)
+
+    # Páginas que son tanto entrada como salida
+    entrance_keywords = ['home', 'index', 'landing', 'categoria', 'product']
+    potential_entrance_exits = filtered[
+        filtered['exit_page_path'].str.contains('|'.join(entrance_keywords), case=False, na=False)
+    ]
+
+    return {
+        'filtered': filtered,
+        'range_dist': range_dist,
+        'section_stats': section_stats,
+        'potential_entrance_exits': potential_entrance_exits
+    }
+
+
+# ========================================
+# RENDIMIENTO POR HORA
+# ========================================
+
+@memoize_prep
+def preparar_hourly_sessions(df):
+    """
+    Agregados por hora y por día de la semana
+
+    Args:
+        df: Resultado de generar_query_hourly_sessions_performance
+
+    Returns:
+        dict con totales, promedio por hora, heatmap día x hora, promedio
+        por día de la semana y mejores/peores horas
+    """
+    data = df.copy()
+    data['hour_int'] = data['hour'].astype(int)
+
+    # Tasas de conversión por hora
+    data['view_item_rate'] = (data['view_item_sessions'] / data['sessions'] * 100).round(2)
+    data['add_to_cart_rate'] = (data['add_to_cart_sessions'] / data['sessions'] * 100).round(2)
+    data['conversion_rate'] = (data['order_sessions'] / data['sessions'] * 100).round(2)
+
+    # Promedio de todas las fechas por hora del día
+    hourly_avg = data.groupby('hour_int').agg({
+        'sessions': 'mean',
+        'pageviews': 'mean',
+        'view_item_sessions': 'mean',
+        'add_to_cart_sessions': 'mean',
+        'order_sessions': 'mean',
+        'view_item_rate': 'mean',
+        'add_to_cart_rate': 'mean',
+        'conversion_rate': 'mean'
+    }).reset_index()
+    hourly_avg['hour'] = hourly_avg['hour_int'].astype(str).str.zfill(2) + ':00'
+
+    # Heatmap día de la semana x hora, solo con los días presentes
+    heatmap = data.pivot_table(
+        values='sessions',
+        index='weekday',
+        columns='hour_int',
+        aggfunc='mean'
+    )
+    heatmap = heatmap.reindex([day for day in WEEKDAY_ORDER if day in heatmap.index])
+
+    weekday_avg = data.groupby('weekday').agg({
+        'sessions': 'mean',
+        'pageviews': 'mean',
+        'view_item_sessions': 'mean',
+        'add_to_cart_sessions': 'mean',
+        'order_sessions': 'mean',
+        'conversion_rate': 'mean'
+    }).reset_index()
+    weekday_avg['weekday_sort'] = weekday_avg['weekday'].str.split(' - ').str[0].astype(int)
+    weekday_avg = weekday_avg.sort_values('weekday_sort')
+    weekday_avg['weekday_name'] = weekday_avg['weekday'].str.split(' - ').str[1]
+
+    return {
+        'total_sessions': data['sessions'].sum(),
+        'total_pageviews': data['pageviews'].sum(),
+        'total_orders': data['order_sessions'].sum(),
+        'avg_sessions_per_hour': data['sessions'].mean(),
+        'hourly_avg': hourly_avg,
+        'heatmap': heatmap,
+        'weekday_avg': weekday_avg,
+        'top_hours_sessions': hourly_avg.nlargest(5, 'sessions'),
+        'bottom_hours_sessions': hourly_avg.nsmallest(5, 'sessions'),
+        'top_hours_conversion': hourly_avg.nlargest(5, 'conversion_rate')
+    }
+
+
+# ========================================
+# RUTAS DE NAVEGACIÓN
+# ========================================
+
+@memoize_prep
+def preparar_session_paths(df):
+    """
+    Rutas con etiquetas cortas y análisis de entradas/salidas sin filtros
+
+    Args:
+        df: Resultado de generar_query_session_path_analysis
+
+    Returns:
+        dict con las rutas, métricas generales, top páginas de entrada y de
+        salida y secuencias que terminan en abandono
+    """
+    paths = df.copy()
+    for column in ('previous_page', 'current_page', 'next_page'):
+        paths[f'{column}_short'] = truncate_labels(paths[column], 40, missing="(not set)")
+    paths['full_path'] = (
+        paths['previous_page_short'] + ' → ' + paths['current_page_short'] + ' → ' + paths['next_page_short']
+    )
+
+    total_sessions = paths['session_count'].sum()
+    is_entrance = paths['previous_page'] == '(entrance)'
+    is_exit = paths['next_page'] == '(exit)'
+
+    entrance_pages = paths[is_entrance].groupby('current_page').agg({
+        'session_count': 'sum'
+    }).reset_index().sort_values('session_count', ascending=False).head(15)
+    entrance_pages['current_page_short'] = truncate_labels(entrance_pages['current_page'], 40, missing="(not set)")
+
+    exit_pages = paths[is_exit].groupby('current_page').agg({
+        'session_count': 'sum'
+    }).reset_index().sort_values('session_count', ascending=False).head(15)
+    exit_pages['current_page_short'] = truncate_labels(exit_pages['current_page'], 40, missing="(not set)")
+
+    return {
+        'paths': paths,
+        'total_paths': len(paths),
+        'total_sessions': total_sessions,
+        'unique_pages': pd.concat([paths['previous_page'], paths['current_page'], paths['next_page']]).nunique(),
+        'avg_sessions_per_path': paths['session_count'].mean(),
+        'max_sessions': int(paths['session_count'].max()),
+        'entrance_pages': entrance_pages,
+        'exit_pages': exit_pages,
+        'entrance_rate': paths[is_entrance]['session_count'].sum() / total_sessions * 100,
+        'exit_rate': paths[is_exit]['session_count'].sum() / total_sessions * 100,
+        # Abandonos después de una página intermedia
+        'critical_exits': paths[is_exit & ~is_entrance].nlargest(5, 'session_count')
+    }
+
+
+@memoize_prep
+def preparar_session_paths_filtrado(df, min_sessions, path_type):
+    """
+    Rutas filtradas por sesiones mínimas y tipo de ruta
+
+    Args:
+        df: Resultado de generar_query_session_path_analysis
+        min_sessions: Mínimo de sesiones por ruta
+        path_type: Uno de PATH_TYPES
+
+    Returns:
+        dict con las rutas filtradas y el top 20
+    """
+    paths = preparar_session_paths(df)['paths']
+    filtered = paths[paths['session_count'] >= min_sessions]
+
+    if path_type == "Solo entradas (entrance)":
+        filtered = filtered[filtered['previous_page'] == '(entrance)']
+    elif path_type == "Solo salidas (exit)":
+        filtered = filtered[filtered['next_page'] == '(exit)']
+    elif path_type == "Rutas internas":
+        filtered = filtered[
+            (filtered['previous_page'] != '(entrance)') &
+            (filtered['next_page'] != '(exit)')
+        ]
+
+    return {
+        'filtered': filtered,
+        'top_paths': filtered.nlargest(20, 'session_count')
+    }
+
+
+@memoize_prep
+def preparar_sankey_rutas(df, min_sessions, path_type, num_routes):
+    """
+    Especificación del Sankey anterior → actual → siguiente de las top rutas
+
+    Args:
+        df: Resultado de generar_query_session_path_analysis
+        min_sessions: Mínimo de sesiones por ruta
+        path_type: Uno de PATH_TYPES
+        num_routes: Número de rutas a incluir
+
+    Returns:
+        dict de build_path_sankey (argumentos de go.Sankey)
+    """
+    filtered = preparar_session_paths_filtrado(df, min_sessions, path_type)['filtered']
+    return build_path_sankey(
+        filtered, ['previous_page', 'current_page', 'next_page'], 'session_count',
+        top_paths=num_routes
+    )
+
+
+def path_step_columns(df):
+    """Columnas step_1..step_n de generar_query_session_paths_n_pasos, en orden"""
+    steps = [c for c in df.columns if c.startswith('step_') and c[5:].isdigit()]
+    return sorted(steps, key=lambda c: int(c[5:]))
+
+
+@memoize_prep
+def preparar_rutas_n_pasos(df, top_k):
+    """
+    Rutas de n pasos ya agregadas en BigQuery: tabla y Sankey
+
+    Args:
+        df: Resultado de generar_query_session_paths_n_pasos
+        top_k: Máximo de enlaces por paso en el Sankey
+
+    Returns:
+        dict con la tabla de rutas (ruta legible), el número de pasos y el
+        dict de build_path_sankey
+    """
+    steps = path_step_columns(df)
+    paths = df.copy()
+    # Ruta legible: pasos no nulos unidos con ' → ' (un bucle por paso, no por fila)
+    ruta = paths[steps[0]].astype('string')
+    for step in steps[1:]:
+        page = paths[step].astype('string')
+        ruta = ruta.where(page.isna(), ruta + ' → ' + page)
+    paths['ruta'] = ruta
+
+    return {
+        'paths': paths,
+        'steps': steps,
+        'total_sessions': int(paths['sessions'].sum()),
+        'sankey': build_path_sankey(df, steps, 'sessions', top_k=top_k)
+    }
+
+
+# ========================================
+# SESIONES SIN CONVERSIÓN
+# ========================================
+
+@memoize_prep
+def preparar_low_converting(df):
+    """
+    Agregados de sesiones sin conversión por fuente, dispositivo, landing y geografía
+
+    Args:
+        df: Resultado de generar_query_low_converting_sessions
+
+    Returns:
+        dict con métricas ponderadas por sesiones y las tablas de cada análisis
+    """
+    sessions = df['total_non_converting_sessions']
+    total_sessions = sessions.sum()
+
+    traffic_analysis = df.groupby(['session_source', 'session_medium']).agg({
+        'total_non_converting_sessions': 'sum',
+        'avg_page_views': 'mean',
+        'pct_bounced_sessions': 'mean'
+    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(15)
+
+    device_analysis = df.groupby('device_category').agg({
+        'total_non_converting_sessions': 'sum',
+        'avg_session_duration_seconds': 'mean',
+        'pct_bounced_sessions': 'mean',
+        'avg_page_views': 'mean'
+    }).reset_index()
+
+    landing_analysis = df.groupby('landing_page').agg({
+        'total_non_converting_sessions': 'sum',
+        'avg_page_views': 'mean',
+        'pct_bounced_sessions': 'mean',
+        'avg_engagement_time_seconds': 'mean'
+    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(20)
+    landing_analysis['landing_page_short'] = truncate_labels(landing_analysis['landing_page'], 50, missing="(not set)")
+
+    geo_analysis = df.groupby(['country', 'city']).agg({
+        'total_non_converting_sessions': 'sum',
+        'avg_page_views': 'mean',
+        'pct_bounced_sessions': 'mean'
+    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(20)
+
+    country_stats = df.groupby('country').agg({
+        'total_non_converting_sessions': 'sum'
+    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(10)
+
+    return {
+        'total_sessions': total_sessions,
+        'total_users': df['unique_users'].sum(),
+        'avg_duration': (df['avg_session_duration_seconds'] * sessions).sum() / total_sessions,
+        'avg_page_views': (df['avg_page_views'] * sessions).sum() / total_sessions,
+        'avg_bounce': (df['pct_bounced_sessions'] * sessions).sum() / total_sessions,
+        'traffic_analysis': traffic_analysis,
+        'device_analysis': device_analysis,
+        'landing_analysis': landing_analysis,
+        'geo_analysis': geo_analysis,
+        'country_stats': country_stats,
+        'high_bounce': df[df['pct_bounced_sessions'] > 70].nlargest(5, 'total_non_converting_sessions'),
+        'low_engagement': df[df['pct_low_engagement'] > 70].nlargest(5, 'total_non_converting_sessions')
+    }
@@ -1,8 +1,19 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
+from visualization.sessions_prep import (
+    PATH_TYPES,
+    shorten_url,
+    preparar_exit_pages,
+    preparar_exit_pages_filtrado,
+    preparar_hourly_sessions,
+    preparar_session_paths,
+    preparar_session_paths_filtrado,
+    preparar_sankey_rutas,
+    preparar_rutas_n_pasos,
+    preparar_low_converting
+)
 
 def mostrar_exit_pages_analysis(df):
     """Visualización para Most Frequent Exit Pages Analysis"""
@@ -12,29 +23,19 @@ def mostrar_exit_pages_analysis(df):
         st.warning("No hay datos de páginas de salida para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_sessions = df['sessions'].sum()
-    unique_exit_pages = len(df)
-    avg_sessions_per_page = df['sessions'].mean()
-    top_exit_rate = df.iloc[0]['exit_percentage'] if len(df) > 0 else 0
+    prep = preparar_exit_pages(df)
+    df_sorted = prep['pareto']
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Sesiones", f"{total_sessions:,}")
+        st.metric("Total Sesiones", f"{prep['total_sessions']:,}")
     with col2:
-        st.metric("Páginas de Salida Únicas", f"{unique_exit_pages}")
+        st.metric("Páginas de Salida Únicas", f"{prep['unique_exit_pages']}")
     with col3:
-        st.metric("Sesiones/Página (Avg)", f"{avg_sessions_per_page:.0f}")
+        st.metric("Sesiones/Página (Avg)", f"{prep['avg_sessions_per_page']:.0f}")
     with col4:
-        st.metric("Mayor % Salida", f"{top_exit_rate:.1f}%")
-    
-    # Acortar URLs para mejor visualización
-    def shorten_url(url, max_length=60):
-        if pd.isna(url):
-            return "(not set)"
-        return url[:max_length] + '...' if len(str(url)) > max_length else url
-    
-    df['exit_page_short'] = df['exit_page_path'].apply(shorten_url)
+        st.metric("Mayor % Salida", f"{prep['top_exit_rate']:.1f}%")
     
     # Filtro por número mínimo de sesiones
     st.subheader("Filtros")
@@ -44,7 +45,7 @@ def mostrar_exit_pages_analysis(df):
         min_sessions_filter = st.slider(
             "Mínimo de sesiones:",
             min_value=1,
-            max_value=int(df['sessions'].max()) if len(df) > 0 else 100,
+            max_value=prep['max_sessions'],
             value=10,
             key="exit_min_sessions"
         )
@@ -57,8 +58,9 @@ def mostrar_exit_pages_analysis(df):
             key="exit_top_n"
         )
     
-    # Aplicar filtros
-    df_filtered = df[df['sessions'] >= min_sessions_filter].head(top_n)
+    # Aplicar filtros (solo se recalcula la parte que depende de ellos)
+    filtrado = preparar_exit_pages_filtrado(df, min_sessions_filter, top_n)
+    df_filtered = filtrado['filtered']
     
     if df_filtered.empty:
         st.warning("No hay datos con los filtros seleccionados. Reduce el mínimo de sesiones.")
@@ -79,14 +81,12 @@ def mostrar_exit_pages_analysis(df):
     # Top páginas de salida
     st.subheader(f" Top {min(top_n, len(df_filtered))} Páginas de Salida")
     
-    top_exits = df_filtered.head(top_n)
-    
     fig_top_exits = px.bar(
-        top_exits,
+        df_filtered,
         x='sessions',
         y='exit_page_short',
         orientation='h',
-        title=f'Top {min(top_n, len(top_exits))} Páginas con Mayor Abandono',
+        title=f'Top {min(top_n, len(df_filtered))} Páginas con Mayor Abandono',
         labels={'sessions': 'Sesiones', 'exit_page_short': 'Página de Salida'},
         color='exit_percentage',
         color_continuous_scale='Reds',
@@ -94,7 +94,7 @@ def mostrar_exit_pages_analysis(df):
     )
     fig_top_exits.update_layout(
         yaxis={'categoryorder': 'total ascending'},
-        height=max(500, len(top_exits) * 25),
+        height=max(500, len(df_filtered) * 25),
         showlegend=False
     )
     st.plotly_chart(fig_top_exits, use_container_width=True)
@@ -102,25 +102,21 @@ def mostrar_exit_pages_analysis(df):
     # Distribución acumulativa
     st.subheader("Análisis de Concentración")
     
-    # Calcular porcentaje acumulativo
-    df_sorted = df.sort_values('sessions', ascending=False).reset_index(drop=True)
-    df_sorted['cumulative_sessions'] = df_sorted['sessions'].cumsum()
-    df_sorted['cumulative_percentage'] = (df_sorted['cumulative_sessions'] / total_sessions * 100).round(2)
-    
     # Gráfico de Pareto
+    pareto_top = df_sorted.head(30)
     fig_pareto = go.Figure()
     
     fig_pareto.add_trace(go.Bar(
-        x=list(range(1, len(df_sorted.head(30)) + 1)),
-        y=df_sorted.head(30)['sessions'],
+        x=list(range(1, len(pareto_top) + 1)),
+        y=pareto_top['sessions'],
         name='Sesiones',
         marker_color='lightblue',
         yaxis='y'
     ))
     
     fig_pareto.add_trace(go.Scatter(
-        x=list(range(1, len(df_sorted.head(30)) + 1)),
-        y=df_sorted.head(30)['cumulative_percentage'],
+        x=list(range(1, len(pareto_top) + 1)),
+        y=pareto_top['cumulative_percentage'],
         name='% Acumulado',
         mode='lines+markers',
         line=dict(color='red', width=2),
@@ -139,37 +135,25 @@ def mostrar_exit_pages_analysis(df):
     st.plotly_chart(fig_pareto, use_container_width=True)
     
     # Métricas de concentración
-    top_10_pct = df_sorted.head(10)['exit_percentage'].sum()
-    top_20_pct = df_sorted.head(20)['exit_percentage'].sum()
+    pages_80pct = prep['pages_80pct']
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Top 10 Páginas", f"{top_10_pct:.1f}% de salidas")
+        st.metric("Top 10 Páginas", f"{prep['top_10_pct']:.1f}% de salidas")
     with col2:
-        st.metric("Top 20 Páginas", f"{top_20_pct:.1f}% de salidas")
+        st.metric("Top 20 Páginas", f"{prep['top_20_pct']:.1f}% de salidas")
     with col3:
-        # Calcular índice de concentración (cuántas páginas acumulan el 80%)
-        pages_80pct = len(df_sorted[df_sorted['cumulative_percentage'] <= 80])
         st.metric("Páginas para 80% salidas", f"{pages_80pct}")
     
     # Distribución de páginas de salida
     st.subheader("Distribución de Sesiones")
     
-    # Crear rangos de sesiones
-    df_filtered['session_range'] = pd.cut(
-        df_filtered['sessions'],
-        bins=[0, 50, 100, 500, 1000, float('inf')],
-        labels=['1-50', '51-100', '101-500', '501-1000', '1000+']
-    )
-    
-    range_dist = df_filtered.groupby('session_range', observed=True).size().reset_index(name='count')
-    
     col1, col2 = st.columns(2)
     
     with col1:
         # Pie chart de distribución por rango
         fig_dist = px.pie(
-            range_dist,
+            filtrado['range_dist'],
             values='count',
             names='session_range',
             title='Distribución de Páginas por Rango de Sesiones',
@@ -193,15 +177,7 @@ def mostrar_exit_pages_analysis(df):
     # Análisis de patrones en URLs
     st.subheader("Análisis de Patrones de URL")
     
-    # Extraer secciones del sitio (primer nivel de path)
-    df_filtered['section'] = df_filtered['exit_page_path'].str.extract(r'^/([^/]+)')[0].fillna('home')
-    
-    section_stats = df_filtered.groupby('section').agg({
-        'sessions': 'sum',
-        'exit_page_path': 'count'
-    }).reset_index()
-    section_stats.columns = ['section', 'total_sessions', 'page_count']
-    section_stats = section_stats.sort_values('total_sessions', ascending=False).head(15)
+    section_stats = filtrado['section_stats']
     
     col1, col2 = st.columns(2)
     
@@ -234,8 +210,8 @@ def mostrar_exit_pages_analysis(df):
     st.subheader("Insights Clave")
     
     # Identificar páginas críticas
-    top_exit = df_sorted.iloc[0] if len(df_sorted) > 0 else None
-    high_exit_pages = df_sorted[df_sorted['exit_percentage'] > 5].head(10)
+    top_exit = prep['top_exit']
+    high_exit_pages = prep['high_exit_pages']
     
     col1, col2 = st.columns(2)
     
@@ -276,17 +252,14 @@ def mostrar_exit_pages_analysis(df):
     5. Agregar contenido relacionado o next steps claros
     
      **Impacto potencial:**
-    - Reducir un 10% las salidas de las top 10 páginas podría retener ~{int(df_sorted.head(10)['sessions'].sum() * 0.1):,} sesiones adicionales
+    - Reducir un 10% las salidas de las top 10 páginas podría retener ~{int(prep['top_10_sessions'] * 0.1):,} sesiones adicionales
     """)
     
     # Comparativa: Páginas de entrada vs salida
     st.subheader("Insight Adicional")
     
     # Identificar páginas que son tanto entrada como salida
-    entrance_keywords = ['home', 'index', 'landing', 'categoria', 'product']
-    potential_entrance_exits = df_filtered[
-        df_filtered['exit_page_path'].str.contains('|'.join(entrance_keywords), case=False, na=False)
-    ]
+    potential_entrance_exits = filtrado['potential_entrance_exits']
     
     if not potential_entrance_exits.empty:
         st.warning(f"""
@@ -307,7 +280,7 @@ def mostrar_exit_pages_analysis(df):
     
     # Botón de descarga
     if st.button("Descargar Datos CSV", key="download_exit_pages"):
-        csv = df.to_csv(index=False)
+        csv = prep['pages'].to_csv(index=False)
         st.download_button(
             label="Descargar CSV",
             data=csv,
@@ -323,43 +296,19 @@ def mostrar_hourly_sessions_performance(df):
         st.warning("No hay datos de rendimiento horario para el rango seleccionado")
         return
     
-    # Convertir hora a entero para mejor ordenamiento
-    df['hour_int'] = df['hour'].astype(int)
+    prep = preparar_hourly_sessions(df)
+    hourly_avg = prep['hourly_avg']
     
     # Métricas generales
-    total_sessions = df['sessions'].sum()
-    total_pageviews = df['pageviews'].sum()
-    total_orders = df['order_sessions'].sum()
-    avg_sessions_per_hour = df['sessions'].mean()
-    
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Sesiones", f"{total_sessions:,}")
+        st.metric("Total Sesiones", f"{prep['total_sessions']:,}")
     with col2:
-        st.metric("Total Pageviews", f"{total_pageviews:,}")
+        st.metric("Total Pageviews", f"{prep['total_pageviews']:,}")
     with col3:
-        st.metric("Total Compras", f"{total_orders:,}")
+        st.metric("Total Compras", f"{prep['total_orders']:,}")
     with col4:
-        st.metric("Sesiones/Hora (Avg)", f"{avg_sessions_per_hour:.0f}")
-    
-    # Calcular tasas de conversión por hora
-    df['view_item_rate'] = (df['view_item_sessions'] / df['sessions'] * 100).round(2)
-    df['add_to_cart_rate'] = (df['add_to_cart_sessions'] / df['sessions'] * 100).round(2)
-    df['conversion_rate'] = (df['order_sessions'] / df['sessions'] * 100).round(2)
-    
-    # Agregar por hora del día (promedio de todas las fechas)
-    hourly_avg = df.groupby('hour_int').agg({
-        'sessions': 'mean',
-        'pageviews': 'mean',
-        'view_item_sessions': 'mean',
-        'add_to_cart_sessions': 'mean',
-        'order_sessions': 'mean',
-        'view_item_rate': 'mean',
-        'add_to_cart_rate': 'mean',
-        'conversion_rate': 'mean'
-    }).reset_index()
-    
-    hourly_avg['hour'] = hourly_avg['hour_int'].apply(lambda x: f'{x:02d}:00')
+        st.metric("Sesiones/Hora (Avg)", f"{prep['avg_sessions_per_hour']:.0f}")
     
     # Análisis por hora del día
     st.subheader("Distribución por Hora del Día")
@@ -417,24 +366,8 @@ def mostrar_hourly_sessions_performance(df):
     # Heatmap de actividad por hora y día de la semana
     st.subheader("Heatmap: Actividad por Día y Hora")
     
-    # Preparar datos para heatmap
-    heatmap_data = df.pivot_table(
-        values='sessions',
-        index='weekday',
-        columns='hour_int',
-        aggfunc='mean'
-    )
-    
-    # Ordenar días de la semana correctamente
-    weekday_order = ['0 - Sunday', '1 - Monday', '2 - Tuesday', '3 - Wednesday', 
-                     '4 - Thursday', '5 - Friday', '6 - Saturday']
-    
-    # Filtrar solo los días que existen en los datos
-    weekday_order = [day for day in weekday_order if day in heatmap_data.index]
-    heatmap_data = heatmap_data.reindex(weekday_order)
-    
     fig_heatmap = px.imshow(
-        heatmap_data,
+        prep['heatmap'],
         labels=dict(x="Hora del Día", y="Día de la Semana", color="Sesiones"),
         title="Sesiones por Día de la Semana y Hora",
         color_continuous_scale='Blues',
@@ -509,20 +442,7 @@ def mostrar_hourly_sessions_performance(df):
     # Análisis por día de la semana
     st.subheader("Análisis por Día de la Semana")
     
-    # Agregar por día de la semana
-    weekday_avg = df.groupby('weekday').agg({
-        'sessions': 'mean',
-        'pageviews': 'mean',
-        'view_item_sessions': 'mean',
-        'add_to_cart_sessions': 'mean',
-        'order_sessions': 'mean',
-        'conversion_rate': 'mean'
-    }).reset_index()
-    
-    # Reordenar días de la semana
-    weekday_avg['weekday_sort'] = weekday_avg['weekday'].str.split(' - ').str[0].astype(int)
-    weekday_avg = weekday_avg.sort_values('weekday_sort')
-    weekday_avg['weekday_name'] = weekday_avg['weekday'].str.split(' - ').str[1]
+    weekday_avg = prep['weekday_avg']
     
     col1, col2 = st.columns(2)
     
@@ -555,12 +475,9 @@ def mostrar_hourly_sessions_performance(df):
     # Identificar mejores y peores horas
     st.subheader("Insights: Mejores y Peores Horas")
     
-    # Top 5 horas por sesiones
-    top_hours_sessions = hourly_avg.nlargest(5, 'sessions')
-    bottom_hours_sessions = hourly_avg.nsmallest(5, 'sessions')
-    
-    # Top 5 horas por conversión
-    top_hours_conversion = hourly_avg.nlargest(5, 'conversion_rate')
+    top_hours_sessions = prep['top_hours_sessions']
+    bottom_hours_sessions = prep['bottom_hours_sessions']
+    top_hours_conversion = prep['top_hours_conversion']
     
     col1, col2, col3 = st.columns(3)
     
@@ -632,34 +549,18 @@ def mostrar_session_path_analysis(df):
         st.warning("No hay datos de rutas de navegación para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_paths = len(df)
-    total_sessions = df['session_count'].sum()
-    unique_pages = pd.concat([df['previous_page'], df['current_page'], df['next_page']]).nunique()
-    avg_sessions_per_path = df['session_count'].mean()
+    prep = preparar_session_paths(df)
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Rutas Únicas", f"{total_paths:,}")
+        st.metric("Rutas Únicas", f"{prep['total_paths']:,}")
     with col2:
-        st.metric("Total Sesiones", f"{total_sessions:,}")
+        st.metric("Total Sesiones", f"{prep['total_sessions']:,}")
     with col3:
-        st.metric("Páginas Únicas", f"{unique_pages}")
+        st.metric("Páginas Únicas", f"{prep['unique_pages']}")
     with col4:
-        st.metric("Sesiones/Ruta (Avg)", f"{avg_sessions_per_path:.1f}")
-    
-    # Acortar URLs para mejor visualización
-    def shorten_url(url, max_length=40):
-        if pd.isna(url) or url == '(entrance)' or url == '(exit)':
-            return url
-        return url[:max_length] + '...' if len(str(url)) > max_length else url
-    
-    df['previous_page_short'] = df['previous_page'].apply(shorten_url)
-    df['current_page_short'] = df['current_page'].apply(shorten_url)
-    df['next_page_short'] = df['next_page'].apply(shorten_url)
-    
-    # Crear columna de ruta completa
-    df['full_path'] = df['previous_page_short'] + ' → ' + df['current_page_short'] + ' → ' + df['next_page_short']
+        st.metric("Sesiones/Ruta (Avg)", f"{prep['avg_sessions_per_path']:.1f}")
     
     # Mostrar tabla con datos
     st.subheader("Top Rutas de Navegación")
@@ -670,7 +571,7 @@ def mostrar_session_path_analysis(df):
         min_sessions = st.slider(
             "Mínimo de sesiones por ruta:",
             min_value=1,
-            max_value=int(df['session_count'].max()),
+            max_value=prep['max_sessions'],
             value=10,
             key="path_min_sessions"
         )
@@ -678,22 +579,13 @@ def mostrar_session_path_analysis(df):
     with col2:
         path_type = st.selectbox(
             "Filtrar por tipo de ruta:",
-            ["Todas", "Solo entradas (entrance)", "Solo salidas (exit)", "Rutas internas"],
+            PATH_TYPES,
             key="path_type_filter"
         )
     
     # Aplicar filtros
-    df_filtered = df[df['session_count'] >= min_sessions].copy()
-    
-    if path_type == "Solo entradas (entrance)":
-        df_filtered = df_filtered[df_filtered['previous_page'] == '(entrance)']
-    elif path_type == "Solo salidas (exit)":
-        df_filtered = df_filtered[df_filtered['next_page'] == '(exit)']
-    elif path_type == "Rutas internas":
-        df_filtered = df_filtered[
-            (df_filtered['previous_page'] != '(entrance)') & 
-            (df_filtered['next_page'] != '(exit)')
-        ]
+    filtrado = preparar_session_paths_filtrado(df, min_sessions, path_type)
+    df_filtered = filtrado['filtered']
     
     # Mostrar tabla
     st.dataframe(
@@ -707,10 +599,8 @@ def mostrar_session_path_analysis(df):
     # Top 20 rutas más comunes
     st.subheader("Top 20 Rutas Más Comunes")
     
-    top_paths = df_filtered.nlargest(20, 'session_count')
-    
     fig_top_paths = px.bar(
-        top_paths,
+        filtrado['top_paths'],
         x='session_count',
         y='full_path',
         orientation='h',
@@ -729,11 +619,7 @@ def mostrar_session_path_analysis(df):
     # Análisis de páginas de entrada
     st.subheader("Análisis de Páginas de Entrada")
     
-    entrance_pages = df[df['previous_page'] == '(entrance)'].groupby('current_page').agg({
-        'session_count': 'sum'
-    }).reset_index().sort_values('session_count', ascending=False).head(15)
-    
-    entrance_pages['current_page_short'] = entrance_pages['current_page'].apply(shorten_url)
+    entrance_pages = prep['entrance_pages']
     
     col1, col2 = st.columns(2)
     
@@ -764,11 +650,7 @@ def mostrar_session_path_analysis(df):
     # Análisis de páginas de salida
     st.subheader("Análisis de Páginas de Salida")
     
-    exit_pages = df[df['next_page'] == '(exit)'].groupby('current_page').agg({
-        'session_count': 'sum'
-    }).reset_index().sort_values('session_count', ascending=False).head(15)
-    
-    exit_pages['current_page_short'] = exit_pages['current_page'].apply(shorten_url)
+    exit_pages = prep['exit_pages']
     
     col1, col2 = st.columns(2)
     
@@ -813,97 +695,35 @@ def mostrar_session_path_analysis(df):
             key="sankey_routes"
         )
     
-    # Preparar datos para Sankey (Top N rutas más comunes)
-    sankey_data = df_filtered.nlargest(num_routes, 'session_count')
-    
-    # Crear nodos únicos con prefijos para evitar colisiones
-    # Estrategia: añadir sufijo _prev, _curr, _next a cada página según su posición
-    prev_pages = sankey_data['previous_page_short'].unique()
-    curr_pages = sankey_data['current_page_short'].unique()
-    next_pages = sankey_data['next_page_short'].unique()
-    
-    # Crear diccionarios de mapeo con sufijos para evitar duplicados
-    prev_dict = {page: f"{page} [entrada]" if page == '(entrance)' else f"{page} ←" for page in prev_pages}
-    curr_dict = {page: f"{page} [página]" for page in curr_pages}
-    next_dict = {page: f"{page} [salida]" if page == '(exit)' else f"{page} →" for page in next_pages}
-    
-    # Crear lista de todos los nodos únicos
-    all_nodes = []
-    all_nodes.extend(prev_dict.values())
-    all_nodes.extend([node for node in curr_dict.values() if node not in all_nodes])
-    all_nodes.extend([node for node in next_dict.values() if node not in all_nodes])
-    
-    # Crear mapeo de índices
-    node_indices = {node: idx for idx, node in enumerate(all_nodes)}
-    
-    # Crear links para el diagrama - PARTE 1: previous → current
-    source_indices_1 = []
-    target_indices_1 = []
-    values_1 = []
-    
-    for _, row in sankey_data.iterrows():
-        prev_node = prev_dict[row['previous_page_short']]
-        curr_node = curr_dict[row['current_page_short']]
-        
-        source_indices_1.append(node_indices[prev_node])
-        target_indices_1.append(node_indices[curr_node])
-        values_1.append(row['session_count'])
-    
-    # Crear links para el diagrama - PARTE 2: current → next
-    source_indices_2 = []
-    target_indices_2 = []
-    values_2 = []
-    
-    for _, row in sankey_data.iterrows():
-        curr_node = curr_dict[row['current_page_short']]
-        next_node = next_dict[row['next_page_short']]
-        
-        source_indices_2.append(node_indices[curr_node])
-        target_indices_2.append(node_indices[next_node])
-        values_2.append(row['session_count'])
-    
-    # Combinar ambas partes
-    all_sources = source_indices_1 + source_indices_2
-    all_targets = target_indices_1 + target_indices_2
-    all_values = values_1 + values_2
-    
-    # Colores personalizados para nodos
-    node_colors = []
-    for node in all_nodes:
-        if '[entrada]' in node or '(entrance)' in node:
-            node_colors.append('rgba(76, 175, 80, 0.8)') # Verde para entradas
-        elif '[salida]' in node or '(exit)' in node:
-            node_colors.append('rgba(244, 67, 54, 0.8)') # Rojo para salidas
-        else:
-            node_colors.append('rgba(33, 150, 243, 0.8)') # Azul para páginas intermedias
-    
-        # Crear Sankey diagram MEJORADO
-        fig_sankey = go.Figure(data=[go.Sankey(
-            node=dict(
-                pad=20,
-                thickness=25,
-                line=dict(color="white", width=2),
-                label=all_nodes,
-                color=node_colors,
-                customdata=[node.replace(' [entrada]', '').replace(' [salida]', '').replace(' [página]', '').replace(' ←', '').replace(' →', '') for node in all_nodes],
-                hovertemplate='%{customdata}<br>%{value} sesiones<extra></extra>'
-            ),
-            link=dict(
-                source=all_sources,
-                target=all_targets,
-                value=all_values,
-                color="rgba(0, 0, 0, 0.2)",
-                hovertemplate='%{value} sesiones<extra></extra>'
-            )
-        )])
-        
-        fig_sankey.update_layout(
-            title=f"Diagrama de Flujo de Navegación (Top {num_routes} Rutas)",
-            height=800,
-            font=dict(size=11, family="Arial"),
-            plot_bgcolor='white',
-            paper_bgcolor='white'
+    # Top N rutas más comunes
+    sankey = preparar_sankey_rutas(df, min_sessions, path_type, num_routes)
+    
+    fig_sankey = go.Figure(data=[go.Sankey(
+        node=dict(
+            pad=20,
+            thickness=25,
+            line=dict(color="white", width=2),
+            label=sankey['labels'],
+            color=sankey['colors'],
+            customdata=sankey['customdata'],
+            hovertemplate='%{customdata}<br>%{value} sesiones<extra></extra>'
+        ),
+        link=dict(
+            source=sankey['source'],
+            target=sankey['target'],
+            value=sankey['value'],
+            color="rgba(0, 0, 0, 0.2)",
+            hovertemplate='%{value} sesiones<extra></extra>'
         )
+    )])
+    
+    fig_sankey.update_layout(
+        title=f"Diagrama de Flujo de Navegación (Top {num_routes} Rutas)",
+        height=800,
+        font=dict(size=11, family="Arial"),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
     
     st.plotly_chart(fig_sankey, use_container_width=True)
     
@@ -919,9 +739,8 @@ def mostrar_session_path_analysis(df):
     # Insights clave
     st.subheader("Insights Clave")
     
-    # Calcular métricas de insight
-    entrance_rate = (df[df['previous_page'] == '(entrance)']['session_count'].sum() / total_sessions * 100)
-    exit_rate = (df[df['next_page'] == '(exit)']['session_count'].sum() / total_sessions * 100)
+    entrance_rate = prep['entrance_rate']
+    exit_rate = prep['exit_rate']
     
     top_entrance = entrance_pages.iloc[0] if len(entrance_pages) > 0 else None
     top_exit = exit_pages.iloc[0] if len(exit_pages) > 0 else None
@@ -946,19 +765,16 @@ def mostrar_session_path_analysis(df):
     st.write("**Rutas Críticas para Optimización:**")
     
     # Rutas con alta salida después de página actual
-    critical_exits = df[
-        (df['next_page'] == '(exit)') & 
-        (df['previous_page'] != '(entrance)')
-    ].nlargest(5, 'session_count')
+    critical_exits = prep['critical_exits']
     
     if not critical_exits.empty:
         st.write("*Usuarios que abandonan después de estas secuencias:*")
         for _, row in critical_exits.iterrows():
-            st.write(f"- **{shorten_url(row['previous_page'])}** → **{shorten_url(row['current_page'])}** → (salida): {row['session_count']:,} sesiones")
+            st.write(f"- **{row['previous_page_short']}** → **{row['current_page_short']}** → (salida): {row['session_count']:,} sesiones")
     
     # Botón de descarga
     if st.button("Descargar Datos CSV", key="download_session_paths"):
-        csv = df.to_csv(index=False)
+        csv = prep['paths'].to_csv(index=False)
         st.download_button(
             label="Descargar CSV",
             data=csv,
@@ -977,6 +793,87 @@ def mostrar_session_path_analysis(df):
             else:
                 st.error("No se pudo generar el análisis. Verifica la API key de Perplexity en secrets.toml.")
 
+def mostrar_session_paths_n_pasos(df):
+    """Visualización para Session Paths de n pasos (agregadas en BigQuery)"""
+    st.subheader("Rutas de Navegación de n Pasos")
+    
+    if df.empty:
+        st.warning("No hay rutas de navegación para el rango seleccionado")
+        return
+    
+    top_k = st.slider(
+        "Máximo de flujos por paso en el diagrama",
+        min_value=5,
+        max_value=100,
+        value=30,
+        step=5,
+        key="sankey_n_pasos_top_k"
+    )
+    
+    prep = preparar_rutas_n_pasos(df, top_k)
+    paths = prep['paths']
+    sankey = prep['sankey']
+    
+    # Métricas generales
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Rutas distintas", f"{len(paths):,}")
+    with col2:
+        st.metric("Sesiones cubiertas", f"{prep['total_sessions']:,}")
+    with col3:
+        st.metric("Pasos por ruta", len(prep['steps']))
+    
+    fig_sankey = go.Figure(data=[go.Sankey(
+        node=dict(
+            pad=20,
+            thickness=25,
+            line=dict(color="white", width=2),
+            label=sankey['labels'],
+            color=sankey['colors'],
+            customdata=sankey['customdata'],
+            hovertemplate='%{customdata}<br>%{value} sesiones<extra></extra>'
+        ),
+        link=dict(
+            source=sankey['source'],
+            target=sankey['target'],
+            value=sankey['value'],
+            color="rgba(0, 0, 0, 0.2)",
+            hovertemplate='%{value} sesiones<extra></extra>'
+        )
+    )])
+    
+    fig_sankey.update_layout(
+        title=f"Flujo de las Primeras {len(prep['steps'])} Páginas de la Sesión",
+        height=800,
+        font=dict(size=11, family="Arial"),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    
+    st.plotly_chart(fig_sankey, use_container_width=True)
+    
+    # Tabla de rutas
+    st.subheader("Rutas más Frecuentes")
+    st.dataframe(
+        paths[['ruta', 'sessions', 'pct_sessions']].rename(columns={
+            'ruta': 'Ruta',
+            'sessions': 'Sesiones',
+            'pct_sessions': '% Sesiones'
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    # Botón de descarga
+    if st.button("Descargar Datos CSV", key="download_session_paths_n"):
+        csv = paths.drop(columns=['path_key']).to_csv(index=False)
+        st.download_button(
+            label="Descargar CSV",
+            data=csv,
+            file_name="session_paths_n_pasos.csv",
+            mime="text/csv"
+        )
+
 def mostrar_low_converting_sessions(df):
     """Visualización para Low Converting Sessions Analysis"""
     st.subheader("Análisis de Sesiones con Baja Conversión")
@@ -985,22 +882,18 @@ def mostrar_low_converting_sessions(df):
         st.warning("No hay datos de sesiones sin conversión para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_sessions = df['total_non_converting_sessions'].sum()
-    total_users = df['unique_users'].sum()
-    avg_duration = (df['avg_session_duration_seconds'] * df['total_non_converting_sessions']).sum() / total_sessions
-    avg_page_views = (df['avg_page_views'] * df['total_non_converting_sessions']).sum() / total_sessions
-    avg_bounce = (df['pct_bounced_sessions'] * df['total_non_converting_sessions']).sum() / total_sessions
+    prep = preparar_low_converting(df)
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Sesiones Sin Conversión", f"{total_sessions:,}")
+        st.metric("Sesiones Sin Conversión", f"{prep['total_sessions']:,}")
     with col2:
-        st.metric("Usuarios Únicos", f"{total_users:,}")
+        st.metric("Usuarios Únicos", f"{prep['total_users']:,}")
     with col3:
-        st.metric("Duración Media", f"{avg_duration:.0f}s")
+        st.metric("Duración Media", f"{prep['avg_duration']:.0f}s")
     with col4:
-        st.metric("Tasa Bounce Media", f"{avg_bounce:.1f}%")
+        st.metric("Tasa Bounce Media", f"{prep['avg_bounce']:.1f}%")
     
     # Mostrar tabla con datos
     st.subheader("Datos Detallados")
@@ -1029,11 +922,7 @@ def mostrar_low_converting_sessions(df):
     # Análisis por fuente de tráfico
     st.subheader("Análisis por Fuente de Tráfico")
     
-    traffic_analysis = df.groupby(['session_source', 'session_medium']).agg({
-        'total_non_converting_sessions': 'sum',
-        'avg_page_views': 'mean',
-        'pct_bounced_sessions': 'mean'
-    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(15)
+    traffic_analysis = prep['traffic_analysis']
     
     col1, col2 = st.columns(2)
     
@@ -1078,12 +967,7 @@ def mostrar_low_converting_sessions(df):
     # Análisis por dispositivo
     st.subheader("Análisis por Dispositivo")
     
-    device_analysis = df.groupby('device_category').agg({
-        'total_non_converting_sessions': 'sum',
-        'avg_session_duration_seconds': 'mean',
-        'pct_bounced_sessions': 'mean',
-        'avg_page_views': 'mean'
-    }).reset_index()
+    device_analysis = prep['device_analysis']
     
     col1, col2 = st.columns(2)
     
@@ -1130,17 +1014,7 @@ def mostrar_low_converting_sessions(df):
     # Análisis de Landing Pages problemáticas
     st.subheader("Landing Pages con Mayor Tasa de No Conversión")
     
-    landing_analysis = df.groupby('landing_page').agg({
-        'total_non_converting_sessions': 'sum',
-        'avg_page_views': 'mean',
-        'pct_bounced_sessions': 'mean',
-        'avg_engagement_time_seconds': 'mean'
-    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(20)
-    
-    # Acortar URLs para mejor visualización
-    landing_analysis['landing_page_short'] = landing_analysis['landing_page'].apply(
-        lambda x: x[:50] + '...' if len(str(x)) > 50 else x
-    )
+    landing_analysis = prep['landing_analysis']
     
     fig_landing = px.bar(
         landing_analysis.head(10),
@@ -1163,22 +1037,14 @@ def mostrar_low_converting_sessions(df):
     # Análisis geográfico
     st.subheader("Análisis Geográfico")
     
-    geo_analysis = df.groupby(['country', 'city']).agg({
-        'total_non_converting_sessions': 'sum',
-        'avg_page_views': 'mean',
-        'pct_bounced_sessions': 'mean'
-    }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(20)
+    geo_analysis = prep['geo_analysis']
     
     col1, col2 = st.columns(2)
     
     with col1:
         # Top países
-        country_stats = df.groupby('country').agg({
-            'total_non_converting_sessions': 'sum'
-        }).reset_index().sort_values('total_non_converting_sessions', ascending=False).head(10)
-        
         fig_countries = px.bar(
-            country_stats,
+            prep['country_stats'],
             x='country',
             y='total_non_converting_sessions',
             title='Top 10 Países con Sesiones Sin Conversión',
@@ -1205,8 +1071,8 @@ def mostrar_low_converting_sessions(df):
     st.subheader("Insights Clave")
     
     # Identificar problemas
-    high_bounce = df[df['pct_bounced_sessions'] > 70].nlargest(5, 'total_non_converting_sessions')
-    low_engagement = df[df['pct_low_engagement'] > 70].nlargest(5, 'total_non_converting_sessions')
+    high_bounce = prep['high_bounce']
+    low_engagement = prep['low_engagement']
     
     col1, col2 = st.columns(2)
     
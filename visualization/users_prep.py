@@ -0,0 +1,208 @@
+"""
+Preparación de datos de las visualizaciones de usuarios (sin Streamlit)
+"""
+import pandas as pd
+
+from visualization.prep import memoize_prep
+
+RETENTION_COLUMNS = ['week_1_retention_pct', 'week_2_retention_pct',
+                     'week_3_retention_pct', 'week_4_retention_pct']
+
+RETENTION_LABELS = ['Semana 1', 'Semana 2', 'Semana 3', 'Semana 4']
+
+MESES_ES = {
+    'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo',
+    'April': 'Abril', 'May': 'Mayo', 'June': 'Junio',
+    'July': 'Julio', 'August': 'Agosto', 'September': 'Septiembre',
+    'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
+}
+
+
+@memoize_prep
+def preparar_retencion_semanal(df):
+    """
+    Cohortes con fecha legible, curva media, heatmap y drop-off
+
+    Args:
+        df: Resultado de generar_query_retencion_semanal
+
+    Returns:
+        dict con la tabla de cohortes (con cohort_display), medias de
+        retención por semana, datos del heatmap y caídas medias
+    """
+    cohorts = df.copy()
+    cohorts['cohort_week'] = pd.to_datetime(cohorts['cohort_week'])
+    cohorts['cohort_display'] = cohorts['cohort_week'].dt.strftime('%d/%m/%Y')
+
+    avg_week1_retention = cohorts['week_1_retention_pct'].mean()
+    avg_week4_retention = cohorts['week_4_retention_pct'].mean()
+
+    heatmap_data = cohorts[['cohort_display'] + RETENTION_COLUMNS].set_index('cohort_display')
+    heatmap_data.columns = RETENTION_LABELS
+
+    return {
+        'cohorts': cohorts,
+        'total_cohorts': len(cohorts),
+        'avg_week1_retention': avg_week1_retention,
+        'avg_week4_retention': avg_week4_retention,
+        'avg_retention': [cohorts[col].mean() for col in RETENTION_COLUMNS],
+        'heatmap_data': heatmap_data,
+        'avg_drop_week1': 100 - avg_week1_retention,
+        'avg_drop_week4': avg_week1_retention - avg_week4_retention
+    }
+
+
+@memoize_prep
+def preparar_clv_sesiones(df):
+    """
+    Métricas de CLV y comparativa compradores / no compradores
+
+    Args:
+        df: Resultado de generar_query_clv_sesiones
+
+    Returns:
+        dict con totales, reparto por tipo de usuario, sesiones medias de cada
+        tipo, top 20 usuarios por CLV y los compradores (CLV > 0)
+    """
+    buyers_df = df[df['user_type'] == 'Buyer']
+    non_buyers_df = df[df['user_type'] == 'Non-Buyer']
+    buyers_only = df[df['customer_lifetime_value'] > 0]
+
+    return {
+        'total_users': len(df),
+        'buyers': len(buyers_df),
+        'total_clv': df['customer_lifetime_value'].sum(),
+        'avg_clv': buyers_only['customer_lifetime_value'].mean(),
+        'user_counts': df['user_type'].value_counts(),
+        'buyers_avg_sessions': buyers_df['total_sessions'].mean(),
+        'non_buyers_avg_sessions': non_buyers_df['total_sessions'].mean(),
+        'buyers_revenue_per_session': buyers_df['revenue_per_session'].mean() if len(buyers_df) > 0 else None,
+        'top_users': df.nlargest(20, 'customer_lifetime_value'),
+        'buyers_only': buyers_only
+    }
+
+
+@memoize_prep
+def preparar_tiempo_primera_compra(df):
+    """
+    Velocidad de conversión por fuente y medio
+
+    Args:
+        df: Resultado de generar_query_tiempo_primera_compra
+
+    Returns:
+        dict con totales, fuente más rápida, top 15 fuentes más rápidas,
+        agregado por medio y fuentes rápidas (< 7 días) y lentas (> 30 días)
+    """
+    total_buyers = df['users_with_purchase'].sum()
+
+    medio_stats = df.groupby('first_medium').agg({
+        'users_with_purchase': 'sum',
+        'avg_days_to_purchase': 'mean'
+    }).reset_index().sort_values('users_with_purchase', ascending=False)
+
+    return {
+        'total_buyers': total_buyers,
+        'overall_avg_days': (df['avg_days_to_purchase'] * df['users_with_purchase']).sum() / total_buyers,
+        'fastest_source': df.loc[df['avg_days_to_purchase'].idxmin()],
+        'top_fastest': df.nsmallest(15, 'avg_days_to_purchase'),
+        'medio_stats': medio_stats,
+        'fast_sources': df[df['avg_days_to_purchase'] < 7],
+        'slow_sources': df[df['avg_days_to_purchase'] > 30]
+    }
+
+
+@memoize_prep
+def preparar_landing_page_attribution(df):
+    """
+    Totales y funnel agregado de las landing pages
+
+    Args:
+        df: Resultado de generar_query_landing_page_attribution
+
+    Returns:
+        dict con totales, la landing principal y las etapas del funnel
+    """
+    return {
+        'total_users': df['unique_users'].sum(),
+        'total_revenue': df['total_revenue'].sum(),
+        'total_purchases': df['total_purchases'].sum(),
+        'top_page': df.iloc[0] if len(df) > 0 else None,
+        'funnel_stages': ['Page Views', 'View Items', 'Add to Cart', 'Begin Checkout', 'Purchases'],
+        'funnel_totals': [
+            df['total_page_views'].sum(),
+            df['total_view_items'].sum(),
+            df['total_add_to_cart'].sum(),
+            df['total_begin_checkout'].sum(),
+            df['total_purchases'].sum()
+        ]
+    }
+
+
+@memoize_prep
+def preparar_adquisicion_usuarios(df):
+    """
+    Totales, agregado por channel group y top fuentes de adquisición
+
+    Args:
+        df: Resultado de generar_query_adquisicion_usuarios
+
+    Returns:
+        dict con totales, conversión global, agregado por canal y top 15
+        fuentes por usuarios
+    """
+    total_users = df['total_users'].sum()
+
+    channel_stats = df.groupby('channel_group').agg({
+        'total_users': 'sum',
+        'total_revenue': 'sum',
+        'total_purchases': 'sum'
+    }).reset_index().sort_values('total_users', ascending=False)
+
+    return {
+        'total_users': total_users,
+        'total_sessions': df['total_sessions'].sum(),
+        'total_revenue': df['total_revenue'].sum(),
+        'overall_conversion': (df['total_purchases'].sum() / total_users * 100) if total_users > 0 else 0,
+        'channel_stats': channel_stats,
+        'top_sources': df.nlargest(15, 'total_users')
+    }
+
+
+def _month_labels(month_dates):
+    """Mes y año en español ('Junio 2025'), con el locale del sistema si está disponible"""
+    try:
+        import locale
+        locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
+        return month_dates.dt.strftime('%B %Y')
+    except Exception:
+        # Si falla, nombres de meses en español a mano
+        labels = month_dates.dt.strftime('%B %Y')
+        for eng, esp in MESES_ES.items():
+            labels = labels.str.replace(eng, esp)
+        return labels
+
+
+@memoize_prep
+def preparar_conversion_mensual(df):
+    """
+    Meses ordenados con etiqueta legible y métricas de conversión
+
+    Args:
+        df: Resultado de generar_query_conversion_mensual
+
+    Returns:
+        dict con los meses (con month_display), conversión media, mejor y peor
+        mes e ingresos totales
+    """
+    months = df.sort_values('month').copy()
+    months['month_date'] = pd.to_datetime(months['month'] + '-01')
+    months['month_display'] = _month_labels(months['month_date'])
+
+    return {
+        'months': months,
+        'avg_conversion': months['conversion_rate'].mean(),
+        'best_month_row': months.loc[months['conversion_rate'].idxmax()],
+        'worst_month_row': months.loc[months['conversion_rate'].idxmin()],
+        'total_revenue': months['total_revenue'].sum()
+    }
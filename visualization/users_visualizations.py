@@ -1,8 +1,16 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from config.settings import Settings
+from visualization.users_prep import (
+    RETENTION_LABELS,
+    preparar_retencion_semanal,
+    preparar_clv_sesiones,
+    preparar_tiempo_primera_compra,
+    preparar_landing_page_attribution,
+    preparar_adquisicion_usuarios,
+    preparar_conversion_mensual
+)
 
 def mostrar_retencion_semanal(df):
     """Visualización para Weekly User Retention Analysis"""
@@ -12,31 +20,26 @@ def mostrar_retencion_semanal(df):
         st.warning("No hay datos de retención semanal para el rango seleccionado")
         return
     
-    # Convertir cohort_week a formato legible
-    df['cohort_week'] = pd.to_datetime(df['cohort_week'])
-    df['cohort_display'] = df['cohort_week'].dt.strftime('%d/%m/%Y')
+    prep = preparar_retencion_semanal(df)
+    cohorts = prep['cohorts']
     
     # Métricas generales
-    total_cohorts = len(df)
-    avg_week1_retention = df['week_1_retention_pct'].mean()
-    avg_week4_retention = df['week_4_retention_pct'].mean()
-    
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Cohortes Analizadas", f"{total_cohorts}")
+        st.metric("Cohortes Analizadas", f"{prep['total_cohorts']}")
     with col2:
-        st.metric("Retención Semana 1 (Promedio)", f"{avg_week1_retention:.1f}%")
+        st.metric("Retención Semana 1 (Promedio)", f"{prep['avg_week1_retention']:.1f}%")
     with col3:
-        st.metric("Retención Semana 4 (Promedio)", f"{avg_week4_retention:.1f}%")
+        st.metric("Retención Semana 4 (Promedio)", f"{prep['avg_week4_retention']:.1f}%")
     
     # Tabla de retención
     st.subheader("Tabla de Retención por Cohorte")
-    display_df = df[[
+    display_df = cohorts[[
         'cohort_display', 'cohort_size', 'week_0_users', 'week_1_users', 
         'week_2_users', 'week_3_users', 'week_4_users',
         'week_1_retention_pct', 'week_2_retention_pct', 
         'week_3_retention_pct', 'week_4_retention_pct'
-    ]].copy()
+    ]]
     
     st.dataframe(display_df.style.format({
         'cohort_size': '{:,}',
@@ -52,14 +55,10 @@ def mostrar_retencion_semanal(df):
     }))
     
     # Gráfico de líneas - Curva de retención promedio
-    retention_cols = ['week_1_retention_pct', 'week_2_retention_pct', 
-                     'week_3_retention_pct', 'week_4_retention_pct']
-    avg_retention = [df[col].mean() for col in retention_cols]
-    
     fig_curve = go.Figure()
     fig_curve.add_trace(go.Scatter(
-        x=['Semana 1', 'Semana 2', 'Semana 3', 'Semana 4'],
-        y=avg_retention,
+        x=RETENTION_LABELS,
+        y=prep['avg_retention'],
         mode='lines+markers',
         name='Retención Promedio',
         line=dict(color='blue', width=3),
@@ -74,14 +73,11 @@ def mostrar_retencion_semanal(df):
     st.plotly_chart(fig_curve, use_container_width=True)
     
     # Heatmap de retención por cohorte
-    if len(df) > 1:
+    if len(cohorts) > 1:
         st.subheader("Heatmap de Retención")
         
-        heatmap_data = df[['cohort_display'] + retention_cols].set_index('cohort_display')
-        heatmap_data.columns = ['Semana 1', 'Semana 2', 'Semana 3', 'Semana 4']
-        
         fig_heatmap = px.imshow(
-            heatmap_data.T,
+            prep['heatmap_data'].T,
             labels=dict(x="Cohorte", y="Semana", color="Retención (%)"),
             title="Retención por Cohorte y Semana",
             color_continuous_scale='RdYlGn',
@@ -91,14 +87,11 @@ def mostrar_retencion_semanal(df):
     
     # Análisis de drop-off
     st.subheader("Análisis de Drop-off")
-    avg_drop_week1 = 100 - avg_week1_retention
-    avg_drop_week4 = avg_week1_retention - avg_week4_retention
-    
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Drop-off Semana 0→1", f"{avg_drop_week1:.1f}%")
+        st.metric("Drop-off Semana 0→1", f"{prep['avg_drop_week1']:.1f}%")
     with col2:
-        st.metric("Drop-off Semana 1→4", f"{avg_drop_week4:.1f}%")
+        st.metric("Drop-off Semana 1→4", f"{prep['avg_drop_week4']:.1f}%")
 
 def mostrar_clv_sesiones(df):
     """Visualización para Customer Lifetime Value with Sessions"""
@@ -108,13 +101,11 @@ def mostrar_clv_sesiones(df):
         st.warning("No hay datos de CLV para el rango seleccionado")
         return
     
+    prep = preparar_clv_sesiones(df)
+    
     # Métricas generales
-    total_users = len(df)
-    buyers = len(df[df['user_type'] == 'Buyer'])
-    non_buyers = len(df[df['user_type'] == 'Non-Buyer'])
-    total_clv = df['customer_lifetime_value'].sum()
-    avg_clv = df[df['customer_lifetime_value'] > 0]['customer_lifetime_value'].mean()
-    avg_sessions = df['total_sessions'].mean()
+    total_users = prep['total_users']
+    buyers = prep['buyers']
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -122,9 +113,9 @@ def mostrar_clv_sesiones(df):
     with col2:
         st.metric("Compradores", f"{buyers:,} ({buyers/total_users*100:.1f}%)")
     with col3:
-        st.metric("CLV Total", f"€{total_clv:,.2f}")
+        st.metric("CLV Total", f"€{prep['total_clv']:,.2f}")
     with col4:
-        st.metric("CLV Promedio (Buyers)", f"€{avg_clv:,.2f}")
+        st.metric("CLV Promedio (Buyers)", f"€{prep['avg_clv']:,.2f}")
     
     # Distribución Buyers vs Non-Buyers
     st.subheader("Distribución de Usuarios")
@@ -133,7 +124,7 @@ def mostrar_clv_sesiones(df):
     
     with col1:
         # Pie chart
-        user_counts = df['user_type'].value_counts()
+        user_counts = prep['user_counts']
         fig_pie = px.pie(
             values=user_counts.values,
             names=user_counts.index,
@@ -144,20 +135,17 @@ def mostrar_clv_sesiones(df):
     
     with col2:
         # Métricas comparativas
-        buyers_df = df[df['user_type'] == 'Buyer']
-        non_buyers_df = df[df['user_type'] == 'Non-Buyer']
-        
         st.write("**Sesiones Promedio:**")
-        st.write(f"- Buyers: {buyers_df['total_sessions'].mean():.1f} sesiones")
-        st.write(f"- Non-Buyers: {non_buyers_df['total_sessions'].mean():.1f} sesiones")
+        st.write(f"- Buyers: {prep['buyers_avg_sessions']:.1f} sesiones")
+        st.write(f"- Non-Buyers: {prep['non_buyers_avg_sessions']:.1f} sesiones")
         
         st.write("**Revenue por Sesión:**")
-        if len(buyers_df) > 0:
-            st.write(f"- Buyers: €{buyers_df['revenue_per_session'].mean():.2f}")
+        if prep['buyers_revenue_per_session'] is not None:
+            st.write(f"- Buyers: €{prep['buyers_revenue_per_session']:.2f}")
     
     # Top usuarios por CLV
     st.subheader("Top Usuarios por CLV")
-    top_users = df.nlargest(20, 'customer_lifetime_value')
+    top_users = prep['top_users']
     
     fig_top = px.bar(
         top_users.head(20),
@@ -178,7 +166,7 @@ def mostrar_clv_sesiones(df):
     # Scatter: Sesiones vs CLV
     st.subheader("Relación: Sesiones vs CLV")
     
-    buyers_only = df[df['customer_lifetime_value'] > 0]
+    buyers_only = prep['buyers_only']
     fig_scatter = px.scatter(
         buyers_only.head(200),
         x='total_sessions',
@@ -199,9 +187,8 @@ def mostrar_clv_sesiones(df):
     # Histograma de distribución de CLV
     st.subheader("Distribución del CLV")
     
-    clv_buyers = df[df['customer_lifetime_value'] > 0]['customer_lifetime_value']
     fig_hist = px.histogram(
-        clv_buyers,
+        buyers_only['customer_lifetime_value'],
         x='customer_lifetime_value',
         nbins=50,
         title='Distribución de CLV (Solo Compradores)',
@@ -217,17 +204,15 @@ def mostrar_tiempo_primera_compra(df):
         st.warning("No hay datos de tiempo a compra para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_buyers = df['users_with_purchase'].sum()
-    overall_avg_days = (df['avg_days_to_purchase'] * df['users_with_purchase']).sum() / total_buyers
-    fastest_source = df.loc[df['avg_days_to_purchase'].idxmin()]
-    slowest_source = df.loc[df['avg_days_to_purchase'].idxmax()]
+    prep = preparar_tiempo_primera_compra(df)
+    fastest_source = prep['fastest_source']
     
+    # Métricas generales
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Compradores", f"{total_buyers:,}")
+        st.metric("Total Compradores", f"{prep['total_buyers']:,}")
     with col2:
-        st.metric("Tiempo Promedio Global", f"{overall_avg_days:.1f} días")
+        st.metric("Tiempo Promedio Global", f"{prep['overall_avg_days']:.1f} días")
     with col3:
         st.metric("Fuente Más Rápida", f"{fastest_source['first_source']} ({fastest_source['avg_days_to_purchase']:.1f}d)")
     
@@ -243,7 +228,7 @@ def mostrar_tiempo_primera_compra(df):
     # Gráfico de barras - Top fuentes por velocidad
     st.subheader("Top Fuentes por Velocidad de Conversión")
     
-    top_fastest = df.nsmallest(15, 'avg_days_to_purchase')
+    top_fastest = prep['top_fastest']
     
     fig_fastest = px.bar(
         top_fastest,
@@ -285,10 +270,7 @@ def mostrar_tiempo_primera_compra(df):
     # Análisis por medio
     st.subheader("Análisis por Medio de Adquisición")
     
-    medio_stats = df.groupby('first_medium').agg({
-        'users_with_purchase': 'sum',
-        'avg_days_to_purchase': 'mean'
-    }).reset_index().sort_values('users_with_purchase', ascending=False)
+    medio_stats = prep['medio_stats']
     
     fig_medio = px.bar(
         medio_stats.head(10),
@@ -308,8 +290,8 @@ def mostrar_tiempo_primera_compra(df):
     # Insights de velocidad
     st.subheader("Insights Clave")
     
-    fast_sources = df[df['avg_days_to_purchase'] < 7]
-    slow_sources = df[df['avg_days_to_purchase'] > 30]
+    fast_sources = prep['fast_sources']
+    slow_sources = prep['slow_sources']
     
     col1, col2 = st.columns(2)
     with col1:
@@ -330,19 +312,17 @@ def mostrar_landing_page_attribution(df):
         st.warning("No hay datos de landing pages para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_users = df['unique_users'].sum()
-    total_revenue = df['total_revenue'].sum()
-    total_purchases = df['total_purchases'].sum()
-    top_page = df.iloc[0] if len(df) > 0 else None
+    prep = preparar_landing_page_attribution(df)
+    top_page = prep['top_page']
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Usuarios", f"{total_users:,}")
+        st.metric("Total Usuarios", f"{prep['total_users']:,}")
     with col2:
-        st.metric("Total Compras", f"{total_purchases:,}")
+        st.metric("Total Compras", f"{prep['total_purchases']:,}")
     with col3:
-        st.metric("Revenue Total", f"€{total_revenue:,.2f}")
+        st.metric("Revenue Total", f"€{prep['total_revenue']:,.2f}")
     with col4:
         if top_page is not None:
             st.metric("Top Landing Page", f"{top_page['unique_users']:,} usuarios")
@@ -385,20 +365,9 @@ def mostrar_landing_page_attribution(df):
     # Funnel de conversión promedio
     st.subheader("Funnel de Conversión Agregado")
     
-    funnel_data = {
-        'Etapa': ['Page Views', 'View Items', 'Add to Cart', 'Begin Checkout', 'Purchases'],
-        'Total': [
-            df['total_page_views'].sum(),
-            df['total_view_items'].sum(),
-            df['total_add_to_cart'].sum(),
-            df['total_begin_checkout'].sum(),
-            df['total_purchases'].sum()
-        ]
-    }
-    
     fig_funnel = go.Figure(go.Funnel(
-        y=funnel_data['Etapa'],
-        x=funnel_data['Total'],
+        y=prep['funnel_stages'],
+        x=prep['funnel_totals'],
         textinfo="value+percent initial"
     ))
     fig_funnel.update_layout(title='Funnel Agregado de Todas las Landing Pages')
@@ -444,20 +413,18 @@ def mostrar_adquisicion_usuarios(df):
         st.warning("No hay datos de adquisición para el rango seleccionado")
         return
     
-    # Métricas generales
-    total_users = df['total_users'].sum()
-    total_revenue = df['total_revenue'].sum()
-    overall_conversion = (df['total_purchases'].sum() / total_users * 100) if total_users > 0 else 0
+    prep = preparar_adquisicion_usuarios(df)
     
+    # Métricas generales
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Usuarios", f"{total_users:,}")
+        st.metric("Total Usuarios", f"{prep['total_users']:,}")
     with col2:
-        st.metric("Sesiones Totales", f"{df['total_sessions'].sum():,}")
+        st.metric("Sesiones Totales", f"{prep['total_sessions']:,}")
     with col3:
-        st.metric("Revenue Total", f"€{total_revenue:,.2f}")
+        st.metric("Revenue Total", f"€{prep['total_revenue']:,.2f}")
     with col4:
-        st.metric("Conversión Global", f"{overall_conversion:.2f}%")
+        st.metric("Conversión Global", f"{prep['overall_conversion']:.2f}%")
     
     # Tabla de datos
     st.dataframe(df.style.format({
@@ -473,11 +440,7 @@ def mostrar_adquisicion_usuarios(df):
     # Análisis por Channel Group
     st.subheader("Performance por Channel Group")
     
-    channel_stats = df.groupby('channel_group').agg({
-        'total_users': 'sum',
-        'total_revenue': 'sum',
-        'total_purchases': 'sum'
-    }).reset_index().sort_values('total_users', ascending=False)
+    channel_stats = prep['channel_stats']
     
     col1, col2 = st.columns(2)
     
@@ -508,7 +471,7 @@ def mostrar_adquisicion_usuarios(df):
     # Top fuentes
     st.subheader("Top Fuentes de Adquisición")
     
-    top_sources = df.nlargest(15, 'total_users')
+    top_sources = prep['top_sources']
     
     fig_sources = px.bar(
         top_sources,
@@ -552,50 +515,26 @@ def mostrar_conversion_mensual(df):
         st.warning("No hay datos de conversión mensual para el rango seleccionado")
         return
     
-    # Ordenar por mes
-    df = df.sort_values('month')
-    
-    # Convertir el mes a formato datetime para mejor manejo
-    df['month_date'] = pd.to_datetime(df['month'] + '-01')
-    df['month_display'] = df['month_date'].dt.strftime('%B %Y') # Formato: "Junio 2025"
-    
-    # Cambiar locale para español (intentar, si falla usar inglés)
-    try:
-        import locale
-        locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
-        df['month_display'] = df['month_date'].dt.strftime('%B %Y')
-    except:
-        # Si falla, usar nombres de meses en español manualmente
-        meses_es = {
-            'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo',
-            'April': 'Abril', 'May': 'Mayo', 'June': 'Junio',
-            'July': 'Julio', 'August': 'Agosto', 'September': 'Septiembre',
-            'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
-        }
-        df['month_display'] = df['month_date'].dt.strftime('%B %Y')
-        for eng, esp in meses_es.items():
-            df['month_display'] = df['month_display'].str.replace(eng, esp)
+    prep = preparar_conversion_mensual(df)
+    df = prep['months']
+    best_month_row = prep['best_month_row']
+    worst_month_row = prep['worst_month_row']
     
     # Métricas generales
-    avg_conversion = df['conversion_rate'].mean()
-    best_month_row = df.loc[df['conversion_rate'].idxmax()]
-    worst_month_row = df.loc[df['conversion_rate'].idxmin()]
-    total_revenue = df['total_revenue'].sum()
-    
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Conversión Promedio", f"{avg_conversion:.2f}%")
+        st.metric("Conversión Promedio", f"{prep['avg_conversion']:.2f}%")
     with col2:
         st.metric("Mejor Mes", f"{best_month_row['month_display']}: {best_month_row['conversion_rate']:.2f}%")
     with col3:
         st.metric("Peor Mes", f"{worst_month_row['month_display']}: {worst_month_row['conversion_rate']:.2f}%")
     with col4:
-        st.metric("Revenue Total", f"€{total_revenue:,.2f}")
+        st.metric("Revenue Total", f"€{prep['total_revenue']:,.2f}")
     
     # Tabla de datos
     display_df = df[['month_display', 'total_users', 'converted_users', 'conversion_rate', 
                       'total_revenue', 'total_transactions', 'avg_revenue_per_converter', 
-                      'avg_revenue_per_user']].copy()
+                      'avg_revenue_per_user']]
     
     st.dataframe(display_df.style.format({
         'total_users': '{:,}',